@@ -0,0 +1,518 @@
+"""
+This module times every stage of the synchronization pipeline on
+synthetic or real matches and keeps a history of the results.
+
+The stages are loading (meta data, positions, events, slicing and
+summary), the ball fusion, the calculation of the sequences, every
+synchronization approach, the players on the field, the template
+matching, the match statistics and the evaluation against the ground
+truth of the synthetic matches. Every stage is run `repeat` times and
+the median wall time and CPU time are recorded.
+
+Each run is appended to a JSON history. A stage is flagged as a
+regression if its median is more than `tolerance` slower than the
+median of the last `window` runs with the same configuration.
+
+Usage:
+    python -m benchmarks.benchmark_suite --data-dir /tmp/handball \
+        --generate 2 --minutes 20 --history benchmark_history.json
+
+Author:
+    @Annabelle Runge
+
+Date:
+    2025-05-22
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import warnings
+from datetime import datetime
+from typing import Any, Callable, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+import variables.data_variables as dv
+from evaluation.accuracy_engine import (APPROACH_COLUMNS, TARGET_EVENTS,
+                                        accuracy_table, to_long_form)
+from help_functions.match_context import MatchContext
+
+# Names of the approaches in the evaluation results
+APPROACH_NAMES = {
+    dv.Approach.NONE: "None",
+    dv.Approach.BASELINE: "Baseline",
+    dv.Approach.RULE_BASED: "Rulebased",
+    dv.Approach.POS_DATA: "pos",
+    dv.Approach.POS_RB: "pos_RB",
+    dv.Approach.POS_CORRECTION: "pos_COR",
+    dv.Approach.COST_BASED: "Cost",
+    dv.Approach.COST_BASED_COR: "Cost_COR",
+    dv.Approach.COST_BASED_RB: "Cost_RB",
+    dv.Approach.COST_BASED_DP: "Cost_DP",
+}
+
+
+@contextlib.contextmanager
+def silenced(quiet: bool = True) -> Iterator[None]:
+    """
+    Suppresses the prints and warnings of the pipeline.
+
+    Args:
+        quiet: Whether to suppress them, nothing is changed if False
+    """
+    with contextlib.ExitStack() as stack:
+        if quiet:
+            stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+            stack.enter_context(warnings.catch_warnings())
+            warnings.simplefilter("ignore")
+        yield
+
+
+def time_stage(timings: dict[str, list[dict[str, float]]], name: str,
+               func: Callable[[], Any], repeat: int = 1,
+               quiet: bool = True) -> Any:
+    """
+    Runs a stage `repeat` times and records its wall and CPU times.
+
+    Args:
+        timings: The timings of all stages, the runs of this stage are
+        appended
+        name: The name of the stage
+        func: The stage
+        repeat: Number of runs
+        quiet: Whether to suppress the prints and warnings of the stage
+
+    Returns:
+        Any: The result of the last run
+    """
+    result = None
+    for _ in range(repeat):
+        with silenced(quiet):
+            wall, cpu = time.perf_counter(), time.process_time()
+            result = func()
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        timings.setdefault(name, []).append({"wall": wall, "cpu": cpu})
+    return result
+
+
+def _load(context: MatchContext, *names: str) -> Callable[[], Any]:
+    """
+    Creates a stage that loads data of the match context again.
+
+    Args:
+        context: The match context
+        names: The names of the data
+
+    Returns:
+        Callable: The stage
+    """
+    def stage() -> Any:
+        context.clear(*names)
+        return [getattr(context, name) for name in names]
+    return stage
+
+
+def phases_at(frames: np.ndarray,
+              sequences: list[tuple[int, int, int]]) -> np.ndarray:
+    """
+    Looks up the phase of the sequence that contains each frame.
+
+    Args:
+        frames: The frames
+        sequences: The sorted (start, end, phase) sequences
+
+    Returns:
+        np.ndarray: The phases, -1 for frames outside of all sequences
+    """
+    seq = np.asarray(sequences, dtype=np.int64).reshape(-1, 3)
+    frames = np.asarray(frames, dtype=float)
+    index = np.searchsorted(seq[:, 0], frames, side="right") - 1
+    inside = (index >= 0) & ~np.isnan(frames)
+    inside[inside] &= frames[inside] < seq[index[inside], 1]
+    return np.where(inside, seq[np.maximum(index, 0), 2], -1)
+
+
+def evaluate_against_ground_truth(
+        results: dict[dv.Approach, pd.DataFrame],
+        ground_truth: dict[str, Any], match_id: int) -> pd.DataFrame:
+    """
+    Evaluates the synchronized events of all approaches against the
+    true phases of a synthetic match.
+
+    Args:
+        results: The synchronized events of every approach
+        ground_truth: The ground truth file of the match
+        match_id: The ID of the match
+
+    Returns:
+        pd.DataFrame: The long-form evaluation results
+    """
+    truth = pd.DataFrame(ground_truth["events"])
+    truth = truth[truth["type"].isin(TARGET_EVENTS)]
+    wide = pd.DataFrame({"Event_id": truth["id"].to_numpy(),
+                         "eID": truth["type"].to_numpy()})
+    for approach, events in results.items():
+        frames = pd.Series(
+            pd.to_numeric(events.iloc[:, 24], errors="coerce").to_numpy(),
+            index=events["eventID"].to_numpy())
+        frames = frames[~frames.index.duplicated()]
+        synced = frames.reindex(wide["Event_id"]).to_numpy()
+        predicted = phases_at(synced, ground_truth["sequences"])
+        wide[APPROACH_COLUMNS[APPROACH_NAMES[approach]]] = np.where(
+            np.isnan(synced), np.nan,
+            (predicted == truth["phase"].to_numpy()).astype(float))
+    return to_long_form(wide, match_id)
+
+
+def benchmark_match(context: MatchContext,
+                    approaches: list[dv.Approach], repeat: int = 1,
+                    quiet: bool = True, candidates: bool = False
+                    ) -> tuple[dict[str, list[dict[str, float]]],
+                               dict[str, int], Optional[pd.DataFrame],
+                               list[str]]:
+    """
+    Times all stages of the pipeline for one match.
+
+    Args:
+        context: The match context
+        approaches: The approaches to time
+        repeat: Number of runs per stage
+        quiet: Whether to suppress the prints and warnings of the stages
+        candidates: Whether the cost based approach scores only the ball
+        event candidates
+
+    Returns:
+        tuple: The timings of all stages, the item counts of the match,
+        the long-form evaluation results, None without ground truth, and
+        the names of the approaches that failed
+    """
+    from evaluation import sportanalysis
+    from main_structure import synchronize_approach
+    from preprocessing.template_matching.template_start import match_formations
+    from sport_analysis.sport_analysis_overall import \
+        create_combined_statistics
+
+    timings: dict[str, list[dict[str, float]]] = {}
+    failures: list[str] = []
+
+    def stage(name: str, func: Callable[[], Any]) -> Any:
+        return time_stage(timings, name, func, repeat, quiet)
+
+    stage("load_meta_data", _load(context, "meta_data"))
+    stage("load_positions", _load(context, "pos_data"))
+    stage("load_events", _load(context, "event_stream"))
+    stage("load_slicing", _load(context, "predictions"))
+    stage("load_summary", _load(context, "summary", "lookup"))
+    stage("ball_fusion", _load(context, "ball"))
+    stage("calculate_sequences", _load(context, "sequences"))
+
+    results = {}
+    for approach in approaches:
+        try:
+            results[approach], _ = stage(
+                f"approach:{approach.name}",
+                lambda approach=approach: synchronize_approach(
+                    approach, context.events, list(context.sequences),
+                    context.match_id, context, candidates))
+        except ValueError as e:
+            # The correction extension fails if no phase of the team exists
+            # before an event, the other stages are timed anyway
+            timings.pop(f"approach:{approach.name}", None)
+            failures.append(approach.name)
+            print(f"Approach {approach.name} failed for match "
+                  f"{context.match_id}: {e}")
+
+    events = results.get(dv.Approach.RULE_BASED, context.events)
+    events = stage("players_on_field",
+                   lambda: sportanalysis.count_players_on_field(
+                       events.copy(), context.sequences, context.pos_data,
+                       context.pid_dict))
+    formations = stage("template_matching", lambda: match_formations(
+        context.pos_data, context.pid_dict, context.sequences,
+        context.lookup, context.summary, context.roster,
+        context.template_path, context.match,
+        kinematics=context.phase_kinematics))
+
+    def match_statistics() -> Any:
+        phase_events = sportanalysis.evaluate_phase_events(
+            events.copy(), context.sequences)
+        phase_events = sportanalysis.next_phase(phase_events,
+                                                context.sequences)
+        return create_combined_statistics(phase_events, context.match_id,
+                                          formations)
+    stage("statistics", match_statistics)
+
+    long = None
+    truth_path = os.path.join(context.base_path, "HBL_Synchronization",
+                              "GroundTruth",
+                              f"ground_truth_{context.match_id}.json")
+    if os.path.exists(truth_path) and results:
+        with open(truth_path, encoding="utf-8") as f:
+            ground_truth = json.load(f)
+        long = stage("evaluation", lambda: evaluate_against_ground_truth(
+            results, ground_truth, context.match_id))
+
+    counts = {"events": len(context.event_stream[2]),
+              "frames": int(context.meta_data[1]) + 1,
+              "sequences": len(context.sequences)}
+    return timings, counts, long, failures
+
+
+def run_benchmark(base_path: str, match_ids: list[int],
+                  approaches: Optional[list[dv.Approach]] = None,
+                  repeat: int = 1, quiet: bool = True,
+                  config: Optional[dict[str, Any]] = None,
+                  candidates: bool = False) -> dict[str, Any]:
+    """
+    Times all stages for several matches.
+
+    Args:
+        base_path: The data directory
+        match_ids: The IDs of the matches
+        approaches: The approaches to time, all approaches if None
+        repeat: Number of runs per stage
+        quiet: Whether to suppress the prints and warnings of the stages
+        config: The configuration of the run, only runs with the same
+        configuration are compared
+        candidates: Whether the cost based approach scores only the ball
+        event candidates
+
+    Returns:
+        dict: The record of the run with the median wall and CPU time of
+        every stage summed over all matches and the failed approaches
+    """
+    approaches = list(dv.Approach) if approaches is None else approaches
+    stages: dict[str, dict[str, float]] = {}
+    counts = {"matches": len(match_ids), "events": 0, "frames": 0,
+              "sequences": 0}
+    longs = []
+    failures: dict[str, list[str]] = {}
+    for match_id in match_ids:
+        context = MatchContext(match_id, base_path=base_path)
+        timings, match_counts, long, failed = benchmark_match(
+            context, approaches, repeat, quiet, candidates)
+        if failed:
+            failures[str(match_id)] = failed
+        for name, runs in timings.items():
+            total = stages.setdefault(name, {"wall": 0.0, "cpu": 0.0})
+            total["wall"] += statistics.median(run["wall"] for run in runs)
+            total["cpu"] += statistics.median(run["cpu"] for run in runs)
+        for key, value in match_counts.items():
+            counts[key] += value
+        if long is not None:
+            longs.append(long)
+        total = sum(statistics.median(run["wall"] for run in runs)
+                    for runs in timings.values())
+        print(f"Match {match_id}: {total:.2f}s")
+
+    record = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.node(),
+        "config": config or {"data_dir": base_path,
+                             "matches": match_ids,
+                             "approaches": [a.name for a in approaches],
+                             "repeat": repeat,
+                             "candidates": candidates},
+        "counts": counts,
+        "stages": stages,
+        "failures": failures,
+    }
+    if longs:
+        table = accuracy_table(pd.concat(longs, ignore_index=True))
+        overall = table[table["event_type"] == "all"]
+        record["accuracy"] = dict(zip(overall["approach"],
+                                      overall["accuracy"].astype(float)))
+    return record
+
+
+def _git_commit() -> Optional[str]:
+    """
+    Returns the current git commit of the repository.
+
+    Returns:
+        str: The commit hash, None outside of a git repository
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+            text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(file_path: str) -> list[dict[str, Any]]:
+    """
+    Loads the benchmark history.
+
+    Args:
+        file_path: The path of the history file
+
+    Returns:
+        list: The records of all previous runs
+    """
+    if not os.path.exists(file_path):
+        return []
+    with open(file_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_history(file_path: str, history: list[dict[str, Any]]) -> None:
+    """
+    Saves the benchmark history.
+
+    Args:
+        file_path: The path of the history file
+        history: The records of all runs
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    os.makedirs(directory, exist_ok=True)
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump(history, f, indent=2)
+
+
+def find_regressions(record: dict[str, Any],
+                     history: list[dict[str, Any]], window: int = 5,
+                     tolerance: float = 0.25, min_seconds: float = 0.05
+                     ) -> list[dict[str, Any]]:
+    """
+    Compares the stages of a run with the previous runs of the same
+    configuration.
+
+    Args:
+        record: The record of the run
+        history: The records of the previous runs
+        window: Number of previous runs the baseline is taken from
+        tolerance: Allowed relative slowdown
+        min_seconds: Slowdowns below this absolute value are ignored
+
+    Returns:
+        list: The regressed stages with their time, baseline and ratio
+    """
+    previous = [old for old in history
+                if old.get("config") == record["config"]][-window:]
+    regressions = []
+    for name, times in record["stages"].items():
+        baseline_times = [old["stages"][name]["wall"] for old in previous
+                          if name in old["stages"]]
+        if not baseline_times:
+            continue
+        baseline = statistics.median(baseline_times)
+        if (times["wall"] > baseline * (1 + tolerance)
+                and times["wall"] - baseline > min_seconds):
+            regressions.append({"stage": name, "wall": times["wall"],
+                                "baseline": baseline,
+                                "ratio": times["wall"] / baseline})
+    return regressions
+
+
+def print_report(record: dict[str, Any],
+                 regressions: list[dict[str, Any]]) -> None:
+    """
+    Prints the stage times of a run and the regressions.
+
+    Args:
+        record: The record of the run
+        regressions: The regressed stages
+    """
+    regressed = {regression["stage"]: regression
+                 for regression in regressions}
+    print(f"\n{'stage':<32} {'wall [s]':>10} {'cpu [s]':>10}")
+    for name, times in record["stages"].items():
+        flag = (f"  REGRESSION x{regressed[name]['ratio']:.2f}"
+                if name in regressed else "")
+        print(f"{name:<32} {times['wall']:10.3f} {times['cpu']:10.3f}{flag}")
+    total = sum(times["wall"] for times in record["stages"].values())
+    print(f"{'total':<32} {total:10.3f}")
+    print("Counts:", record["counts"])
+    if record.get("failures"):
+        print("Failed approaches:", record["failures"])
+    if "accuracy" in record:
+        print("Accuracy:", {approach: round(accuracy, 3) for
+                            approach, accuracy in record["accuracy"].items()})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Time every stage of the synchronization pipeline.')
+    parser.add_argument('--data-dir', required=True,
+                        help='Data directory with the layout of the '
+                        'handball data drive')
+    parser.add_argument('--match-id', type=int, nargs='+',
+                        help='Matches to time, all matches of the mapping '
+                        'file if not given')
+    parser.add_argument('--generate', type=int, default=0,
+                        help='Generate this many synthetic matches first')
+    parser.add_argument('--minutes', type=float, default=20,
+                        help='Gross playing time of generated matches')
+    parser.add_argument('--event-density', type=float, default=1.0,
+                        help='Event density of generated matches')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the generated matches')
+    parser.add_argument('--approach', nargs='+',
+                        choices=[a.name for a in dv.Approach],
+                        help='Approaches to time, all if not given')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Runs per stage')
+    parser.add_argument('--history', default='benchmark_history.json',
+                        help='JSON file with the results of all runs')
+    parser.add_argument('--window', type=int, default=5,
+                        help='Number of previous runs for the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed relative slowdown per stage')
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help='Exit with code 1 if a stage regressed')
+    parser.add_argument('--candidates', action='store_true',
+                        help='Score only the ball event candidates in the '
+                        'cost based approach')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Show the prints of the pipeline')
+    args = parser.parse_args()
+
+    from help_functions.headless import enable_headless_mode
+    enable_headless_mode()
+
+    config = {"repeat": args.repeat,
+              "approaches": args.approach or [a.name for a in dv.Approach],
+              "candidates": args.candidates}
+    if args.generate:
+        from benchmarks.synthetic_match import generate_season
+        match_ids = generate_season(args.data_dir, args.generate,
+                                    args.minutes, args.event_density,
+                                    args.seed)
+        config.update({"synthetic": True, "matches": args.generate,
+                       "minutes": args.minutes,
+                       "event_density": args.event_density,
+                       "seed": args.seed})
+    else:
+        match_ids = args.match_id or pd.read_csv(
+            MatchContext(0, base_path=args.data_dir).mapping_file,
+            delimiter=";")["match_id"].tolist()
+        config.update({"data_dir": os.path.abspath(args.data_dir),
+                       "matches": match_ids})
+
+    approaches = [dv.Approach[name] for name in config["approaches"]]
+    record = run_benchmark(args.data_dir, match_ids, approaches,
+                           args.repeat, not args.verbose, config,
+                           args.candidates)
+    history = load_history(args.history)
+    regressions = find_regressions(record, history, args.window,
+                                   args.tolerance)
+    record["regressions"] = regressions
+    save_history(args.history, history + [record])
+    print_report(record, regressions)
+
+    if regressions:
+        print(f"{len(regressions)} stage(s) regressed.")
+        if args.fail_on_regression:
+            sys.exit(1)
@@ -0,0 +1,631 @@
+"""
+This module compares the outputs of the pipeline of a reference and a
+candidate implementation (differential testing).
+
+Faster implementations of functions like `rolling_mode`,
+`combine_both_valid_ball_data`, `sync_pos_data_batch` or `get_players_count`
+have to give the same results as the reference code. The harness runs
+the pipeline of a match once with the reference code and once with the
+candidate functions substituted, and compares
+    - the combined ball positions,
+    - the game phase sequences,
+    - the synchronized frame and the phase of every event per approach,
+    - the player counts of every event,
+    - the formations and the combined match statistics.
+Frames and numbers are compared with tolerances. All mismatches are
+collected in a report with one row per mismatching value.
+
+The reference outputs can be saved as golden files. Without candidates
+the current code is compared against the golden files, so every change
+of the results is found.
+
+Usage:
+    python -m benchmarks.differential --data-dir /tmp/handball \
+        --golden-dir golden --candidate \
+        existing_code.rolling_mode:rolling_mode=my_module:fast_mode
+
+Author:
+    @Annabelle Runge
+
+Date:
+    2025-05-23
+"""
+import argparse
+import contextlib
+import importlib
+import json
+import math
+import os
+import sys
+from enum import Enum
+from typing import Any, Callable, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+import variables.data_variables as dv
+from benchmarks.benchmark_suite import phases_at, silenced
+from evaluation.accuracy_engine import TARGET_EVENTS
+from help_functions.match_context import MatchContext
+
+REPORT_COLUMNS = ["match", "section", "approach", "key", "event_type",
+                  "field", "reference", "candidate"]
+
+
+def resolve(name: str) -> Any:
+    """
+    Imports an object by its name.
+
+    Args:
+        name: The name as "module.path:attribute"
+
+    Returns:
+        Any: The object
+    """
+    module_name, _, attribute = name.partition(":")
+    if not attribute:
+        raise ValueError(f"Expected 'module:attribute', got '{name}'")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+@contextlib.contextmanager
+def substituted(replacements: dict[str, Callable[..., Any]]
+                ) -> Iterator[None]:
+    """
+    Replaces functions by candidate implementations.
+
+    Functions that were imported with `from module import function` are
+    bound in several modules, so the function is replaced in every loaded
+    module that refers to the original.
+
+    Args:
+        replacements: The candidates by the name of the replaced
+        function as "module.path:function"
+    """
+    patched = []
+    try:
+        for target, candidate in replacements.items():
+            original = resolve(target)
+            attribute = target.partition(":")[2]
+            for module in list(sys.modules.values()):
+                if getattr(module, attribute, None) is original:
+                    setattr(module, attribute, candidate)
+                    patched.append((module, attribute, original))
+        yield
+    finally:
+        for module, attribute, original in reversed(patched):
+            setattr(module, attribute, original)
+
+
+def to_json(value: Any) -> Any:
+    """
+    Converts nested results into plain JSON values: string keys, python
+    numbers, lists instead of tuples and arrays and names of enums.
+
+    Args:
+        value: The value
+
+    Returns:
+        Any: The JSON value
+    """
+    if isinstance(value, dict):
+        return {str(key.name if isinstance(key, Enum) else key): to_json(item)
+                for key, item in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [to_json(item) for item in value]
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, np.generic):
+        return value.item()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if pd.isna(value):
+        return None
+    return str(value)
+
+
+def _event_keys(events: pd.DataFrame) -> list[str]:
+    """
+    Creates unique keys of the events from their Sportradar IDs.
+
+    Args:
+        events: The events of the match
+
+    Returns:
+        list: The keys, "row_{index}" for events without ID
+    """
+    keys = []
+    for idx, event_id in enumerate(events["eventID"].tolist()):
+        key = f"row_{idx}" if pd.isna(event_id) else str(event_id)
+        if key in keys:
+            key = f"{key}#{idx}"
+        keys.append(key)
+    return keys
+
+
+def capture_outputs(context: MatchContext, approaches: list[dv.Approach],
+                    quiet: bool = True) -> dict[str, Any]:
+    """
+    Runs the pipeline of a match and collects all outputs.
+
+    Args:
+        context: The match context
+        approaches: The approaches to run
+        quiet: Whether to suppress the prints and warnings of the pipeline
+
+    Returns:
+        dict: The outputs, JSON values except for the array "ball"
+    """
+    from evaluation import sportanalysis
+    from main_structure import synchronize_approach
+    from preprocessing.template_matching.template_start import match_formations
+    from sport_analysis.sport_analysis_overall import \
+        create_combined_statistics
+
+    outputs: dict[str, Any] = {"match_id": context.match_id, "events": {},
+                               "errors": {}}
+    with silenced(quiet):
+        outputs["ball"] = np.asarray(context.ball_positions, dtype=float)
+        outputs["sequences"] = to_json(context.sequences)
+
+        results = {}
+        for approach in approaches:
+            try:
+                results[approach], _ = synchronize_approach(
+                    approach, context.events, list(context.sequences),
+                    context.match_id, context)
+            except Exception as e:
+                outputs["errors"][approach.name] = f"{type(e).__name__}: {e}"
+                continue
+            events = results[approach]
+            frames = pd.to_numeric(events.iloc[:, 24],
+                                   errors="coerce").to_numpy(dtype=float)
+            phases = phases_at(frames, context.sequences)
+            outputs["events"][approach.name] = {
+                key: {"type": str(event_type),
+                      "frame": None if math.isnan(frame) else frame,
+                      "phase": int(phase)}
+                for key, event_type, frame, phase in zip(
+                    _event_keys(events), events.iloc[:, 0], frames, phases)}
+
+        events = results.get(dv.Approach.RULE_BASED, context.events)
+        # Unconverted results of the stages, used by the later stages
+        raw: dict[str, Any] = {}
+
+        def counts() -> dict[str, Any]:
+            counted = sportanalysis.count_players_on_field(
+                events.copy(), context.sequences, context.pos_data,
+                context.pid_dict)
+            raw["counts"] = counted
+            return {key: {"type": event[0], "home": to_json(event[26]),
+                          "away": to_json(event[27])}
+                    for key, event in zip(_event_keys(counted),
+                                          counted.values)
+                    if event[0] in TARGET_EVENTS}
+
+        def formations() -> list[Any]:
+            raw["formations"] = match_formations(
+                context.pos_data, context.pid_dict, context.sequences,
+                context.lookup, context.summary, context.roster,
+                context.template_path, context.match,
+                kinematics=context.phase_kinematics)
+            return raw["formations"]
+
+        def statistics() -> dict[str, Any]:
+            phase_events = sportanalysis.evaluate_phase_events(
+                raw["counts"].copy(), context.sequences)
+            phase_events = sportanalysis.next_phase(phase_events,
+                                                    context.sequences)
+            return create_combined_statistics(
+                phase_events, context.match_id, raw["formations"])
+
+        # A failing stage is reported as a mismatch instead of stopping
+        # the comparison
+        for name, stage in (("counts", counts), ("formations", formations),
+                            ("statistics", statistics)):
+            try:
+                outputs[name] = to_json(stage())
+            except Exception as e:
+                outputs[name] = None
+                outputs["errors"][name] = f"{type(e).__name__}: {e}"
+    return outputs
+
+
+def save_golden(outputs: dict[str, Any], golden_dir: str) -> None:
+    """
+    Saves the outputs of a match as golden files: the ball positions as
+    .npy file and all other outputs as JSON file.
+
+    Args:
+        outputs: The outputs of the match
+        golden_dir: The directory of the golden files
+    """
+    os.makedirs(golden_dir, exist_ok=True)
+    match_id = outputs["match_id"]
+    np.save(os.path.join(golden_dir, f"golden_{match_id}_ball.npy"),
+            outputs["ball"])
+    with open(os.path.join(golden_dir, f"golden_{match_id}.json"), "w",
+              encoding="utf-8") as f:
+        json.dump({key: value for key, value in outputs.items()
+                   if key != "ball"}, f, indent=1)
+
+
+def load_golden(match_id: int, golden_dir: str) -> Optional[dict[str, Any]]:
+    """
+    Loads the golden outputs of a match.
+
+    Args:
+        match_id: The ID of the match
+        golden_dir: The directory of the golden files
+
+    Returns:
+        dict: The outputs, None if there are no golden files
+    """
+    json_path = os.path.join(golden_dir, f"golden_{match_id}.json")
+    if not os.path.exists(json_path):
+        return None
+    with open(json_path, encoding="utf-8") as f:
+        outputs = json.load(f)
+    outputs["ball"] = np.load(os.path.join(golden_dir,
+                                           f"golden_{match_id}_ball.npy"))
+    return outputs
+
+
+def _flatten(value: Any, prefix: str = "") -> dict[str, Any]:
+    """
+    Flattens nested dictionaries and lists into paths and leaf values.
+
+    Args:
+        value: The nested value
+        prefix: The path of the value
+
+    Returns:
+        dict: The leaf values by their paths
+    """
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, list):
+        items = enumerate(value)
+    else:
+        return {prefix: value}
+    flat = {}
+    for key, item in items:
+        flat.update(_flatten(item, f"{prefix}/{key}" if prefix else str(key)))
+    return flat
+
+
+def values_equal(reference: Any, candidate: Any, rtol: float = 1e-6,
+                 atol: float = 1e-9) -> bool:
+    """
+    Compares two values, numbers within the tolerances.
+
+    Args:
+        reference: The reference value
+        candidate: The candidate value
+        rtol: Relative tolerance of numbers
+        atol: Absolute tolerance of numbers
+
+    Returns:
+        bool: Whether the values are equal
+    """
+    numbers = (int, float, np.number)
+    if (isinstance(reference, numbers) and isinstance(candidate, numbers)
+            and not isinstance(reference, bool)
+            and not isinstance(candidate, bool)):
+        if math.isnan(reference) or math.isnan(candidate):
+            return math.isnan(reference) and math.isnan(candidate)
+        return math.isclose(reference, candidate, rel_tol=rtol, abs_tol=atol)
+    return bool(reference == candidate)
+
+
+def _diff_ball(reference: np.ndarray, candidate: np.ndarray, rtol: float,
+               atol: float) -> list[dict[str, Any]]:
+    """
+    Compares the ball positions. Consecutive mismatching frames are
+    reported as one range.
+
+    Args:
+        reference: The reference ball positions
+        candidate: The candidate ball positions
+        rtol: Relative tolerance
+        atol: Absolute tolerance
+
+    Returns:
+        list: The mismatches
+    """
+    if reference.shape != candidate.shape:
+        return [{"key": "shape", "field": "shape",
+                 "reference": str(reference.shape),
+                 "candidate": str(candidate.shape)}]
+    close = np.isclose(reference, candidate, rtol=rtol, atol=atol,
+                       equal_nan=True)
+    bad = ~close.reshape(len(close), -1).all(axis=1)
+    frames = np.flatnonzero(bad)
+    if len(frames) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(frames) > 1)
+    starts = frames[np.r_[0, breaks + 1]]
+    ends = frames[np.r_[breaks, len(frames) - 1]]
+    return [{"key": f"{start}-{end}", "field": "xy",
+             "reference": str(reference[start].tolist()),
+             "candidate": str(candidate[start].tolist())}
+            for start, end in zip(starts, ends)]
+
+
+def _diff_events(reference: dict[str, dict[str, Any]],
+                 candidate: dict[str, dict[str, Any]], fields: list[str],
+                 frame_tolerance: float, rtol: float, atol: float
+                 ) -> list[dict[str, Any]]:
+    """
+    Compares per-event outputs.
+
+    Args:
+        reference: The reference outputs by event key
+        candidate: The candidate outputs by event key
+        fields: The compared fields
+        frame_tolerance: Allowed difference of the frames
+        rtol: Relative tolerance of the other numbers
+        atol: Absolute tolerance of the other numbers
+
+    Returns:
+        list: The mismatches
+    """
+    rows = []
+    for key in list(reference) + [key for key in candidate
+                                  if key not in reference]:
+        ref, cand = reference.get(key), candidate.get(key)
+        event_type = (ref or cand)["type"]
+        if ref is None or cand is None:
+            rows.append({"key": key, "event_type": event_type,
+                         "field": "event", "reference": ref is not None,
+                         "candidate": cand is not None})
+            continue
+        for field in fields:
+            if field == "frame":
+                equal = ((ref[field] is None) == (cand[field] is None)
+                         and (ref[field] is None or abs(
+                             ref[field] - cand[field]) <= frame_tolerance))
+            else:
+                equal = values_equal(ref[field], cand[field], rtol, atol)
+            if not equal:
+                rows.append({"key": key, "event_type": event_type,
+                             "field": field, "reference": ref[field],
+                             "candidate": cand[field]})
+    return rows
+
+
+def _diff_nested(reference: Any, candidate: Any, rtol: float,
+                 atol: float) -> list[dict[str, Any]]:
+    """
+    Compares nested JSON outputs value by value.
+
+    Args:
+        reference: The reference output
+        candidate: The candidate output
+        rtol: Relative tolerance of numbers
+        atol: Absolute tolerance of numbers
+
+    Returns:
+        list: The mismatches, with the path of the value as key
+    """
+    ref, cand = _flatten(reference), _flatten(candidate)
+    missing = object()
+    rows = []
+    for path in list(ref) + [path for path in cand if path not in ref]:
+        ref_value, cand_value = ref.get(path, missing), cand.get(path, missing)
+        if (ref_value is missing or cand_value is missing
+                or not values_equal(ref_value, cand_value, rtol, atol)):
+            rows.append({
+                "key": path, "field": "value",
+                "reference": None if ref_value is missing else ref_value,
+                "candidate": None if cand_value is missing else cand_value})
+    return rows
+
+
+def diff_outputs(reference: dict[str, Any], candidate: dict[str, Any],
+                 frame_tolerance: float = 0, rtol: float = 1e-6,
+                 atol: float = 1e-9) -> pd.DataFrame:
+    """
+    Compares the outputs of the reference and the candidate for a match.
+
+    Args:
+        reference: The reference outputs
+        candidate: The candidate outputs
+        frame_tolerance: Allowed difference of the synchronized frames
+        rtol: Relative tolerance of numbers
+        atol: Absolute tolerance of numbers
+
+    Returns:
+        pd.DataFrame: One row per mismatching value with the columns
+        REPORT_COLUMNS
+    """
+    rows = []
+
+    def add(section: str, found: list[dict[str, Any]],
+            approach: Optional[str] = None) -> None:
+        for row in found:
+            rows.append({"section": section, "approach": approach, **row})
+
+    add("ball", _diff_ball(np.asarray(reference["ball"], dtype=float),
+                           np.asarray(candidate["ball"], dtype=float),
+                           rtol, atol))
+    add("sequences", _diff_nested(reference["sequences"],
+                                  candidate["sequences"], rtol, atol))
+    approaches = list(reference["events"]) + [
+        name for name in candidate["events"]
+        if name not in reference["events"]]
+    for name in approaches:
+        add("events", _diff_events(
+            reference["events"].get(name, {}),
+            candidate["events"].get(name, {}), ["frame", "phase"],
+            frame_tolerance, rtol, atol), name)
+    add("errors", _diff_nested(reference["errors"], candidate["errors"],
+                               rtol, atol))
+    add("counts", _diff_events(reference["counts"] or {},
+                               candidate["counts"] or {}, ["home", "away"],
+                               0, rtol, atol))
+    add("formations", _diff_nested(reference["formations"],
+                                   candidate["formations"], rtol, atol))
+    add("statistics", _diff_nested(reference["statistics"],
+                                   candidate["statistics"], rtol, atol))
+
+    report = pd.DataFrame(rows, columns=REPORT_COLUMNS[1:])
+    report.insert(0, "match", reference["match_id"])
+    return report
+
+
+def run_differential(base_path: str, match_ids: list[int],
+                     candidates: Optional[dict[str, Callable[..., Any]]
+                                          ] = None,
+                     golden_dir: Optional[str] = None,
+                     update_golden: bool = False,
+                     approaches: Optional[list[dv.Approach]] = None,
+                     frame_tolerance: float = 0, rtol: float = 1e-6,
+                     atol: float = 1e-9, quiet: bool = True,
+                     position_cache: Optional[str] = None
+                     ) -> pd.DataFrame:
+    """
+    Compares the reference and the candidate outputs of several matches.
+
+    The reference outputs are taken from the golden files if they exist
+    and are computed with the current code otherwise. The candidate
+    outputs are computed with the candidate functions substituted, or
+    with the current code if there are no candidates.
+
+    Args:
+        base_path: The data directory
+        match_ids: The IDs of the matches
+        candidates: The candidate functions by the name of the replaced
+        function as "module.path:function"
+        golden_dir: The directory of the golden files
+        update_golden: Whether to compute the reference outputs with the
+        current code and save them as golden files
+        approaches: The approaches to compare, all approaches if None
+        frame_tolerance: Allowed difference of the synchronized frames
+        rtol: Relative tolerance of numbers
+        atol: Absolute tolerance of numbers
+        quiet: Whether to suppress the prints and warnings of the pipeline
+        position_cache: The directory of the position stores of the
+        candidate runs, the candidates read the position files if None
+
+    Returns:
+        pd.DataFrame: The mismatches of all matches
+    """
+    approaches = list(dv.Approach) if approaches is None else approaches
+    reports = []
+    for match_id in match_ids:
+        reference = None
+        if golden_dir is not None and not update_golden:
+            reference = load_golden(match_id, golden_dir)
+        if reference is None:
+            reference = capture_outputs(
+                MatchContext(match_id, base_path=base_path), approaches,
+                quiet)
+            if golden_dir is not None:
+                save_golden(reference, golden_dir)
+                print(f"Saved golden outputs of match {match_id}")
+                if not candidates:
+                    continue
+        with substituted(candidates or {}):
+            candidate = capture_outputs(
+                MatchContext(match_id, base_path=base_path,
+                             position_cache=position_cache), approaches,
+                quiet)
+        report = diff_outputs(reference, candidate, frame_tolerance, rtol,
+                              atol)
+        print(f"Match {match_id}: {len(report)} mismatches")
+        reports.append(report)
+    if not reports:
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+    return pd.concat(reports, ignore_index=True)
+
+
+def print_report(report: pd.DataFrame, n_rows: int = 20) -> None:
+    """
+    Prints the number of mismatches per section and approach and the
+    first mismatching values.
+
+    Args:
+        report: The mismatches
+        n_rows: Number of mismatching values that are printed
+    """
+    if report.empty:
+        print("No mismatches.")
+        return
+    print("\nMismatches per section:")
+    print(report.fillna({"approach": "-"}).groupby(
+        ["section", "approach"]).size().to_string())
+    print(f"\nFirst {min(n_rows, len(report))} mismatches:")
+    print(report.head(n_rows).to_string(index=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Compare the pipeline outputs of the reference and '
+        'candidate implementations.')
+    parser.add_argument('--data-dir', required=True,
+                        help='Data directory with the layout of the '
+                        'handball data drive')
+    parser.add_argument('--match-id', type=int, nargs='+',
+                        help='Matches to compare, all matches of the '
+                        'mapping file if not given')
+    parser.add_argument('--generate', type=int, default=0,
+                        help='Generate this many synthetic matches first')
+    parser.add_argument('--minutes', type=float, default=20,
+                        help='Gross playing time of generated matches')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the generated matches')
+    parser.add_argument('--candidate', action='append', default=[],
+                        metavar='TARGET=CANDIDATE',
+                        help='Replace the function TARGET by CANDIDATE, '
+                        'both given as module.path:function')
+    parser.add_argument('--approach', nargs='+',
+                        choices=[a.name for a in dv.Approach],
+                        help='Approaches to compare, all if not given')
+    parser.add_argument('--golden-dir',
+                        help='Directory of the golden reference outputs')
+    parser.add_argument('--update-golden', action='store_true',
+                        help='Recompute and save the golden outputs')
+    parser.add_argument('--frame-tolerance', type=float, default=0,
+                        help='Allowed difference of the synchronized frames')
+    parser.add_argument('--rtol', type=float, default=1e-6,
+                        help='Relative tolerance of numbers')
+    parser.add_argument('--atol', type=float, default=1e-9,
+                        help='Absolute tolerance of numbers')
+    parser.add_argument('--report',
+                        help='CSV file for the mismatching values')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Show the prints of the pipeline')
+    parser.add_argument('--position-cache',
+                        help='Run the candidates on the memory-mapped '
+                        'position stores in this directory')
+    args = parser.parse_args()
+
+    from help_functions.headless import enable_headless_mode
+    enable_headless_mode()
+
+    if args.generate:
+        from benchmarks.synthetic_match import generate_season
+        match_ids = generate_season(args.data_dir, args.generate,
+                                    args.minutes, seed=args.seed)
+    else:
+        match_ids = args.match_id or pd.read_csv(
+            MatchContext(0, base_path=args.data_dir).mapping_file,
+            delimiter=";")["match_id"].tolist()
+
+    candidates = {}
+    for spec in args.candidate:
+        target, _, replacement = spec.partition("=")
+        candidates[target] = resolve(replacement)
+
+    report = run_differential(
+        args.data_dir, match_ids, candidates, args.golden_dir,
+        args.update_golden,
+        [dv.Approach[name] for name in args.approach]
+        if args.approach else None,
+        args.frame_tolerance, args.rtol, args.atol, not args.verbose,
+        args.position_cache)
+    if args.report:
+        report.to_csv(args.report, index=False)
+    print_report(report)
+    sys.exit(1 if len(report) else 0)
@@ -0,0 +1,547 @@
+"""
+This module sweeps the parameters of the synchronization approaches on
+matches with ground truth.
+
+Tuning the distance thresholds of the position approach (0.3 m and
+0.99 m), the sigmoids of the cost approach (d=5, e=2.5 for the distance
+and d=0.2, e=-25 for the acceleration), its acceptance cutoff (0.5) and
+the window of the rolling mode of the phase predictions (101 frames)
+would need a run of the whole pipeline per setting. The sweep computes
+everything that does not depend on the parameters once per match:
+    - the player-ball distances in the windows of the events of the
+      position approach, reduced to the frames where the minimum of the
+      distances, scanned backwards from the event, drops. The last frame
+      below any threshold is a binary search in these frames.
+    - the player-ball distances and the ball acceleration in the windows
+      of the cost approach,
+    - the smoothed phase predictions per window of the rolling mode.
+Every parameter set is then evaluated with array transforms and scored
+against the ground truth with the evaluation engine. The matches are
+processed in parallel, the result is a table with the accuracy of every
+approach per parameter set.
+
+Usage:
+    python -m benchmarks.parameter_sweep --data-dir /tmp/handball \
+        --grid near=0.2,0.3,0.4 threshold=0.8,0.99,1.2 \
+        --grid cutoff=0.3,0.5 --output sweep.csv
+
+Author:
+    @Annabelle Runge
+
+Date:
+    2025-05-26
+"""
+import argparse
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+import variables.data_variables as dv
+from benchmarks.benchmark_suite import phases_at
+from evaluation.accuracy_engine import (APPROACH_COLUMNS, TARGET_EVENTS,
+                                        TARGET_OVERALL, accuracy_table,
+                                        to_long_form)
+from help_functions.event_windows import event_windows
+from help_functions.gap_index import search_start
+from help_functions.match_context import MatchContext
+from synchronization_approaches.cost_function_approach_2 import (cost_targets,
+                                                                 sigmoid)
+from synchronization_approaches.pos_data_approach import event_players
+
+# Approaches of the sweep, as named in the evaluation results
+SWEEP_APPROACHES = ["None", "pos", "Cost"]
+
+
+@dataclass(frozen=True)
+class SweepParameters:
+    """
+    One parameter set of the sweep, the defaults are the values of the
+    approaches.
+
+    Attributes:
+        near (float): Distance to the ball of the first search of the
+        position approach in meters.
+        threshold (float): Distance to the ball of the second search of
+        the position approach in meters.
+        distance_d (float): Slope of the distance sigmoid of the cost.
+        distance_e (float): Midpoint of the distance sigmoid in meters.
+        acceleration_d (float): Slope of the acceleration sigmoid.
+        acceleration_e (float): Midpoint of the acceleration sigmoid of
+        the negative acceleration.
+        cutoff (float): The highest accepted cost of the cost approach.
+        smoothing (int): The window of the rolling mode of the phase
+        predictions in frames, odd.
+    """
+
+    near: float = 0.3
+    threshold: float = 0.99
+    distance_d: float = 5.0
+    distance_e: float = 2.5
+    acceleration_d: float = 0.2
+    acceleration_e: float = -25.0
+    cutoff: float = 0.5
+    smoothing: int = 101
+
+
+def parameter_grid(values: dict[str, list[Any]]) -> list[SweepParameters]:
+    """
+    Creates all combinations of the parameter values.
+
+    Args:
+        values: The values of the swept parameters, the other parameters
+        keep their defaults
+
+    Returns:
+        list: The parameter sets
+    """
+    names = [field.name for field in fields(SweepParameters)]
+    unknown = set(values) - set(names)
+    if unknown:
+        raise ValueError(f"Unknown parameters {sorted(unknown)}, expected "
+                         f"some of {names}")
+    keys = list(values)
+    return [SweepParameters(**dict(zip(keys, combination)))
+            for combination in itertools.product(*values.values())]
+
+
+def parse_grid(specs: list[str]) -> dict[str, list[Any]]:
+    """
+    Parses the parameter values of the command line.
+
+    Args:
+        specs: The values as "name=value,value,..."
+
+    Returns:
+        dict: The values per parameter
+    """
+    types = {field.name: field.type for field in fields(SweepParameters)}
+    values = {}
+    for spec in specs:
+        name, _, listed = spec.partition("=")
+        if name not in types or not listed:
+            raise ValueError(f"Expected 'name=value,...' with a name of "
+                             f"{list(types)}, got '{spec}'")
+        cast = int if types[name] in (int, "int") else float
+        values[name] = [cast(value) for value in listed.split(",")]
+    return values
+
+
+def backward_minima(frames: np.ndarray,
+                    distances: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the frames of a window at which the minimum of the distances,
+    scanned backwards from the event, drops. The last frame with a
+    distance below a threshold is the first of these frames with a
+    distance below the threshold.
+
+    Args:
+        frames: [W] frames of the window
+        distances: [W] distances, NaN for frames without data
+
+    Returns:
+        tuple: The frames and their distances, latest frame first
+    """
+    backwards = np.where(np.isnan(distances), np.inf, distances)[::-1]
+    minima = np.minimum.accumulate(backwards)
+    drops = np.concatenate([np.isfinite(minima[:1]),
+                            minima[1:] < minima[:-1]])
+    return frames[::-1][drops], minima[drops]
+
+
+def last_below(minima: tuple[np.ndarray, np.ndarray],
+               thresholds: np.ndarray) -> np.ndarray:
+    """
+    Finds the last frame of a window below every threshold.
+
+    Args:
+        minima: The backward minima of the window
+        thresholds: The thresholds
+
+    Returns:
+        np.ndarray: The frame per threshold, -1 if the distances are never
+        below the threshold
+    """
+    frames, values = minima
+    first = np.searchsorted(-values, -np.asarray(thresholds), side="right")
+    return np.where(first < len(frames),
+                    frames[np.minimum(first, len(frames) - 1)]
+                    if len(frames) else -1, -1)
+
+
+@dataclass
+class MatchSweep:
+    """
+    The parameter-independent data of one match.
+
+    Attributes:
+        match_id (int): The ID of the match.
+        event_ids (np.ndarray): The IDs of the target events with ground
+        truth.
+        event_types (np.ndarray): Their types.
+        truth_phase (np.ndarray): Their true phases.
+        raw_frames (np.ndarray): Their Sportradar frames, NaN if unknown.
+        pos_events (np.ndarray): The position in event_ids of the events
+        of the position approach.
+        pos_near (list): The backward minima of their windows.
+        pos_far (list): The backward minima of their windows extended by
+        the interruptions.
+        cost_blocks (list): The position in event_ids, the frames, the
+        distances, the ball acceleration and the first choosable frame of
+        the events of the cost approach, in blocks of equal width.
+        predictions (np.ndarray): The per-frame phase predictions.
+        framerate (int): The framerate of the position data.
+    """
+
+    match_id: int
+    event_ids: np.ndarray
+    event_types: np.ndarray
+    truth_phase: np.ndarray
+    raw_frames: np.ndarray
+    pos_events: np.ndarray
+    pos_near: list[tuple[np.ndarray, np.ndarray]]
+    pos_far: list[tuple[np.ndarray, np.ndarray]]
+    cost_blocks: list[tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray,
+                            np.ndarray]]
+    predictions: np.ndarray
+    framerate: int
+
+
+def prepare_match(context: MatchContext) -> MatchSweep:
+    """
+    Computes the parameter-independent data of a match, with the windows
+    of sync_pos_data_batch and sync_events_cost.
+
+    Args:
+        context: The match context
+
+    Returns:
+        MatchSweep: The data of the match
+    """
+    truth_file = os.path.join(context.base_path, "HBL_Synchronization",
+                              "GroundTruth",
+                              f"ground_truth_{context.match_id}.json")
+    with open(truth_file, "r", encoding="utf-8") as f:
+        truth = pd.DataFrame(json.load(f)["events"])
+    truth = truth[truth["type"].isin(TARGET_EVENTS)]
+    events = context.events
+    # The first row of every event ID, as in the evaluation
+    rows = pd.Series(np.arange(len(events)),
+                     index=events["eventID"].to_numpy())
+    rows = rows[~rows.index.duplicated()]
+    position = pd.Series(np.arange(len(truth)),
+                         index=truth["id"].to_numpy())
+    row_of_event = rows.reindex(truth["id"]).to_numpy()
+    raw_frames = np.full(len(truth), np.nan)
+    known = ~np.isnan(row_of_event)
+    raw_frames[known] = pd.to_numeric(
+        events.iloc[row_of_event[known].astype(int), 24],
+        errors="coerce").to_numpy()
+
+    def positions_of(event_rows: list[int]) -> np.ndarray:
+        """The position in the truth of the events of rows, -1 if none."""
+        ids = events["eventID"].iloc[event_rows].to_numpy()
+        found = position.reindex(ids).to_numpy()
+        return np.where(np.isnan(found), -1, found).astype(np.int64)
+
+    values = events.values
+    # Windows of the position approach
+    players = event_players(events, context.pid_dict, context.roster)
+    first_rows = set(rows.to_numpy())
+    pos_rows = [row for row in players if row in first_rows]
+    pos_near, pos_far = [], []
+    if pos_rows:
+        frames = np.array([values[row][24] for row in pos_rows],
+                          dtype=np.int64)
+        xids = np.array([players[row][1] for row in pos_rows])
+        groups = np.array([players[row][0] for row in pos_rows])
+        before = context.search_windows.before_frames(
+            [values[row][0] for row in pos_rows], 499)
+        windows = event_windows(frames, xids, groups, context.pos_data,
+                                context.ball_positions,
+                                before=int(before.max()))
+        complete = windows.complete() & (
+            windows.frames >= (frames - before)[:, None])
+        distances = np.where(complete, windows.distances(), np.nan)
+        for i, t_event in enumerate(frames):
+            pos_near.append(backward_minima(windows.frames[i],
+                                            distances[i]))
+            lower, _ = search_start(context.gaps.combined(groups[i],
+                                                          xids[i]),
+                                    int(t_event), int(before[i]))
+            if lower < t_event - before[i]:
+                extended = event_windows(
+                    frames[i:i + 1], xids[i:i + 1], groups[i:i + 1],
+                    context.pos_data, context.ball_positions,
+                    before=int(t_event - lower))
+                pos_far.append(backward_minima(
+                    extended.frames[0],
+                    np.where(extended.complete(), extended.distances(),
+                             np.nan)[0]))
+            else:
+                pos_far.append(pos_near[-1])
+
+    # Windows of the cost approach, in the blocks of sync_events_cost
+    targets = np.array(cost_targets(
+        events, context.pos_data, context.pid_dict, context.xids,
+        context.ball_positions, context.gaps, context.search_windows),
+        dtype=np.int64).reshape(-1, 6)
+    usual = targets[:, 4] - targets[:, 3] <= targets[:, 5]
+    cost_blocks = []
+    for block in [targets[usual]] + [targets[i:i + 1]
+                                     for i in np.flatnonzero(~usual)]:
+        if len(block) == 0:
+            continue
+        event_rows, groups, xids, starts, ends, _ = block.T
+        windows = event_windows(
+            ends, xids, groups, context.pos_data, context.ball_positions,
+            before=max(int((ends - starts).max()), 1),
+            ball_acceleration=context.ball_acceleration)
+        distance = np.hypot(windows.ball[..., 0] - windows.player[..., 0],
+                            windows.ball[..., 1] - windows.player[..., 1])
+        cost_blocks.append((positions_of(list(event_rows)), windows.frames,
+                            distance, windows.acceleration, starts))
+
+    return MatchSweep(
+        context.match_id, truth["id"].to_numpy(), truth["type"].to_numpy(),
+        truth["phase"].to_numpy(), raw_frames,
+        positions_of(pos_rows), pos_near, pos_far, cost_blocks,
+        context.predictions, context.framerate)
+
+
+def pos_frames(match: MatchSweep,
+               grid: list[SweepParameters]) -> np.ndarray:
+    """
+    Synchronizes the events of the position approach for all parameter
+    sets.
+
+    Args:
+        match: The data of the match
+        grid: The parameter sets
+
+    Returns:
+        np.ndarray: [S, N] frame of every event per parameter set
+    """
+    synced = np.tile(match.raw_frames, (len(grid), 1))
+    near = np.array([parameters.near for parameters in grid])
+    threshold = np.array([parameters.threshold for parameters in grid])
+    for i, position in enumerate(match.pos_events):
+        if position < 0:
+            continue
+        frame = last_below(match.pos_near[i], near)
+        frame = np.where(frame >= 0, frame,
+                         last_below(match.pos_far[i], threshold))
+        synced[:, position] = np.where(frame >= 0, frame,
+                                       synced[:, position])
+    return synced
+
+
+def cost_frames(match: MatchSweep,
+                grid: list[SweepParameters]) -> np.ndarray:
+    """
+    Synchronizes the events of the cost approach for all parameter sets.
+
+    Args:
+        match: The data of the match
+        grid: The parameter sets
+
+    Returns:
+        np.ndarray: [S, N] frame of every event per parameter set
+    """
+    synced = np.tile(match.raw_frames, (len(grid), 1))
+    for positions, frames, distance, acceleration, starts in \
+            match.cost_blocks:
+        outside = frames < starts[:, None]
+        rows = np.arange(len(frames))
+        inside_truth = positions >= 0
+        for s, parameters in enumerate(grid):
+            total_cost = (
+                sigmoid(distance, d=parameters.distance_d,
+                        e=parameters.distance_e)
+                + sigmoid(-acceleration, d=parameters.acceleration_d,
+                          e=parameters.acceleration_e))
+            total_cost = np.where(np.isnan(total_cost) | outside, np.inf,
+                                  total_cost)
+            best = total_cost.argmin(axis=1)
+            tracking_idx = np.where(np.isfinite(total_cost).any(axis=1),
+                                    frames[rows, best], 0)
+            lowest_cost = np.where(tracking_idx != 0,
+                                   total_cost.min(axis=1) / 2, 0)
+            accept = ((lowest_cost <= parameters.cutoff)
+                      & (tracking_idx != 0) & inside_truth)
+            synced[s, positions[accept]] = tracking_idx[accept]
+    return synced
+
+
+def sweep_match(match: MatchSweep,
+                grid: list[SweepParameters]) -> pd.DataFrame:
+    """
+    Evaluates all parameter sets on one match.
+
+    Args:
+        match: The data of the match
+        grid: The parameter sets
+
+    Returns:
+        pd.DataFrame: The long-form evaluation results with the index of
+        the parameter set in the column "set"
+    """
+    from plot_functions.processing import sequences_from_predictions
+
+    synced = {"None": np.tile(match.raw_frames, (len(grid), 1)),
+              "pos": pos_frames(match, grid),
+              "Cost": cost_frames(match, grid)}
+    sequences = {window: sequences_from_predictions(
+        match.predictions, match.framerate, window)
+        for window in {parameters.smoothing for parameters in grid}}
+    results = []
+    for s, parameters in enumerate(grid):
+        wide = pd.DataFrame({"Event_id": match.event_ids,
+                             "eID": match.event_types})
+        for approach, frames in synced.items():
+            predicted = phases_at(frames[s],
+                                  sequences[parameters.smoothing])
+            wide[APPROACH_COLUMNS[approach]] = np.where(
+                np.isnan(frames[s]), np.nan,
+                (predicted == match.truth_phase).astype(float))
+        long = to_long_form(wide, match.match_id)
+        long["set"] = s
+        results.append(long)
+    return pd.concat(results, ignore_index=True)
+
+
+def run_match_sweep(match_id: int, base_path: str, season: dv.Season,
+                    grid: list[SweepParameters],
+                    position_cache: Optional[str] = None
+                    ) -> Optional[pd.DataFrame]:
+    """
+    Prepares and sweeps one match in a worker process.
+
+    Args:
+        match_id: The ID of the match
+        base_path: The data directory
+        season: The season of the match
+        grid: The parameter sets
+        position_cache: The directory of the memory-mapped position stores
+
+    Returns:
+        pd.DataFrame: The long-form evaluation results, None if the match
+        failed
+    """
+    try:
+        context = MatchContext(match_id, base_path, season,
+                               position_cache=position_cache)
+        return sweep_match(prepare_match(context), grid)
+    except Exception as e:
+        print(f"Error sweeping match {match_id}: {e}")
+        return None
+
+
+def score_sweep(long: pd.DataFrame,
+                grid: list[SweepParameters]) -> pd.DataFrame:
+    """
+    Scores every parameter set with the evaluation engine.
+
+    Args:
+        long: The long-form evaluation results of all matches
+        grid: The parameter sets
+
+    Returns:
+        pd.DataFrame: The parameters and the accuracy and the number of
+        evaluated target events of every approach per parameter set
+    """
+    rows = []
+    for s, parameters in enumerate(grid):
+        table = accuracy_table(long[long["set"] == s])
+        table = table[(table["event_type"] == TARGET_OVERALL)
+                      & table["approach"].isin(SWEEP_APPROACHES)]
+        row = asdict(parameters)
+        for approach, accuracy, total in zip(
+                table["approach"], table["accuracy"], table["total"]):
+            row[f"{approach}_accuracy"] = accuracy
+            row[f"{approach}_total"] = int(total)
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def run_sweep(base_path: str, match_ids: list[int],
+              grid: list[SweepParameters],
+              season: dv.Season = dv.Season.SEASON_2020_2021,
+              max_workers: Optional[int] = None,
+              position_cache: Optional[str] = None
+              ) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Sweeps the parameter sets over several matches in a process pool.
+
+    Args:
+        base_path: The data directory
+        match_ids: The IDs of the matches with ground truth
+        grid: The parameter sets
+        season: The season of the matches
+        max_workers: Number of processes, the number of CPUs if None
+        position_cache: The directory of the memory-mapped position stores
+
+    Returns:
+        tuple: The results table and the long-form evaluation results
+    """
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(run_match_sweep, match_id, base_path,
+                                   season, grid, position_cache)
+                   for match_id in match_ids]
+        results = [future.result() for future in futures]
+    results = [long for long in results if long is not None]
+    print(f"Swept {len(grid)} parameter sets on {len(results)} of "
+          f"{len(match_ids)} matches")
+    if not results:
+        return pd.DataFrame(), pd.DataFrame()
+    long = pd.concat(results, ignore_index=True)
+    return score_sweep(long, grid), long
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Sweep the parameters of the synchronization '
+        'approaches on matches with ground truth.')
+    parser.add_argument('--data-dir', required=True,
+                        help='Data directory with the layout of the '
+                        'handball data drive')
+    parser.add_argument('--match-id', type=int, nargs='+',
+                        help='Matches to sweep, all matches of the mapping '
+                        'file if not given')
+    parser.add_argument('--grid', nargs='+', action='extend', default=[],
+                        metavar='NAME=VALUES',
+                        help='Values of a parameter as name=v1,v2,...; '
+                        'parameters: ' + ", ".join(
+                            field.name for field in fields(SweepParameters)))
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of processes')
+    parser.add_argument('--position-cache',
+                        help='Directory of the memory-mapped position '
+                        'stores')
+    parser.add_argument('--output',
+                        help='CSV file for the results table')
+    parser.add_argument('--top', type=int, default=10,
+                        help='Number of the best parameter sets printed')
+    args = parser.parse_args()
+
+    from help_functions.headless import enable_headless_mode
+    enable_headless_mode()
+
+    sweep_ids = args.match_id or pd.read_csv(
+        MatchContext(0, base_path=args.data_dir).mapping_file,
+        delimiter=";")["match_id"].tolist()
+    sweep_grid = parameter_grid(parse_grid(args.grid))
+    results_table, _ = run_sweep(args.data_dir, sweep_ids, sweep_grid,
+                                 max_workers=args.workers,
+                                 position_cache=args.position_cache)
+    if args.output:
+        results_table.to_csv(args.output, index=False)
+    if not results_table.empty:
+        print(results_table.sort_values(
+            "pos_accuracy", ascending=False).head(args.top).to_string(
+                index=False))
@@ -0,0 +1,815 @@
+"""
+This module generates synthetic handball matches in the layout of the
+handball data drive, so that the whole pipeline can be run and timed
+without the real data.
+
+For every match it writes
+- a Kinexon position CSV with two ball sensors and two teams of 14
+  players at 20 Hz,
+- a Sportradar timeline and summary JSON,
+- the per-frame phase predictions of the slicing as .npy file,
+- the rows of the mapping and lookup CSVs,
+- the player profiles of all players and
+- the ground truth (true frame and phase) of every event.
+
+The match is simulated as a sequence of possessions. Each possession is
+a counter or positional attack that ends with an event of the attacking
+or the defending team. The players move towards the positions of their
+formation, the ball is passed between the players of the attacking team
+and the player of an event holds the ball right before it, so the
+position based approaches find realistic ball contacts. The Sportradar
+timestamps are delayed by a few seconds like the real data.
+
+Usage:
+    python -m benchmarks.synthetic_match --output-dir /tmp/handball \
+        --matches 2 --minutes 20
+
+Author:
+    @Annabelle Runge
+
+Date:
+    2025-05-22
+"""
+import argparse
+import json
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+import variables.data_variables as dv
+
+FPS = 20
+
+TEAM_NAMES = [
+    "SC Magdeburg", "THW Kiel", "SG Flensburg-Handewitt", "MT Melsungen",
+    "Rhein-Neckar Loewen", "TBV Lemgo Lippe", "HSG Wetzlar",
+    "SC DHfK Leipzig", "TSV Hannover-Burgdorf", "Frisch Auf Goeppingen",
+    "Bergischer HC", "HC Erlangen", "GWD Minden", "TVB Stuttgart",
+    "Fuechse Berlin", "HBW Balingen-Weilstetten",
+]
+FIRST_NAMES = [
+    "Andreas", "Bjarki", "Christian", "Domagoj", "Emil", "Fabian",
+    "Gisli", "Hendrik", "Igor", "Jannik", "Kay", "Lukas", "Magnus",
+    "Niclas", "Omar", "Patrick", "Rune", "Sander", "Timo", "Uwe",
+]
+LAST_NAMES = [
+    "Andersson", "Boehm", "Duvnjak", "Ekberg", "Fäth", "Gensheimer",
+    "Hansen", "Jakobsen", "Kühn", "Lagergren", "Mertens", "Nilsson",
+    "O'Sullivan", "Pekeler", "Reichmann", "Sørensen", "Tollbring",
+    "Weinhold", "Wiencek", "Zeitz",
+]
+FIELD_ROLES = ["LW", "LB", "CB", "RB", "RW", "P"]
+
+# Outcomes of a possession with their probabilities and whether the
+# event belongs to the attacking team
+OUTCOMES = {
+    "score_change": (0.48, True),
+    "shot_saved": (0.16, True),
+    "shot_off_target": (0.07, True),
+    "shot_blocked": (0.05, True),
+    "technical_ball_fault": (0.08, True),
+    "technical_rule_fault": (0.06, True),
+    "steal": (0.06, False),
+    "seven_m_awarded": (0.04, True),
+}
+
+# Phases of the attacking team A and B: (counter attack, positional)
+ATTACK_PHASES = {0: (1, 3), 1: (2, 4)}
+
+N_PLAYERS = 14
+N_COURT = 7
+
+
+@dataclass
+class Team:
+    """
+    A synthetic team with its roster.
+
+    Attributes:
+        name (str): The name of the team.
+        competitor_id (str): The Sportradar competitor ID.
+        player_ids (list): The numeric Sportradar player IDs, which are
+        also the sensor IDs of the position data.
+        names (list): The names of the players.
+        roles (list): The roles of the players, "G" for goalkeepers.
+    """
+
+    name: str
+    competitor_id: str
+    player_ids: list[int] = field(default_factory=list)
+    names: list[str] = field(default_factory=list)
+    roles: list[str] = field(default_factory=list)
+
+
+@dataclass
+class SyntheticMatch:
+    """
+    The simulated data of one match.
+
+    Attributes:
+        match_id (int): The Sportradar ID of the match.
+        home (Team): The home team.
+        away (Team): The away team.
+        start (datetime): The time of the first position frame.
+        throw_off (int): The frame of the throw-off.
+        halves (list): The (start, end) frames of both halves.
+        segments (list): The true (start, end, phase) sequences.
+        events (list): The events with their true frame.
+        predictions (np.ndarray): The noisy per-frame phase predictions.
+        positions (dict): The positions of the players of both teams,
+        arrays of shape (frames, 14, 2), and of the two ball sensors,
+        shape (frames, 2, 2).
+    """
+
+    match_id: int
+    home: Team
+    away: Team
+    start: datetime
+    throw_off: int
+    halves: list[tuple[int, int]]
+    segments: list[tuple[int, int, int]]
+    events: list[dict[str, Any]]
+    predictions: np.ndarray
+    positions: dict[str, np.ndarray]
+
+    @property
+    def file_name(self) -> str:
+        """The name of the position file."""
+        return (f"{self.start:%Y%m%d}_{self.home.name}_{self.away.name}"
+                .replace(" ", "_") + ".csv")
+
+    @property
+    def teams(self) -> tuple[Team, Team]:
+        """Team A and B, ordered alphabetically like the pipeline."""
+        return tuple(sorted((self.home, self.away),  # type: ignore
+                            key=lambda team: team.name))
+
+
+def create_teams(rng: np.random.Generator, n_teams: int) -> list[Team]:
+    """
+    Creates teams with 14 players each, two of them goalkeepers.
+
+    Args:
+        rng: The random generator
+        n_teams: The number of teams
+
+    Returns:
+        list: The teams
+    """
+    teams = []
+    for index in range(n_teams):
+        team = Team(name=TEAM_NAMES[index % len(TEAM_NAMES)]
+                    + ("" if index < len(TEAM_NAMES)
+                       else f" {index // len(TEAM_NAMES) + 1}"),
+                    competitor_id=f"sr:competitor:{2000 + index}")
+        names: set[str] = set()
+        while len(names) < N_PLAYERS:
+            names.add(f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}")
+        team.names = sorted(names)
+        team.player_ids = [100000 + index * 100 + number
+                           for number in range(N_PLAYERS)]
+        team.roles = ["G", "G"] + [FIELD_ROLES[number % 6]
+                                   for number in range(N_PLAYERS - 2)]
+        teams.append(team)
+    return teams
+
+
+def simulate_phases(rng: np.random.Generator,
+                    halves: list[tuple[int, int]], n_frames: int,
+                    event_density: float
+                    ) -> tuple[list[tuple[int, int, int]],
+                               list[dict[str, Any]]]:
+    """
+    Simulates the possessions of both halves.
+
+    Args:
+        rng: The random generator
+        halves: The (start, end) frames of both halves
+        n_frames: The number of frames of the match
+        event_density: Factor for the number of possessions per minute
+
+    Returns:
+        tuple: The (start, end, phase) sequences and the events with the
+        index of their team (0 for team A, 1 for team B), the frame and
+        the phase at the frame
+    """
+    outcomes = list(OUTCOMES)
+    probabilities = np.array([OUTCOMES[name][0] for name in outcomes])
+    probabilities /= probabilities.sum()
+    segments: list[tuple[int, int, int]] = []
+    events: list[dict[str, Any]] = []
+
+    def add_event(frame: int, event_type: str,
+                  team: Optional[int] = None, phase: int = 0) -> None:
+        events.append({"frame": int(frame), "type": event_type,
+                       "team": team, "phase": phase})
+
+    # Warm-up before the throw-off
+    segments.append((0, halves[0][0], 0))
+    add_event(halves[0][0], "match_started")
+    timeouts = [0, 0]
+    attacker = int(rng.integers(2))
+    for half, (start, end) in enumerate(halves):
+        add_event(start, "period_start")
+        attacker = 1 - attacker if half else attacker
+        t = start
+        while t < end - FPS:
+            counter = rng.random() < 0.25
+            duration = (rng.integers(60, 160) if counter
+                        else rng.integers(300, 900)) / event_density
+            phase = ATTACK_PHASES[attacker][0 if counter else 1]
+            phase_end = int(min(t + max(duration, 2 * FPS), end))
+            segments.append((t, phase_end, phase))
+            outcome = str(rng.choice(outcomes, p=probabilities))
+            team = attacker if OUTCOMES[outcome][1] else 1 - attacker
+            add_event(phase_end - int(rng.integers(2, 20)), outcome, team,
+                      phase)
+            t = phase_end
+
+            pause = 0
+            if outcome == "score_change":
+                pause = int(rng.integers(80, 200))
+            elif outcome == "seven_m_awarded":
+                pause = int(rng.integers(200, 400))
+                add_event(t + pause - 10, "score_change"
+                          if rng.random() < 0.75 else "seven_m_missed",
+                          attacker, 0)
+            elif rng.random() < 0.15:
+                pause = int(rng.integers(40, 160))
+            if pause and rng.random() < 0.05:
+                add_event(t + pause // 2, "suspension", 1 - attacker, 0)
+                add_event(t + pause // 2 + 120 * FPS, "suspension_over",
+                          1 - attacker, 0)
+            if pause and timeouts[attacker] < 3 and rng.random() < 0.04:
+                timeouts[attacker] += 1
+                add_event(t + 10, "timeout", attacker, 0)
+                add_event(t + pause + 60 * FPS - 10, "timeout_over",
+                          attacker, 0)
+                pause += 60 * FPS
+            if pause:
+                pause_end = min(t + pause, end)
+                segments.append((t, pause_end, 0))
+                t = pause_end
+            if outcome not in ("shot_blocked",) or rng.random() < 0.5:
+                attacker = 1 - attacker
+        if t < end:
+            segments.append((t, end, 0))
+        add_event(end, "break_start" if half == 0 else "match_ended")
+        next_start = halves[1][0] if half == 0 else n_frames
+        segments.append((end, next_start, 0))
+
+    # Events that fall after the end of the match are dropped
+    events = [event for event in events if event["frame"] < n_frames]
+    events.sort(key=lambda event: event["frame"])
+    return segments, events
+
+
+def phase_per_frame(segments: list[tuple[int, int, int]],
+                    n_frames: int) -> np.ndarray:
+    """
+    Expands the sequences to the phase of every frame.
+
+    Args:
+        segments: The (start, end, phase) sequences
+        n_frames: The number of frames
+
+    Returns:
+        np.ndarray: The phase of every frame
+    """
+    phases = np.zeros(n_frames, dtype=np.int64)
+    for start, end, phase in segments:
+        phases[start:end] = phase
+    return phases
+
+
+def noisy_predictions(rng: np.random.Generator,
+                      phases: np.ndarray) -> np.ndarray:
+    """
+    Adds short bursts of wrong phases to the true phases, like the
+    predictions of the slicing model.
+
+    Args:
+        rng: The random generator
+        phases: The true phase of every frame
+
+    Returns:
+        np.ndarray: The predicted phase of every frame
+    """
+    predictions = phases.copy()
+    n_bursts = len(phases) // 400
+    starts = rng.integers(0, len(phases), n_bursts)
+    lengths = rng.integers(3, 40, n_bursts)
+    labels = rng.integers(0, 5, n_bursts)
+    for start, length, label in zip(starts, lengths, labels):
+        predictions[start:start + length] = label
+    return predictions
+
+
+def _smooth(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Smooths the values along the first axis with a moving average.
+
+    Args:
+        values: The values
+        window: The window length in frames
+
+    Returns:
+        np.ndarray: The smoothed values
+    """
+    padded = np.concatenate([np.repeat(values[:1], window, axis=0), values])
+    cumsum = np.cumsum(padded, axis=0)
+    return (cumsum[window:] - cumsum[:-window]) / window
+
+
+def simulate_positions(rng: np.random.Generator, phases: np.ndarray,
+                       halves: list[tuple[int, int]],
+                       events: list[dict[str, Any]]
+                       ) -> dict[str, np.ndarray]:
+    """
+    Simulates the positions of the players of both teams and of the two
+    ball sensors, and chooses the player of every event.
+
+    Args:
+        rng: The random generator
+        phases: The true phase of every frame
+        halves: The (start, end) frames of both halves
+        events: The events, the index of their player is added
+
+    Returns:
+        dict: The positions of the teams "a" and "b" and of the "ball"
+        sensors
+    """
+    n_frames = len(phases)
+    frames = np.arange(n_frames)
+    # Team A plays from left to right in the first half
+    direction = np.where(frames < halves[1][0], 1.0, -1.0)
+    in_break = (frames >= halves[0][1]) & (frames < halves[1][0])
+
+    # Formation slots: goalkeeper and six field players
+    defence = np.array([[1, 0], [7, -7.5], [6.5, -4.5], [6, -1.5],
+                        [6, 1.5], [6.5, 4.5], [7, 7.5]])
+    offence = np.array([[1, 0], [18, -8], [10, -5], [9, 0],
+                        [10, 5], [18, 8], [14, 1]])
+    neutral = np.array([[1, 0], [8, -6], [8, -2], [8, 2],
+                        [8, 6], [5, -4], [5, 4]])
+
+    # Lineups: goalkeeper 0 and six of the twelve field players, changed
+    # at random pauses
+    lineups = []
+    for _ in range(2):
+        lineup = np.zeros((n_frames, N_COURT), dtype=np.int64)
+        current = np.r_[0, 2 + rng.permutation(12)[:6]]
+        change_frames = np.flatnonzero(np.diff(phases) != 0)
+        start = 0
+        for frame in change_frames:
+            if rng.random() < 0.3:
+                lineup[start:frame + 1] = current
+                start = frame + 1
+                bench = np.setdiff1d(np.arange(2, N_PLAYERS), current)
+                slot = int(rng.integers(1, N_COURT))
+                current = current.copy()
+                current[slot] = rng.choice(bench)
+        lineup[start:] = current
+        lineups.append(lineup)
+
+    positions = {}
+    for team in range(2):
+        own = direction * (-20.0 if team == 0 else 20.0)
+        attacking = np.isin(phases, ATTACK_PHASES[team])
+        defending = np.isin(phases, ATTACK_PHASES[1 - team])
+        # Substitutes sit on the bench outside of the field
+        xy = np.empty((n_frames, N_PLAYERS, 2))
+        xy[:, :, 0] = (np.sign(-own)[:, None] *
+                       (3 + 0.4 * np.arange(N_PLAYERS))[None, :])
+        xy[:, :, 1] = -11.5
+        for slot in range(N_COURT):
+            target = np.where(attacking[:, None], offence[slot],
+                              np.where(defending[:, None], defence[slot],
+                                       neutral[slot]))
+            # Distances from the own goal line, mirrored with the direction
+            target_x = own - np.sign(own) * target[:, 0]
+            target_y = target[:, 1] * np.sign(-own)
+            slot_xy = _smooth(np.column_stack([target_x, target_y]), 30)
+            slot_xy += _smooth(rng.normal(0, 2.0, (n_frames, 2)), 40)
+            players = lineups[team][:, slot]
+            xy[frames, players] = slot_xy
+        xy[in_break] = np.nan
+        positions["ab"[team]] = xy
+
+    # The player of every event is on the court at the time of the event
+    for event in events:
+        if event["team"] is None:
+            event["player"] = None
+            continue
+        team = event["team"]
+        lineup = lineups[team][min(event["frame"], n_frames - 1)]
+        event["player"] = int(rng.choice(lineup[1:]))
+
+    attacker = np.where(np.isin(phases, ATTACK_PHASES[0]), 0,
+                        np.where(np.isin(phases, ATTACK_PHASES[1]), 1, -1))
+    # The ball holder of every frame: (team, player)
+    holder = np.full((n_frames, 2), -1, dtype=np.int64)
+    t = 0
+    while t < n_frames:
+        length = int(rng.integers(20, 60))
+        if attacker[t] >= 0:
+            team = attacker[t]
+            lineup = lineups[team][t]
+            holder[t:t + length] = (team, rng.choice(lineup[1:]))
+        t += length
+    # The player of an event holds the ball right before it
+    for event in events:
+        if event.get("player") is not None:
+            start = max(event["frame"] - int(rng.integers(15, 40)), 0)
+            holder[start:event["frame"] + 1] = (event["team"],
+                                                event["player"])
+
+    ball = np.zeros((n_frames, 2))
+    held = holder[:, 0] >= 0
+    team_xy = np.stack([positions["a"], positions["b"]])
+    ball[held] = team_xy[holder[held, 0], frames[held], holder[held, 1]]
+    ball[held] += np.array([0.15, 0.1])
+    # Passes: the ball travels to the new holder within a few frames
+    changes = np.flatnonzero(np.any(np.diff(holder, axis=0) != 0, axis=1))
+    for change in changes:
+        end = min(change + 8, n_frames - 1)
+        ball[change:end + 1] = np.linspace(ball[change], ball[end],
+                                           end - change + 1)
+    ball[~held & ~in_break] = _smooth(ball, 10)[~held & ~in_break]
+
+    # Ball sensor 1 is used in the first half, sensor 2 in the second
+    # half, both are valid for a few seconds around the switch
+    switch = halves[1][0]
+    balls = np.full((n_frames, 2, 2), np.nan)
+    balls[:switch + 100, 0] = ball[:switch + 100]
+    balls[switch - 100:, 1] = (ball[switch - 100:]
+                               + rng.normal(0, 0.02, (n_frames - switch
+                                                      + 100, 2)))
+    for sensor in range(2):
+        for _ in range(n_frames // 2000):
+            start = int(rng.integers(0, n_frames))
+            balls[start:start + int(rng.integers(5, 60)), sensor] = np.nan
+    balls[in_break] = np.nan
+    positions["ball"] = balls
+    return positions
+
+
+def simulate_match(rng: np.random.Generator, match_id: int, home: Team,
+                   away: Team, start: datetime, minutes: float = 60,
+                   event_density: float = 1.0,
+                   break_minutes: float = 2) -> SyntheticMatch:
+    """
+    Simulates one match.
+
+    Args:
+        rng: The random generator
+        match_id: The Sportradar ID of the match
+        home: The home team
+        away: The away team
+        start: The time of the first position frame
+        minutes: The gross playing time of the match in minutes
+        event_density: Factor for the number of possessions per minute
+        break_minutes: The length of the half-time break in minutes
+
+    Returns:
+        SyntheticMatch: The simulated match
+    """
+    throw_off = 30 * FPS
+    half = int(minutes * 60 * FPS / 2)
+    pause = int(break_minutes * 60 * FPS)
+    halves = [(throw_off, throw_off + half),
+              (throw_off + half + pause, throw_off + 2 * half + pause)]
+    n_frames = halves[1][1] + 30 * FPS
+
+    segments, events = simulate_phases(rng, halves, n_frames, event_density)
+    phases = phase_per_frame(segments, n_frames)
+    positions = simulate_positions(rng, phases, halves, events)
+    return SyntheticMatch(
+        match_id=match_id, home=home, away=away, start=start,
+        throw_off=throw_off, halves=halves, segments=segments,
+        events=events, predictions=noisy_predictions(rng, phases),
+        positions=positions)
+
+
+def write_position_csv(match: SyntheticMatch, file_path: str) -> None:
+    """
+    Writes the positions in the Kinexon CSV format.
+
+    Args:
+        match: The simulated match
+        file_path: The path of the CSV file
+    """
+    team_a, team_b = match.teams
+    groups = [("Ball", ["Ball 1", "Ball 2"], [900001, 900002], ["0", "0"],
+               match.positions["ball"])]
+    for team, key in ((team_a, "a"), (team_b, "b")):
+        groups.append((team.name, team.names, team.player_ids,
+                       [str(number + 1) for number in range(N_PLAYERS)],
+                       match.positions[key]))
+
+    xy = np.concatenate([group[4] for group in groups], axis=1)
+    sensor_ids = np.concatenate([group[2] for group in groups])
+    names = np.concatenate([group[1] for group in groups])
+    numbers = np.concatenate([group[3] for group in groups])
+    group_ids = np.concatenate([[index + 1] * len(group[2])
+                                for index, group in enumerate(groups)])
+    group_names = np.concatenate([[group[0]] * len(group[2])
+                                  for group in groups])
+
+    frame, sensor = np.nonzero(~np.isnan(xy[:, :, 0]))
+    t_null = int(match.start.timestamp() * 1000)
+    table = pd.DataFrame({
+        "ts in ms": t_null + frame * (1000 // FPS),
+        "sensor id": sensor_ids[sensor],
+        "mapped id": sensor_ids[sensor],
+        "full name": names[sensor],
+        "number": numbers[sensor],
+        "group id": group_ids[sensor],
+        "group name": group_names[sensor],
+        "x in m": xy[frame, sensor, 0],
+        "y in m": xy[frame, sensor, 1],
+        "z in m": np.where(group_ids[sensor] == 1, 0.5, 0.0),
+    })
+    table.to_csv(file_path, index=False, float_format="%.3f")
+
+
+def _competitor(team: Team, qualifier: str) -> dict[str, Any]:
+    """
+    Creates the Sportradar competitor entry of a team.
+
+    Args:
+        team: The team
+        qualifier: "home" or "away"
+
+    Returns:
+        dict: The competitor
+    """
+    return {
+        "id": team.competitor_id, "name": team.name,
+        "qualifier": qualifier,
+        "players": [{"id": f"sr:player:{pid}", "name": name}
+                    for pid, name in zip(team.player_ids, team.names)],
+    }
+
+
+def build_timeline(rng: np.random.Generator,
+                   match: SyntheticMatch) -> dict[str, Any]:
+    """
+    Creates the Sportradar timeline of the match. The timestamps of the
+    events are delayed by up to six seconds.
+
+    Args:
+        rng: The random generator
+        match: The simulated match
+
+    Returns:
+        dict: The timeline JSON
+    """
+    team_a, team_b = match.teams
+    teams = (team_a, team_b)
+    qualifiers = {team_a.name: "home" if team_a is match.home else "away",
+                  team_b.name: "home" if team_b is match.home else "away"}
+    score = {"home": 0, "away": 0}
+    timeline = []
+    period = 0
+    for event_id, event in enumerate(match.events, start=1):
+        delay = (0.0 if event["team"] is None
+                 else float(rng.uniform(0.5, 6.0)))
+        time = match.start + timedelta(seconds=event["frame"] / FPS + delay)
+        half = 1 if event["frame"] < match.halves[1][0] else 2
+        clock = max(event["frame"] - match.halves[half - 1][0], 0) / FPS
+        clock += 1800 * (half - 1)
+        entry: dict[str, Any] = {
+            "id": 1000000 + event_id, "type": event["type"],
+            "time": time.replace(microsecond=0).isoformat(),
+        }
+        if event["type"] == "period_start":
+            period += 1
+            entry.update({"period": period, "period_type": "regular_period",
+                          "period_name": ("1st_half" if period == 1
+                                          else "2nd_half")})
+        else:
+            entry["match_clock"] = f"{int(clock // 60)}:{int(clock % 60):02d}"
+        if event["team"] is not None:
+            team = teams[event["team"]]
+            qualifier = qualifiers[team.name]
+            entry["competitor"] = qualifier
+            player = event.get("player")
+            if player is not None:
+                person = {"id": f"sr:player:{team.player_ids[player]}",
+                          "name": team.names[player]}
+                if event["type"] == "score_change":
+                    score[qualifier] += 1
+                    entry.update({"home_score": score["home"],
+                                  "away_score": score["away"],
+                                  "scorer": person})
+                elif event["type"] not in ("timeout", "timeout_over"):
+                    entry["player"] = person
+        timeline.append(entry)
+        event["id"] = entry["id"]
+    timeline.sort(key=lambda entry: entry["time"])
+    return {
+        "sport_event": _sport_event(match),
+        "sport_event_status": {"status": "closed",
+                               "home_score": score["home"],
+                               "away_score": score["away"]},
+        "statistics": {"totals": {"competitors": [
+            _competitor(match.home, "home"),
+            _competitor(match.away, "away")]}},
+        "timeline": timeline,
+    }
+
+
+def _sport_event(match: SyntheticMatch) -> dict[str, Any]:
+    """
+    Creates the Sportradar sport event entry of the match.
+
+    Args:
+        match: The simulated match
+
+    Returns:
+        dict: The sport event
+    """
+    return {
+        "id": f"sr:sport_event:{match.match_id}",
+        "start_time": match.start.isoformat(),
+        "competitors": [
+            {"id": match.home.competitor_id, "name": match.home.name,
+             "qualifier": "home"},
+            {"id": match.away.competitor_id, "name": match.away.name,
+             "qualifier": "away"}],
+    }
+
+
+def write_match(base_path: str, match: SyntheticMatch,
+                rng: np.random.Generator,
+                season: dv.Season = dv.Season.SEASON_2020_2021
+                ) -> dict[str, dict[str, Any]]:
+    """
+    Writes the files of one match and returns its rows of the mapping
+    and lookup CSVs.
+
+    Args:
+        base_path: The data directory
+        match: The simulated match
+        rng: The random generator
+        season: The season of the match
+
+    Returns:
+        dict: The "mapping" and "lookup" rows of the match
+    """
+    season_name = f"season_{season.value}"
+    directories = {
+        "positions": os.path.join(base_path, "HBL_Positions",
+                                  season.value.replace("_", "-")),
+        "timeline": os.path.join(base_path, "HBL_Events", season_name,
+                                 "EventTimeline"),
+        "summary": os.path.join(base_path, "HBL_Events", season_name,
+                                "EventSummaries"),
+        "slicing": os.path.join(base_path, "HBL_Slicing", season_name),
+        "truth": os.path.join(base_path, "HBL_Synchronization",
+                              "GroundTruth"),
+    }
+    for directory in directories.values():
+        os.makedirs(directory, exist_ok=True)
+
+    write_position_csv(match, os.path.join(directories["positions"],
+                                           match.file_name))
+    np.save(os.path.join(directories["slicing"], f"{match.file_name}.npy"),
+            match.predictions)
+
+    timeline = build_timeline(rng, match)
+    with open(os.path.join(directories["timeline"],
+                           f"sport_events_{match.match_id}_timeline.json"),
+              "w", encoding="utf-8") as f:
+        json.dump(timeline, f, ensure_ascii=False)
+    summary = {key: timeline[key] for key in
+               ("sport_event", "sport_event_status", "statistics")}
+    with open(os.path.join(directories["summary"],
+                           f"sport_events_{match.match_id}_summary.json"),
+              "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False)
+
+    with open(os.path.join(directories["truth"],
+                           f"ground_truth_{match.match_id}.json"),
+              "w", encoding="utf-8") as f:
+        json.dump({"match_id": match.match_id,
+                   "sequences": match.segments,
+                   "events": [{key: event.get(key) for key in
+                               ("id", "type", "frame", "phase", "team",
+                                "player")} for event in match.events]},
+                  f, indent=1)
+
+    return {
+        "mapping": {"match_id": match.match_id,
+                    "raw_video": f"{match.file_name[:-4]}.mp4",
+                    "raw_pos_knx": match.file_name,
+                    "cutH1": match.throw_off, "offset_h2": 0,
+                    "firstVH2": match.halves[1][0]},
+        "lookup": {"match_id": f"sr:sport_event:{match.match_id}",
+                   "file_name": match.file_name,
+                   "home_team_name": match.home.name,
+                   "home_team_id": match.home.competitor_id,
+                   "away_team_name": match.away.name,
+                   "away_team_id": match.away.competitor_id},
+    }
+
+
+def write_player_profiles(base_path: str, teams: list[Team]) -> None:
+    """
+    Writes the Sportradar player profiles of all players.
+
+    Args:
+        base_path: The data directory
+        teams: The teams
+    """
+    directory = os.path.join(base_path, "HBL_Events", "general",
+                             "PlayerProfiles")
+    os.makedirs(directory, exist_ok=True)
+    for team in teams:
+        for pid, name, role in zip(team.player_ids, team.names, team.roles):
+            with open(os.path.join(directory, f"players_{pid}_profile.json"),
+                      "w", encoding="utf-8") as f:
+                json.dump({"player": {"id": f"sr:player:{pid}",
+                                      "name": name, "type": role},
+                           "competitors": [{"id": team.competitor_id,
+                                            "name": team.name}]},
+                          f, ensure_ascii=False)
+
+
+def generate_season(base_path: str, n_matches: int = 1,
+                    minutes: float = 60, event_density: float = 1.0,
+                    seed: int = 0, first_match_id: int = 23400000,
+                    season: dv.Season = dv.Season.SEASON_2020_2021
+                    ) -> list[int]:
+    """
+    Generates synthetic matches with all input files of the pipeline.
+
+    Args:
+        base_path: The data directory
+        n_matches: The number of matches
+        minutes: The gross playing time of every match in minutes
+        event_density: Factor for the number of possessions per minute
+        seed: The seed of the random generator
+        first_match_id: The Sportradar ID of the first match
+        season: The season of the matches
+
+    Returns:
+        list: The IDs of the generated matches
+    """
+    rng = np.random.default_rng(seed)
+    teams = create_teams(rng, max(2, min(len(TEAM_NAMES), 2 * n_matches)))
+    write_player_profiles(base_path, teams)
+
+    rows: dict[str, list[dict[str, Any]]] = {"mapping": [], "lookup": []}
+    match_ids = []
+    for index in range(n_matches):
+        home, away = (teams[(2 * index) % len(teams)],
+                      teams[(2 * index + 1) % len(teams)])
+        start = (datetime(2020, 10, 1, 18, 0, tzinfo=timezone.utc)
+                 + timedelta(days=index))
+        match_id = first_match_id + index
+        match = simulate_match(rng, match_id, home, away, start, minutes,
+                               event_density)
+        match_rows = write_match(base_path, match, rng, season)
+        for key in rows:
+            rows[key].append(match_rows[key])
+        match_ids.append(match_id)
+        print(f"Generated match {match_id}: {home.name} - {away.name}, "
+              f"{len(match.events)} events, "
+              f"{len(match.predictions)} frames")
+
+    mapping_dir = os.path.join(base_path, "HBL_Synchronization")
+    lookup_dir = os.path.join(base_path, "HBL_Events", "lookup")
+    os.makedirs(mapping_dir, exist_ok=True)
+    os.makedirs(lookup_dir, exist_ok=True)
+    pd.DataFrame(rows["mapping"]).to_csv(
+        os.path.join(mapping_dir, f"mapping{season.value}.csv"),
+        sep=";", index=False)
+    pd.DataFrame(rows["lookup"]).to_csv(
+        os.path.join(lookup_dir, f"lookup_matches_{season.value}.csv"),
+        index=False)
+    return match_ids
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Generate synthetic handball matches.')
+    parser.add_argument('--output-dir', required=True,
+                        help='Data directory for the generated files')
+    parser.add_argument('--matches', type=int, default=1,
+                        help='Number of matches')
+    parser.add_argument('--minutes', type=float, default=60,
+                        help='Gross playing time per match in minutes')
+    parser.add_argument('--event-density', type=float, default=1.0,
+                        help='Factor for the number of possessions')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the random generator')
+    args = parser.parse_args()
+
+    generate_season(args.output_dir, args.matches, args.minutes,
+                    args.event_density, args.seed)
@@ -0,0 +1,227 @@
+"""
+This module keeps a persistent running aggregate of the per-game
+accuracies written by the evaluation. Instead of re-reading every
+detailed results file after each game, the accumulator stores the sum of
+the accuracies and the number of games for every approach and event
+type. Each evaluated game updates these totals in constant time and the
+season summary is rendered from them on demand.
+
+The main functionalities include:
+- Reading the accuracy rows of a detailed results CSV file.
+- Loading, updating and saving the accumulator CSV file.
+- Rendering the season summary from the accumulator.
+- Rebuilding the accumulator from all detailed results files.
+
+author: Annabelle Runge
+date: 12.05.2025
+"""
+
+import csv
+import os
+from typing import Any, Iterable, Optional
+
+import pandas as pd
+
+KEY_COLUMNS = ["Approach", "Event Type"]
+ACCUMULATOR_COLUMNS = KEY_COLUMNS + ["Accuracy Sum", "Game Count"]
+
+
+def read_detailed_results(file_path: str) -> pd.DataFrame:
+    """
+    Reads the accuracy rows of a detailed results CSV file.
+
+    The detailed results files contain a second header and a section
+    title for the specific events. Only rows with an approach, an event
+    type and a finite accuracy are kept. The approach "None" is read as
+    a name and not as a missing value.
+
+    Args:
+        file_path: Path to the detailed results CSV file
+
+    Returns:
+        DataFrame: Columns "Approach", "Event Type" and "Accuracy"
+    """
+    df = pd.read_csv(file_path, header=None, names=KEY_COLUMNS + ["Accuracy"],
+                     usecols=[0, 1, 2], dtype=str, keep_default_na=False,
+                     na_values=[""], skip_blank_lines=True)
+    df["Accuracy"] = pd.to_numeric(df["Accuracy"], errors="coerce")
+    return df.dropna().reset_index(drop=True)
+
+
+def empty_accumulator() -> pd.DataFrame:
+    """
+    Creates an accumulator without any games.
+
+    Returns:
+        DataFrame: Accumulator indexed by approach and event type
+    """
+    index = pd.MultiIndex.from_arrays([[], []], names=KEY_COLUMNS)
+    return pd.DataFrame({"Accuracy Sum": pd.Series(dtype=float),
+                         "Game Count": pd.Series(dtype=int)}, index=index)
+
+
+def load_accumulator(file_path: str) -> pd.DataFrame:
+    """
+    Loads the accumulator from a CSV file.
+
+    Args:
+        file_path: Path to the accumulator CSV file
+
+    Returns:
+        DataFrame: Accumulator indexed by approach and event type, empty
+        if the file does not exist yet
+    """
+    if not os.path.exists(file_path):
+        return empty_accumulator()
+    df = pd.read_csv(file_path, dtype={"Approach": str, "Event Type": str},
+                     keep_default_na=False, na_values=[""])
+    df["Game Count"] = df["Game Count"].astype(int)
+    return df.set_index(KEY_COLUMNS)
+
+
+def save_accumulator(accumulator: pd.DataFrame, file_path: str) -> None:
+    """
+    Saves the accumulator to a CSV file.
+
+    Args:
+        accumulator: Accumulator indexed by approach and event type
+        file_path: Path to the accumulator CSV file
+    """
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    accumulator.reset_index()[ACCUMULATOR_COLUMNS].to_csv(
+        file_path, index=False)
+
+
+def _game_totals(rows: pd.DataFrame) -> pd.DataFrame:
+    """
+    Sums the accuracy rows of one game per approach and event type.
+
+    Args:
+        rows: Accuracy rows as returned by read_detailed_results
+
+    Returns:
+        DataFrame: Accuracy sum and game count per approach and event type
+    """
+    totals = rows.groupby(KEY_COLUMNS, sort=False)["Accuracy"].agg(
+        ["sum", "count"])
+    return totals.rename(columns={"sum": "Accuracy Sum",
+                                  "count": "Game Count"})
+
+
+def _combine(accumulator: pd.DataFrame, totals: pd.DataFrame,
+             sign: int) -> pd.DataFrame:
+    """
+    Adds or subtracts game totals while keeping the order in which
+    approaches and event types first appeared.
+
+    Args:
+        accumulator: Accumulator indexed by approach and event type
+        totals: Game totals indexed by approach and event type
+        sign: 1 to add the totals, -1 to subtract them
+
+    Returns:
+        DataFrame: The combined accumulator
+    """
+    index = accumulator.index.append(
+        totals.index.difference(accumulator.index, sort=False))
+    combined = (accumulator.reindex(index, fill_value=0) +
+                sign * totals.reindex(index, fill_value=0))
+    combined["Game Count"] = combined["Game Count"].astype(int)
+    return combined[combined["Game Count"] > 0]
+
+
+def update_accumulator(accumulator: pd.DataFrame,
+                       game_rows: pd.DataFrame,
+                       previous_rows: Optional[pd.DataFrame] = None
+                       ) -> pd.DataFrame:
+    """
+    Adds the accuracies of one game to the accumulator.
+
+    When a game is evaluated again, the rows of its previous detailed
+    results file are removed first so the game is only counted once.
+
+    Args:
+        accumulator: Accumulator indexed by approach and event type
+        game_rows: Accuracy rows of the evaluated game
+        previous_rows: Accuracy rows of an earlier evaluation of the same
+        game, if there was one
+
+    Returns:
+        DataFrame: The updated accumulator
+    """
+    if previous_rows is not None and not previous_rows.empty:
+        accumulator = _combine(accumulator, _game_totals(previous_rows), -1)
+    return _combine(accumulator, _game_totals(game_rows), 1)
+
+
+def average_accuracies(accumulator: pd.DataFrame) -> dict[Any, Any]:
+    """
+    Calculates the average accuracy per approach and event type.
+
+    Args:
+        accumulator: Accumulator indexed by approach and event type
+
+    Returns:
+        dict: Nested dictionary {Approach: {Event Type: accuracy}}
+    """
+    averages = accumulator["Accuracy Sum"] / accumulator["Game Count"]
+    avg_type_accuracies: dict[Any, Any] = {}
+    for (approach, event_type), accuracy in averages.items():
+        avg_type_accuracies.setdefault(approach, {})[event_type] = accuracy
+    return avg_type_accuracies
+
+
+def write_summary(accumulator: pd.DataFrame, output_file: str) -> None:
+    """
+    Writes the season summary of the average accuracies to a CSV file.
+
+    Args:
+        accumulator: Accumulator indexed by approach and event type
+        output_file: Path to the output summary file
+    """
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+
+    rows: list[Any] = []
+    rows.append([])  # Empty row for spacing
+    rows.append(["Event-Type Accuracies"])
+    rows.append(["Approach", "Event Type", "Average Accuracy"])
+    for approach, event_types in average_accuracies(accumulator).items():
+        for event_type, accuracy in event_types.items():
+            rows.append([approach, event_type, f"{accuracy:.4f}"])
+
+    with open(output_file, 'w', newline='', encoding='utf-8') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerows(rows)
+
+    print(f"Summary results saved to {output_file}")
+
+
+def rebuild_accumulator(directory: str,
+                        exclude: Iterable[str] = ()) -> pd.DataFrame:
+    """
+    Rebuilds the accumulator from all detailed results files in a
+    directory, e.g. after results were deleted or edited by hand.
+
+    Args:
+        directory: Path to the directory containing the detailed results
+        exclude: File names of detailed results that are left out, e.g.
+        of the game that is added to the accumulator afterwards
+
+    Returns:
+        DataFrame: Accumulator indexed by approach and event type
+    """
+    excluded = set(exclude)
+    frames = []
+    for file_name in sorted(os.listdir(directory)):
+        if (file_name.endswith(".csv") and
+                file_name.startswith("detailed_results_") and
+                file_name not in excluded):
+            file_path = os.path.join(directory, file_name)
+            try:
+                frames.append(read_detailed_results(file_path))
+            except Exception as e:
+                print(f"Error processing file {file_path}: {e}")
+
+    if not frames:
+        return empty_accumulator()
+    return _game_totals(pd.concat(frames, ignore_index=True))
@@ -0,0 +1,233 @@
+"""
+This module computes the accuracies of all synchronization approaches at
+once. The evaluation results are brought into a long-form table with one
+row per match, event and approach, so that the overall, per-event-type
+and target-event accuracies of every approach follow from a single
+groupby. Confidence intervals are estimated with a vectorized bootstrap
+that resamples whole matches.
+
+The main functionalities include:
+- Converting the evaluated DataFrame of a match into the long form.
+- Saving and loading the long-form results of a season.
+- Calculating the accuracy table for all approaches.
+- Calculating bootstrap confidence intervals for the accuracy table.
+
+author: Annabelle Runge
+date: 14.05.2025
+"""
+
+import os
+import warnings
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+# Approach names used in the results files and their correctness columns
+APPROACH_COLUMNS = {
+    "None": "none_correct",
+    "Baseline": "bl_correct",
+    "Rulebased": "rb_correct",
+    "pos": "pos_correct",
+    "pos_RB": "pos_rb_correct",
+    "pos_COR": "pos_cor_correct",
+    "Cost": "cost_correct",
+    "Cost_RB": "cost_rb_correct",
+    "Cost_COR": "cost_cor_correct",
+    "Cost_DP": "cost_dp_correct",
+}
+
+# Events the synchronization approaches are targeting
+TARGET_EVENTS = [
+    "score_change", "shot_saved", "shot_off_target", "shot_blocked",
+    "technical_rule_fault", "seven_m_awarded", "steal",
+    "technical_ball_fault"
+]
+
+LONG_COLUMNS = ["match", "event_id", "event_type", "approach", "correct"]
+OVERALL = "all"
+TARGET_OVERALL = "specific_events_overall"
+
+
+def to_long_form(df: pd.DataFrame, match_id: int,
+                 event_type_column: str = "eID",
+                 event_id_column: str = "Event_id") -> pd.DataFrame:
+    """
+    Converts the evaluated DataFrame of one match into the long form.
+
+    Only predictions that were evaluated, i.e. with a correctness of 0
+    or 1, are kept.
+
+    Args:
+        df: DataFrame with one row per annotated event and one
+        correctness column per approach
+        match_id: The ID of the match
+        event_type_column: Column name for event types
+        event_id_column: Column name for event IDs
+
+    Returns:
+        DataFrame: Columns "match", "event_id", "event_type", "approach"
+        and "correct"
+    """
+    columns = {column: approach for approach, column
+               in APPROACH_COLUMNS.items() if column in df.columns}
+    wide = df[[event_id_column, event_type_column] + list(columns)].rename(
+        columns={event_id_column: "event_id",
+                 event_type_column: "event_type", **columns})
+    long = wide.melt(id_vars=["event_id", "event_type"],
+                     var_name="approach", value_name="correct")
+    long["correct"] = pd.to_numeric(long["correct"], errors="coerce")
+    long = long[long["correct"].isin([0, 1])]
+    long.insert(0, "match", match_id)
+    long["correct"] = long["correct"].astype(np.int8)
+    return long[LONG_COLUMNS].reset_index(drop=True)
+
+
+def save_long_results(long: pd.DataFrame, file_path: str) -> None:
+    """
+    Saves the long-form results of a match to a CSV file.
+
+    Args:
+        long: Long-form results
+        file_path: Path to the output CSV file
+    """
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    long.to_csv(file_path, index=False)
+
+
+def load_long_results(directory: str) -> pd.DataFrame:
+    """
+    Loads the long-form results of all matches in a directory.
+
+    Args:
+        directory: Path to the directory containing the
+        long_results_*.csv files
+
+    Returns:
+        DataFrame: The concatenated long-form results
+    """
+    frames = [
+        pd.read_csv(os.path.join(directory, file_name),
+                    dtype={"approach": str, "event_type": str},
+                    keep_default_na=False, na_values=[""])
+        for file_name in sorted(os.listdir(directory))
+        if file_name.startswith("long_results_") and
+        file_name.endswith(".csv")
+    ]
+    if not frames:
+        return pd.DataFrame(columns=LONG_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def _count_table(long: pd.DataFrame, keys: list[str]) -> pd.DataFrame:
+    """
+    Counts correct and evaluated predictions per event type, plus the
+    rows for all events and for the target events.
+
+    Args:
+        long: Long-form results
+        keys: Grouping columns in addition to the event type
+
+    Returns:
+        DataFrame: Columns "correct" and "total" indexed by the keys and
+        the event type
+    """
+    counts = long.groupby(keys + ["event_type"], sort=False)["correct"].agg(
+        correct="sum", total="count")
+    by_type = counts.reset_index()
+
+    overall = by_type.groupby(keys, sort=False)[["correct", "total"]].sum()
+    target = by_type[by_type["event_type"].isin(TARGET_EVENTS)].groupby(
+        keys, sort=False)[["correct", "total"]].sum()
+
+    # Approaches without any evaluated prediction have an accuracy of 0
+    if keys == ["approach"]:
+        approaches = pd.Index(list(APPROACH_COLUMNS), name="approach")
+        approaches = approaches.append(
+            overall.index.difference(approaches, sort=False))
+        overall = overall.reindex(approaches, fill_value=0)
+        target = target.reindex(approaches, fill_value=0)
+
+    overall["event_type"] = OVERALL
+    target["event_type"] = TARGET_OVERALL
+    table = pd.concat([overall.reset_index(), by_type,
+                       target.reset_index()], ignore_index=True)
+    return table.set_index(keys + ["event_type"])
+
+
+def accuracy_table(long: pd.DataFrame) -> pd.DataFrame:
+    """
+    Calculates the overall, per-event-type and target-event accuracies
+    of all approaches.
+
+    The rows for all events use the event type "all" and the rows for the
+    target events use "specific_events_overall", as in the detailed
+    results files.
+
+    Args:
+        long: Long-form results of one or more matches
+
+    Returns:
+        DataFrame: Columns "approach", "event_type", "correct", "total"
+        and "accuracy"
+    """
+    table = _count_table(long, ["approach"])
+    table["accuracy"] = (table["correct"] /
+                         table["total"].where(table["total"] > 0)).fillna(0)
+    return table.reset_index()
+
+
+def bootstrap_confidence_intervals(long: pd.DataFrame,
+                                   n_boot: int = 1000,
+                                   alpha: float = 0.05,
+                                   seed: Optional[int] = None
+                                   ) -> pd.DataFrame:
+    """
+    Calculates bootstrap confidence intervals for the accuracy table.
+
+    Whole matches are resampled with replacement, because the events of
+    one match are not independent. All bootstrap samples are evaluated at
+    once as a product of the resampling weights with the per-match count
+    matrices.
+
+    Args:
+        long: Long-form results of several matches
+        n_boot: Number of bootstrap samples
+        alpha: Significance level, 0.05 gives 95% intervals
+        seed: Seed for the random number generator
+
+    Returns:
+        DataFrame: The accuracy table with the additional columns
+        "ci_low" and "ci_high"
+    """
+    table = accuracy_table(long)
+    counts = _count_table(long, ["match", "approach"]).reset_index()
+    correct = counts.pivot_table(index="match",
+                                 columns=["approach", "event_type"],
+                                 values="correct", aggfunc="sum",
+                                 fill_value=0)
+    total = counts.pivot_table(index="match",
+                               columns=["approach", "event_type"],
+                               values="total", aggfunc="sum",
+                               fill_value=0).reindex(columns=correct.columns)
+
+    # Resampling weights: how often each match is drawn per sample
+    rng = np.random.default_rng(seed)
+    n_matches = len(correct.index)
+    weights = rng.multinomial(n_matches, np.full(n_matches, 1 / n_matches),
+                              size=n_boot)
+    boot_correct = weights @ correct.to_numpy(dtype=float)
+    boot_total = weights @ total.to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        boot_accuracy = np.where(boot_total > 0,
+                                 boot_correct / boot_total, np.nan)
+    # Columns without any evaluated prediction stay NaN
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        low, high = np.nanpercentile(
+            boot_accuracy, [100 * alpha / 2, 100 * (1 - alpha / 2)], axis=0)
+
+    intervals = pd.DataFrame({"ci_low": low, "ci_high": high},
+                             index=correct.columns).reset_index()
+    return table.merge(intervals, on=["approach", "event_type"],
+                       how="left")
@@ -0,0 +1,262 @@
+"""
+This module calibrates the search windows and the baseline offsets of
+the event types on annotated matches.
+
+The offset of an event is the difference of its annotated (true) frame
+and its Sportradar frame. The offsets of all matches are collected from
+    - the ground truth files of HBL_Synchronization/GroundTruth, joined
+      with the events of the match on the event ID, and
+    - the annotated JSONL files, paired with the reformatted timeline
+      files as in evaluation.compute_differences,
+and are summarized per event type in one groupby: the number of events,
+the mean offset (the baseline of the event type) and the lower and upper
+quantile. The search window of an event type covers the lower quantile,
+e.g. 99 % of the true frames before the events. The windows and the
+offsets are saved as JSON file that the approaches load at the start of
+a match (help_functions.search_windows).
+
+Usage:
+    python -m evaluation.calibrate_windows --data-dir /tmp/handball \
+        --quantile 0.99 --table windows.csv
+
+Author:
+    @Annabelle Runge
+
+Date:
+    2025-05-26
+"""
+import argparse
+import json
+import os
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+import variables.data_variables as dv
+from evaluation.compute_differences import (compute_event_differences,
+                                            load_catalog, load_jsonl_as_frame,
+                                            resolve_match_files)
+from help_functions.match_context import MatchContext
+from help_functions.search_windows import (BASELINE_OFFSETS,
+                                           SEARCH_WINDOWS_FILE, SearchWindows)
+
+OFFSET_COLUMNS = ["match_id", "event_type", "offset"]
+TABLE_COLUMNS = ["event_type", "count", "baseline", "lower", "upper",
+                 "before"]
+
+
+def ground_truth_offsets(base_path: str, match_ids: list[int],
+                         season: dv.Season = dv.Season.SEASON_2020_2021
+                         ) -> pd.DataFrame:
+    """
+    Collects the offsets of the events of the matches with a ground truth
+    file.
+
+    Args:
+        base_path: The data directory
+        match_ids: The IDs of the matches
+        season: The season of the matches
+
+    Returns:
+        pd.DataFrame: The match ID, the event type and the offset of every
+        event
+    """
+    offsets = []
+    for match_id in match_ids:
+        truth_file = os.path.join(base_path, "HBL_Synchronization",
+                                  "GroundTruth",
+                                  f"ground_truth_{match_id}.json")
+        if not os.path.exists(truth_file):
+            continue
+        with open(truth_file, "r", encoding="utf-8") as f:
+            truth = pd.DataFrame(json.load(f)["events"])
+        events = MatchContext(match_id, base_path, season).events
+        raw = pd.DataFrame({
+            "id": events["eventID"].to_numpy(),
+            "event_type": events.iloc[:, 0].to_numpy(),
+            "raw_frame": pd.to_numeric(events.iloc[:, 24],
+                                       errors="coerce").to_numpy()})
+        joined = raw.drop_duplicates("id").merge(truth[["id", "frame"]],
+                                                 on="id")
+        offsets.append(pd.DataFrame({
+            "match_id": match_id,
+            "event_type": joined["event_type"],
+            "offset": joined["frame"] - joined["raw_frame"]}))
+    return pd.concat(offsets, ignore_index=True) if offsets else \
+        pd.DataFrame(columns=OFFSET_COLUMNS)
+
+
+def annotation_offsets(csv_file: str, old_jsonl_dir: str,
+                       new_jsonl_dir: str,
+                       match_ids: Optional[list[int]] = None
+                       ) -> pd.DataFrame:
+    """
+    Collects the offsets of the events of the annotated JSONL files.
+
+    Args:
+        csv_file: Path to the mapping CSV file of the season
+        old_jsonl_dir: Directory containing the reformatted JSONL files
+        new_jsonl_dir: Directory containing the annotation files
+        match_ids: IDs of the matches, all matches of the catalog if None
+
+    Returns:
+        pd.DataFrame: The match ID, the event type and the offset of every
+        event
+    """
+    catalog = load_catalog(csv_file)
+    if match_ids is None:
+        match_ids = catalog.index.tolist()
+    offsets = []
+    for match_id, old_file, new_file in resolve_match_files(
+            match_ids, catalog, old_jsonl_dir, new_jsonl_dir):
+        changes = compute_event_differences(load_jsonl_as_frame(old_file),
+                                            load_jsonl_as_frame(new_file),
+                                            match_id)
+        offsets.append(pd.DataFrame({
+            "match_id": match_id, "event_type": changes["event_type"],
+            "offset": changes["difference"]}))
+    return pd.concat(offsets, ignore_index=True) if offsets else \
+        pd.DataFrame(columns=OFFSET_COLUMNS)
+
+
+def calibrate(offsets: pd.DataFrame, quantile: float = 0.99,
+              min_events: int = 10, margin: int = 0) -> pd.DataFrame:
+    """
+    Summarizes the offsets per event type.
+
+    Args:
+        offsets: The offsets of all events
+        quantile: The share of the true frames the windows cover
+        min_events: The minimum number of events of a calibrated type
+        margin: Number of frames that are added to every window
+
+    Returns:
+        pd.DataFrame: The number of events, the mean offset, the lower and
+        upper quantile of the offsets and the window (frames before the
+        event) of every event type
+    """
+    offsets = offsets.dropna(subset=["offset"])
+    grouped = offsets.groupby("event_type")["offset"]
+    table = pd.DataFrame({
+        "count": grouped.size(),
+        "baseline": grouped.mean().round(),
+        "lower": grouped.quantile(1 - quantile),
+        "upper": grouped.quantile(quantile)})
+    table = table[table["count"] >= min_events]
+    # The true frames before the events are searched in the window
+    table["before"] = np.maximum(np.ceil(-table["lower"]), 1) + margin
+    table = table.astype({"count": int, "baseline": int, "before": int})
+    return table.reset_index()[TABLE_COLUMNS]
+
+
+def to_search_windows(table: pd.DataFrame,
+                      quantile: Optional[float] = None) -> SearchWindows:
+    """
+    Converts the calibration table to the windows of the approaches.
+
+    Args:
+        table: The calibration table from calibrate()
+        quantile: The quantile of the table
+
+    Returns:
+        SearchWindows: The windows and the offsets, the constant means
+        for types that were not calibrated
+    """
+    return SearchWindows(
+        dict(zip(table["event_type"], table["before"].astype(int))),
+        {**BASELINE_OFFSETS,
+         **dict(zip(table["event_type"], table["baseline"].astype(int)))},
+        quantile)
+
+
+def calibrate_windows(base_path: str, match_ids: list[int],
+                      season: dv.Season = dv.Season.SEASON_2020_2021,
+                      annotations: Optional[tuple[str, str, str]] = None,
+                      quantile: float = 0.99, min_events: int = 10,
+                      margin: int = 0,
+                      output_file: Optional[str] = None) -> pd.DataFrame:
+    """
+    Calibrates the windows on the ground truth and the annotations of the
+    matches and saves them.
+
+    Args:
+        base_path: The data directory
+        match_ids: The IDs of the matches
+        season: The season of the matches
+        annotations: The mapping CSV file, the directory of the
+        reformatted and of the annotated JSONL files, not used if None
+        quantile: The share of the true frames the windows cover
+        min_events: The minimum number of events of a calibrated type
+        margin: Number of frames that are added to every window
+        output_file: The JSON file of the windows, search_windows.json in
+        HBL_Synchronization if None
+
+    Returns:
+        pd.DataFrame: The calibration table
+    """
+    offsets = [ground_truth_offsets(base_path, match_ids, season)]
+    if annotations is not None:
+        offsets.append(annotation_offsets(*annotations, match_ids))
+    table = calibrate(pd.concat(offsets, ignore_index=True), quantile,
+                      min_events, margin)
+    if output_file is None:
+        output_file = os.path.join(base_path, "HBL_Synchronization",
+                                   SEARCH_WINDOWS_FILE)
+    to_search_windows(table, quantile).save(output_file)
+    print(f"Search windows of {len(table)} event types saved in "
+          f"{output_file}")
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Calibrate the search windows and the baseline '
+        'offsets of the event types on annotated matches.')
+    parser.add_argument('--data-dir', required=True,
+                        help='Data directory with the layout of the '
+                        'handball data drive')
+    parser.add_argument('--match-id', type=int, nargs='+',
+                        help='Matches to calibrate on, all matches of the '
+                        'mapping file if not given')
+    parser.add_argument('--season', default=dv.Season.SEASON_2020_2021.name,
+                        choices=[s.name for s in dv.Season],
+                        help='Season of the matches')
+    parser.add_argument('--catalog',
+                        help='Mapping CSV file for the annotated JSONL '
+                        'files, the mapping file of the data directory if '
+                        'not given')
+    parser.add_argument('--old-dir',
+                        help='Directory containing the reformatted files')
+    parser.add_argument('--new-dir',
+                        help='Directory containing the annotation files')
+    parser.add_argument('--quantile', type=float, default=0.99,
+                        help='Share of the true frames the windows cover')
+    parser.add_argument('--min-events', type=int, default=10,
+                        help='Minimum number of events of a calibrated '
+                        'event type')
+    parser.add_argument('--margin', type=int, default=0,
+                        help='Frames added to every window')
+    parser.add_argument('--output',
+                        help='JSON file of the windows, search_windows.json '
+                        'in HBL_Synchronization if not given')
+    parser.add_argument('--table',
+                        help='CSV file for the calibration table')
+    args = parser.parse_args()
+
+    mapping_file = MatchContext(0, base_path=args.data_dir).mapping_file
+    match_ids = args.match_id or pd.read_csv(
+        mapping_file, delimiter=";")["match_id"].tolist()
+    annotations: Optional[tuple[Any, Any, Any]] = None
+    if args.new_dir:
+        if not args.old_dir:
+            parser.error("--new-dir requires --old-dir")
+        annotations = (args.catalog or mapping_file, args.old_dir,
+                       args.new_dir)
+    table = calibrate_windows(args.data_dir, match_ids,
+                              dv.Season[args.season], annotations,
+                              args.quantile, args.min_events, args.margin,
+                              args.output)
+    if args.table:
+        table.to_csv(args.table, index=False)
+    print(table.to_string(index=False))
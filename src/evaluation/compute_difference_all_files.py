@@ -1,68 +1,36 @@
-import os
+"""
+This module processes the event differences of multiple games, computes
+statistical summaries and generates a boxplot of the differences per
+event type.
 
-import matplotlib.pyplot as plt
-import pandas as pd
+The Details CSV files written for each game are read in parallel and
+folded into running statistics, so the memory use does not grow with the
+number of games:
+- The mean and standard deviation per event type are accumulated with
+  Welford's algorithm.
+- The quantiles for the boxplot are taken from a fixed-size reservoir
+  sample per event type.
+The running statistics can be saved and merged, e.g. to combine several
+seasons.
 
-"""
-This script processes event data from multiple CSV files, computes statistical
-summaries, and generates visualizations.
-Modules:
-    os: Provides a way of using operating system dependent functionality.
-    pandas: Library for data manipulation and analysis.
-    matplotlib.pyplot: Library for creating static, animated, and interactive
-    visualizations.
-Constants:
-    details_dir (str): Directory containing the event details CSV files.
-    output_dir_sum (str): Directory to save the summary statistics CSV file.
-    output_dir_box (str): Directory to save the boxplot image file.
-Variables:
-    all_events_data (DataFrame): DataFrame to store concatenated event data
-    from all CSV files.
-    excluded_events_boxplot (list): List of event types to exclude from the
-    boxplot.
-    df_filtered_boxplot (DataFrame): DataFrame containing filtered event data
-    for the boxplot.
-    boxplot_data (list): List of series containing 'difference' values for each
-    event type.
-    boxplot_filename (str): Path to save the boxplot image file.
-    summary_stats_all_games (DataFrame): DataFrame containing mean and standard
-    deviation of 'difference' for each event type.
-    overall_mean (float): Overall mean of 'difference' across all events.
-    overall_std (float): Overall standard deviation of 'difference' across all
-    events.
-    overall_stats (DataFrame): DataFrame containing overall mean and standard
-    deviation.
-    final_summary_stats_all_games (DataFrame): DataFrame containing combined
-    summary statistics for each event type and overall.
-    summary_filename (str): Path to save the summary statistics CSV file.
-Functions:
-    None
-Execution:
-    1. Reads and concatenates event data from CSV files in the details_dir.
-    2. Filters out specified event types for the boxplot.
-    3. Generates and saves a boxplot of 'difference' values by event type.
-    4. Computes and saves summary statistics (mean and standard deviation)
-    of 'difference'
-    for each event type and overall.
-"""
-import matplotlib
+Author:
+    @Annabelle Runge
 
-matplotlib.use("Agg")  # Verwenden eines nicht-interaktiven Backends
+Date:
+    2025-05-16
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterator, Optional
 
-# Input directories and output directories
-details_dir = r"D:\Handball\HBL_Events\season_20_21\EventDifference\Details"
-output_dir_sum = r"D:\Handball\HBL_Events\season_20_21\EventDifference\Summary"
-output_dir_box = r"D:\Handball\HBL_Events\season_20_21\EventDifference\Boxplot"
+import numpy as np
+import pandas as pd
 
-# Concatenate all event data from CSV files
-all_events_data = pd.DataFrame()
-for file in os.listdir(details_dir):
-    if file.endswith(".csv"):
-        file_path = os.path.join(details_dir, file)
-        df = pd.read_csv(file_path)
-        all_events_data = pd.concat([all_events_data, df], ignore_index=True)
+from help_functions.headless import enable_headless_mode
 
-# Filter out specific event types for the boxplot
+# Event types that are not shown in the boxplot
 excluded_events_boxplot = [
     "match_started",
     "period_start",
@@ -72,56 +40,372 @@ excluded_events_boxplot = [
     "break_start",
     "match_ended",
 ]
-df_filtered_boxplot = all_events_data[
-    ~all_events_data["event_type"].isin(excluded_events_boxplot)
-]
 
-# Generate and save boxplot of 'difference' values by event type
-plt.figure(figsize=(14, 7))
-boxplot_data = [
-    df_filtered_boxplot[df_filtered_boxplot["event_type"] == et]["difference"]
-    for et in df_filtered_boxplot["event_type"].unique()
-]
-plt.boxplot(
-    boxplot_data, tick_labels=df_filtered_boxplot["event_type"].unique(),
-    showmeans=True, showfliers=False
-)
-plt.xlabel("Event Type")
-plt.ylabel("Difference in t_start (new - old)")
-plt.title("Boxplot of Differences in t_start Across All Games by Event Type")
-plt.xticks(rotation=45)
-plt.grid(True)
-plt.tight_layout()
-
-boxplot_filename = os.path.join(
-    output_dir_box, "boxplot_differences_all_games_withoutOutliers.png")
-plt.savefig(boxplot_filename)
-plt.close()
-print(f"Boxplot saved for all events here: {boxplot_filename}")
-
-# Compute summary statistics for each event type and overall
-summary_stats_all_games = (
-    all_events_data.groupby("event_type")["difference"]
-    .agg(["mean", "std"])
-    .reset_index()
-)
-overall_mean = all_events_data["difference"].mean()
-overall_std = all_events_data["difference"].std()
-
-overall_stats = pd.DataFrame(
-    {"event_type": ["overall"], "mean": [overall_mean], "std": [overall_std]}
-)
-final_summary_stats_all_games = pd.concat(
-    [summary_stats_all_games, overall_stats], ignore_index=True
-)
-
-summary_filename = os.path.join(
-    output_dir_sum, "summary_statistics_all_games.csv")
-final_summary_stats_all_games.to_csv(summary_filename, index=False)
-print(f"Summary of Calculations for all events saved here: {summary_filename}")
-
-
-# # Boxplot ohne Ausreißer anzeigen
-# plt.boxplot(data, showfliers=False)
-# plt.title("Boxplot ohne Ausreißer (showfliers=False)")
-# plt.show()
+OVERALL = "overall"
+
+
+class DifferenceStatistics:
+    """
+    Running statistics of the 'difference' values per event type.
+
+    For every event type the number of values, the mean and the sum of
+    squared deviations (Welford) are kept together with a uniform
+    reservoir sample of at most reservoir_size values.
+
+    Attributes:
+        reservoir_size (int): Maximum number of sampled values per event
+        type.
+        stats (dict): Maps each event type to its count, mean, m2 and
+        reservoir sample, in the order the event types appeared.
+    """
+
+    def __init__(self, reservoir_size: int = 10000,
+                 seed: Optional[int] = None) -> None:
+        self.reservoir_size = reservoir_size
+        self.stats: dict[str, dict[str, Any]] = {}
+        self._rng = np.random.default_rng(seed)
+
+    def _merge_group(self, key: str, count: int, mean: float, m2: float,
+                     sample: np.ndarray) -> None:
+        """
+        Merges the statistics of a group of values into an event type.
+
+        Args:
+            key: The event type, or "overall"
+            count: Number of values in the group
+            mean: Mean of the group
+            m2: Sum of squared deviations from the mean of the group
+            sample: Uniform sample of at most reservoir_size values of
+            the group
+        """
+        current = self.stats.get(key)
+        if current is None:
+            self.stats[key] = {"count": count, "mean": mean, "m2": m2,
+                               "sample": sample}
+            return
+
+        # Parallel variant of Welford's algorithm (Chan et al.)
+        n_a, n_b = current["count"], count
+        total = n_a + n_b
+        delta = mean - current["mean"]
+        current["mean"] += delta * n_b / total
+        current["m2"] += m2 + delta ** 2 * n_a * n_b / total
+
+        # The merged reservoir draws from both samples in proportion to
+        # the number of values they represent
+        size = min(self.reservoir_size, total)
+        from_a = self._rng.hypergeometric(n_a, n_b, size)
+        current["sample"] = np.concatenate([
+            self._rng.choice(current["sample"], from_a, replace=False),
+            self._rng.choice(sample, size - from_a, replace=False)])
+        current["count"] = total
+
+    def _sample(self, values: np.ndarray) -> np.ndarray:
+        """
+        Draws a uniform sample of at most reservoir_size values.
+
+        Args:
+            values: The values to sample from
+
+        Returns:
+            np.ndarray: The sampled values
+        """
+        if len(values) <= self.reservoir_size:
+            return values
+        return self._rng.choice(values, self.reservoir_size, replace=False)
+
+    def update(self, df: pd.DataFrame) -> None:
+        """
+        Adds the differences of one game.
+
+        Args:
+            df: DataFrame with the columns 'event_type' and 'difference'
+        """
+        df = df[["event_type", "difference"]].dropna()
+        if df.empty:
+            return
+        groups = df.groupby("event_type", sort=False)["difference"]
+        for event_type, values in groups:
+            self._add_values(str(event_type), values.to_numpy(dtype=float))
+        self._add_values(OVERALL, df["difference"].to_numpy(dtype=float))
+
+    def _add_values(self, key: str, values: np.ndarray) -> None:
+        """
+        Merges an array of values into the statistics of an event type.
+
+        Args:
+            key: The event type, or "overall"
+            values: The 'difference' values
+        """
+        mean = float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+        self._merge_group(key, len(values), mean, m2, self._sample(values))
+
+    def merge(self, other: "DifferenceStatistics") -> None:
+        """
+        Merges the statistics of another collection, e.g. of another
+        season, into this one.
+
+        Args:
+            other: The statistics to merge
+        """
+        for key, stats in other.stats.items():
+            self._merge_group(key, stats["count"], stats["mean"],
+                              stats["m2"], stats["sample"])
+
+    def summary(self) -> pd.DataFrame:
+        """
+        Calculates the mean and the sample standard deviation per event
+        type, followed by the overall statistics.
+
+        Returns:
+            DataFrame: Columns 'event_type', 'mean' and 'std'
+        """
+        rows = [
+            {"event_type": key, "mean": stats["mean"],
+             "std": (np.sqrt(stats["m2"] / (stats["count"] - 1))
+                     if stats["count"] > 1 else np.nan)}
+            for key, stats in self.stats.items()
+        ]
+        summary = pd.DataFrame(rows, columns=["event_type", "mean", "std"])
+        is_overall = summary["event_type"] == OVERALL
+        return pd.concat([
+            summary[~is_overall].sort_values("event_type"),
+            summary[is_overall]], ignore_index=True)
+
+    def boxplot_stats(self, excluded_events: list[str]
+                      ) -> list[dict[str, Any]]:
+        """
+        Calculates the boxplot statistics per event type from the
+        reservoir samples. The means are the exact running means.
+
+        Args:
+            excluded_events: Event types that are not shown
+
+        Returns:
+            list: One dictionary per event type as used by Axes.bxp
+        """
+        from matplotlib import cbook
+
+        boxes = []
+        for key, stats in self.stats.items():
+            if key == OVERALL or key in excluded_events:
+                continue
+            box = cbook.boxplot_stats(stats["sample"], labels=[key])[0]
+            box["mean"] = stats["mean"]
+            boxes.append(box)
+        return boxes
+
+    def save(self, file_path: str) -> None:
+        """
+        Saves the statistics to a JSON file.
+
+        Args:
+            file_path: Path to the JSON file
+        """
+        state = {
+            "reservoir_size": self.reservoir_size,
+            "stats": {key: {"count": stats["count"], "mean": stats["mean"],
+                            "m2": stats["m2"],
+                            "sample": stats["sample"].tolist()}
+                      for key, stats in self.stats.items()},
+        }
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+
+    @classmethod
+    def load(cls, file_path: str,
+             seed: Optional[int] = None) -> "DifferenceStatistics":
+        """
+        Loads statistics saved with save.
+
+        Args:
+            file_path: Path to the JSON file
+            seed: Seed for the random number generator of the reservoir
+
+        Returns:
+            DifferenceStatistics: The loaded statistics
+        """
+        with open(file_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        statistics = cls(state["reservoir_size"], seed)
+        for key, stats in state["stats"].items():
+            statistics.stats[key] = {
+                "count": stats["count"], "mean": stats["mean"],
+                "m2": stats["m2"],
+                "sample": np.asarray(stats["sample"], dtype=float)}
+        return statistics
+
+
+def read_details(details_dirs: list[str], max_workers: int = 8
+                 ) -> Iterator[pd.DataFrame]:
+    """
+    Reads the Details CSV files of one or more directories in parallel.
+    At most twice the number of workers files are held in memory.
+
+    Args:
+        details_dirs: Directories containing the Details CSV files
+        max_workers: Number of threads used for reading
+
+    Yields:
+        DataFrame: The 'event_type' and 'difference' columns of one file
+    """
+    file_paths = [os.path.join(details_dir, file)
+                  for details_dir in details_dirs
+                  for file in sorted(os.listdir(details_dir))
+                  if file.endswith(".csv")]
+    window = 2 * max_workers
+
+    def read(file_path: str) -> pd.DataFrame:
+        return pd.read_csv(file_path, usecols=["event_type", "difference"])
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for start in range(0, len(file_paths), window):
+            yield from executor.map(read, file_paths[start:start + window])
+
+
+def collect_statistics(details_dirs: list[str],
+                       reservoir_size: int = 10000,
+                       max_workers: int = 8,
+                       seed: Optional[int] = None) -> DifferenceStatistics:
+    """
+    Collects the running statistics of all Details CSV files.
+
+    Args:
+        details_dirs: Directories containing the Details CSV files
+        reservoir_size: Maximum number of sampled values per event type
+        max_workers: Number of threads used for reading
+        seed: Seed for the random number generator of the reservoir
+
+    Returns:
+        DifferenceStatistics: The statistics of all games
+    """
+    statistics = DifferenceStatistics(reservoir_size, seed)
+    for df in read_details(details_dirs, max_workers):
+        statistics.update(df)
+    return statistics
+
+
+def save_boxplot(statistics: DifferenceStatistics,
+                 output_dir_box: str) -> str:
+    """
+    Generates and saves the boxplot of the 'difference' values by event
+    type without outliers.
+
+    Args:
+        statistics: The statistics of all games
+        output_dir_box: Directory to save the boxplot image file
+
+    Returns:
+        str: Path of the saved boxplot
+    """
+    from matplotlib import pyplot as plt
+
+    _, ax = plt.subplots(figsize=(14, 7))
+    ax.bxp(statistics.boxplot_stats(excluded_events_boxplot),
+           showmeans=True, showfliers=False)
+    ax.set_xlabel("Event Type")
+    ax.set_ylabel("Difference in t_start (new - old)")
+    ax.set_title(
+        "Boxplot of Differences in t_start Across All Games by Event Type")
+    ax.tick_params(axis="x", labelrotation=45)
+    ax.grid(True)
+    plt.tight_layout()
+
+    boxplot_filename = os.path.join(
+        output_dir_box, "boxplot_differences_all_games_withoutOutliers.png")
+    plt.savefig(boxplot_filename)
+    plt.close()
+    print(f"Boxplot saved for all events here: {boxplot_filename}")
+    return boxplot_filename
+
+
+def save_summary(statistics: DifferenceStatistics,
+                 output_dir_sum: str) -> str:
+    """
+    Saves the mean and standard deviation of the 'difference' values for
+    each event type and overall.
+
+    Args:
+        statistics: The statistics of all games
+        output_dir_sum: Directory to save the summary statistics CSV file
+
+    Returns:
+        str: Path of the saved summary
+    """
+    summary_filename = os.path.join(
+        output_dir_sum, "summary_statistics_all_games.csv")
+    statistics.summary().to_csv(summary_filename, index=False)
+    print("Summary of Calculations for all events saved here: "
+          f"{summary_filename}")
+    return summary_filename
+
+
+def compute_difference_all_files(details_dirs: list[str],
+                                 output_dir_sum: str,
+                                 output_dir_box: str,
+                                 state_files: Optional[list[str]] = None,
+                                 save_state: Optional[str] = None,
+                                 reservoir_size: int = 10000,
+                                 max_workers: int = 8
+                                 ) -> DifferenceStatistics:
+    """
+    Computes the summary statistics and the boxplot of the differences of
+    all games.
+
+    Args:
+        details_dirs: Directories containing the Details CSV files
+        output_dir_sum: Directory to save the summary statistics CSV file
+        output_dir_box: Directory to save the boxplot image file
+        state_files: Saved statistics, e.g. of other seasons, that are
+        merged into the result
+        save_state: Path to save the merged statistics to
+        reservoir_size: Maximum number of sampled values per event type
+        max_workers: Number of threads used for reading
+
+    Returns:
+        DifferenceStatistics: The merged statistics
+    """
+    statistics = collect_statistics(details_dirs, reservoir_size,
+                                    max_workers)
+    for state_file in state_files or []:
+        statistics.merge(DifferenceStatistics.load(state_file))
+
+    if save_state:
+        statistics.save(save_state)
+    save_boxplot(statistics, output_dir_box)
+    save_summary(statistics, output_dir_sum)
+    return statistics
+
+
+if __name__ == "__main__":
+    # Input directories and output directories
+    DETAILS_DIR = (
+        r"D:\Handball\HBL_Events\season_20_21\EventDifference\Details")
+    OUTPUT_DIR_SUM = (
+        r"D:\Handball\HBL_Events\season_20_21\EventDifference\Summary")
+    OUTPUT_DIR_BOX = (
+        r"D:\Handball\HBL_Events\season_20_21\EventDifference\Boxplot")
+
+    parser = argparse.ArgumentParser(
+        description='Summarize the event differences of all games.')
+    parser.add_argument('--details-dir', action='append', default=None,
+                        help='Directory containing the Details CSV files, '
+                             'can be repeated to combine seasons')
+    parser.add_argument('--output-dir-sum', default=OUTPUT_DIR_SUM,
+                        help='Directory to save the summary CSV file')
+    parser.add_argument('--output-dir-box', default=OUTPUT_DIR_BOX,
+                        help='Directory to save the boxplot')
+    parser.add_argument('--merge-state', action='append', default=None,
+                        help='Saved statistics to merge, can be repeated')
+    parser.add_argument('--save-state', default=None,
+                        help='Path to save the merged statistics to')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='Number of threads used for reading')
+    args = parser.parse_args()
+
+    enable_headless_mode()
+    compute_difference_all_files(args.details_dir or [DETAILS_DIR],
+                                 args.output_dir_sum, args.output_dir_box,
+                                 args.merge_state, args.save_state,
+                                 max_workers=args.workers)
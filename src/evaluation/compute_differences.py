@@ -1,51 +1,51 @@
-import json
-import os
-from typing import Any
+"""
+This module compares the event timestamps of the reformatted timeline
+JSONL files with the annotated JSONL files and generates statistical
+summaries and visualizations for every match of a season.
 
-import matplotlib.pyplot as plt
-import pandas as pd
+The matches are taken from the mapping CSV file (catalog) of the season.
+For each match the reformatted file sport_events_{match_id}_timeline_
+reformatted.jsonl is paired with the newest annotation file ending in the
+name of the match video. The pairs are processed in a process pool and
+the events are joined on (annotator, event_type).
 
-"""
-This script compares event timestamps from two JSONL files and generates
-statistical summaries and visualizations.
-Functions:
-    load_jsonl_as_dict(filename):
-        Loads a JSONL file and returns a dictionary of events keyed by
-        (annotator, event_type).
-Variables:
-    old_jsonl_dir (str): Directory containing the old JSONL files.
-    new_jsonl_dir (str): Directory containing the new JSONL files.
-    output_dir (str): Directory to save the output files.
-    old_file (str): Path to the old JSONL file.
-    new_file (str): Path to the new JSONL file.
-    old_data (dict): Dictionary of events from the old JSONL file.
-    new_data (dict): Dictionary of events from the new JSONL file.
-    changes_list (list): List of dictionaries containing differences in event
-    timestamps.
-    df_changes (DataFrame): DataFrame containing the changes in event
-    timestamps.
-    df_filtered (DataFrame): Filtered DataFrame excluding specific event
-    types.
-    boxplot_filename (str): Path to save the boxplot image.
-    csv_filename (str): Path to save the detailed differences CSV file.
-    summary_stats (DataFrame): DataFrame containing summary statistics
-    for each
-    event type.
-    overall_mean (float): Overall mean difference in timestamps.
-    overall_std (float): Overall standard deviation of differences in
-    timestamps.
-    overall_stats (DataFrame): DataFrame containing overall summary
-    statistics.
-    final_summary_stats (DataFrame): DataFrame containing both event
-    type-specific
-    and overall summary statistics.
-    summary_csv_filename (str): Path to save the summary statistics
-    CSV file.
-Outputs:
+Outputs per match:
     - Boxplot image showing differences in event timestamps by event type.
     - CSV file with detailed differences in event timestamps.
     - CSV file with summary statistics of differences in event timestamps.
+
+Author:
+    @Annabelle Runge
+
+Date:
+    2025-05-16
 """
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional
+
+import pandas as pd
+
+from help_functions.headless import enable_headless_mode
+
+# Event types that are not shown in the boxplot
+excluded_events_boxplot = [
+    "match_started",
+    "period_start",
+    "substitution",
+    "suspension_over",
+    "period_score",
+    "break_start",
+    "match_ended",
+]
+
+# Event types that are not part of the summary statistics
+excluded_events_summary = ["substitution", "suspension_over"]
+
+KEY_COLUMNS = ["annotator", "event_type"]
+DETAIL_COLUMNS = KEY_COLUMNS + ["old_t_start", "new_t_start", "difference"]
 
 
 def load_jsonl_as_dict(filename: str) -> dict[Any, Any]:
@@ -95,138 +95,323 @@ def load_jsonl_as_dict(filename: str) -> dict[Any, Any]:
     return data_dict
 
 
-# Directories containing the old and new JSONL files
-old_jsonl_dir = r"D:\Handball\HBL_Events\season_20_21\EventJson"
-new_jsonl_dir = r"D:\Handball\HBL_Synchronization\Annotationen"
-output_dir_sum = r"D:\Handball\HBL_Events\season_20_21\EventDifference\Summary"
-output_dir_det = r"D:\Handball\HBL_Events\season_20_21\EventDifference\Details"
-output_dir_box = r"D:\Handball\HBL_Events\season_20_21\EventDifference\Boxplot"
-
-# Paths to the old and new JSONL files
-old_file = os.path.join(
-    old_jsonl_dir, "sport_events_23400321_timeline_reformatted.jsonl"
-)
-new_file = os.path.join(
-    new_jsonl_dir,
-    "241027-091504_2020-10-15_754549_rhein-neckar_loewen-sc_dhfk_leipzig-"
-    "720p-3000kbps.jsonl"
-)
-
-# Load the events from the old and new JSONL files
-old_data = load_jsonl_as_dict(old_file)
-new_data = load_jsonl_as_dict(new_file)
-
-# Compare the timestamps of events in the old and new JSONL files
-changes_list = []
-for event_key in old_data.keys():
-    if event_key in new_data:
-        old_t_start = old_data[event_key].get("t_start")
-        new_t_start = new_data[event_key].get("t_start")
-
-        # Only consider events with integer t_start values
-        if isinstance(old_t_start, int) and isinstance(new_t_start, int):
-            # Calculate the difference in timestamps
-            diff = new_t_start - old_t_start
-            event_type = old_data[event_key]["labels"]["type"]
-            changes_list.append(
-                {
-                    "annotator": event_key[0],
-                    "event_type": event_type,
-                    "old_t_start": old_t_start,
-                    "new_t_start": new_t_start,
-                    "difference": diff,
-                }
-            )
-        else:
-            print(f"Warning: Not integer t_start values for key {event_key}")
-
-# Create a DataFrame from the list of changes
-df_changes = pd.DataFrame(changes_list)
-
-# Filter out specific event types
-excluded_events_boxplot = [
-    "match_started",
-    "period_start",
-    "substitution",
-    "suspension_over",
-    "period_score",
-    "break_start",
-    "match_ended",
-]
-df_filtered_boxplot = df_changes[
-    ~df_changes["event_type"].isin(excluded_events_boxplot)
-]
+def load_jsonl_as_frame(filename: str) -> pd.DataFrame:
+    """
+    Loads the events of a JSONL file into a DataFrame with one row per
+    (annotator, event_type).
 
-# Create a boxplot of the differences in timestamps by event type
-plt.figure(figsize=(12, 6))
-boxplot_data = [
-    df_filtered_boxplot[df_filtered_boxplot["event_type"] == et]["difference"]
-    for et in df_filtered_boxplot["event_type"].unique()
-]
-plt.boxplot(boxplot_data,
-            tick_labels=df_filtered_boxplot["event_type"].unique(),
-            showmeans=True)
-plt.xlabel("Event Type")
-plt.ylabel("Difference in t_start (new - old)")
-plt.title("Boxplot of Differences in t_start by Event Type")
-plt.xticks(rotation=45)
-plt.grid(True)
-plt.tight_layout()
-
-# Save the boxplot image
-match_id = os.path.basename(old_file).split("_")[2]
-boxplot_filename = os.path.join(
-    output_dir_box, f"boxplot_differences_match_{match_id}.png"
-)
-plt.savefig(boxplot_filename)
-plt.close()
-
-# Save adjustments in a CSV-File
-csv_filename = os.path.join(
-    output_dir_det, f"differences_details_match_{match_id}.csv")
-df_changes.to_csv(csv_filename, index=False)
-
-print(f"Boxplot saved here: {boxplot_filename}")
-print(f"Calculations saved here: {csv_filename}")
-
-# Calculation of summary_statistics just without "substitution" and
-# "suspension_over"
-excluded_events_summary = ["substitution", "suspension_over"]
-df_filtered_summary = df_changes[
-    ~df_changes["event_type"].isin(excluded_events_summary)
-]
+    As in load_jsonl_as_dict, events without 'annotator', 't_start' or
+    'type' are skipped and the last event of a key wins, while the keys
+    keep the order of their first occurrence.
 
-# Calculate mean and standard deviation for event-types
-summary_stats = (
-    df_filtered_summary.groupby("event_type")["difference"]
-    .agg(["mean", "std"])
-    .reset_index()
-)
+    Args:
+        filename (str): The path to the JSONL file to be loaded.
 
-# Naming of columns
-summary_stats.columns = ["event_type", "average_difference", "std_deviation"]
+    Returns:
+        DataFrame: Columns 'annotator', 'event_type', 't_start' and
+        't_start_is_int'
+    """
+    with open(filename, "r", encoding="utf-8") as f:
+        events = [json.loads(line) for line in f if line.strip()]
 
-# Calculate overall mean and standard deviation
-overall_mean = df_filtered_summary["difference"].mean()
-overall_std = df_filtered_summary["difference"].std()
+    df = pd.DataFrame({
+        "annotator": [event.get("annotator") for event in events],
+        "event_type": [event["labels"].get("type") for event in events],
+        "t_start": pd.Series([event.get("t_start") for event in events],
+                             dtype=object),
+    })
+    valid = (df["annotator"].astype(bool) & df["t_start"].notna() &
+             df["event_type"].astype(bool))
+    if not valid.all():
+        print(f"Warning: {int((~valid).sum())} events without 'annotator', "
+              f"'t_start' or 'type' found in file {filename}.")
 
-# Overall statistics into a new DataFrame
-overall_stats = pd.DataFrame(
-    {
+    df = df[valid].groupby(KEY_COLUMNS, sort=False, as_index=False).last()
+    # bool is a subclass of int but no valid timestamp
+    df["t_start_is_int"] = df["t_start"].map(
+        lambda value: isinstance(value, int) and not isinstance(value, bool))
+    return df
+
+
+def compute_event_differences(old_df: pd.DataFrame, new_df: pd.DataFrame,
+                              match_id: Any = None) -> pd.DataFrame:
+    """
+    Joins the events of the old and the new file on (annotator,
+    event_type) and calculates the differences of their timestamps.
+    Only events with integer t_start values in both files are kept.
+
+    Args:
+        old_df: Events of the reformatted timeline file
+        new_df: Events of the annotated file
+        match_id: ID of the match, used in the warning message
+
+    Returns:
+        DataFrame: Columns 'annotator', 'event_type', 'old_t_start',
+        'new_t_start' and 'difference'
+    """
+    joined = old_df.merge(new_df, on=KEY_COLUMNS, how="inner",
+                          suffixes=("_old", "_new"))
+    is_int = joined["t_start_is_int_old"] & joined["t_start_is_int_new"]
+    if not is_int.all():
+        print(f"Warning: {int((~is_int).sum())} events with not integer "
+              f"t_start values in match {match_id}")
+
+    joined = joined[is_int]
+    changes = pd.DataFrame({
+        "annotator": joined["annotator"],
+        "event_type": joined["event_type"],
+        "old_t_start": joined["t_start_old"].astype("int64"),
+        "new_t_start": joined["t_start_new"].astype("int64"),
+    }, columns=DETAIL_COLUMNS[:-1])
+    changes["difference"] = changes["new_t_start"] - changes["old_t_start"]
+    return changes.reset_index(drop=True)
+
+
+def summarize_differences(df_changes: pd.DataFrame) -> pd.DataFrame:
+    """
+    Calculates the mean and standard deviation of the differences per
+    event type and overall, without "substitution" and "suspension_over".
+
+    Args:
+        df_changes: The differences of one match
+
+    Returns:
+        DataFrame: Columns 'event_type', 'average_difference' and
+        'std_deviation'
+    """
+    df_filtered_summary = df_changes[
+        ~df_changes["event_type"].isin(excluded_events_summary)
+    ]
+    summary_stats = (
+        df_filtered_summary.groupby("event_type")["difference"]
+        .agg(["mean", "std"])
+        .reset_index()
+    )
+    summary_stats.columns = ["event_type", "average_difference",
+                             "std_deviation"]
+    overall_stats = pd.DataFrame({
         "event_type": ["overall"],
-        "average_difference": [overall_mean],
-        "std_deviation": [overall_std],
-    }
-)
+        "average_difference": [df_filtered_summary["difference"].mean()],
+        "std_deviation": [df_filtered_summary["difference"].std()],
+    })
+    return pd.concat([summary_stats, overall_stats], ignore_index=True)
+
+
+def save_boxplot(df_changes: pd.DataFrame, boxplot_filename: str) -> None:
+    """
+    Creates a boxplot of the differences in timestamps by event type.
+
+    Args:
+        df_changes: The differences of one match
+        boxplot_filename: Path to save the boxplot image
+    """
+    from matplotlib import pyplot as plt
+
+    df_filtered_boxplot = df_changes[
+        ~df_changes["event_type"].isin(excluded_events_boxplot)
+    ]
+    groups = df_filtered_boxplot.groupby("event_type", sort=False)[
+        "difference"]
+
+    plt.figure(figsize=(12, 6))
+    plt.boxplot([values.to_numpy() for _, values in groups],
+                tick_labels=list(groups.groups), showmeans=True)
+    plt.xlabel("Event Type")
+    plt.ylabel("Difference in t_start (new - old)")
+    plt.title("Boxplot of Differences in t_start by Event Type")
+    plt.xticks(rotation=45)
+    plt.grid(True)
+    plt.tight_layout()
+    plt.savefig(boxplot_filename)
+    plt.close()
+
+
+def load_catalog(csv_file: str) -> pd.DataFrame:
+    """
+    Loads the mapping CSV file of a season.
+
+    Args:
+        csv_file: Path to the mapping CSV file
+
+    Returns:
+        DataFrame: The catalog indexed by match_id
+    """
+    df = pd.read_csv(csv_file, delimiter=";")
+    return df.set_index(df["match_id"].astype(int))
+
+
+def index_annotations(new_jsonl_dir: str) -> dict[str, str]:
+    """
+    Indexes the annotation files by the name of the match video. The
+    annotation files are named {timestamp}_{video_name}.jsonl; if a video
+    was annotated several times, the newest file is used.
+
+    Args:
+        new_jsonl_dir: Directory containing the annotation files
+
+    Returns:
+        dict: Maps the video name without extension to the annotation file
+    """
+    annotations = {}
+    for file in sorted(os.listdir(new_jsonl_dir)):
+        stem, extension = os.path.splitext(file)
+        if extension == ".jsonl" and "_" in stem:
+            annotations[stem.split("_", 1)[1]] = os.path.join(
+                new_jsonl_dir, file)
+    return annotations
+
+
+def resolve_match_files(match_ids: list[int], catalog: pd.DataFrame,
+                        old_jsonl_dir: str, new_jsonl_dir: str
+                        ) -> list[tuple[int, str, str]]:
+    """
+    Finds the reformatted and the annotated JSONL file of each match.
+
+    Args:
+        match_ids: IDs of the matches
+        catalog: The mapping CSV file indexed by match_id
+        old_jsonl_dir: Directory containing the reformatted JSONL files
+        new_jsonl_dir: Directory containing the annotation files
+
+    Returns:
+        list: (match_id, old_file, new_file) of all matches whose files
+        were found
+    """
+    annotations = index_annotations(new_jsonl_dir)
+    pairs = []
+    for match_id in match_ids:
+        old_file = os.path.join(
+            old_jsonl_dir,
+            f"sport_events_{match_id}_timeline_reformatted.jsonl")
+        if int(match_id) not in catalog.index:
+            print(f"Match {match_id} not found in the catalog")
+            continue
+        video = os.path.splitext(
+            str(catalog.loc[int(match_id), "raw_video"]))[0]
+        new_file = annotations.get(video)
+        if new_file is None or not os.path.exists(old_file):
+            print(f"JSONL files of match {match_id} not found")
+            continue
+        pairs.append((int(match_id), old_file, new_file))
+    return pairs
+
+
+def process_match(match_id: int, old_file: str, new_file: str,
+                  output_dir_det: str, output_dir_sum: str,
+                  output_dir_box: str) -> Optional[int]:
+    """
+    Computes and saves the differences, the summary and the boxplot of
+    one match.
+
+    Args:
+        match_id: ID of the match
+        old_file: Path to the reformatted JSONL file
+        new_file: Path to the annotated JSONL file
+        output_dir_det: Directory to save the detailed differences
+        output_dir_sum: Directory to save the summary statistics
+        output_dir_box: Directory to save the boxplot
+
+    Returns:
+        int: Number of compared events, or None if the match failed
+    """
+    try:
+        df_changes = compute_event_differences(
+            load_jsonl_as_frame(old_file), load_jsonl_as_frame(new_file),
+            match_id)
+
+        df_changes.to_csv(os.path.join(
+            output_dir_det, f"differences_details_match_{match_id}.csv"),
+            index=False)
+        summarize_differences(df_changes).to_csv(os.path.join(
+            output_dir_sum, f"summary_statistics_match_{match_id}.csv"),
+            index=False)
+        save_boxplot(df_changes, os.path.join(
+            output_dir_box, f"boxplot_differences_match_{match_id}.png"))
+    except Exception as e:
+        print(f"Error processing match {match_id}: {e}")
+        return None
+    return len(df_changes)
+
+
+def compute_differences(match_ids: Optional[list[int]], csv_file: str,
+                        old_jsonl_dir: str, new_jsonl_dir: str,
+                        output_dir_det: str, output_dir_sum: str,
+                        output_dir_box: str,
+                        max_workers: Optional[int] = None
+                        ) -> dict[int, Optional[int]]:
+    """
+    Computes the timestamp differences of several matches in a process
+    pool.
+
+    Args:
+        match_ids: IDs of the matches, all matches of the catalog if None
+        csv_file: Path to the mapping CSV file of the season
+        old_jsonl_dir: Directory containing the reformatted JSONL files
+        new_jsonl_dir: Directory containing the annotation files
+        output_dir_det: Directory to save the detailed differences
+        output_dir_sum: Directory to save the summary statistics
+        output_dir_box: Directory to save the boxplots
+        max_workers: Number of processes, the number of CPUs if None
+
+    Returns:
+        dict: Number of compared events per match, None if it failed
+    """
+    catalog = load_catalog(csv_file)
+    if match_ids is None:
+        match_ids = catalog.index.tolist()
+    pairs = resolve_match_files(match_ids, catalog, old_jsonl_dir,
+                                new_jsonl_dir)
+    for output_dir in (output_dir_det, output_dir_sum, output_dir_box):
+        os.makedirs(output_dir, exist_ok=True)
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            match_id: executor.submit(process_match, match_id, old_file,
+                                      new_file, output_dir_det,
+                                      output_dir_sum, output_dir_box)
+            for match_id, old_file, new_file in pairs
+        }
+        for match_id, future in futures.items():
+            results[match_id] = future.result()
+
+    processed = sum(count is not None for count in results.values())
+    print(f"Differences saved for {processed} of {len(match_ids)} matches "
+          f"in {output_dir_det}")
+    return results
+
 
-# Combine overall statistics with event type statistics
-final_summary_stats = pd.concat(
-    [summary_stats, overall_stats], ignore_index=True)
+if __name__ == "__main__":
+    # Directories containing the old and new JSONL files
+    CSV_FILE = r"D:\Handball\HBL_Synchronization\mapping20_21.csv"
+    OLD_JSONL_DIR = r"D:\Handball\HBL_Events\season_20_21\EventJson"
+    NEW_JSONL_DIR = r"D:\Handball\HBL_Synchronization\Annotationen"
+    OUTPUT_DIR = r"D:\Handball\HBL_Events\season_20_21\EventDifference"
 
-# Save the summary statistics to a CSV file
-summary_csv_filename = os.path.join(
-    output_dir_sum, f"summary_statistics_match_{match_id}.csv"
-)
-final_summary_stats.to_csv(summary_csv_filename, index=False)
+    parser = argparse.ArgumentParser(
+        description='Compare the event timestamps of the reformatted and '
+                    'the annotated JSONL files.')
+    parser.add_argument('--match-id', type=int, action='append',
+                        default=None,
+                        help='ID of a match, can be repeated; all matches '
+                             'of the catalog if omitted')
+    parser.add_argument('--catalog', default=CSV_FILE,
+                        help='Mapping CSV file of the season')
+    parser.add_argument('--old-dir', default=OLD_JSONL_DIR,
+                        help='Directory containing the reformatted files')
+    parser.add_argument('--new-dir', default=NEW_JSONL_DIR,
+                        help='Directory containing the annotation files')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR,
+                        help='Directory for the Details, Summary and '
+                             'Boxplot folders')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of processes')
+    args = parser.parse_args()
 
-print(f"Summary saved here: {summary_csv_filename}")
+    enable_headless_mode()
+    compute_differences(args.match_id, args.catalog, args.old_dir,
+                        args.new_dir,
+                        os.path.join(args.output_dir, "Details"),
+                        os.path.join(args.output_dir, "Summary"),
+                        os.path.join(args.output_dir, "Boxplot"),
+                        args.workers)
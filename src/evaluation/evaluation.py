@@ -24,17 +24,19 @@ date: 01.04.2025
 import csv
 import json
 import os
-from collections import defaultdict
 from typing import Any
 
 import pandas as pd
 
+from evaluation import accuracy_accumulator, accuracy_engine
+
 
 def generate_paths(number: int, name: str,
                    base_path: str = r"D:\Handball\HBL_Events",
                    season: str = "season_20_21",
                    ) -> tuple[str, str, str, str, str, str, str,
-                              str, str, str, str, str, str, str, str]:
+                              str, str, str, str, str, str, str, str,
+                              str, str, str]:
     """
     Generate file paths dynamically based on inputs.
 
@@ -74,19 +76,29 @@ def generate_paths(number: int, name: str,
         datengrundlage, r"cost_based_cor", f"{number}_cost_based_cor_fl.csv")
     csv_cost_rb_path = os.path.join(
         datengrundlage, r"cost_based_rb", f"{number}_cost_based_rb_fl.csv")
+    csv_cost_dp_path = os.path.join(
+        datengrundlage, r"cost_based_dp", f"{number}_cost_based_dp_fl.csv")
     output_path = os.path.join(
         datengrundlage, r"results", f"detailed_results_{number}.csv")
+    # Long-form results (match, event, approach, correct) of the game
+    long_results_path = os.path.join(
+        datengrundlage, r"results", f"long_results_{number}.csv")
     # Directory containing the CSV files
 
     directory_results = os.path.join(datengrundlage, r"results")
     # Save results to CSV
     output_file_all = os.path.join(datengrundlage,
                                    r"results_summary.csv")
+    # Running totals of the accuracies of all evaluated games
+    accumulator_path = os.path.join(datengrundlage,
+                                    r"results_accumulator.csv")
 
     return (excel_path, name_new_game_path, event_path, csv_bl_path,
             csv_rb_path, csv_none_path, csv_pos_path, csv_pos_rb_path,
             csv_pos_cor_path, csv_cost_path, csv_cost_cor_path,
-            csv_cost_rb_path, output_path, directory_results, output_file_all)
+            csv_cost_rb_path, csv_cost_dp_path, output_path,
+            directory_results, output_file_all, accumulator_path,
+            long_results_path)
 
 
 def calculate_if_correct(phase_true: int, phase_predicted: int,
@@ -162,84 +174,47 @@ def process_csv_file(df: pd.DataFrame, csv_df: pd.DataFrame,
     return df
 
 
-def calculate_model_accuracy(df: pd.DataFrame,
-                             correct_column: str) -> float:
-    """
-    Calculate the accuracy for a specific model based on its
-    correct column.
-
-    Args:
-        df: DataFrame containing the data
-        correct_column: Name of the column containing correctness
-        information
-
-    Returns:
-        float: Accuracy value
-    """
-    correct_count = (df[correct_column] == 1).sum()
-    total = df[correct_column].isin([0, 1]).sum()
-    return correct_count / total if total > 0 else 0
-
-
-def calculate_accuracy_for_event_type(df: Any, event_type_column: Any,
-                                      correct_column: Any) -> Any:
-    """
-    Calculate accuracy for each event type.
-
-    Args:
-        df: DataFrame containing the data
-        event_type_column: Column name for event types
-        correct_column: Column name for correctness values
-
-    Returns:
-        Series: Accuracy per event type
-    """
-    # Find the accuracy for each event type
-    accuracy_per_event = df.groupby(event_type_column).apply(
-        lambda group: (group[correct_column] ==
-                       1).sum() / group[correct_column].isin([0, 1]).sum()
-    )
-    return accuracy_per_event
-
-
-def calculate_accuracy_for_specific_events(df: pd.DataFrame,
-                                           correct_column: str
-                                           ) -> Any:
+def split_accuracy_table(table: pd.DataFrame
+                         ) -> tuple[list[tuple[str, str, float]],
+                                    dict[Any, Any], dict[str, float]]:
     """
-    Calculate accuracy specifically for predefined handball events.
+    Splits the accuracy table of the accuracy engine into the overall,
+    per-event-type and specific events accuracies written to the
+    detailed results.
 
     Args:
-        df: DataFrame containing the data
-        correct_column: Column name for correctness values
+        table: Accuracy table with the columns "approach", "event_type"
+        and "accuracy"
 
     Returns:
-        tuple: (overall accuracy for specified events, dict of accuracies
-        per event type)
+        tuple: (list of (approach, "all", accuracy), dict of event type
+        accuracies per approach, dict of specific events accuracy per
+        approach)
     """
-    # Define the specific events we want to analyze
-    specific_events = [
-        "score_change", "shot_saved", "shot_off_target", "shot_blocked",
-        "technical_rule_fault", "seven_m_awarded", "steal",
-        "technical_ball_fault"
-    ]
-
-    # Filter DataFrame for specific events
-    specific_events_df = df[df['eID'].isin(specific_events)]
-
-    # Calculate overall accuracy for specific events
-    correct_count = (specific_events_df[correct_column] == 1).sum()
-    # false_count = (specific_events_df[correct_column] == 0).sum()
-    total_count = specific_events_df[correct_column].isin([0, 1]).sum()
-    overall_accuracy = correct_count / total_count if total_count > 0 else 0
-
-    return overall_accuracy
+    overall = table[table["event_type"] == accuracy_engine.OVERALL]
+    specific = table[table["event_type"] ==
+                     accuracy_engine.TARGET_OVERALL]
+    per_type = table[~table["event_type"].isin(
+        [accuracy_engine.OVERALL, accuracy_engine.TARGET_OVERALL])]
+
+    accuracy_data = [(approach, accuracy_engine.OVERALL, accuracy)
+                     for approach, accuracy in zip(overall["approach"],
+                                                   overall["accuracy"])]
+    event_type_accuracies: dict[Any, Any] = {
+        approach: {} for approach in overall["approach"]}
+    for approach, event_type, accuracy in zip(per_type["approach"],
+                                              per_type["event_type"],
+                                              per_type["accuracy"]):
+        event_type_accuracies[approach][event_type] = accuracy
+    specific_events_accuracies = dict(zip(specific["approach"],
+                                          specific["accuracy"]))
+    return accuracy_data, event_type_accuracies, specific_events_accuracies
 
 
 def write_results_to_csv(output_path: str,
                          accuracy_data: list[tuple[str, str, float]],
                          event_type_accuracies: dict[Any, Any],
-                         specific_events_accuracies:
-                             dict[str, tuple[float, dict[str, float]]]
+                         specific_events_accuracies: dict[str, float]
                          ) -> None:
     """
     Write accuracy results to a CSV file.
@@ -284,73 +259,57 @@ def write_results_to_csv(output_path: str,
 
 
 def calculate_all_accuracies(directory: str,
-                             output_file: str) -> None:
+                             output_file: str,
+                             accumulator_file: str = "") -> None:
     """
     Calculate the average overall and event-type accuracies for
     each approach across all CSV files.
 
+    This rescans every detailed results file and is only needed to
+    recompute the summary from scratch. After each game the running
+    accumulator is updated instead (see update_accuracy_summary).
+
     :param directory: Path to the directory containing CSV files.
     :param output_file: Path to the output summary file.
-    :return: Two dictionaries: overall accuracies and event-type
-    accuracies.
+    :param accumulator_file: Optional path where the rebuilt accumulator
+    is saved.
     """
-    # Create directory if it doesn't exist
-    os.makedirs(os.path.dirname(output_file), exist_ok=True)
-
-    # Nested dict: {Approach: {Event Type: [accuracies]}}
-    type_accuracies: dict[Any, Any] = defaultdict(lambda: defaultdict(list))
-    # Iterate through all CSV files in the directory
-    for file_name in os.listdir(directory):
-        if (file_name.endswith(".csv") and
-                file_name.startswith("detailed_results_")):
-            file_path = os.path.join(directory, file_name)
-            try:
-                # Read the CSV file
-                df = pd.read_csv(file_path)
-
-                # Extract event-type accuracies
-                if 'Event Type' in df.columns and 'Accuracy' in df.columns:
-                    for _, row in df.iterrows():
-                        approach = row['Approach']
-                        event_type = row['Event Type']
-                        # Convert accuracy string to float
-                        try:
-                            accuracy = float(row['Accuracy'])
-                            type_accuracies[approach][event_type].append(
-                                accuracy)
-                        except ValueError:
-                            print(
-                                f"Warning: Could not convert accuracy value "
-                                f"'{row['Accuracy']}' to float")
-                            continue
-            except Exception as e:
-                print(f"Error processing file {file_path}: {e}")
-
-    # Calculate the average event-type accuracy for each approach
-    avg_type_accuracies = {
-        approach: {
-            event_type: sum(acc_list) / len(acc_list) if acc_list else 0
-            for event_type, acc_list in event_types.items()
-        }
-        for approach, event_types in type_accuracies.items()
-    }
-    # Prepare data for CSV
-    rows: list[Any] = []
-
-    # Add event-type accuracies
-    rows.append([])  # Empty row for spacing
-    rows.append(["Event-Type Accuracies"])
-    rows.append(["Approach", "Event Type", "Average Accuracy"])
-    for approach, event_types in avg_type_accuracies.items():
-        for event_type, accuracy in event_types.items():
-            rows.append([approach, event_type, f"{accuracy:.4f}"])
-
-    # Write data to CSV
-    with open(output_file, 'w', newline='', encoding='utf-8') as csv_file:
-        writer = csv.writer(csv_file)
-        writer.writerows(rows)
-
-    print(f"Summary results saved to {output_file}")
+    accumulator = accuracy_accumulator.rebuild_accumulator(directory)
+    if accumulator_file:
+        accuracy_accumulator.save_accumulator(accumulator, accumulator_file)
+    accuracy_accumulator.write_summary(accumulator, output_file)
+
+
+def update_accuracy_summary(output_path: str,
+                            accumulator_file: str,
+                            output_file: str,
+                            previous_rows: Any = None) -> None:
+    """
+    Adds the detailed results of one game to the running accumulator and
+    renders the season summary from it. If there is no accumulator yet,
+    it is seeded with the other detailed results files of the directory,
+    so games evaluated before the accumulator existed are kept.
+
+    Args:
+        output_path: Path to the detailed results CSV file of the game
+        accumulator_file: Path to the accumulator CSV file
+        output_file: Path to the output summary file
+        previous_rows: Accuracy rows of an earlier evaluation of the
+        same game, which are replaced by the new results
+    """
+    if os.path.exists(accumulator_file):
+        accumulator = accuracy_accumulator.load_accumulator(accumulator_file)
+    else:
+        # The earlier results of this game are not part of the seed
+        accumulator = accuracy_accumulator.rebuild_accumulator(
+            os.path.dirname(output_path),
+            exclude=[os.path.basename(output_path)])
+        previous_rows = None
+    game_rows = accuracy_accumulator.read_detailed_results(output_path)
+    accumulator = accuracy_accumulator.update_accumulator(
+        accumulator, game_rows, previous_rows)
+    accuracy_accumulator.save_accumulator(accumulator, accumulator_file)
+    accuracy_accumulator.write_summary(accumulator, output_file)
 
 
 def initialize_dataframe_columns(df: pd.DataFrame) -> pd.DataFrame:
@@ -373,7 +332,8 @@ def initialize_dataframe_columns(df: pd.DataFrame) -> pd.DataFrame:
         "Phase_pos_cor-based", "Phase_pos_cor_time", "pos_cor_correct",
         "Phase_cost-based", "cost_time", "cost_correct",
         "Phase_cost_based_rb-based", "cost_rb_time", "cost_rb_correct",
-        "Phase_cost_cor-based", "cost_cor_time", "cost_cor_correct"
+        "Phase_cost_cor-based", "cost_cor_time", "cost_cor_correct",
+        "Phase_cost_dp-based", "cost_dp_time", "cost_dp_correct"
     ]
 
     for column in columns_to_initialize:
@@ -389,8 +349,9 @@ def main(game_number: int, game_name: str) -> None:
     (excel_path, name_new_game_path, event_path, csv_bl_path,
      csv_rb_path, csv_none_path, csv_pos_path, csv_pos_rb_path,
      csv_pos_cor_path, csv_cost_path, csv_cost_cor_path,
-     csv_cost_rb_path, output_path, directory_results, output_file_all) = (
-         generate_paths(game_number, game_name))
+     csv_cost_rb_path, csv_cost_dp_path, output_path, _, output_file_all,
+     accumulator_path, long_results_path) = generate_paths(
+         game_number, game_name)
 
     # Read and prepare the main DataFrame
     df = pd.read_excel(excel_path)  # Lesen der Excel Datei (True Values)
@@ -433,6 +394,7 @@ def main(game_number: int, game_name: str) -> None:
     df_csv_cost = pd.read_csv(csv_cost_path)
     df_csv_cost_cor = pd.read_csv(csv_cost_cor_path)
     df_csv_cost_rb = pd.read_csv(csv_cost_rb_path)
+    df_csv_cost_dp = pd.read_csv(csv_cost_dp_path)
 
     # Map event IDs from the timeline to the DataFrame
     for event in events_inital:
@@ -475,105 +437,34 @@ def main(game_number: int, game_name: str) -> None:
                           "cost_cor_time", "cost_cor_correct")
     df = process_csv_file(df, df_csv_cost_rb, "Phase_cost_based_rb-based",
                           "cost_rb_time", "cost_rb_correct")
+    df = process_csv_file(df, df_csv_cost_dp, "Phase_cost_dp-based",
+                          "cost_dp_time", "cost_dp_correct")
 
     # Save the updated DataFrame
     os.makedirs(os.path.dirname(name_new_game_path), exist_ok=True)
     df.to_excel(name_new_game_path, index=False)
     print(f"Excel file updated and saved to {name_new_game_path}")
 
-    # Calculate model accuracies
-    baseline_accuracy = calculate_model_accuracy(df, 'bl_correct')
-    none_accuracy = calculate_model_accuracy(df, 'none_correct')
-    rulebased_accuracy = calculate_model_accuracy(df, 'rb_correct')
-    pos_accuracy = calculate_model_accuracy(df, 'pos_correct')
-    pos_rb_accuracy = calculate_model_accuracy(df, 'pos_rb_correct')
-    pos_cor_accuracy = calculate_model_accuracy(df, 'pos_cor_correct')
-    cost_accuracy = calculate_model_accuracy(df, 'cost_correct')
-    cost_rb_accuracy = calculate_model_accuracy(df, 'cost_rb_correct')
-    cost_cor_accuracy = calculate_model_accuracy(df, 'cost_cor_correct')
-
-    # Calculate per-event-type accuracies
-    baseline_accuracy_per_event = calculate_accuracy_for_event_type(
-        df, 'eID', 'bl_correct')
-    none_accuracy_per_event = calculate_accuracy_for_event_type(
-        df, 'eID', 'none_correct')
-    rulebased_accuracy_per_event = calculate_accuracy_for_event_type(
-        df, 'eID', 'rb_correct')
-    pos_accuracy_per_event = calculate_accuracy_for_event_type(
-        df, 'eID', 'pos_correct')
-    pos_rb_accuracy_per_event = calculate_accuracy_for_event_type(
-        df, 'eID', 'pos_rb_correct')
-    pos_cor_accuracy_per_event = calculate_accuracy_for_event_type(
-        df, 'eID', 'pos_cor_correct')
-    cost_accuracy_per_event = calculate_accuracy_for_event_type(
-        df, 'eID', 'cost_correct')
-    cost_rb_accuracy_per_event = calculate_accuracy_for_event_type(
-        df, 'eID', 'cost_rb_correct')
-    cost_cor_accuracy_per_event = calculate_accuracy_for_event_type(
-        df, 'eID', 'cost_cor_correct')
-
-    # Prepare accuracy data for CSV output
-    accuracy_data = [
-        ("None", "all", none_accuracy),
-        ("Baseline", "all", baseline_accuracy),
-        ("Rulebased", "all", rulebased_accuracy),
-        ("pos", "all", pos_accuracy),
-        ("pos_RB", "all", pos_rb_accuracy),
-        ("pos_COR", "all", pos_cor_accuracy),
-        ("Cost", "all", cost_accuracy),
-        ("Cost_RB", "all", cost_rb_accuracy),
-        ("Cost_COR", "all", cost_cor_accuracy)
-    ]
+    # Calculate the accuracies of all approaches in one pass
+    long_results = accuracy_engine.to_long_form(df, game_number)
+    accuracy_engine.save_long_results(long_results, long_results_path)
+    accuracy_data, event_type_accuracies, specific_events_accuracies = (
+        split_accuracy_table(accuracy_engine.accuracy_table(long_results)))
 
-    # Prepare event type accuracies for CSV output
-    event_type_accuracies = {
-        "None": none_accuracy_per_event.to_dict(),
-        "Baseline": baseline_accuracy_per_event.to_dict(),
-        "Rulebased": rulebased_accuracy_per_event.to_dict(),
-        "pos": pos_accuracy_per_event.to_dict(),
-        "pos_RB": pos_rb_accuracy_per_event.to_dict(),
-        "pos_COR": pos_cor_accuracy_per_event.to_dict(),
-        "Cost": cost_accuracy_per_event.to_dict(),
-        "Cost_RB": cost_rb_accuracy_per_event.to_dict(),
-        "Cost_COR": cost_cor_accuracy_per_event.to_dict()
-    }
-
-    # Calculate accuracies for specific events
-    specific_events_accuracies = {}
-    specific_events_accuracies["None"] = (
-        calculate_accuracy_for_specific_events(
-            df, 'none_correct'))
-    specific_events_accuracies["Baseline"] = (
-        calculate_accuracy_for_specific_events(
-            df, 'bl_correct'))
-    specific_events_accuracies["Rulebased"] = (
-        calculate_accuracy_for_specific_events(
-            df, 'rb_correct'))
-    specific_events_accuracies["pos"] = (
-        calculate_accuracy_for_specific_events(
-            df, 'pos_correct'))
-    specific_events_accuracies["pos_RB"] = (
-        calculate_accuracy_for_specific_events(
-            df, 'pos_rb_correct'))
-    specific_events_accuracies["pos_COR"] = (
-        calculate_accuracy_for_specific_events(
-            df, 'pos_cor_correct'))
-    specific_events_accuracies["Cost"] = (
-        calculate_accuracy_for_specific_events(
-            df, 'cost_correct'))
-    specific_events_accuracies["Cost_RB"] = (
-        calculate_accuracy_for_specific_events(
-            df, 'cost_rb_correct'))
-    specific_events_accuracies["Cost_COR"] = (
-        calculate_accuracy_for_specific_events(
-            df, 'cost_cor_correct'))
+    # Keep the results of an earlier run of this game so they can be
+    # replaced in the running accumulator
+    previous_rows = None
+    if os.path.exists(output_path):
+        previous_rows = accuracy_accumulator.read_detailed_results(
+            output_path)
 
     # Write detailed results to CSV with specific events accuracies
     write_results_to_csv(output_path, accuracy_data,
                          event_type_accuracies, specific_events_accuracies)
 
-    # Calculate and write summary results
-    calculate_all_accuracies(directory_results, output_file_all)
+    # Update the running totals and write summary results
+    update_accuracy_summary(output_path, accumulator_path, output_file_all,
+                            previous_rows)
 
     print(f"Evaluation completed for game {game_number}: {game_name}")
 
@@ -1,131 +1,158 @@
-import pandas as pd
-
 """
-This script processes event data from an Excel file and calculates
-various statistics for each event type.
+This script processes evaluated event data and calculates various
+statistics for each event type. The statistics are calculated with the
+accuracy engine, either for a single progressed Excel file or for the
+long-form results of a whole season, optionally with bootstrap
+confidence intervals.
 Author:
     @Annabelle Runge
 Date:
     2025-04-29
 """
+import argparse
+import os
+from typing import Any
+
+import pandas as pd
+
+from evaluation import accuracy_engine
 
 # List of event IDs we want to analyze
-target_events = [
-    'score_change',
-    'seven_m_awarded',
-    'shot_blocked',
-    'shot_off_target',
-    'shot_saved',
-    'steal',
-    'technical_ball_fault',
-    'technical_rule_fault'
-]
+target_events = accuracy_engine.TARGET_EVENTS
 
 # Columns we want to calculate means for
-algorithm_columns = [
-    'none_correct',
-    'bl_correct',
-    'rb_correct',
-    'pos_correct',
-    'pos_rb_correct',
-    'pos_cor_correct',
-    'cost_correct',
-    'cost_rb_correct',
-    'cost_cor_correct'
-]
-
-try:
-    # Read the Excel file with the full path
-    file_path = (
-        r"D:\Handball\HBL_Events\season_20_21\Datengrundlagen\progressed_excel"
-        r"\Bergischer HC_HSG Nordhorn-Lingen_11.10.2020_20-21_updated.csv.xlsx"
-    )
-    df = pd.read_excel(file_path)
-
-    # Initialize results dictionaries
-    results = {}
-    counts = {}
-    sums = {}
+algorithm_columns = list(accuracy_engine.APPROACH_COLUMNS.values())
+
+
+def calculate_event_statistics(long: pd.DataFrame
+                               ) -> tuple[pd.DataFrame, pd.DataFrame,
+                                          pd.DataFrame]:
+    """
+    Calculates the percentage of correct predictions, the number of
+    evaluated predictions and the number of correct predictions for each
+    target event and algorithm column.
+
+    Args:
+        long: Long-form results of one or more matches
+
+    Returns:
+        tuple: DataFrames with the percentages, the total counts and the
+        sum of ones, indexed by event type with one column per algorithm
+    """
+    table = accuracy_engine.accuracy_table(long)
+    table = table[table["event_type"].isin(target_events)]
+    table = table.assign(
+        column=table["approach"].map(accuracy_engine.APPROACH_COLUMNS),
+        percentage=table["accuracy"] * 100)
+
+    def to_wide(value: str) -> pd.DataFrame:
+        wide = table.pivot(index="event_type", columns="column",
+                           values=value)
+        events = [event for event in target_events if event in wide.index]
+        columns = [col for col in algorithm_columns if col in wide.columns]
+        return wide.reindex(index=events, columns=columns).rename_axis(
+            index=None, columns=None)
+
+    results_df = to_wide("percentage").fillna(0).round(2)
+    counts_df = to_wide("total").fillna(0).astype(int)
+    sums_df = to_wide("correct").fillna(0).astype(int)
 
-    # Calculate means for each event type
     for event in target_events:
-        # Filter rows for this event type
-        event_data = df[df['eID'] == event]
-
-        # Skip if no data found for this event
-        if len(event_data) == 0:
+        if event not in results_df.index:
             print(f"No data found for event: {event}")
-            continue
-
-        # Calculate means and store counts for each algorithm column
-        means = {}
-        event_counts = {}
-        event_sums = {}
-
-        for col in algorithm_columns:
-            if col in event_data.columns:
-                # Convert to numeric, ignoring errors
-                numeric_data = pd.to_numeric(event_data[col], errors='coerce')
-
-                # Calculate total count (excluding NaN)
-                total_count = numeric_data.count()
-                event_counts[col] = total_count
 
-                # Calculate sum of ones (correct predictions)
-                sum_ones = numeric_data.sum()
-                event_sums[col] = sum_ones
+    return results_df, counts_df, sums_df
 
-                # Calculate mean
-                mean_val = numeric_data.mean()
-                means[col] = mean_val * 100 if not pd.isna(mean_val) else 0
 
-        results[event] = means
-        counts[event] = event_counts
-        sums[event] = event_sums
+def print_event_statistics(results_df: pd.DataFrame,
+                           counts_df: pd.DataFrame,
+                           sums_df: pd.DataFrame) -> None:
+    """
+    Prints the event statistics as tables.
 
-    # Create DataFrames
-    results_df = pd.DataFrame.from_dict(results, orient='index')
-    counts_df = pd.DataFrame.from_dict(counts, orient='index')
-    sums_df = pd.DataFrame.from_dict(sums, orient='index')
+    Args:
+        results_df: Percentages per event type and algorithm column
+        counts_df: Total counts per event type and algorithm column
+        sums_df: Sum of ones per event type and algorithm column
+    """
+    def print_rows(df: pd.DataFrame, fmt: Any) -> None:
+        for event, row in df.iterrows():
+            values = [fmt(row.get(col, 0)) for col in algorithm_columns]
+            print(f"{event:<25} | " + " | ".join(f"{val:<12}"
+                                                 for val in values))
 
-    # Round percentage values
-    results_df = results_df.round(2)
-
-    # Save to Excel with multiple sheets
-    output_file = "event_type_analysis.xlsx"
-    with pd.ExcelWriter(output_file) as writer:
-        results_df.to_excel(writer, sheet_name='Percentages')
-        counts_df.to_excel(writer, sheet_name='Total Counts')
-        sums_df.to_excel(writer, sheet_name='Sum of Ones')
-
-    # Print results
     print("\nResults (percentages):")
     print("-" * 100)
     print(f"{'Event Type':<25} | " +
           " | ".join(f"{col:<12}" for col in algorithm_columns))
     print("-" * 100)
-
-    for event, means in results.items():
-        values = [f"{means.get(col, 0):.2f}%" for col in algorithm_columns]
-        print(f"{event:<25} | " + " | ".join(f"{val:<12}" for val in values))
+    print_rows(results_df, lambda value: f"{value:.2f}%")
 
     print("\nTotal Counts:")
     print("-" * 100)
-    for event, event_counts in counts.items():
-        counts_values = [str(event_counts.get(col, 0))
-                         for col in algorithm_columns]
-        print(f"{event:<25} | " +
-              " | ".join(f"{val:<12}" for val in counts_values))
+    print_rows(counts_df, str)
 
     print("\nSum of Ones (Correct Predictions):")
     print("-" * 100)
-    for event, event_sums in sums.items():
-        sums_values = [str(event_sums.get(col, 0))
-                       for col in algorithm_columns]
-        print(f"{event:<25} | " + " | ".join(f"{val:<12}"
-                                             for val in sums_values))
+    print_rows(sums_df, str)
+
+
+def process_events(long: pd.DataFrame, output_file: str,
+                   n_boot: int = 0) -> None:
+    """
+    Calculates the event statistics, saves them to an Excel file with
+    multiple sheets and prints them.
+
+    Args:
+        long: Long-form results of one or more matches
+        output_file: Path to the output Excel file
+        n_boot: Number of bootstrap samples for the confidence intervals,
+        no intervals are calculated if 0
+    """
+    results_df, counts_df, sums_df = calculate_event_statistics(long)
+
+    with pd.ExcelWriter(output_file) as writer:
+        results_df.to_excel(writer, sheet_name='Percentages')
+        counts_df.to_excel(writer, sheet_name='Total Counts')
+        sums_df.to_excel(writer, sheet_name='Sum of Ones')
+        if n_boot > 0:
+            intervals = accuracy_engine.bootstrap_confidence_intervals(
+                long, n_boot=n_boot)
+            intervals.to_excel(writer, sheet_name='Confidence Intervals',
+                               index=False)
 
+    print_event_statistics(results_df, counts_df, sums_df)
     print(f"\nResults have been saved to {output_file}")
 
-except Exception as e:
-    print(f"Error processing file: {str(e)}")
+
+if __name__ == "__main__":
+    DEFAULT_INPUT_FILE = (
+        r"D:\Handball\HBL_Events\season_20_21\Datengrundlagen\progressed_excel"
+        r"\Bergischer HC_HSG Nordhorn-Lingen_11.10.2020_20-21_updated.csv.xlsx"
+    )
+
+    parser = argparse.ArgumentParser(
+        description='Calculate accuracy statistics per event type.')
+    parser.add_argument('--input-file', default=DEFAULT_INPUT_FILE,
+                        help='Progressed Excel file of a single match')
+    parser.add_argument('--results-dir', default=None,
+                        help='Directory with the long_results_*.csv files '
+                             'of a season, used instead of --input-file')
+    parser.add_argument('--output-file', default="event_type_analysis.xlsx",
+                        help='Excel file the statistics are saved to')
+    parser.add_argument('--bootstrap', type=int, default=0,
+                        help='Number of bootstrap samples for confidence '
+                             'intervals over matches')
+    args = parser.parse_args()
+
+    try:
+        if args.results_dir:
+            long_results = accuracy_engine.load_long_results(
+                args.results_dir)
+        else:
+            long_results = accuracy_engine.to_long_form(
+                pd.read_excel(args.input_file),
+                os.path.basename(args.input_file))
+        process_events(long_results, args.output_file, args.bootstrap)
+    except Exception as e:
+        print(f"Error processing file: {str(e)}")
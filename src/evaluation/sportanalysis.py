@@ -9,6 +9,7 @@ Author:
 Date:
     2025-04-01
 """
+import logging
 import re
 import unicodedata
 from typing import Any, Union
@@ -17,8 +18,11 @@ import floodlight.io.kinexon as fliok
 import numpy as np
 import pandas as pd
 
+from help_functions.instrumentation import span
 from synchronization_approaches.pos_data_approach import get_pos_filepath
 
+logger = logging.getLogger(__name__)
+
 
 def next_phase(events: pd.DataFrame,
                sequences: list[tuple[int, int, int]]
@@ -145,11 +149,32 @@ def evaluation_of_players_on_field(match_id: int, events: pd.DataFrame,
     Returns:
         None
     """
-    filepath_data = get_pos_filepath(match_id)
-    pos_data = fliok.read_position_data_csv(filepath_data)
-    pid_dict, _, _, _ = fliok.get_meta_data(
-        filepath_data)
+    with span("load_positions") as counts:
+        filepath_data = get_pos_filepath(match_id)
+        pos_data = fliok.read_position_data_csv(filepath_data)
+        pid_dict, counts["frames"], _, _ = fliok.get_meta_data(
+            filepath_data)
+    with span("count_players", events=len(events)):
+        return count_players_on_field(events, sequences, pos_data, pid_dict)
+
+
+def count_players_on_field(events: pd.DataFrame,
+                           sequences: list[tuple[int, int, int]],
+                           pos_data: Any, pid_dict: dict[str, Any]
+                           ) -> pd.DataFrame:
+    """
+    Counts the players of both teams on the field for every event on
+    already loaded position data.
+
+    Args:
+        events (pd.DataFrame): The events of the match.
+        sequences (list): The (start, end, phase) sequences.
+        pos_data (list): The XY objects of all groups.
+        pid_dict (dict): The meta data of the position file.
 
+    Returns:
+        pd.DataFrame: The events with the home and away team counts
+    """
     xids = fliok.create_links_from_meta_data(pid_dict, identifier="name")
     team_order = calculate_team_order(events)
 
@@ -249,7 +274,8 @@ def get_players_count(sequence: pd.DataFrame,
             frames_less_than_7_players += 1
 
         if player_count_frame > 7:
-            print(f"Player count frame {frame} is {player_count_frame}")
+            logger.debug("Player count frame %s is %s", frame,
+                         player_count_frame)
         player_count_frame = 0
 
     # Calculate the mean number of players
@@ -260,7 +286,7 @@ def get_players_count(sequence: pd.DataFrame,
         players_count = 0
 
     if players_count > 7:
-        print(f"Average player count is {players_count}")
+        logger.debug("Average player count is %s", players_count)
     if frames_less_than_7_players > 40:
         players_count = 7.0
 
@@ -203,9 +203,9 @@ gk_ids_b = teamsheet_b.loc[teamsheet_b["role"] == "G", "xID"]
 
 # set goal keepers to nan
 for xID in gk_ids_a:
-    xy1.xy[:, 2 * xID: 2 * xID + 2] = np.NaN
+    xy1.xy[:, 2 * xID: 2 * xID + 2] = np.nan
 for xID in gk_ids_b:
-    xy2.xy[:, 2 * xID: 2 * xID + 2] = np.NaN
+    xy2.xy[:, 2 * xID: 2 * xID + 2] = np.nan
 
 xy_objects = {"a": xy1, "b": xy2}
 
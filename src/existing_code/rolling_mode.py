@@ -1,6 +1,5 @@
 import numpy as np
 from numpy.lib.stride_tricks import sliding_window_view
-from scipy.stats import mode
 
 
 def _mode(signal: np.array) -> np.array:
@@ -9,6 +8,8 @@ def _mode(signal: np.array) -> np.array:
     calculated for each row
     returns: modes of each row (window), results in shape (signal length x 1)
     """
+    from scipy.stats import mode
+
     return mode(signal, axis=1)[0]
 
 
@@ -1,6 +1,4 @@
 import numpy as np
-from scipy.optimize import linear_sum_assignment
-from scipy.spatial.distance import cdist
 
 
 def scale_coords_from_zero_to_one(coords, aspect_x=1, aspect_y=0.5):
@@ -42,6 +40,8 @@ def template_matching(coords, templates):
     -------
     fsim: dict with keys: template names and value: respective fsim value
     """
+    from scipy.optimize import linear_sum_assignment
+    from scipy.spatial.distance import cdist
 
     # normalize templates from 0 to 1
     for key in templates.keys():
@@ -66,7 +66,7 @@ def template_matching(coords, templates):
     coords_nonan = np.delete(coords, nan_cols, 1)
     average_position = np.delete(average_position, nan_cols, 0)
     solved_pos = np.full(
-        (coords_nonan.shape[0], int(coords_nonan.shape[1] / 2), 2), np.NaN
+        (coords_nonan.shape[0], int(coords_nonan.shape[1] / 2), 2), np.nan
     )
 
     # loop through frames and assign role for each frame
@@ -84,7 +84,7 @@ def template_matching(coords, templates):
         # solve linear sum assignment
         row, col = linear_sum_assignment(cost_matrix)
         # sort coordinates into solved roles
-        solved_frame = np.full((int(coords_nonan.shape[1] / 2), 2), np.NaN)
+        solved_frame = np.full((int(coords_nonan.shape[1] / 2), 2), np.nan)
         solved_frame[row] = frame.reshape((-1, 2))[col]
         solved_pos[i] = solved_frame
 
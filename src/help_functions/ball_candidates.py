@@ -0,0 +1,312 @@
+"""
+This module builds the per-match index of ball event candidates.
+
+Passes, shots and turnovers leave traces in the ball data: a peak of the
+ball acceleration, a change of the flight direction or a change of the
+player nearest to the ball. find_candidates() detects these frames with
+vectorized peak detection over the whole match and stores them sorted,
+with a flag per indicator and the ball acceleration as strength. The
+index is saved next to the position store of the match
+(help_functions.position_store).
+
+Approaches look up the candidates in the window of an event with
+searchsorted instead of scanning every frame:
+
+    candidates = context.ball_candidates
+    frames = candidates.window_frames(starts, ends)
+
+The cost approach snaps every event to the candidate with the lowest
+cost in its window when sync_events_cost gets the index
+(synchronize_approach(..., candidates=True), or the --candidates switch
+of the benchmark suite).
+
+Author:
+    @Annabelle Runge
+
+Date:
+    2025-05-25
+"""
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CANDIDATES_FILE = "ball_candidates.npz"
+
+# Flags of the indicators of a candidate
+ACCELERATION_PEAK = 1
+DIRECTION_CHANGE = 2
+POSSESSION_CHANGE = 4
+
+
+@dataclass
+class CandidateIndex:
+    """
+    The sorted candidate frames of ball events of a match.
+
+    Attributes:
+        frames (np.ndarray): int64 candidate frames, sorted.
+        kinds (np.ndarray): uint8 flags of the indicators of every
+        candidate.
+        strength (np.ndarray): float32 ball acceleration at the candidate,
+        0 if unknown.
+    """
+
+    frames: np.ndarray
+    kinds: np.ndarray
+    strength: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def select(self, kinds: int) -> "CandidateIndex":
+        """
+        Returns the candidates with at least one of the given indicators.
+
+        Args:
+            kinds: The flags of the indicators, e.g.
+            ACCELERATION_PEAK | POSSESSION_CHANGE
+
+        Returns:
+            CandidateIndex: The selected candidates
+        """
+        selected = (self.kinds & kinds) != 0
+        return CandidateIndex(self.frames[selected], self.kinds[selected],
+                              self.strength[selected])
+
+    def bounds(self, starts: Any, ends: Any) -> tuple[np.ndarray,
+                                                      np.ndarray]:
+        """
+        Returns the positions of the candidates in time windows.
+
+        Args:
+            starts: The first frames of the windows
+            ends: The frames after the last frames of the windows
+
+        Returns:
+            tuple: The first position and the position after the last
+            candidate of every window
+        """
+        return (np.searchsorted(self.frames, starts, side="left"),
+                np.searchsorted(self.frames, ends, side="left"))
+
+    def window_positions(self, starts: Any, ends: Any
+                         ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the positions of the candidates of many time windows as
+        a matrix.
+
+        Args:
+            starts: [N] first frames of the windows
+            ends: [N] frames after the last frames of the windows
+
+        Returns:
+            tuple: [N, K] positions in the index and [N, K] mask of the
+            positions inside the windows, K is the largest number of
+            candidates in a window
+        """
+        lo, hi = self.bounds(starts, ends)
+        counts = np.maximum(hi - lo, 0)
+        width = max(int(counts.max(initial=0)), 1)
+        inside = np.arange(width) < counts[:, None]
+        positions = np.where(inside, lo[:, None] + np.arange(width), 0)
+        return positions, inside
+
+    def window_frames(self, starts: Any, ends: Any) -> np.ndarray:
+        """
+        Returns the candidate frames of many time windows as a matrix.
+
+        Args:
+            starts: [N] first frames of the windows
+            ends: [N] frames after the last frames of the windows
+
+        Returns:
+            np.ndarray: [N, K] candidate frames per window, padded with -1
+        """
+        positions, inside = self.window_positions(starts, ends)
+        if len(self) == 0:
+            return np.full(positions.shape, -1, dtype=np.int64)
+        return np.where(inside, self.frames[positions], -1)
+
+    def save(self, file_path: str,
+             source: Optional[dict[str, Any]] = None) -> None:
+        """
+        Saves the index as compressed npz file.
+
+        Args:
+            file_path: The path of the npz file
+            source: The fingerprint of the position file
+        """
+        np.savez_compressed(file_path, frames=self.frames, kinds=self.kinds,
+                            strength=self.strength,
+                            source=np.array(json.dumps(source)))
+
+    @classmethod
+    def load(cls, file_path: str,
+             source: Optional[dict[str, Any]] = None
+             ) -> Optional["CandidateIndex"]:
+        """
+        Loads a saved index if it belongs to the position file.
+
+        Args:
+            file_path: The path of the npz file
+            source: The fingerprint of the position file, not checked if
+            None
+
+        Returns:
+            CandidateIndex: The index, None if it has to be built
+        """
+        if not os.path.exists(file_path):
+            return None
+        with np.load(file_path) as data:
+            if (source is not None
+                    and json.loads(str(data["source"])) != source):
+                return None
+            return cls(data["frames"], data["kinds"], data["strength"])
+
+
+def acceleration_peaks(ball_acceleration: np.ndarray,
+                       min_acceleration: float = 25.0) -> np.ndarray:
+    """
+    Finds the local maxima of the ball acceleration.
+
+    Args:
+        ball_acceleration: The acceleration of the ball
+        min_acceleration: The minimum acceleration of a peak, where the
+        acceleration cost of the cost approach is halved
+
+    Returns:
+        np.ndarray: The frames of the peaks
+    """
+    a = np.asarray(ball_acceleration, dtype=float)
+    if len(a) < 3:
+        return np.zeros(0, dtype=np.int64)
+    peak = ((a[1:-1] > a[:-2]) & (a[1:-1] >= a[2:])
+            & (a[1:-1] >= min_acceleration))
+    return np.flatnonzero(peak) + 1
+
+
+def direction_changes(ball_positions: np.ndarray, framerate: int,
+                      stride: int = 3, min_angle: float = 45.0,
+                      min_speed: float = 2.0) -> np.ndarray:
+    """
+    Finds the frames where the ball changes its direction, comparing the
+    movement over `stride` frames before and after every frame.
+
+    Args:
+        ball_positions: The combined ball positions
+        framerate: The framerate of the position data
+        stride: Number of frames of the movement before and after
+        min_angle: The minimum change of the direction in degrees
+        min_speed: The minimum speed before and after in m/s
+
+    Returns:
+        np.ndarray: The frames of the direction changes
+    """
+    positions = np.asarray(ball_positions, dtype=float)
+    if len(positions) <= 2 * stride:
+        return np.zeros(0, dtype=np.int64)
+    incoming = positions[stride:-stride] - positions[:-2 * stride]
+    outgoing = positions[2 * stride:] - positions[stride:-stride]
+    speed_in = np.hypot(*incoming.T)
+    speed_out = np.hypot(*outgoing.T)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cosine = (incoming * outgoing).sum(axis=1) / (speed_in * speed_out)
+    min_distance = min_speed * stride / framerate
+    change = ((cosine < np.cos(np.radians(min_angle)))
+              & (speed_in >= min_distance) & (speed_out >= min_distance))
+    # Keep the first frame of consecutive changes
+    change[1:] &= ~change[:-1]
+    return np.flatnonzero(change) + stride
+
+
+def possession_changes(possession: Any, radius: float = 1.0) -> np.ndarray:
+    """
+    Finds the frames where another player gets close to the ball than
+    the previous owner.
+
+    Args:
+        possession: The possession timeline of the match
+        radius: The maximum distance of an owner to the ball in meters
+
+    Returns:
+        np.ndarray: The first frames of the new owners
+    """
+    owned = np.flatnonzero(possession.known()
+                           & (possession.distance < radius))
+    owner = (possession.team[owned].astype(np.int32) * 1000
+             + possession.player[owned])
+    return owned[1:][owner[1:] != owner[:-1]]
+
+
+def find_candidates(ball_positions: np.ndarray,
+                    ball_acceleration: np.ndarray, framerate: int,
+                    possession: Optional[Any] = None,
+                    min_acceleration: float = 25.0) -> CandidateIndex:
+    """
+    Builds the candidate index of a match from all indicators.
+
+    Args:
+        ball_positions: The combined ball positions
+        ball_acceleration: The acceleration of the ball
+        framerate: The framerate of the position data
+        possession: The possession timeline, no possession changes if
+        None
+        min_acceleration: The minimum acceleration of a peak
+
+    Returns:
+        CandidateIndex: The sorted candidates
+    """
+    indicators = [
+        (acceleration_peaks(ball_acceleration, min_acceleration),
+         ACCELERATION_PEAK),
+        (direction_changes(ball_positions, framerate), DIRECTION_CHANGE)]
+    if possession is not None:
+        indicators.append((possession_changes(possession),
+                           POSSESSION_CHANGE))
+    all_frames = np.concatenate([frames for frames, _ in indicators])
+    all_kinds = np.concatenate([np.full(len(frames), kind, dtype=np.uint8)
+                                for frames, kind in indicators])
+    frames, inverse = np.unique(all_frames, return_inverse=True)
+    kinds = np.zeros(len(frames), dtype=np.uint8)
+    np.bitwise_or.at(kinds, inverse, all_kinds)
+    acceleration = np.asarray(ball_acceleration, dtype=float)
+    strength = np.zeros(len(frames), dtype=np.float32)
+    inside = frames < len(acceleration)
+    strength[inside] = np.nan_to_num(acceleration[frames[inside]])
+    return CandidateIndex(frames.astype(np.int64), kinds, strength)
+
+
+def load_or_find_candidates(context: Any) -> CandidateIndex:
+    """
+    Returns the candidate index of a match. With a position cache the
+    index is saved next to the position store and loaded on the next
+    run.
+
+    Args:
+        context: The match context
+
+    Returns:
+        CandidateIndex: The candidate index of the match
+    """
+    if context.position_cache is None:
+        return find_candidates(context.ball_positions,
+                               context.ball_acceleration, context.framerate,
+                               context.possession)
+    store = context.position_store
+    file_path = os.path.join(store.path, CANDIDATES_FILE)
+    source = store.index.get("source")
+    candidates = CandidateIndex.load(file_path, source)
+    if candidates is None:
+        candidates = find_candidates(
+            context.ball_positions, context.ball_acceleration,
+            context.framerate, context.possession)
+        candidates.save(file_path, source)
+        logger.info("Saved %s ball event candidates %s", len(candidates),
+                    file_path)
+    return candidates
@@ -0,0 +1,388 @@
+"""
+This module runs the synchronization approaches, the players-on-field
+count and the template matching of one match in parallel worker
+processes.
+
+The position data of the match is loaded once and published in shared
+memory with help_functions.shared_positions. Every worker attaches to
+it once per match and works on read-only views, so the memory per
+worker stays flat and more workers fit on a node. Only the results
+(the synchronized events, the counted events and the formations) are
+sent back to the main process.
+
+The season loop run_season() loads the inputs of the next matches in the
+background with help_functions.prefetcher while a match is computed.
+
+Usage:
+    python -m help_functions.batch_runner 23400263 23400265 \
+        --data-dir D:/Handball
+
+Author:
+    @Annabelle Runge
+
+Date:
+    2025-05-24
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Iterator, Optional
+
+import variables.data_variables as dv
+from help_functions.match_context import MatchContext
+from help_functions.prefetcher import MatchPrefetcher
+from help_functions.shared_positions import (SharedMatch, attach_context,
+                                             publish_context)
+
+logger = logging.getLogger(__name__)
+
+# The context of the shared match a worker process is attached to
+_WORKER_CONTEXT: Optional[MatchContext] = None
+_WORKER_BLOCKS: list[Any] = []
+
+
+def _worker_context(shared: SharedMatch) -> MatchContext:
+    """
+    Returns the context of a shared match in a worker process. A worker
+    attaches only once per match and detaches from the previous match.
+
+    Args:
+        shared: The handle of the shared match
+
+    Returns:
+        MatchContext: The context with read-only views of the positions
+    """
+    global _WORKER_CONTEXT
+    if (_WORKER_CONTEXT is None
+            or _WORKER_CONTEXT.__dict__.get("_shared_key") != shared.key):
+        _WORKER_CONTEXT = None
+        for block in _WORKER_BLOCKS:
+            try:
+                block.close()
+            except BufferError:
+                # A view of the previous match is still referenced, the
+                # mapping is released when the view is collected
+                pass
+        _WORKER_BLOCKS.clear()
+        _WORKER_CONTEXT = attach_context(shared, _WORKER_BLOCKS)
+        _WORKER_CONTEXT.__dict__["_shared_key"] = shared.key
+    return _WORKER_CONTEXT
+
+
+def _synchronize(shared: SharedMatch, approach: dv.Approach) -> Any:
+    """
+    Runs one approach on the shared match.
+
+    Args:
+        shared: The handle of the shared match
+        approach: The approach
+
+    Returns:
+        pd.DataFrame: The synchronized events
+    """
+    from main_structure import synchronize_approach
+
+    context = _worker_context(shared)
+    events, _ = synchronize_approach(approach, context.events,
+                                     list(context.sequences),
+                                     context.match_id, context)
+    return events
+
+
+def _count_players(shared: SharedMatch, events: Any) -> Any:
+    """
+    Counts the players on the field for the events on the shared match.
+
+    Args:
+        shared: The handle of the shared match
+        events: The synchronized events
+
+    Returns:
+        pd.DataFrame: The events with the home and away team counts
+    """
+    from evaluation.sportanalysis import count_players_on_field
+
+    context = _worker_context(shared)
+    return count_players_on_field(events, context.sequences,
+                                  context.pos_data, context.pid_dict)
+
+
+def _match_formations(shared: SharedMatch) -> Any:
+    """
+    Runs the template matching on the shared match.
+
+    Args:
+        shared: The handle of the shared match
+
+    Returns:
+        list: The formations of the attacking phases
+    """
+    from preprocessing.template_matching.template_start import match_formations
+
+    context = _worker_context(shared)
+    return match_formations(context.pos_data, context.pid_dict,
+                            context.sequences, context.lookup,
+                            context.summary, context.roster,
+                            context.template_path, context.match,
+                            kinematics=context.phase_kinematics)
+
+
+def create_executor(max_workers: Optional[int] = None
+                    ) -> ProcessPoolExecutor:
+    """
+    Creates a process pool for shared matches. The workers are spawned
+    instead of forked, so that the pool can be used while loading
+    threads are running, and can be reused for all matches of a season.
+
+    Args:
+        max_workers: The number of processes, the number of CPUs if None
+
+    Returns:
+        ProcessPoolExecutor: The process pool
+    """
+    return ProcessPoolExecutor(max_workers=max_workers,
+                               mp_context=multiprocessing.get_context(
+                                   "spawn"))
+
+
+class SharedMatchPool:
+    """
+    A process pool whose workers share the position data of one match.
+
+        with SharedMatchPool(context, max_workers=4) as pool:
+            results = pool.synchronize(list(dv.Approach))
+
+    Attributes:
+        context (MatchContext): The match context.
+        max_workers (int): The number of processes, the number of CPUs if
+        None.
+        executor (ProcessPoolExecutor): A process pool from
+        create_executor() that is reused and not shut down, a new pool is
+        created if None.
+    """
+
+    def __init__(self, context: MatchContext,
+                 max_workers: Optional[int] = None,
+                 executor: Optional[ProcessPoolExecutor] = None) -> None:
+        self.context = context
+        self.max_workers = max_workers
+        self.shared: Optional[SharedMatch] = None
+        self._executor = executor
+        self._owns_executor = executor is None
+
+    def __enter__(self) -> "SharedMatchPool":
+        self.shared = publish_context(self.context)
+        if self._owns_executor:
+            try:
+                self._executor = create_executor(self.max_workers)
+            except BaseException:
+                self.shared.close()
+                raise
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+        if self.shared is not None:
+            self.shared.close()
+
+    def submit_synchronize(self, approach: dv.Approach) -> Future:
+        """
+        Starts one approach in a worker.
+
+        Args:
+            approach: The approach
+
+        Returns:
+            Future: The future of the synchronized events
+        """
+        return self._executor.submit(_synchronize, self.shared, approach)
+
+    def submit_count_players(self, events: Any) -> Future:
+        """
+        Starts the players-on-field count for events in a worker.
+
+        Args:
+            events: The synchronized events
+
+        Returns:
+            Future: The future of the counted events
+        """
+        return self._executor.submit(_count_players, self.shared, events)
+
+    def submit_match_formations(self) -> Future:
+        """
+        Starts the template matching in a worker.
+
+        Returns:
+            Future: The future of the formations
+        """
+        return self._executor.submit(_match_formations, self.shared)
+
+    def synchronize(self, approaches: list[dv.Approach]
+                    ) -> dict[dv.Approach, Any]:
+        """
+        Runs several approaches in parallel.
+
+        Args:
+            approaches: The approaches
+
+        Returns:
+            dict: The synchronized events of every approach, or the
+            exception if the approach failed
+        """
+        futures = {approach: self.submit_synchronize(approach)
+                   for approach in approaches}
+        return {approach: future.exception() or future.result()
+                for approach, future in futures.items()}
+
+
+def run_match(context: MatchContext, approaches: list[dv.Approach],
+              max_workers: Optional[int] = None,
+              count_approach: Optional[dv.Approach] = dv.Approach.RULE_BASED,
+              formations: bool = True,
+              executor: Optional[ProcessPoolExecutor] = None
+              ) -> dict[str, Any]:
+    """
+    Runs the approaches, the players-on-field count and the template
+    matching of a match in parallel on shared position data.
+
+    Args:
+        context: The match context
+        approaches: The approaches
+        max_workers: The number of processes, the number of CPUs if None
+        count_approach: The approach whose events are counted, no count
+        if None
+        formations: Whether to run the template matching
+        executor: A process pool from create_executor() that is reused,
+        a new pool is created if None
+
+    Returns:
+        dict: "events" with the results of every approach, "counts" with
+        the counted events and "formations"; failed stages contain their
+        exception
+    """
+    with SharedMatchPool(context, max_workers, executor) as pool:
+        formation_future = (pool.submit_match_formations()
+                            if formations else None)
+        futures = {approach: pool.submit_synchronize(approach)
+                   for approach in approaches}
+        results: dict[str, Any] = {"events": {}}
+        for approach, future in futures.items():
+            results["events"][approach] = (future.exception()
+                                           or future.result())
+        events = results["events"].get(count_approach)
+        if count_approach is not None and not isinstance(events,
+                                                         BaseException):
+            if events is None:
+                events = context.events
+            future = pool.submit_count_players(events)
+            results["counts"] = future.exception() or future.result()
+        if formation_future is not None:
+            results["formations"] = (formation_future.exception()
+                                     or formation_future.result())
+    return results
+
+
+def run_season(match_ids: list[int], base_path: str,
+               approaches: list[dv.Approach],
+               max_workers: Optional[int] = None, lookahead: int = 2,
+               prefetch_workers: int = 2,
+               memory_budget_mb: Optional[float] = None,
+               season: dv.Season = dv.Season.SEASON_2020_2021,
+               context_options: Optional[dict[str, Any]] = None,
+               **match_options: Any) -> Iterator[tuple[int, Any]]:
+    """
+    Runs all matches of a season one after another with run_match on one
+    process pool. While a match is computed the inputs of the next
+    matches are loaded in the background by a MatchPrefetcher.
+
+    Args:
+        match_ids: The IDs of the matches
+        base_path: The data directory
+        approaches: The approaches
+        max_workers: The number of processes
+        lookahead: Number of matches that are loaded ahead
+        prefetch_workers: Number of loading threads
+        memory_budget_mb: Memory budget of the prefetched matches,
+        unlimited if None
+        season: The season of the matches
+        context_options: Further fields of the match contexts, e.g.
+        position_cache, template_path or search_windows_file
+        match_options: Further keyword arguments of run_match
+
+    Yields:
+        tuple: The match ID and the results of run_match, or the
+        exception if the match failed
+    """
+    with create_executor(max_workers) as executor, \
+            MatchPrefetcher(match_ids, base_path, season, lookahead,
+                            prefetch_workers, memory_budget_mb,
+                            context_options) as prefetcher:
+        for context in prefetcher:
+            try:
+                results = run_match(context, approaches,
+                                    executor=executor, **match_options)
+            except Exception as e:
+                logger.warning("Match %s failed: %s", context.match_id, e)
+                results = e
+            yield context.match_id, results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Run all approaches of the matches in parallel on '
+        'shared position data.')
+    parser.add_argument('match_ids', type=int, nargs='+',
+                        help='The IDs of the matches')
+    parser.add_argument('--data-dir', default=r"D:\Handball",
+                        help='Data directory with the layout of the '
+                        'handball data drive')
+    parser.add_argument('--approach', nargs='+',
+                        choices=[a.name for a in dv.Approach],
+                        help='Approaches to run, all if not given')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='Number of worker processes')
+    parser.add_argument('--lookahead', type=int, default=2,
+                        help='Number of matches that are loaded ahead')
+    parser.add_argument('--memory-budget', type=float,
+                        help='Memory budget of the prefetched matches in MB')
+    parser.add_argument('--position-cache',
+                        help='Directory of the memory-mapped position '
+                        'stores and the saved roster, positions are read '
+                        'from the CSV files if not given')
+    parser.add_argument('--search-windows',
+                        help='Calibrated search windows, search_windows.json '
+                        'in HBL_Synchronization if not given')
+    parser.add_argument('--templates',
+                        help='Formation template file, the default '
+                        'templates if not given')
+    args = parser.parse_args()
+
+    from help_functions.headless import enable_headless_mode
+    enable_headless_mode()
+
+    match_approaches = ([dv.Approach[name] for name in args.approach]
+                        if args.approach else list(dv.Approach))
+    for match_id, match_results in run_season(
+            args.match_ids, args.data_dir, match_approaches, args.workers,
+            args.lookahead, memory_budget_mb=args.memory_budget,
+            context_options={
+                name: value for name, value in (
+                    ("position_cache", args.position_cache),
+                    ("search_windows_file", args.search_windows),
+                    ("template_path", args.templates))
+                if value is not None}):
+        print(f"Match {match_id}")
+        if isinstance(match_results, BaseException):
+            print(f"  failed: {match_results}")
+            continue
+        for name, result in match_results["events"].items():
+            status = (f"failed: {result}"
+                      if isinstance(result, BaseException)
+                      else f"{len(result)} events")
+            print(f"  {name.name}: {status}")
+        if "formations" in match_results:
+            print(f"  Formations: {len(match_results['formations'])}")
@@ -0,0 +1,177 @@
+"""
+This module cuts the positions around many events at once into
+event-centric window tensors.
+
+The position-based approaches look at the player of an event and the
+ball in the frames before the event. Slicing these windows event by
+event and frame by frame in Python dominates their runtime. event_windows()
+gathers the windows of all N events of a match with fancy indexing into
+one [N, W, 2] player tensor and one [N, W, 2] ball tensor, together with
+the frame of every window position and a mask of the frames inside the
+match. Frames outside the match are padded with NaN, so distances, costs
+and the search for the possession frame become array expressions over
+all events.
+
+    windows = event_windows(frames, xids, groups, context.pos_data,
+                            context.ball_positions, before=500)
+    distances = windows.distances()
+
+The XY objects may be memory-mapped (help_functions.position_store), the
+fancy indexing then reads only the pages of the windows.
+
+Author:
+    @Annabelle Runge
+
+Date:
+    2025-05-25
+"""
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import numpy as np
+
+
+@dataclass
+class EventWindows:
+    """
+    The positions of the player and the ball around N events.
+
+    Attributes:
+        frames (np.ndarray): [N, W] frame of every window position.
+        player (np.ndarray): [N, W, 2] positions of the event player.
+        ball (np.ndarray): [N, W, 2] positions of the ball.
+        valid (np.ndarray): [N, W] whether the frame is inside the player
+        and the ball data.
+        acceleration (np.ndarray): [N, W] acceleration of the ball, None
+        if not requested.
+    """
+
+    frames: np.ndarray
+    player: np.ndarray
+    ball: np.ndarray
+    valid: np.ndarray
+    acceleration: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    @property
+    def width(self) -> int:
+        """The number of frames of every window."""
+        return self.frames.shape[1]
+
+    def complete(self) -> np.ndarray:
+        """
+        Returns the frames inside the match in which the player and the
+        ball positions are known.
+
+        Returns:
+            np.ndarray: [N, W] mask of the complete frames
+        """
+        return (self.valid & ~np.isnan(self.player).any(axis=-1)
+                & ~np.isnan(self.ball).any(axis=-1))
+
+    def distances(self) -> np.ndarray:
+        """
+        Returns the distance between the player and the ball.
+
+        Returns:
+            np.ndarray: [N, W] distances, NaN for incomplete frames
+        """
+        return np.linalg.norm(self.player - self.ball, axis=-1)
+
+
+def last_true(mask: np.ndarray) -> np.ndarray:
+    """
+    Returns the last window position per event at which a mask is set,
+    i.e. the first hit of a backwards search from the event.
+
+    Args:
+        mask: [N, W] mask
+
+    Returns:
+        np.ndarray: [N] window positions, -1 if the mask is not set
+    """
+    width = mask.shape[1]
+    position = width - 1 - np.argmax(mask[:, ::-1], axis=1)
+    return np.where(mask.any(axis=1), position, -1)
+
+
+def event_windows(frames: Any, players: Any, groups: Any,
+                  pos_data: list[Any], ball_positions: np.ndarray,
+                  before: int = 500, after: int = 0,
+                  ball_acceleration: Optional[np.ndarray] = None
+                  ) -> EventWindows:
+    """
+    Gathers the player and ball positions around many events. The window
+    of an event with frame t covers the frames t - before to
+    t + after - 1.
+
+    Args:
+        frames: [N] frames of the events
+        players: [N] xIDs of the event players in their groups
+        groups: [N] indices of the groups of the players in pos_data
+        pos_data: The XY objects of all groups
+        ball_positions: The combined ball positions
+        before: Number of frames before the event
+        after: Number of frames from the event on
+        ball_acceleration: The acceleration of the ball, gathered as well
+        if given
+
+    Returns:
+        EventWindows: The windows of all events
+    """
+    frames = np.asarray(frames, dtype=np.int64).reshape(-1)
+    return gather_frames(frames[:, None] + np.arange(-before, after),
+                         players, groups, pos_data, ball_positions,
+                         ball_acceleration)
+
+
+def gather_frames(index: np.ndarray, players: Any, groups: Any,
+                  pos_data: list[Any], ball_positions: np.ndarray,
+                  ball_acceleration: Optional[np.ndarray] = None
+                  ) -> EventWindows:
+    """
+    Gathers the player and ball positions at arbitrary frames per event,
+    e.g. at the candidate frames in the window of every event.
+
+    Args:
+        index: [N, W] frames per event, frames outside of the match (e.g.
+        -1 as padding) are masked
+        players: [N] xIDs of the event players in their groups
+        groups: [N] indices of the groups of the players in pos_data
+        pos_data: The XY objects of all groups
+        ball_positions: The combined ball positions
+        ball_acceleration: The acceleration of the ball, gathered as well
+        if given
+
+    Returns:
+        EventWindows: The positions at the frames of all events
+    """
+    index = np.asarray(index, dtype=np.int64)
+    players = np.asarray(players, dtype=np.int64).reshape(-1)
+    groups = np.asarray(groups, dtype=np.int64).reshape(-1)
+    n_events, width = index.shape
+
+    player = np.full((n_events, width, 2), np.nan)
+    valid = (index >= 0) & (index < len(ball_positions))
+    for group in np.unique(groups):
+        selected = groups == group
+        xy = pos_data[group].xy
+        inside = valid[selected] & (index[selected] < len(xy))
+        rows = np.clip(index[selected], 0, len(xy) - 1)
+        columns = 2 * players[selected][:, None] + np.arange(2)
+        gathered = xy[rows[:, :, None], columns[:, None, :]]
+        gathered[~inside] = np.nan
+        player[selected] = gathered
+        valid[selected] = inside
+
+    rows = np.clip(index, 0, len(ball_positions) - 1)
+    ball = np.asarray(ball_positions)[rows]
+    ball[~valid] = np.nan
+    acceleration = None
+    if ball_acceleration is not None:
+        acceleration = np.asarray(ball_acceleration, dtype=float)[
+            np.clip(index, 0, len(ball_acceleration) - 1)]
+        acceleration[~(valid & (index < len(ball_acceleration)))] = np.nan
+    return EventWindows(index, player, ball, valid, acceleration)
@@ -27,9 +27,8 @@ Date:
 import json
 from datetime import datetime as dt
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 
-import matplotlib
 import pandas as pd
 import pytz  # type: ignore
 from floodlight import Events
@@ -37,8 +36,7 @@ from floodlight.io.sportradar import read_event_data_json
 
 import preprocessing.reformatJson_methods as reformatjson_methods
 import variables.data_variables as dv
-
-matplotlib.use("TkAgg", force=True)
+from help_functions.search_windows import BASELINE_OFFSETS
 
 
 def create_event_objects(
@@ -276,6 +274,21 @@ def calculate_event_stream(match_id: int) -> tuple[Any, int, Any]:
     (
         _, path_timeline, _, positions_path, _, _, _, _
     ) = reformatjson_methods.get_paths_by_match_id(match_id)
+    return load_event_stream(path_timeline, positions_path)
+
+
+def load_event_stream(path_timeline: Any,
+                      positions_path: Any) -> tuple[Any, int, Any]:
+    """
+    Loads the event stream of a match from its timeline file and aligns
+    the events with the positional data.
+    Args:
+        path_timeline (str): The path to the Sportradar timeline file.
+        positions_path (str): The path to the Kinexon position file.
+    Returns:
+        tuple[Any, int, Any]: The event stream, the offset between the
+        event data and the positional data in frames and the events.
+    """
     (
         first_time_pos_str,
         first_time_pos_unix,
@@ -313,42 +326,25 @@ def calculate_event_stream(match_id: int) -> tuple[Any, int, Any]:
     return event_stream_all, offset, event_all.events
 
 
-def adjust_timestamp_baseline(events: Any) -> Any:
+def adjust_timestamp_baseline(events: Any,
+                              offsets: Optional[dict[str, int]] = None
+                              ) -> Any:
     """
     Adjusts the timestamp of the events to the baseline.
     Args:
         events: The event data
+        offsets: The mean offset of every event type in frames, the
+        constant means of help_functions.search_windows if None
     Returns:
         The event data with the adjusted timestamp
     """
-    event_adjustments = {
-        'break_start': -359,
-        'match_started': -258983,
-        'red_card': -260,
-        'score_change': -109,
-        'seven_m_awarded': -469,
-        'seven_m_missed': -74,
-        'shot_blocked': -142,
-        'shot_off_target': -237,
-        'shot_saved': -251,
-        'steal': -257,
-        'substitution ': -5,
-        'suspension': -386,
-        'suspension_over': -384,
-        'technical_ball_fault': -245,
-        'technical_rule_fault': -258,
-        'timeout': -284,
-        'timeout_over': -29,
-        'yellow_card': -268
-    }
+    if offsets is None:
+        offsets = BASELINE_OFFSETS
     for idx, event in enumerate(events.values):
+        # Get the event type and adjust timestamp based on mean value
         event_type = event[0]
-    # Dictionary mapping event types to their mean values (rounded)
-
-    # Get the event type and adjust timestamp based on mean value
-        event_type = event[0]
-        if event_type in event_adjustments:
-            mean_adjustment = event_adjustments[event_type]
+        if event_type in offsets:
+            mean_adjustment = offsets[event_type]
             events.iloc[idx, 24] = events.iloc[idx, 24] + mean_adjustment
     return events
 
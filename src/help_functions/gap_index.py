@@ -0,0 +1,277 @@
+"""
+This module indexes the gaps (runs of missing frames) of the position
+data of a match.
+
+The approaches extend their lookback before an event when the game was
+interrupted, i.e. when the player or the ball positions are missing in
+the window. Counting the missing frames frame by frame in Python is
+slow, and the check of the cost approach never detected a gap. A
+GapIndex stores the NaN runs of one series run-length encoded, with the
+number of missing frames before every run, and answers with binary
+searches:
+    - the number of missing or valid frames in [a, b),
+    - the first frame of a window that ends at b and contains k valid
+      frames (the lookback extended by the interruptions).
+
+MatchGaps holds the gap index of the ball, of every player and of every
+player combined with the ball (a frame is missing if either is missing)
+and is built once per match.
+
+    gaps = build_match_gaps(pos_data, pid_dict, ball_positions)
+    start, missing = search_start(gaps.combined(group, xid), t_event, 499)
+
+Author:
+    @Annabelle Runge
+
+Date:
+    2025-05-26
+"""
+from dataclasses import dataclass, field
+from typing import Any, Optional, Union
+
+import numpy as np
+
+
+class GapIndex:
+    """
+    The run-length encoded missing frames of one series.
+
+    Attributes:
+        starts (np.ndarray): The first frames of the gaps, sorted.
+        ends (np.ndarray): The frames after the last frames of the gaps.
+        n_frames (int): The number of frames of the series.
+        before (np.ndarray): The number of missing frames before every gap
+        and in total as last element.
+    """
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray,
+                 n_frames: int) -> None:
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        self.n_frames = int(n_frames)
+        self.before = np.concatenate(
+            [[0], np.cumsum(self.ends - self.starts)]).astype(np.int64)
+        # The valid runs between the gaps and the valid frames before them
+        self._run_starts = np.concatenate([[0], self.ends])
+        self._valid_before = self._run_starts - self.before
+
+    @classmethod
+    def from_mask(cls, missing: np.ndarray) -> "GapIndex":
+        """
+        Builds the index from a mask of the missing frames.
+
+        Args:
+            missing: [n] mask of the missing frames
+
+        Returns:
+            GapIndex: The index of the gaps
+        """
+        missing = np.asarray(missing, dtype=bool)
+        edges = np.diff(np.concatenate([[0], missing.astype(np.int8), [0]]))
+        return cls(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1),
+                   len(missing))
+
+    @classmethod
+    def from_positions(cls, *positions: np.ndarray) -> "GapIndex":
+        """
+        Builds the index of the frames in which any of the position
+        series is missing.
+
+        Args:
+            positions: [n, 2] position series, e.g. a player and the ball
+
+        Returns:
+            GapIndex: The index of the gaps
+        """
+        n_frames = min(len(xy) for xy in positions)
+        missing = np.zeros(n_frames, dtype=bool)
+        for xy in positions:
+            missing |= np.isnan(np.asarray(xy[:n_frames],
+                                           dtype=float)).any(axis=1)
+        return cls.from_mask(missing)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def missing_before(self, t: Union[int, np.ndarray]
+                       ) -> Union[int, np.ndarray]:
+        """
+        Counts the missing frames before a frame.
+
+        Args:
+            t: The frame or an array of frames
+
+        Returns:
+            int: The number of missing frames in [0, t)
+        """
+        t = np.clip(t, 0, self.n_frames)
+        if len(self) == 0:
+            return 0 if np.ndim(t) == 0 else np.zeros(np.shape(t), np.int64)
+        # All gaps that started before t, minus the part of the last of
+        # them after t
+        gap = np.searchsorted(self.starts, t, side="left")
+        last = np.maximum(gap - 1, 0)
+        count = self.before[gap] - np.where(
+            gap > 0, np.maximum(self.ends[last] - t, 0), 0)
+        return int(count) if np.ndim(count) == 0 else count
+
+    def missing_count(self, a: int, b: int) -> int:
+        """
+        Counts the missing frames in an interval.
+
+        Args:
+            a: The first frame
+            b: The frame after the last frame
+
+        Returns:
+            int: The number of missing frames in [a, b)
+        """
+        if b <= a:
+            return 0
+        return int(self.missing_before(b) - self.missing_before(a))
+
+    def valid_count(self, a: int, b: int) -> int:
+        """
+        Counts the valid frames in an interval, frames outside of the
+        series are not valid.
+
+        Args:
+            a: The first frame
+            b: The frame after the last frame
+
+        Returns:
+            int: The number of valid frames in [a, b)
+        """
+        a = min(max(a, 0), self.n_frames)
+        b = min(max(b, 0), self.n_frames)
+        if b <= a:
+            return 0
+        return (b - a) - self.missing_count(a, b)
+
+    def extend_back(self, end: int, k: int) -> int:
+        """
+        Returns the first frame of the window that ends at a frame and
+        contains k valid frames.
+
+        Args:
+            end: The frame after the last frame of the window
+            k: The number of valid frames
+
+        Returns:
+            int: The first frame, 0 if there are less than k valid frames
+            before end
+        """
+        end = min(max(end, 0), self.n_frames)
+        target = (end - self.missing_before(end)) - k
+        if target < 0:
+            return 0
+        run = int(np.searchsorted(self._valid_before, target,
+                                  side="right")) - 1
+        return int(self._run_starts[run] + target - self._valid_before[run])
+
+    def gaps_in(self, a: int, b: int) -> list[tuple[int, int]]:
+        """
+        Returns the gaps that overlap an interval.
+
+        Args:
+            a: The first frame
+            b: The frame after the last frame
+
+        Returns:
+            list: The (start, end) of the gaps, cut to the interval
+        """
+        first = int(np.searchsorted(self.ends, a, side="right"))
+        last = int(np.searchsorted(self.starts, b, side="left"))
+        return [(max(int(start), a), min(int(end), b)) for start, end
+                in zip(self.starts[first:last], self.ends[first:last])]
+
+
+def search_start(gaps: GapIndex, t_event: int, window: int,
+                 min_gap: int = 10) -> tuple[int, int]:
+    """
+    Returns the first frame of the lookback before an event. If more than
+    min_gap frames of the window are missing, the game was interrupted
+    and the window is extended until it contains `window` valid frames.
+
+    Args:
+        gaps: The gap index of the player and the ball
+        t_event: The frame of the event
+        window: The number of frames of the lookback
+        min_gap: The number of missing frames from which the window is
+        extended
+
+    Returns:
+        tuple: The first frame of the lookback and the number of missing
+        frames of the original window
+    """
+    start = t_event - window
+    missing = gaps.missing_count(max(start, 0), t_event)
+    if missing > min_gap:
+        return min(gaps.extend_back(t_event, window), max(start, 0)), missing
+    return start, missing
+
+
+@dataclass
+class MatchGaps:
+    """
+    The gap indices of the ball and of all players of a match.
+
+    Attributes:
+        ball (GapIndex): The gaps of the combined ball positions.
+        players (dict): The gaps of every (group, xID).
+        combined_players (dict): The frames in which the player or the
+        ball is missing, per (group, xID).
+    """
+
+    ball: GapIndex
+    players: dict[tuple[int, int], GapIndex] = field(default_factory=dict)
+    combined_players: dict[tuple[int, int], GapIndex] = field(
+        default_factory=dict)
+
+    def player(self, group: int, xid: int) -> GapIndex:
+        """The gaps of a player."""
+        return self.players[(int(group), int(xid))]
+
+    def combined(self, group: int, xid: int) -> GapIndex:
+        """The frames in which the player or the ball is missing."""
+        return self.combined_players[(int(group), int(xid))]
+
+
+def build_match_gaps(pos_data: list[Any],
+                     pid_dict: Optional[dict[str, Any]],
+                     ball_positions: np.ndarray,
+                     groups: Optional[Any] = None) -> MatchGaps:
+    """
+    Builds the gap indices of the ball and of all players of a match.
+
+    Args:
+        pos_data: The XY objects of all groups
+        pid_dict: The meta data of the position file, used to skip the
+        ball group
+        ball_positions: The combined ball positions
+        groups: The indices of the groups of the players in pos_data, all
+        groups but the ball if None
+
+    Returns:
+        MatchGaps: The gap indices
+    """
+    if groups is None:
+        from synchronization_approaches.pos_data_approach import \
+            find_key_position
+
+        ball_num = find_key_position(pid_dict, "Ball")
+        groups = [group for group in range(len(pos_data))
+                  if group != ball_num]
+    ball_missing = np.isnan(np.asarray(ball_positions,
+                                       dtype=float)).any(axis=1)
+    gaps = MatchGaps(GapIndex.from_mask(ball_missing))
+    for group in groups:
+        xy = np.asarray(pos_data[group].xy, dtype=float)
+        n_frames = min(len(xy), len(ball_missing))
+        missing = np.isnan(xy).reshape(len(xy), -1, 2).any(axis=2)
+        for xid in range(missing.shape[1]):
+            key = (int(group), xid)
+            gaps.players[key] = GapIndex.from_mask(missing[:, xid])
+            gaps.combined_players[key] = GapIndex.from_mask(
+                missing[:n_frames, xid] | ball_missing[:n_frames])
+    return gaps
@@ -0,0 +1,57 @@
+"""
+This module provides the headless mode of the analysis. No module of the
+project selects a matplotlib backend at import time; matplotlib picks its
+default backend, or the one given in the MPLBACKEND environment variable.
+In headless mode the non-interactive Agg backend is used and figures are
+closed instead of shown, so batch runs and worker processes neither need
+a display nor pay for initializing Tk.
+
+The headless mode is enabled with enable_headless_mode() or by setting
+the environment variable HANDBALL_HEADLESS=1, which is inherited by
+worker processes.
+
+Author:
+    @Annabelle Runge
+
+Date:
+    2025-05-19
+"""
+import os
+import sys
+
+HEADLESS_ENV = "HANDBALL_HEADLESS"
+
+
+def enable_headless_mode() -> None:
+    """
+    Enables the headless mode for this process and all processes started
+    from it.
+    """
+    os.environ[HEADLESS_ENV] = "1"
+    os.environ["MPLBACKEND"] = "Agg"
+    # Only switch if matplotlib was already imported, never import it here
+    if "matplotlib" in sys.modules:
+        sys.modules["matplotlib"].use("Agg")
+
+
+def is_headless() -> bool:
+    """
+    Checks whether the headless mode is enabled.
+
+    Returns:
+        bool: True if figures should not be shown
+    """
+    return os.environ.get(HEADLESS_ENV, "") not in ("", "0")
+
+
+def show_or_close() -> None:
+    """
+    Shows the current figures, or closes them in headless mode so that
+    batch runs do not accumulate open figures.
+    """
+    from matplotlib import pyplot as plt
+
+    if is_headless():
+        plt.close("all")
+    else:
+        plt.show()
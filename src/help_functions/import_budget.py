@@ -0,0 +1,102 @@
+"""
+This module checks the import time of the modules on the synchronization
+hot path. Every module is imported in a fresh interpreter, as a worker
+process would do, and the check fails if the import takes longer than
+its budget or loads a module that should only be imported lazily
+(tkinter, scipy and the floodlight models). matplotlib itself is always
+loaded because floodlight imports pyplot, but no backend is selected.
+
+Usage:
+    python -m help_functions.import_budget [--scale 1.5]
+
+The exit code is 1 if a budget is exceeded, so the check can be run
+before starting a batch run or in CI.
+
+Author:
+    @Annabelle Runge
+
+Date:
+    2025-05-19
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Import time budgets in seconds per hot path module
+IMPORT_BUDGETS = {
+    "variables.data_variables": 0.1,
+    "synchronization_approaches.rule_based": 1.0,
+    "synchronization_approaches.pos_data_approach": 1.5,
+    "synchronization_approaches.cost_function_approach_2": 1.5,
+    "help_functions.floodlight_code": 1.5,
+    "evaluation.sportanalysis": 1.5,
+    "main_structure": 2.0,
+}
+
+# Modules that must not be loaded by importing the hot path
+LAZY_MODULES = ["tkinter", "scipy", "floodlight.models"]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "loaded": [
+    name for name in {lazy!r} if name in sys.modules]}}))
+"""
+
+
+def measure_import(module: str) -> dict[str, object]:
+    """
+    Imports a module in a fresh interpreter and measures the import time.
+
+    Args:
+        module: The name of the module
+
+    Returns:
+        dict: The import time in seconds ("elapsed") and the lazy modules
+        that were loaded ("loaded")
+    """
+    src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=src_dir)
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module,
+                                             lazy=LAZY_MODULES)],
+        capture_output=True, text=True, cwd=src_dir, env=env, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def check_import_budgets(scale: float = 1.0) -> bool:
+    """
+    Checks the import time budgets of all hot path modules.
+
+    Args:
+        scale: Factor applied to all budgets, e.g. for slow machines
+
+    Returns:
+        bool: True if all modules are within their budget
+    """
+    ok = True
+    for module, budget in IMPORT_BUDGETS.items():
+        measured = measure_import(module)
+        elapsed = float(measured["elapsed"])  # type: ignore
+        loaded = measured["loaded"]
+        passed = elapsed <= budget * scale and not loaded
+        ok = ok and passed
+        print(f"{'OK  ' if passed else 'FAIL'} {module:<55} "
+              f"{elapsed:6.3f}s / {budget * scale:5.2f}s"
+              + (f"  eager imports: {', '.join(loaded)}"  # type: ignore
+                 if loaded else ""))
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Check the import time budgets of the hot path.')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='Factor applied to all budgets')
+    args = parser.parse_args()
+
+    sys.exit(0 if check_import_budgets(args.scale) else 1)
@@ -0,0 +1,318 @@
+"""
+This module provides the instrumentation of the analysis runs: leveled
+logging instead of prints and nested spans that measure every stage of
+a run.
+
+A span records the wall time, the CPU time, the peak of the traced
+memory (if tracemalloc is enabled for the run), the maximum resident set
+size of the process and the item counts of a stage, e.g. the number of
+events, frames and sequences. Spans are only recorded inside of a run
+report; without an active report they cost almost nothing, so the
+stages can always be wrapped.
+
+    with run_report("23400263_POS_DATA", json_path="run.json"):
+        main_structure.approach_plot(23400263, dv.Approach.POS_DATA)
+
+The reports of all runs of a season are aggregated per stage path with
+flame_summary() and can be written as folded stacks for flame graph
+tools (flamegraph.pl, speedscope).
+
+Usage:
+    python -m help_functions.instrumentation reports/ [--folded out.txt]
+
+Author:
+    @Annabelle Runge
+
+Date:
+    2025-05-23
+"""
+import argparse
+import contextlib
+import glob
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Iterator, Optional, Union
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore
+
+LOG_FORMAT = "%(levelname)s %(name)s: %(message)s"
+
+# The reports of the active runs, the innermost run records the spans
+_ACTIVE_RUNS: list["RunReport"] = []
+
+
+def configure_logging(level: Union[int, str] = logging.INFO,
+                      log_file: Optional[str] = None) -> None:
+    """
+    Configures the leveled logging that replaces the prints of the
+    analysis. DEBUG shows the per-event and per-frame messages of the
+    synchronization loops, INFO the per-match messages and WARNING only
+    problems with the data.
+
+    Args:
+        level: The log level, e.g. "DEBUG", "INFO" or "WARNING"
+        log_file: File for the log messages, stderr if None
+    """
+    handler: logging.Handler = (logging.FileHandler(log_file, encoding="utf-8")
+                                if log_file else logging.StreamHandler())
+    logging.basicConfig(level=level, format=LOG_FORMAT, handlers=[handler],
+                        force=True)
+
+
+def max_rss_mb() -> Optional[float]:
+    """
+    Returns the maximum resident set size of the process so far.
+
+    Returns:
+        float: The maximum RSS in MB, None if it is not available
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return rss / (1024 ** 2 if sys.platform == "darwin" else 1024)
+
+
+class RunReport:
+    """
+    The spans of one run, e.g. one approach of one match.
+
+    Attributes:
+        name (str): The name of the run.
+        trace_memory (bool): Whether the peak memory of the spans is
+        measured with tracemalloc, which slows down the run.
+        records (list): The finished spans.
+    """
+
+    def __init__(self, name: str, trace_memory: bool = False) -> None:
+        self.name = name
+        self.trace_memory = trace_memory
+        self.started = datetime.now().isoformat(timespec="seconds")
+        self.records: list[dict[str, Any]] = []
+        self._stack: list[dict[str, Any]] = []
+
+    @contextlib.contextmanager
+    def span(self, name: str, **counts: int) -> Iterator[dict[str, int]]:
+        """
+        Measures a stage of the run. Spans can be nested; the path of a
+        span contains the names of all enclosing spans.
+
+        Args:
+            name: The name of the stage
+            counts: Item counts of the stage
+
+        Yields:
+            dict: The item counts, which the stage can update
+        """
+        frame = {"counts": dict(counts), "peak": 0}
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1]["peak"] = max(self._stack[-1]["peak"], peak)
+            tracemalloc.reset_peak()
+            frame["start"] = frame["peak"] = current
+        path = "/".join([parent["name"] for parent in self._stack] + [name])
+        frame["name"] = name
+        self._stack.append(frame)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield frame["counts"]
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            self._stack.pop()
+            record = {"run": self.name, "path": path, "name": name,
+                      "depth": path.count("/"), "wall": wall, "cpu": cpu,
+                      "peak_memory_mb": None, "max_rss_mb": max_rss_mb(),
+                      **frame["counts"]}
+            if tracing:
+                frame["peak"] = max(frame["peak"],
+                                    tracemalloc.get_traced_memory()[1])
+                record["peak_memory_mb"] = ((frame["peak"] - frame["start"])
+                                            / 1024 ** 2)
+                if self._stack:
+                    self._stack[-1]["peak"] = max(self._stack[-1]["peak"],
+                                                  frame["peak"])
+            self.records.append(record)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Returns the finished spans.
+
+        Returns:
+            pd.DataFrame: One row per span, in the order they finished
+        """
+        return pd.DataFrame(self.records)
+
+    def save_json(self, file_path: str) -> None:
+        """
+        Saves the report as JSON file.
+
+        Args:
+            file_path: The path of the JSON file
+        """
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump({"run": self.name, "started": self.started,
+                       "spans": self.records}, f, indent=1)
+
+    def save_csv(self, file_path: str) -> None:
+        """
+        Saves the spans as CSV file.
+
+        Args:
+            file_path: The path of the CSV file
+        """
+        self.to_frame().to_csv(file_path, index=False)
+
+
+@contextlib.contextmanager
+def run_report(name: str, trace_memory: bool = False,
+               json_path: Optional[str] = None,
+               csv_path: Optional[str] = None) -> Iterator[RunReport]:
+    """
+    Records the spans of a run and saves the report at the end of the
+    run, also if the run fails.
+
+    Args:
+        name: The name of the run
+        trace_memory: Whether to measure the peak memory with tracemalloc
+        json_path: Path of the JSON report, not saved if None
+        csv_path: Path of the CSV report, not saved if None
+
+    Yields:
+        RunReport: The report of the run
+    """
+    report = RunReport(name, trace_memory)
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    _ACTIVE_RUNS.append(report)
+    try:
+        with report.span("run"):
+            yield report
+    finally:
+        _ACTIVE_RUNS.remove(report)
+        if started_tracing:
+            tracemalloc.stop()
+        if json_path is not None:
+            report.save_json(json_path)
+        if csv_path is not None:
+            report.save_csv(csv_path)
+
+
+@contextlib.contextmanager
+def span(name: str, **counts: int) -> Iterator[dict[str, int]]:
+    """
+    Measures a stage in the active run report. Without an active report
+    the stage is only run.
+
+    Args:
+        name: The name of the stage
+        counts: Item counts of the stage
+
+    Yields:
+        dict: The item counts, which the stage can update
+    """
+    if not _ACTIVE_RUNS:
+        yield dict(counts)
+        return
+    with _ACTIVE_RUNS[-1].span(name, **counts) as span_counts:
+        yield span_counts
+
+
+def load_reports(paths: list[str]) -> pd.DataFrame:
+    """
+    Loads the spans of several JSON run reports.
+
+    Args:
+        paths: The paths of the reports or of directories with reports
+
+    Returns:
+        pd.DataFrame: The spans of all runs
+    """
+    files = []
+    for path in paths:
+        files += (sorted(glob.glob(os.path.join(path, "*.json")))
+                  if os.path.isdir(path) else [path])
+    spans = []
+    for file_path in files:
+        with open(file_path, encoding="utf-8") as f:
+            spans += json.load(f)["spans"]
+    return pd.DataFrame(spans)
+
+
+def flame_summary(spans: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggregates the spans of all runs per stage path. The self time of a
+    stage is its time without the time of its child stages.
+
+    Args:
+        spans: The spans of one or more runs
+
+    Returns:
+        pd.DataFrame: Per path the number of calls, the total wall and
+        CPU time, the self time, the share of the total time of all runs
+        and the maximum peak memory
+    """
+    if spans.empty:
+        return pd.DataFrame(columns=["path", "calls", "wall", "cpu",
+                                     "self_wall", "share", "peak_memory_mb"])
+    summary = spans.groupby("path").agg(
+        calls=("wall", "size"), wall=("wall", "sum"), cpu=("cpu", "sum"),
+        peak_memory_mb=("peak_memory_mb", "max"))
+    parents = [path.rpartition("/")[0] for path in summary.index]
+    child_wall = pd.Series(summary["wall"].to_numpy(),
+                           index=parents).groupby(level=0).sum()
+    summary["self_wall"] = summary["wall"] - child_wall.reindex(
+        summary.index).fillna(0)
+    total = summary.loc[summary.index.str.count("/") == 0, "wall"].sum()
+    summary["share"] = summary["wall"] / total if total else 0.0
+    return summary.reset_index()[["path", "calls", "wall", "cpu",
+                                  "self_wall", "share", "peak_memory_mb"]]
+
+
+def write_folded(summary: pd.DataFrame, file_path: str) -> None:
+    """
+    Writes the self times of the summary as folded stacks
+    ("run;stage;substage microseconds"), the input format of
+    flamegraph.pl and speedscope.
+
+    Args:
+        summary: The flame summary
+        file_path: The path of the text file
+    """
+    with open(file_path, "w", encoding="utf-8") as f:
+        for path, self_wall in zip(summary["path"], summary["self_wall"]):
+            f.write(f"{path.replace('/', ';')} "
+                    f"{max(int(self_wall * 1e6), 0)}\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Aggregate run reports into a flame summary.')
+    parser.add_argument('reports', nargs='+',
+                        help='JSON run reports or directories with reports')
+    parser.add_argument('--folded',
+                        help='Write the self times as folded stacks')
+    parser.add_argument('--csv', help='Write the summary as CSV file')
+    args = parser.parse_args()
+
+    season = flame_summary(load_reports(args.reports))
+    with pd.option_context("display.width", 200,
+                           "display.max_rows", None):
+        print(season.sort_values("wall", ascending=False).to_string(
+            index=False, float_format="{:.3f}".format))
+    if args.folded:
+        write_folded(season, args.folded)
+    if args.csv:
+        season.to_csv(args.csv, index=False)
@@ -0,0 +1,349 @@
+"""
+This module bundles the input files and the loaded data of one match.
+
+All paths of a match are resolved from a single data directory with the
+layout of the handball data drive (HBL_Positions, HBL_Events,
+HBL_Slicing, HBL_Synchronization), so the same code runs on the real
+data and on synthetic matches in any directory. The data is loaded
+lazily and only once per match: the position data, the meta data, the
+combined ball positions, the events and the game phase sequences are
+shared by all synchronization approaches of the match.
+
+With a position cache the position data, the meta data and the ball
+data are read from the memory-mapped store of
+help_functions.position_store instead of the position file, which is
+only parsed once to build the store.
+
+Author:
+    @Annabelle Runge
+
+Date:
+    2025-05-22
+"""
+import os
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+import variables.data_variables as dv
+
+# Default template file of the formation template matching
+TEMPLATE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "existing_code", "templates.json")
+
+
+@dataclass
+class MatchContext:
+    """
+    The input files and the lazily loaded data of one match.
+
+    Attributes:
+        match_id (int): The Sportradar ID of the match.
+        base_path (str): The data directory, e.g. "D:\\Handball".
+        season (dv.Season): The season of the match.
+        template_path (str): The formation template file.
+        position_cache (str): The directory of the memory-mapped position
+        stores, the position file is read directly if None.
+        search_windows_file (str): The calibrated search windows of the
+        event types, search_windows.json in HBL_Synchronization if None.
+    """
+
+    match_id: int
+    base_path: str = r"D:\Handball"
+    season: dv.Season = dv.Season.SEASON_2020_2021
+    template_path: str = TEMPLATE_PATH
+    position_cache: Optional[str] = None
+    search_windows_file: Optional[str] = None
+
+    @property
+    def season_name(self) -> str:
+        """The name of the season folders, e.g. "season_20_21"."""
+        return f"season_{self.season.value}"
+
+    @property
+    def mapping_file(self) -> str:
+        """The mapping of the match IDs to the video and position files."""
+        return os.path.join(self.base_path, "HBL_Synchronization",
+                            f"mapping{self.season.value}.csv")
+
+    @property
+    def lookup_file(self) -> str:
+        """The lookup table of the matches and teams."""
+        return os.path.join(self.base_path, "HBL_Events", "lookup",
+                            f"lookup_matches_{self.season.value}.csv")
+
+    @cached_property
+    def match_row(self) -> pd.Series:
+        """The row of the match in the mapping file."""
+        df = pd.read_csv(self.mapping_file, delimiter=";")
+        match_row = df[df["match_id"] == int(self.match_id)]
+        if match_row.empty:
+            raise ValueError(f"Match {self.match_id} not found in "
+                             f"{self.mapping_file}")
+        return match_row.iloc[0]
+
+    @property
+    def match(self) -> str:
+        """The name of the position file of the match."""
+        return str(self.match_row["raw_pos_knx"])
+
+    @property
+    def positions_path(self) -> str:
+        """The Kinexon position file."""
+        return os.path.join(self.base_path, "HBL_Positions",
+                            self.season.value.replace("_", "-"), self.match)
+
+    @property
+    def timeline_path(self) -> str:
+        """The Sportradar timeline file."""
+        return os.path.join(
+            self.base_path, "HBL_Events", self.season_name, "EventTimeline",
+            f"sport_events_{self.match_id}_timeline.json")
+
+    @property
+    def summary_path(self) -> str:
+        """The Sportradar summary file."""
+        return os.path.join(
+            self.base_path, "HBL_Events", self.season_name,
+            "EventSummaries", f"sport_events_{self.match_id}_summary.json")
+
+    @property
+    def predictions_path(self) -> str:
+        """The per-frame phase predictions of the slicing."""
+        return os.path.join(self.base_path, "HBL_Slicing", self.season_name,
+                            f"{self.match}.npy")
+
+    @property
+    def player_profiles(self) -> str:
+        """The directory of the Sportradar player profiles."""
+        return os.path.join(self.base_path, "HBL_Events", "general",
+                            "PlayerProfiles")
+
+    @property
+    def position_store_path(self) -> str:
+        """The directory of the position store of the match."""
+        if self.position_cache is None:
+            raise ValueError("No position cache set")
+        return os.path.join(self.position_cache, self.season_name,
+                            str(self.match_id))
+
+    @cached_property
+    def position_store(self) -> Any:
+        """The memory-mapped position store, built on first use."""
+        from help_functions.position_store import open_or_build_store
+
+        return open_or_build_store(self)
+
+    @cached_property
+    def meta_data(self) -> tuple[dict[str, Any], int, int, int]:
+        """The meta data of the position file: pID_dict, number of
+        frames, framerate and first timestamp."""
+        if self.position_cache is not None:
+            return self.position_store.meta_data
+        import floodlight.io.kinexon as fliok
+
+        return fliok.get_meta_data(self.positions_path)
+
+    @property
+    def pid_dict(self) -> dict[str, Any]:
+        """The sensor and player IDs of every group."""
+        return self.meta_data[0]
+
+    @property
+    def framerate(self) -> int:
+        """The framerate of the position data."""
+        return self.meta_data[2]
+
+    @cached_property
+    def pos_data(self) -> list[Any]:
+        """The XY objects of all groups, sorted by group."""
+        if self.position_cache is not None:
+            return self.position_store.xy_objects()
+        import floodlight.io.kinexon as fliok
+
+        return fliok.read_position_data_csv(self.positions_path)
+
+    @cached_property
+    def xids(self) -> dict[str, dict[str, int]]:
+        """The links of the player names to the xIDs of every group."""
+        import floodlight.io.kinexon as fliok
+
+        return fliok.create_links_from_meta_data(self.pid_dict,
+                                                 identifier="name")
+
+    @property
+    def ball_num(self) -> int:
+        """The index of the ball group."""
+        from synchronization_approaches.pos_data_approach import \
+            find_key_position
+
+        return find_key_position(self.pid_dict, "Ball")
+
+    @cached_property
+    def ball(self) -> tuple[np.ndarray, np.ndarray]:
+        """The combined ball positions and the ball acceleration."""
+        if self.position_cache is not None:
+            return (self.position_store.ball_positions,
+                    self.position_store.ball_acceleration)
+        import help_functions.position_helpers as position_helpers
+
+        return position_helpers.prepare_ball_data(
+            self.pos_data[self.ball_num])
+
+    @property
+    def ball_positions(self) -> np.ndarray:
+        """The combined ball positions."""
+        return self.ball[0]
+
+    @property
+    def ball_acceleration(self) -> np.ndarray:
+        """The acceleration of the combined ball positions."""
+        return self.ball[1]
+
+    @cached_property
+    def possession(self) -> Any:
+        """The nearest player to the ball in every frame, saved with the
+        position store if there is a position cache."""
+        from help_functions.possession import load_or_compute_possession
+
+        return load_or_compute_possession(self)
+
+    @cached_property
+    def ball_candidates(self) -> Any:
+        """The sorted candidate frames of ball events, saved with the
+        position store if there is a position cache."""
+        from help_functions.ball_candidates import load_or_find_candidates
+
+        return load_or_find_candidates(self)
+
+    @cached_property
+    def phase_kinematics(self) -> pd.DataFrame:
+        """The distance, velocity, spread and centroid of both teams in
+        every sequence, saved with the position store if there is a
+        position cache."""
+        from help_functions.phase_kinematics import \
+            load_or_compute_phase_kinematics
+
+        return load_or_compute_phase_kinematics(self)
+
+    @cached_property
+    def distance_pyramid(self) -> Any:
+        """The player-ball distances with their block minima for the
+        coarse-to-fine search of the position approach."""
+        from synchronization_approaches.pos_data_approach import \
+            distance_pyramid
+
+        return distance_pyramid(self.pos_data, self.pid_dict,
+                                self.ball_positions)
+
+    @cached_property
+    def search_windows(self) -> Any:
+        """The search windows and the baseline offsets of the event
+        types, the defaults without a calibration file."""
+        from help_functions.search_windows import (load_search_windows,
+                                                   search_windows_path)
+
+        return load_search_windows(
+            self.search_windows_file or search_windows_path(self.base_path))
+
+    @cached_property
+    def gaps(self) -> Any:
+        """The gap indices of the ball and of all players for the
+        interruption handling of the approaches."""
+        from help_functions.gap_index import build_match_gaps
+
+        return build_match_gaps(self.pos_data, self.pid_dict,
+                                self.ball_positions)
+
+    @cached_property
+    def cost_pyramid(self) -> Any:
+        """The player costs with their block minima for the
+        coarse-to-fine search of the cost approach."""
+        from synchronization_approaches.cost_function_approach_2 import \
+            cost_pyramid
+
+        return cost_pyramid(self.pos_data, self.pid_dict,
+                            self.ball_positions, self.ball_acceleration)
+
+    @cached_property
+    def event_stream(self) -> tuple[Any, int, pd.DataFrame]:
+        """The event stream, the offset and the events with teams."""
+        from help_functions.floodlight_code import (add_team_to_events,
+                                                    calculate_team_order,
+                                                    load_event_stream)
+
+        event_stream, offset, events = load_event_stream(
+            self.timeline_path, self.positions_path)
+        events = add_team_to_events(events, calculate_team_order(events))
+        return event_stream, offset, events
+
+    @property
+    def events(self) -> pd.DataFrame:
+        """A fresh copy of the events, as the approaches change them."""
+        return self.event_stream[2].copy()
+
+    @cached_property
+    def predictions(self) -> np.ndarray:
+        """The per-frame phase predictions."""
+        return np.load(self.predictions_path)
+
+    @cached_property
+    def sequences(self) -> list[tuple[int, int, int]]:
+        """The (start, end, phase) sequences of the game phases."""
+        from plot_functions.processing import sequences_from_predictions
+
+        return sequences_from_predictions(self.predictions, self.framerate)
+
+    @cached_property
+    def summary(self) -> pd.DataFrame:
+        """The Sportradar summary of the match."""
+        return pd.read_json(self.summary_path)
+
+    @cached_property
+    def roster(self) -> Any:
+        """The players of the season, saved in the position cache."""
+        from help_functions.roster_index import (ROSTER_FILE,
+                                                 load_or_build_roster_index)
+
+        file_path = None
+        if self.position_cache is not None:
+            os.makedirs(os.path.join(self.position_cache, self.season_name),
+                        exist_ok=True)
+            file_path = os.path.join(self.position_cache, self.season_name,
+                                     ROSTER_FILE)
+        return load_or_build_roster_index(
+            self.player_profiles, os.path.dirname(self.summary_path),
+            file_path)
+
+    @cached_property
+    def lookup(self) -> pd.DataFrame:
+        """The lookup table of the matches and teams."""
+        return pd.read_csv(self.lookup_file)
+
+    def load(self) -> "MatchContext":
+        """
+        Loads all data of the match at once.
+
+        Returns:
+            MatchContext: The context itself
+        """
+        for name in ("pos_data", "ball", "event_stream", "sequences",
+                     "summary", "lookup"):
+            getattr(self, name)
+        return self
+
+    def clear(self, *names: str) -> None:
+        """
+        Drops loaded data, so that it is loaded again on the next access.
+
+        Args:
+            names: The names of the data, all loaded data if empty
+        """
+        loaded = [name for name, value in vars(type(self)).items()
+                  if isinstance(value, cached_property)]
+        for name in names or loaded:
+            self.__dict__.pop(name, None)
@@ -0,0 +1,204 @@
+"""
+This module provides a multi-resolution pyramid of per-block minima for
+coarse-to-fine searches over per-frame series.
+
+The position and the cost approach search the frames before every event
+at full resolution: the last frame in which the distance between the
+player and the ball is below a threshold, or the frame with the lowest
+cost. A MinPyramid keeps the full-resolution series (20 Hz) of every
+column (e.g. every player) and the minima of blocks of 4 and 20 frames
+(5 Hz and 1 Hz). A search first looks at the block minima of the
+coarsest level, skips all blocks that cannot contain a hit and refines
+only the remaining blocks at the finer levels. Blocks that are only
+partly inside the searched interval are refined, too, so the results are
+bit-identical to the exhaustive search. Long lookbacks (interruptions
+of the game, events without a frame) are searched in a few dozen steps.
+
+    pyramid = MinPyramid(distances)
+    frame = pyramid.last_below(column, t_event - 499, t_event, 0.3)
+
+Author:
+    @Annabelle Runge
+
+Date:
+    2025-05-26
+"""
+from typing import Any, Optional, Union
+
+import numpy as np
+
+# Block lengths of the coarse levels, 5 Hz and 1 Hz at 20 Hz
+FACTORS = (4, 20)
+
+
+class MinPyramid:
+    """
+    The per-frame series of several columns with their block minima.
+
+    Attributes:
+        values (np.ndarray): [n, P] full-resolution series, NaN values are
+        never below a threshold.
+        factors (tuple): The block lengths of the coarse levels, each a
+        multiple of the previous one.
+        levels (list): [ceil(n / f), P] block minima of every level,
+        ignoring NaN.
+        missing (np.ndarray): [n + 1, P] cumulative count of the NaN
+        values.
+        columns (dict): The column of every key, e.g. of every
+        (group, xID) of the players.
+    """
+
+    def __init__(self, values: np.ndarray,
+                 factors: tuple[int, ...] = FACTORS,
+                 columns: Optional[dict[Any, int]] = None) -> None:
+        self.values = np.asarray(values, dtype=float)
+        if self.values.ndim == 1:
+            self.values = self.values[:, None]
+        self.factors = factors
+        self.columns = columns or {}
+        n_frames = len(self.values)
+        self.levels = [
+            np.fmin.reduceat(self.values, np.arange(0, n_frames, factor),
+                             axis=0)
+            if n_frames else self.values[:0]
+            for factor in factors]
+        self.missing = np.zeros((n_frames + 1, self.values.shape[1]),
+                                dtype=np.int64)
+        np.cumsum(np.isnan(self.values), axis=0, out=self.missing[1:])
+
+    @classmethod
+    def from_arrays(cls, values: np.ndarray, levels: list[np.ndarray],
+                    missing: np.ndarray, factors: tuple[int, ...],
+                    columns: Optional[dict[Any, int]] = None
+                    ) -> "MinPyramid":
+        """
+        Creates a pyramid from already computed arrays, e.g. views of
+        shared memory, without copying them.
+
+        Args:
+            values: [n, P] full-resolution series
+            levels: The block minima of every level
+            missing: [n + 1, P] cumulative count of the NaN values
+            factors: The block lengths of the levels
+            columns: The column of every key
+
+        Returns:
+            MinPyramid: The pyramid
+        """
+        pyramid = cls.__new__(cls)
+        pyramid.values = values
+        pyramid.levels = list(levels)
+        pyramid.missing = missing
+        pyramid.factors = tuple(factors)
+        pyramid.columns = columns or {}
+        return pyramid
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def _clip(self, lo: int, hi: int) -> tuple[int, int]:
+        """
+        Cuts an interval to the frames of the series.
+
+        Args:
+            lo: The first frame
+            hi: The frame after the last frame
+
+        Returns:
+            tuple: The cut interval
+        """
+        return (min(max(int(lo), 0), len(self)),
+                min(max(int(hi), 0), len(self)))
+
+    def count_missing(self, column: int, lo: int, hi: int) -> int:
+        """
+        Counts the NaN values of a column in an interval.
+
+        Args:
+            column: The column
+            lo: The first frame
+            hi: The frame after the last frame
+
+        Returns:
+            int: The number of NaN values
+        """
+        lo, hi = self._clip(lo, hi)
+        if lo >= hi:
+            return 0
+        return int(self.missing[hi, column] - self.missing[lo, column])
+
+    def last_below(self, column: int, lo: int, hi: int,
+                   threshold: float) -> int:
+        """
+        Searches backwards for the last frame of an interval in which a
+        column is below a threshold.
+
+        Args:
+            column: The column
+            lo: The first frame
+            hi: The frame after the last frame
+            threshold: The threshold
+
+        Returns:
+            int: The frame, -1 if the column is never below the threshold
+        """
+        lo, hi = self._clip(lo, hi)
+        if lo >= hi:
+            return -1
+        return self._last_below(len(self.factors) - 1, column, lo, hi,
+                                threshold)
+
+    def _last_below(self, level: int, column: int, lo: int, hi: int,
+                    threshold: float) -> int:
+        if level < 0:
+            hits = np.flatnonzero(self.values[lo:hi, column] < threshold)
+            return lo + int(hits[-1]) if len(hits) else -1
+        factor = self.factors[level]
+        first = lo // factor
+        minima = self.levels[level][first:(hi - 1) // factor + 1, column]
+        for block in np.flatnonzero(minima < threshold)[::-1]:
+            start = (first + int(block)) * factor
+            found = self._last_below(level - 1, column, max(lo, start),
+                                     min(hi, start + factor), threshold)
+            if found >= 0:
+                return found
+        return -1
+
+    def argmin(self, column: int, lo: int,
+               hi: int) -> tuple[int, Union[float, np.floating]]:
+        """
+        Finds the first frame with the lowest value of a column in an
+        interval, like np.argmin. The column must not contain NaN.
+
+        Args:
+            column: The column
+            lo: The first frame
+            hi: The frame after the last frame
+
+        Returns:
+            tuple: The frame and the lowest value, -1 and inf if the
+            interval is empty
+        """
+        lo, hi = self._clip(lo, hi)
+        if lo >= hi:
+            return -1, np.inf
+        return self._argmin(len(self.factors) - 1, column, lo, hi)
+
+    def _argmin(self, level: int, column: int, lo: int,
+                hi: int) -> tuple[int, Union[float, np.floating]]:
+        if level < 0 or hi - lo <= self.factors[0]:
+            window = self.values[lo:hi, column]
+            position = int(np.argmin(window))
+            return lo + position, window[position]
+        factor = self.factors[level]
+        first, last = lo // factor, (hi - 1) // factor
+        minima = self.levels[level][first:last + 1, column].copy()
+        # Blocks that are only partly inside the interval
+        for block in {first, last}:
+            start, end = max(lo, block * factor), min(hi,
+                                                      (block + 1) * factor)
+            if start != block * factor or end != (block + 1) * factor:
+                minima[block - first] = self.values[start:end, column].min()
+        block = first + int(np.argmin(minima))
+        return self._argmin(level - 1, column, max(lo, block * factor),
+                            min(hi, (block + 1) * factor))
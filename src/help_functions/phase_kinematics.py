@@ -0,0 +1,258 @@
+"""
+This module computes the kinematics of both teams in every sequence of a
+match in one pass.
+
+The template matching fitted the floodlight DistanceModel and
+VelocityModel over the full match and then sliced and reduced the
+results with np.nansum / np.nanmean phase by phase. Here the frame-level
+kinematics of a team are computed once:
+    - the distance covered by every player (central differences, like
+      floodlight's DistanceModel),
+    - the centroid of the team and its spread (mean distance of the
+      players to the centroid),
+and reduced over all sequence boundaries at once with np.add.reduceat.
+Missing positions are left out of the sums and counted, so every mean is
+the sum divided by the number of valid values.
+
+The result is a compact table with one row per sequence and team:
+
+    table = phase_kinematics({"a": xy_a, "b": xy_b}, sequences)
+    table.loc[(3, "a"), "velocity"]
+
+The table of the match context is calculated on the teams of the
+formation analysis ("a" and "b" without the goalkeepers, see
+template_start.formation_teams) and feeds match_formations(). With a
+position cache it is saved next to the position store
+(help_functions.position_store).
+
+Author:
+    @Annabelle Runge
+
+Date:
+    2025-05-26
+"""
+import json
+import logging
+import os
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+PHASE_KINEMATICS_FILE = "phase_kinematics.npz"
+KINEMATICS_COLUMNS = ["sequence", "team", "start", "end", "phase", "frames",
+                      "tracked", "valid", "distance", "velocity", "spread",
+                      "centroid_x", "centroid_y"]
+
+
+def segment_reduce(values: np.ndarray, starts: np.ndarray,
+                   ends: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Sums the values of every segment [start, end) and counts them,
+    leaving out NaN values.
+
+    Args:
+        values: [n, ...] per-frame values
+        starts: [s] first frames of the segments
+        ends: [s] frames after the last frames of the segments
+
+    Returns:
+        tuple: [s, ...] sums and numbers of valid values of the segments
+    """
+    values = np.asarray(values, dtype=float)
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    counts = valid.astype(np.int64)
+    n_frames = len(values)
+    starts = np.clip(np.asarray(starts, dtype=np.int64), 0, n_frames)
+    ends = np.clip(np.asarray(ends, dtype=np.int64), starts, n_frames)
+    shape = (len(starts),) + values.shape[1:]
+    if len(starts) == 0:
+        return np.zeros(shape), np.zeros(shape, dtype=np.int64)
+    bounds = np.column_stack([starts, ends]).ravel()
+    if np.all(np.diff(bounds) >= 0):
+        # The segments are sorted and disjoint, the sums of the segments
+        # are at the even positions of the reduction
+        pad = np.zeros((1,) + values.shape[1:])
+        sums = np.add.reduceat(np.concatenate([filled, pad]), bounds,
+                               axis=0)[::2]
+        valid_counts = np.add.reduceat(
+            np.concatenate([counts, pad.astype(np.int64)]), bounds,
+            axis=0)[::2]
+    else:
+        sums = np.array([filled[a:b].sum(axis=0) for a, b
+                         in zip(starts, ends)]).reshape(shape)
+        valid_counts = np.array([counts[a:b].sum(axis=0) for a, b
+                                 in zip(starts, ends)]).reshape(shape)
+    # reduceat returns the value at the index for empty segments
+    empty = ends == starts
+    sums[empty] = 0
+    valid_counts[empty] = 0
+    return sums, valid_counts
+
+
+def frame_kinematics(xy: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Calculates the frame-level kinematics of a team.
+
+    Args:
+        xy: [n, 2 * players] positions of the players
+
+    Returns:
+        dict: [n] distance covered by all players and number of players
+        with a distance, [n, 2] centroid and [n] spread of the team, NaN
+        in frames without positions
+    """
+    xy = np.asarray(xy, dtype=float)
+    differences = np.gradient(xy, axis=0) if len(xy) > 1 else \
+        np.full_like(xy, np.nan)
+    distance = np.hypot(differences[:, ::2], differences[:, 1::2])
+    x, y = xy[:, ::2], xy[:, 1::2]
+    tracked = ~(np.isnan(x) | np.isnan(y))
+    n_players = tracked.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        centroid = np.column_stack([
+            np.where(tracked, x, 0.0).sum(axis=1),
+            np.where(tracked, y, 0.0).sum(axis=1)]) / n_players[:, None]
+        spread = np.where(tracked, np.hypot(x - centroid[:, :1],
+                                            y - centroid[:, 1:]),
+                          0.0).sum(axis=1) / n_players
+    return {"distance": np.nansum(distance, axis=1),
+            "valid": (~np.isnan(distance)).sum(axis=1),
+            "centroid": centroid, "spread": spread}
+
+
+def phase_kinematics(xy_objects: dict[str, Any],
+                     sequences: list[tuple[int, int, int]]) -> pd.DataFrame:
+    """
+    Calculates the kinematics of every team in every sequence.
+
+    Args:
+        xy_objects: The XY objects of the teams by team name
+        sequences: The (start, end, phase) sequences
+
+    Returns:
+        pd.DataFrame: The total distance covered, the mean velocity, the
+        mean spread and the mean centroid of every team in every sequence
+        with the number of frames, of frames with positions (tracked) and
+        of player frames with a distance (valid), indexed by sequence and
+        team
+    """
+    seq = np.asarray(sequences, dtype=np.int64).reshape(-1, 3)
+    order = np.argsort(seq[:, 0], kind="stable")
+    tables = []
+    for team, xy in xy_objects.items():
+        frame = frame_kinematics(xy.xy)
+        starts, ends = seq[order, 0], seq[order, 1]
+        distance, _ = segment_reduce(frame["distance"], starts, ends)
+        valid, _ = segment_reduce(frame["valid"], starts, ends)
+        spread, tracked = segment_reduce(frame["spread"], starts, ends)
+        centroid, _ = segment_reduce(frame["centroid"], starts, ends)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            table = pd.DataFrame({
+                "sequence": order, "team": team, "start": starts,
+                "end": ends, "phase": seq[order, 2],
+                "frames": np.clip(ends, 0, len(xy.xy)) -
+                np.clip(starts, 0, len(xy.xy)),
+                "tracked": tracked, "valid": valid.astype(np.int64),
+                "distance": distance,
+                "velocity": distance * xy.framerate / valid,
+                "spread": spread / tracked,
+                "centroid_x": centroid[:, 0] / tracked,
+                "centroid_y": centroid[:, 1] / tracked})
+        tables.append(table)
+    if not tables:
+        return pd.DataFrame(columns=KINEMATICS_COLUMNS).set_index(
+            ["sequence", "team"])
+    return pd.concat(tables, ignore_index=True).sort_values(
+        ["sequence", "team"], kind="stable").set_index(["sequence", "team"])
+
+
+def save_phase_kinematics(table: pd.DataFrame, file_path: str,
+                          source: Optional[dict[str, Any]] = None) -> None:
+    """
+    Saves the table as compressed npz file.
+
+    Args:
+        table: The table from phase_kinematics()
+        file_path: The path of the npz file
+        source: The fingerprint of the position file
+    """
+    flat = table.reset_index()
+    columns = {column: flat[column].to_numpy()
+               for column in KINEMATICS_COLUMNS}
+    columns["team"] = flat["team"].to_numpy(dtype=str)
+    np.savez_compressed(file_path, **columns,
+                        source=np.array(json.dumps(source)))
+
+
+def load_phase_kinematics(file_path: str,
+                          sequences: list[tuple[int, int, int]],
+                          source: Optional[dict[str, Any]] = None
+                          ) -> Optional[pd.DataFrame]:
+    """
+    Loads a saved table if it belongs to the position file and the
+    sequences.
+
+    Args:
+        file_path: The path of the npz file
+        sequences: The (start, end, phase) sequences of the match
+        source: The fingerprint of the position file, not checked if None
+
+    Returns:
+        pd.DataFrame: The table, None if it has to be computed
+    """
+    if not os.path.exists(file_path):
+        return None
+    with np.load(file_path) as data:
+        if (source is not None
+                and json.loads(str(data["source"])) != source):
+            return None
+        table = pd.DataFrame({column: data[column]
+                              for column in KINEMATICS_COLUMNS})
+    seq = np.asarray(sequences, dtype=np.int64).reshape(-1, 3)
+    saved = table.drop_duplicates("sequence").sort_values("sequence")
+    if (len(saved) != len(seq) or not np.array_equal(
+            saved[["start", "end", "phase"]].to_numpy(),
+            seq[saved["sequence"].to_numpy()])):
+        return None
+    return table.set_index(["sequence", "team"])
+
+
+def load_or_compute_phase_kinematics(context: Any) -> pd.DataFrame:
+    """
+    Returns the kinematics of the teams of the formation analysis in the
+    sequences of a match. With a position cache the table is saved next
+    to the position store and loaded on the next run.
+
+    Args:
+        context: The match context
+
+    Returns:
+        pd.DataFrame: The table of the match, with the teams "a" and "b"
+    """
+    from preprocessing.template_matching.template_start import formation_teams
+
+    def teams() -> dict[str, Any]:
+        return formation_teams(context.pos_data, context.pid_dict,
+                               context.lookup, context.summary,
+                               context.roster, context.match)
+
+    if context.position_cache is None:
+        return phase_kinematics(teams(), context.sequences)
+    store = context.position_store
+    file_path = os.path.join(store.path, PHASE_KINEMATICS_FILE)
+    # The goalkeepers of the teams are filtered with the roster
+    source = {"positions": store.index.get("source"),
+              "roster": [str(pid) for pid, role
+                         in zip(context.roster.pids, context.roster.roles)
+                         if role == "G"]}
+    table = load_phase_kinematics(file_path, context.sequences, source)
+    if table is None:
+        table = phase_kinematics(teams(), context.sequences)
+        save_phase_kinematics(table, file_path, source)
+        logger.info("Saved the kinematics of %s sequences %s",
+                    len(context.sequences), file_path)
+    return table
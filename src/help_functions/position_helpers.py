@@ -11,11 +11,13 @@ Date:
     2025-04-01
 """
 
+import logging
 from typing import Any
 
 import numpy as np
 from floodlight import XY
-from floodlight.models.kinematics import AccelerationModel
+
+logger = logging.getLogger(__name__)
 
 
 def prepare_ball_data(ball_data: Any) -> tuple[Any, Any]:
@@ -77,9 +79,9 @@ def combine_ball_data(ball_data_1: Any, ball_data_2: Any) -> Any:
 
             first_idx = np.where(both_valid)[0][0] if np.any(
                 both_valid) else 'N/A'
-            print(f"Warning: Found {np.sum(both_valid)}"
-                  f" positions where both ball tracks have valid data. "
-                  f"First occurrence at index {first_idx}")
+            logger.info("Found %s positions where both ball tracks have "
+                        "valid data. First occurrence at index %s",
+                        np.sum(both_valid), first_idx)
         else:
             ball_positions = np.where(
                 ~np.isnan(ball_data_1), ball_data_1,
@@ -161,6 +163,8 @@ def get_acceleration_cost(pos_data: Any) -> Any:
     Returns:
         The acceleration cost
     """
+    from floodlight.models.kinematics import AccelerationModel
+
     am = AccelerationModel()
     am.fit(pos_data)
 
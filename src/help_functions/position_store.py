@@ -0,0 +1,347 @@
+"""
+This module caches the position data of a match as a time-chunked,
+memory-mapped store.
+
+The synchronization only needs the positions near the events, usually
+the 500 frames before an event. Reading a Kinexon file materializes the
+whole match as floodlight XY objects, although most of it is never
+touched. The store is written once per match from the parsed position
+file: the positions of all groups, the combined ball positions and the
+ball acceleration are laid out as one array of time chunks (one minute
+per chunk by default) in positions.npy, and the meta data of the file,
+the columns of every group and the chunk size are written to index.json.
+
+Opening the store maps the array into memory without reading it.
+window() and window_all() return views of the frames of a time window,
+so only the pages of the overlapping chunks are read from disk. The XY
+objects of xy_objects() are memory-mapped too, so existing code that
+indexes frames (event_windows, inf_values) only reads the pages
+it uses.
+
+    store = open_or_build_store(context, cache_dir)
+    player = store.window("Team A", 3, t_event - 500, t_event)
+
+Author:
+    @Annabelle Runge
+
+Date:
+    2025-05-25
+"""
+import json
+import logging
+import os
+from typing import Any, Optional, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Version of the layout, stores of other versions are rebuilt
+STORE_VERSION = 1
+INDEX_FILE = "index.json"
+DATA_FILE = "positions.npy"
+
+# The groups of the derived ball data in the store
+BALL_GROUP = "_ball"
+ACCELERATION_GROUP = "_ball_acceleration"
+
+
+def source_fingerprint(file_path: str) -> dict[str, Any]:
+    """
+    Identifies the version of a position file by its size and
+    modification time.
+
+    Args:
+        file_path: The position file
+
+    Returns:
+        dict: The size and modification time of the file
+    """
+    stat = os.stat(file_path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+class PositionStore:
+    """
+    A time-chunked, memory-mapped position store of one match.
+
+    Attributes:
+        path (str): The directory of the store.
+        index (dict): The content of index.json.
+        n_frames (int): The number of frames of the match.
+        chunk_frames (int): The number of frames per time chunk.
+        framerate (int): The framerate of the position data.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE), encoding="utf-8") as f:
+            self.index = json.load(f)
+        self.n_frames = self.index["n_frames"]
+        self.chunk_frames = self.index["chunk_frames"]
+        self.framerate = self.index["framerate"]
+        self.chunks = np.load(os.path.join(path, DATA_FILE), mmap_mode="r")
+        # Frame-major view of all chunks, reshaping does not read the file
+        self._frames = self.chunks.reshape(-1, self.chunks.shape[2])
+        self._columns = {name: tuple(columns) for name, columns
+                         in self.index["groups"].items()}
+
+    @classmethod
+    def build(cls, path: str, pos_data: list[Any],
+              meta_data: tuple[dict[str, Any], int, int, int],
+              ball_positions: np.ndarray, ball_acceleration: np.ndarray,
+              chunk_seconds: int = 60,
+              source: Optional[dict[str, Any]] = None) -> "PositionStore":
+        """
+        Writes the store of a match. The chunks are written one after
+        another, the index is written last, so that an interrupted build
+        leaves no valid store behind.
+
+        Args:
+            path: The directory of the store
+            pos_data: The XY objects of all groups
+            meta_data: The meta data of the position file
+            ball_positions: The combined ball positions
+            ball_acceleration: The acceleration of the ball
+            chunk_seconds: The length of a time chunk in seconds
+            source: The fingerprint of the position file
+
+        Returns:
+            PositionStore: The opened store
+        """
+        pid_dict, _, framerate, _ = meta_data
+        arrays = [xy.xy for xy in pos_data] + [
+            np.asarray(ball_positions, dtype=float).reshape(-1, 2),
+            np.asarray(ball_acceleration, dtype=float).reshape(-1, 1)]
+        names = list(pid_dict) + [BALL_GROUP, ACCELERATION_GROUP]
+        if len(names) != len(arrays):
+            raise ValueError(f"{len(pos_data)} XY objects for "
+                             f"{len(pid_dict)} groups")
+        n_frames = max(len(array) for array in arrays)
+        chunk_frames = max(int(chunk_seconds * framerate), 1)
+        n_chunks = max(-(-n_frames // chunk_frames), 1)
+        groups = {}
+        start = 0
+        for name, array in zip(names, arrays):
+            groups[name] = (start, start + array.shape[1])
+            start += array.shape[1]
+
+        os.makedirs(path, exist_ok=True)
+        index_path = os.path.join(path, INDEX_FILE)
+        if os.path.exists(index_path):
+            os.remove(index_path)
+        chunks = np.lib.format.open_memmap(
+            os.path.join(path, DATA_FILE), mode="w+", dtype=np.float64,
+            shape=(n_chunks, chunk_frames, start))
+        for chunk in range(n_chunks):
+            t0 = chunk * chunk_frames
+            block = chunks[chunk]
+            block[...] = np.nan
+            for (first, last), array in zip(groups.values(), arrays):
+                rows = array[t0:t0 + chunk_frames]
+                block[:len(rows), first:last] = rows
+        chunks.flush()
+        del chunks
+
+        index = {"version": STORE_VERSION, "n_frames": n_frames,
+                 "chunk_frames": chunk_frames, "framerate": framerate,
+                 "meta_data": list(meta_data), "groups": groups,
+                 "directions": [xy.direction for xy in pos_data],
+                 "source": source}
+        with open(index_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, default=int)
+        logger.info("Built position store %s: %s frames in %s chunks",
+                    path, n_frames, n_chunks)
+        return cls(path)
+
+    @property
+    def meta_data(self) -> tuple[dict[str, Any], int, int, int]:
+        """The meta data of the position file: pID_dict, number of
+        frames, framerate and first timestamp."""
+        pid_dict, n_frames, framerate, t_null = self.index["meta_data"]
+        return pid_dict, n_frames, framerate, t_null
+
+    @property
+    def groups(self) -> list[str]:
+        """The names of the groups of the position file."""
+        return [name for name in self._columns
+                if name not in (BALL_GROUP, ACCELERATION_GROUP)]
+
+    def _group_columns(self, group: Union[int, str]) -> tuple[int, int]:
+        """
+        Returns the columns of a group.
+
+        Args:
+            group: The name or the index of the group
+
+        Returns:
+            tuple: The first and the last column (exclusive)
+        """
+        if isinstance(group, (int, np.integer)):
+            group = self.groups[group]
+        if group not in self._columns:
+            raise KeyError(f"Group {group} not in store {self.path}")
+        return self._columns[group]
+
+    def _frame_range(self, t0: int, t1: int) -> slice:
+        """
+        Cuts a time window to the frames of the match.
+
+        Args:
+            t0: The first frame
+            t1: The frame after the last frame
+
+        Returns:
+            slice: The frames of the window
+        """
+        return slice(min(max(t0, 0), self.n_frames),
+                     min(max(t1, 0), self.n_frames))
+
+    def window(self, group: Union[int, str], player: int, t0: int,
+               t1: int) -> np.ndarray:
+        """
+        Returns the positions of a player in a time window. Frames
+        outside of the match are cut off, so the window starts at
+        max(t0, 0).
+
+        Args:
+            group: The name or the index of the group
+            player: The xID of the player in the group
+            t0: The first frame
+            t1: The frame after the last frame
+
+        Returns:
+            np.ndarray: Read-only view of the x and y positions
+        """
+        first, last = self._group_columns(group)
+        column = first + 2 * player
+        if player < 0 or column + 2 > last:
+            raise IndexError(f"Player {player} not in group {group}")
+        return self._frames[self._frame_range(t0, t1), column:column + 2]
+
+    def group_window(self, group: Union[int, str], t0: int,
+                     t1: int) -> np.ndarray:
+        """
+        Returns the positions of all players of a group in a time window.
+
+        Args:
+            group: The name or the index of the group
+            t0: The first frame
+            t1: The frame after the last frame
+
+        Returns:
+            np.ndarray: Read-only view in the layout of XY.xy
+        """
+        first, last = self._group_columns(group)
+        return self._frames[self._frame_range(t0, t1), first:last]
+
+    def window_all(self, t0: int, t1: int) -> dict[str, np.ndarray]:
+        """
+        Returns the positions of all groups in a time window. Reads only
+        the chunks that overlap the window.
+
+        Args:
+            t0: The first frame
+            t1: The frame after the last frame
+
+        Returns:
+            dict: Read-only views in the layout of XY.xy per group name
+        """
+        frames = self._frames[self._frame_range(t0, t1)]
+        return {name: frames[:, first:last]
+                for name, (first, last) in self._columns.items()
+                if name not in (BALL_GROUP, ACCELERATION_GROUP)}
+
+    def xy_objects(self) -> list[Any]:
+        """
+        Returns memory-mapped XY objects of all groups in the order of
+        the position file.
+
+        Returns:
+            list: The XY objects
+        """
+        from floodlight import XY
+
+        return [XY(xy=self.group_window(name, 0, self.n_frames),
+                   framerate=self.framerate, direction=direction)
+                for name, direction in zip(self.groups,
+                                           self.index["directions"])]
+
+    @property
+    def ball_positions(self) -> np.ndarray:
+        """Memory-mapped combined ball positions."""
+        return self.group_window(BALL_GROUP, 0, self.n_frames)
+
+    @property
+    def ball_acceleration(self) -> np.ndarray:
+        """Memory-mapped acceleration of the combined ball positions."""
+        return self.group_window(ACCELERATION_GROUP, 0, self.n_frames)[:, 0]
+
+    def nbytes(self) -> int:
+        """
+        Returns the size of the position array on disk.
+
+        Returns:
+            int: The size in bytes
+        """
+        return int(self.chunks.nbytes)
+
+
+def open_store(path: str,
+               source: Optional[dict[str, Any]] = None
+               ) -> Optional[PositionStore]:
+    """
+    Opens an existing store if it is complete and up to date.
+
+    Args:
+        path: The directory of the store
+        source: The fingerprint of the position file, not checked if None
+
+    Returns:
+        PositionStore: The store, None if it has to be built
+    """
+    try:
+        store = PositionStore(path)
+    except (OSError, ValueError, KeyError):
+        return None
+    if store.index.get("version") != STORE_VERSION:
+        return None
+    if source is not None and store.index.get("source") != source:
+        logger.info("Position file of store %s changed", path)
+        return None
+    return store
+
+
+def open_or_build_store(context: Any, cache_dir: Optional[str] = None,
+                        chunk_seconds: int = 60) -> PositionStore:
+    """
+    Opens the position store of a match and builds it from the position
+    file if it does not exist or the position file has changed.
+
+    Args:
+        context: The match context
+        cache_dir: The directory of the stores, the position cache of the
+        context if None
+        chunk_seconds: The length of a time chunk in seconds
+
+    Returns:
+        PositionStore: The store of the match
+    """
+    import floodlight.io.kinexon as fliok
+
+    import help_functions.position_helpers as position_helpers
+    from synchronization_approaches.pos_data_approach import find_key_position
+
+    path = (context.position_store_path if cache_dir is None else
+            os.path.join(cache_dir, context.season_name,
+                         str(context.match_id)))
+    source = source_fingerprint(context.positions_path)
+    store = open_store(path, source)
+    if store is not None:
+        return store
+    meta_data = fliok.get_meta_data(context.positions_path)
+    pos_data = fliok.read_position_data_csv(context.positions_path)
+    ball_positions, ball_acceleration = position_helpers.prepare_ball_data(
+        pos_data[find_key_position(meta_data[0], "Ball")])
+    return PositionStore.build(path, pos_data, meta_data, ball_positions,
+                               ball_acceleration, chunk_seconds, source)
@@ -0,0 +1,272 @@
+"""
+This module computes the per-frame ball possession timeline of a match.
+
+The position-based approaches ask again and again which player was
+closest to the ball before an event. compute_possession() answers this
+once for every frame in one vectorized pass over all team groups: the
+nearest player (xID), the group of their team and their distance to the
+combined ball positions. The timeline is compact (int16 player, int8
+team, float16 distance, five bytes per frame) and is saved next to the
+position store of the match (help_functions.position_store), so it is
+computed once per match and can be reused by the analysis.
+
+Searching the possession frame of an event is then a backward search on
+these small arrays:
+
+    timeline = context.possession
+    frame = timeline.last_possession(t_event, group, xid, radius=0.3)
+
+Note that the timeline only knows the nearest player. A player within
+the radius of the ball is not the owner if another player is even
+closer, so searches on the timeline can differ from the distance tests
+of sync_pos_data in crowded situations.
+
+Author:
+    @Annabelle Runge
+
+Date:
+    2025-05-25
+"""
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import numpy as np
+
+from help_functions.event_windows import last_true
+
+logger = logging.getLogger(__name__)
+
+POSSESSION_FILE = "possession.npz"
+
+# Frames per block of the vectorized pass
+BLOCK_FRAMES = 12000
+
+
+@dataclass
+class PossessionTimeline:
+    """
+    The nearest player to the ball in every frame of a match.
+
+    Attributes:
+        player (np.ndarray): int16 xID of the nearest player in their
+        group, -1 if the ball or all players are unknown.
+        team (np.ndarray): int8 index of the group of the nearest player
+        in pos_data, -1 if unknown.
+        distance (np.ndarray): float16 distance of the nearest player to
+        the ball in meters, NaN if unknown.
+    """
+
+    player: np.ndarray
+    team: np.ndarray
+    distance: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.player)
+
+    def known(self) -> np.ndarray:
+        """
+        Returns the frames in which the nearest player is known.
+
+        Returns:
+            np.ndarray: Mask of the frames
+        """
+        return self.player >= 0
+
+    def owner_at(self, frames: Any) -> tuple[np.ndarray, np.ndarray,
+                                             np.ndarray]:
+        """
+        Returns the nearest players at several frames.
+
+        Args:
+            frames: The frames
+
+        Returns:
+            tuple: The xIDs, the groups and the distances, -1 and NaN for
+            frames outside of the match
+        """
+        frames = np.asarray(frames, dtype=np.int64)
+        inside = (frames >= 0) & (frames < len(self))
+        rows = np.clip(frames, 0, max(len(self) - 1, 0))
+        return (np.where(inside, self.player[rows], -1),
+                np.where(inside, self.team[rows], -1),
+                np.where(inside, self.distance[rows].astype(float), np.nan))
+
+    def last_possession(self, t_event: int, group: int, player: int,
+                        radius: float, window: int = 499,
+                        lower: Optional[int] = None) -> int:
+        """
+        Searches backwards from an event for the last frame in which the
+        player was the nearest player within a radius of the ball.
+
+        Args:
+            t_event: The frame of the event
+            group: The index of the group of the player in pos_data
+            player: The xID of the player in their group
+            radius: The maximum distance to the ball in meters
+            window: Number of frames before the event that are searched
+            lower: The first frame that is searched, t_event - window if
+            None
+
+        Returns:
+            int: The frame, -1 if the player was not in possession
+        """
+        start = max(t_event - window if lower is None else lower, 0)
+        end = min(max(t_event, 0), len(self))
+        if start >= end:
+            return -1
+        hits = ((self.player[start:end] == player)
+                & (self.team[start:end] == group)
+                & (self.distance[start:end] < radius))
+        position = last_true(hits[None, :])[0]
+        return -1 if position < 0 else start + int(position)
+
+    def save(self, file_path: str,
+             source: Optional[dict[str, Any]] = None) -> None:
+        """
+        Saves the timeline as compressed npz file.
+
+        Args:
+            file_path: The path of the npz file
+            source: The fingerprint of the position file
+        """
+        np.savez_compressed(file_path, player=self.player, team=self.team,
+                            distance=self.distance,
+                            source=np.array(json.dumps(source)))
+
+    @classmethod
+    def load(cls, file_path: str,
+             source: Optional[dict[str, Any]] = None
+             ) -> Optional["PossessionTimeline"]:
+        """
+        Loads a saved timeline if it belongs to the position file.
+
+        Args:
+            file_path: The path of the npz file
+            source: The fingerprint of the position file, not checked if
+            None
+
+        Returns:
+            PossessionTimeline: The timeline, None if it has to be
+            computed
+        """
+        if not os.path.exists(file_path):
+            return None
+        with np.load(file_path) as data:
+            if (source is not None
+                    and json.loads(str(data["source"])) != source):
+                return None
+            return cls(data["player"], data["team"], data["distance"])
+
+
+def compute_possession(pos_data: list[Any], pid_dict: dict[str, Any],
+                       ball_positions: np.ndarray) -> PossessionTimeline:
+    """
+    Computes the nearest player to the ball in every frame over all team
+    groups at once.
+
+    Args:
+        pos_data: The XY objects of all groups
+        pid_dict: The meta data of the position file
+        ball_positions: The combined ball positions
+
+    Returns:
+        PossessionTimeline: The timeline of the match
+    """
+    from synchronization_approaches.pos_data_approach import find_key_position
+
+    ball_num = find_key_position(pid_dict, "Ball")
+    teams = [group for group in range(len(pos_data)) if group != ball_num]
+    n_frames = len(ball_positions)
+    player = np.full(n_frames, -1, dtype=np.int16)
+    team = np.full(n_frames, -1, dtype=np.int8)
+    distance = np.full(n_frames, np.nan, dtype=np.float16)
+    # xID and group of every column of the distance matrix
+    xids = np.concatenate([np.arange(pos_data[group].xy.shape[1] // 2)
+                           for group in teams])
+    groups = np.concatenate([np.full(pos_data[group].xy.shape[1] // 2,
+                                     group) for group in teams])
+    for t0 in range(0, n_frames, BLOCK_FRAMES):
+        t1 = min(t0 + BLOCK_FRAMES, n_frames)
+        ball = np.asarray(ball_positions[t0:t1], dtype=float)
+        distances = np.concatenate([
+            np.hypot(pos_data[group].xy[t0:t1, 0::2] - ball[:, :1],
+                     pos_data[group].xy[t0:t1, 1::2] - ball[:, 1:])
+            for group in teams], axis=1)
+        distances = np.where(np.isnan(distances), np.inf, distances)
+        nearest = distances.argmin(axis=1)
+        nearest_distance = distances[np.arange(t1 - t0), nearest]
+        known = np.isfinite(nearest_distance)
+        player[t0:t1][known] = xids[nearest[known]]
+        team[t0:t1][known] = groups[nearest[known]]
+        distance[t0:t1][known] = nearest_distance[known]
+    return PossessionTimeline(player, team, distance)
+
+
+def load_or_compute_possession(context: Any) -> PossessionTimeline:
+    """
+    Returns the possession timeline of a match. With a position cache
+    the timeline is saved next to the position store and loaded on the
+    next run.
+
+    Args:
+        context: The match context
+
+    Returns:
+        PossessionTimeline: The timeline of the match
+    """
+    if context.position_cache is None:
+        return compute_possession(context.pos_data, context.pid_dict,
+                                  context.ball_positions)
+    store = context.position_store
+    file_path = os.path.join(store.path, POSSESSION_FILE)
+    source = store.index.get("source")
+    timeline = PossessionTimeline.load(file_path, source)
+    if timeline is None:
+        timeline = compute_possession(context.pos_data, context.pid_dict,
+                                      context.ball_positions)
+        timeline.save(file_path, source)
+        logger.info("Saved possession timeline %s", file_path)
+    return timeline
+
+
+def sync_possession_batch(timeline: PossessionTimeline, frames: Any,
+                          players: Any, groups: Any,
+                          threshold: float = 0.99) -> np.ndarray:
+    """
+    Finds the last possession frame before every event on the possession
+    timeline, with the search of sync_pos_data: first within 0.3 m in the
+    499 frames before the event, then within the threshold in a window
+    that is extended by the frames without a known owner.
+
+    Args:
+        timeline: The possession timeline of the match
+        frames: The frame indices of the events
+        players: The xIDs of the players of the events
+        groups: The indices of the groups of the players in pos_data
+        threshold: Threshold for the distance to the ball (in meters)
+
+    Returns:
+        np.ndarray: Frame index of the last possession before every event,
+        the event frame if no possession is found
+    """
+    synced = np.asarray(frames, dtype=np.int64).copy()
+    known = timeline.known()
+    for i, (t_event, player, group) in enumerate(zip(synced.copy(), players,
+                                                     groups)):
+        frame = timeline.last_possession(t_event, group, player, 0.3)
+        if frame < 0:
+            start = min(max(t_event - 499, 0), len(timeline))
+            end = min(max(t_event, 0), len(timeline))
+            none_idx = int((~known[start:end]).sum())
+            lower = t_event - 499
+            if none_idx > 10:
+                logger.debug("Game was interrupted for %s frames", none_idx)
+                lower -= none_idx
+            frame = timeline.last_possession(t_event, group, player,
+                                             threshold, lower=lower)
+        if frame >= 0:
+            synced[i] = frame
+    return synced
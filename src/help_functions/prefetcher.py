@@ -0,0 +1,233 @@
+"""
+This module loads the inputs of the next matches of a season in the
+background while the current match is computed.
+
+The season loop is strictly load-then-compute: while a match is
+synchronized the disk is idle, and while the next position file is
+parsed the CPU waits. The MatchPrefetcher resolves the paths of the next
+`lookahead` matches and loads their positions, timelines, summaries and
+slicing arrays on a small thread pool. The loaded contexts are kept in
+an LRU cache with a memory budget; when the budget is exceeded the least
+recently used contexts are dropped, except for the match that is
+currently computed. At most lookahead + 1 contexts are kept.
+
+    prefetcher = MatchPrefetcher(match_ids, base_path, lookahead=2)
+    for context in prefetcher:
+        run_match(context, approaches)
+
+Author:
+    @Annabelle Runge
+
+Date:
+    2025-05-24
+"""
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Iterator, Optional
+
+import pandas as pd
+
+import variables.data_variables as dv
+from help_functions.match_context import MatchContext
+
+logger = logging.getLogger(__name__)
+
+# The inputs that are loaded in the background, in loading order
+PREFETCH_DATA = ("match_row", "meta_data", "pos_data", "event_stream",
+                 "summary", "lookup", "predictions")
+
+
+def context_nbytes(context: MatchContext) -> int:
+    """
+    Estimates the memory of the loaded data of a match context.
+
+    Args:
+        context: The match context
+
+    Returns:
+        int: The estimated size in bytes
+    """
+    loaded = context.__dict__
+    nbytes = sum(xy.xy.nbytes for xy in loaded.get("pos_data", []))
+    nbytes += sum(array.nbytes for array in loaded.get("ball", ()))
+    if "predictions" in loaded:
+        nbytes += loaded["predictions"].nbytes
+    if "event_stream" in loaded:
+        nbytes += int(loaded["event_stream"][2].memory_usage(
+            deep=True).sum())
+    for name in ("summary", "lookup"):
+        if isinstance(loaded.get(name), pd.DataFrame):
+            nbytes += int(loaded[name].memory_usage(deep=True).sum())
+    return nbytes
+
+
+class MatchPrefetcher:
+    """
+    Loads the inputs of the next matches of a season in the background.
+
+    Attributes:
+        match_ids (list): The IDs of the matches in processing order.
+        base_path (str): The data directory.
+        season (dv.Season): The season of the matches.
+        lookahead (int): Number of matches that are loaded ahead.
+        memory_budget_mb (float): Memory budget of the cached contexts,
+        unlimited if None.
+        context_options (dict): Further fields of the match contexts,
+        e.g. position_cache, template_path or search_windows_file.
+    """
+
+    def __init__(self, match_ids: list[int], base_path: str,
+                 season: dv.Season = dv.Season.SEASON_2020_2021,
+                 lookahead: int = 2, max_workers: int = 2,
+                 memory_budget_mb: Optional[float] = None,
+                 context_options: Optional[dict[str, Any]] = None) -> None:
+        self.match_ids = list(match_ids)
+        self.base_path = base_path
+        self.season = season
+        self.lookahead = lookahead
+        self.memory_budget_mb = memory_budget_mb
+        self.context_options = dict(context_options or {})
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="prefetch")
+        self._cache: "OrderedDict[int, MatchContext]" = OrderedDict()
+        self._futures: dict[int, Future] = {}
+        self._pinned: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "MatchPrefetcher":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Stops the background loading and drops all cached contexts.
+        """
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        with self._lock:
+            self._cache.clear()
+            self._futures.clear()
+
+    def _load(self, context: MatchContext) -> MatchContext:
+        """
+        Loads the inputs of a match in a background thread.
+
+        Args:
+            context: The match context
+
+        Returns:
+            MatchContext: The context with the loaded inputs
+        """
+        for name in PREFETCH_DATA:
+            with self._lock:
+                if context.match_id not in self._cache:
+                    # Evicted while loading
+                    return context
+            getattr(context, name)
+        with self._lock:
+            self._enforce_budget()
+        return context
+
+    def prefetch(self, match_id: int) -> None:
+        """
+        Starts loading a match in the background, if it is not cached.
+
+        Args:
+            match_id: The ID of the match
+        """
+        with self._lock:
+            if match_id in self._cache:
+                return
+            context = self.create_context(match_id)
+            self._cache[match_id] = context
+        self._futures[match_id] = self._executor.submit(self._load, context)
+
+    def get(self, match_id: int,
+            position: Optional[int] = None) -> MatchContext:
+        """
+        Returns the context of a match once its inputs are loaded and
+        starts loading the next matches. The match stays in the cache
+        until the next match is requested.
+
+        Args:
+            match_id: The ID of the match
+            position: The position of the match in match_ids, the first
+            occurrence of the match if None
+
+        Returns:
+            MatchContext: The loaded context
+        """
+        self.prefetch(match_id)
+        with self._lock:
+            self._pinned = match_id
+            self._cache.move_to_end(match_id)
+        future = self._futures.pop(match_id, None)
+        if future is not None:
+            try:
+                future.result()
+            except Exception as e:
+                # Loading is repeated by the caller and fails there
+                logger.warning("Prefetching match %s failed: %s",
+                               match_id, e)
+        if position is None and match_id in self.match_ids:
+            position = self.match_ids.index(match_id)
+        if position is not None:
+            for next_id in self.match_ids[
+                    position + 1:position + 1 + self.lookahead]:
+                self.prefetch(next_id)
+        with self._lock:
+            context = self._cache.get(match_id)
+            self._enforce_budget()
+        return context or self.create_context(match_id)
+
+    def create_context(self, match_id: int) -> MatchContext:
+        """
+        Creates the context of a match without loaded data.
+
+        Args:
+            match_id: The ID of the match
+
+        Returns:
+            MatchContext: The context
+        """
+        return MatchContext(match_id, self.base_path, self.season,
+                            **self.context_options)
+
+    def cached_mb(self) -> float:
+        """
+        Returns the memory of the cached contexts.
+
+        Returns:
+            float: The estimated size in MB
+        """
+        return sum(context_nbytes(context)
+                   for context in list(self._cache.values())) / 1024 ** 2
+
+    def _enforce_budget(self) -> None:
+        """
+        Drops the least recently used contexts until at most lookahead + 1
+        contexts are cached and they fit into the memory budget. The
+        pinned match is never dropped. Must be called with the lock held.
+        """
+        sizes = {match_id: (context_nbytes(context) / 1024 ** 2
+                            if self.memory_budget_mb is not None else 0.0)
+                 for match_id, context in self._cache.items()}
+        total = sum(sizes.values())
+        for match_id in list(self._cache):
+            if (len(self._cache) <= self.lookahead + 1
+                    and (self.memory_budget_mb is None
+                         or total <= self.memory_budget_mb)):
+                break
+            if match_id == self._pinned:
+                continue
+            del self._cache[match_id]
+            total -= sizes[match_id]
+            logger.info("Dropped prefetched match %s (%.1f MB)", match_id,
+                        sizes[match_id])
+
+    def __iter__(self) -> Iterator[MatchContext]:
+        for position, match_id in enumerate(self.match_ids):
+            yield self.get(match_id, position)
@@ -0,0 +1,302 @@
+"""
+This module builds the season-wide index of the players: the Sportradar
+player ID, the name, the normalized name, the role (e.g. "G" for
+goalkeepers) and the team of every player of a season.
+
+The goalkeeper filter of the template matching opened the profile file
+of every player of both teams in every match. The index is built once
+per season from the event summaries (the players of every team) and the
+player profiles (the roles), kept for the process and, with a file path
+(e.g. in the position cache), saved as compressed npz file:
+
+    roster = load_or_build_roster_index(profiles_dir, summaries_dir,
+                                        file_path)
+    roster.player_roles(player_ids)
+    roster.player_id("Igor Andersson", "THW Kiel")
+
+The position approaches resolve the player of an event with the index:
+the Sportradar ID of the player is the sensor ID of the position data, so
+the column of the player is found without fuzzy matching of the names.
+
+Author:
+    @Annabelle Runge
+
+Date:
+    2025-05-26
+"""
+import glob
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ROSTER_FILE = "roster_index.npz"
+ROSTER_COLUMNS = ["pids", "names", "normalized", "roles", "team_ids",
+                  "team_names"]
+UNKNOWN_ROLE = "Unknown"
+
+# The indices built in this process by directories and file
+_ROSTERS: dict[tuple[str, str, Optional[str]],
+               tuple[dict[str, Any], "RosterIndex"]] = {}
+
+
+def normalize_player_name(name: str) -> str:
+    """
+    Normalizes a player name like the name resolver of the position
+    approach, in lower case.
+
+    Args:
+        name: The name, "First Last" or "Last, First"
+
+    Returns:
+        str: The normalized name
+    """
+    from synchronization_approaches.pos_data_approach import normalize
+
+    return " ".join(normalize(name).lower().split())
+
+
+@dataclass
+class RosterIndex:
+    """
+    The players of a season.
+
+    Attributes:
+        pids (np.ndarray): The Sportradar IDs of the players without the
+        "sr:player:" prefix.
+        names (np.ndarray): The names.
+        normalized (np.ndarray): The normalized names.
+        roles (np.ndarray): The roles, "Unknown" without profile.
+        team_ids (np.ndarray): The Sportradar IDs of the teams.
+        team_names (np.ndarray): The names of the teams.
+    """
+
+    pids: np.ndarray
+    names: np.ndarray
+    normalized: np.ndarray
+    roles: np.ndarray
+    team_ids: np.ndarray
+    team_names: np.ndarray
+    _rows: dict[str, int] = field(init=False, repr=False)
+    _by_name: dict[tuple[str, str], list[str]] = field(init=False,
+                                                       repr=False)
+
+    def __post_init__(self) -> None:
+        self._rows = {str(pid): row for row, pid in enumerate(self.pids)}
+        self._by_name = {}
+        for pid, name, team in zip(self.pids, self.normalized,
+                                   self.team_names):
+            for key in ((str(team), str(name)), ("", str(name))):
+                self._by_name.setdefault(key, []).append(str(pid))
+
+    def __len__(self) -> int:
+        return len(self.pids)
+
+    def role(self, pid: Any, default: str = UNKNOWN_ROLE) -> str:
+        """
+        Returns the role of a player.
+
+        Args:
+            pid: The Sportradar ID of the player, with or without prefix
+            default: The role of unknown players
+
+        Returns:
+            str: The role
+        """
+        row = self._rows.get(str(pid).split(":")[-1])
+        return default if row is None else str(self.roles[row])
+
+    def player_roles(self, pids: Iterable[Any]) -> dict[Any, str]:
+        """
+        Returns the roles of several players.
+
+        Args:
+            pids: The Sportradar IDs of the players
+
+        Returns:
+            dict: The role of every player
+        """
+        return {pid: self.role(pid) for pid in pids}
+
+    def player_id(self, name: str,
+                  team_name: Optional[str] = None) -> Optional[str]:
+        """
+        Finds the Sportradar ID of a player by the name.
+
+        Args:
+            name: The name of the player
+            team_name: The name of the team, all teams if None
+
+        Returns:
+            str: The ID, None if no or several players have the name
+        """
+        pids = self._by_name.get((team_name or "",
+                                  normalize_player_name(name)), [])
+        return pids[0] if len(pids) == 1 else None
+
+    def save(self, file_path: str,
+             source: Optional[dict[str, Any]] = None) -> None:
+        """
+        Saves the index as compressed npz file.
+
+        Args:
+            file_path: The path of the npz file
+            source: The fingerprint of the profiles and summaries
+        """
+        np.savez_compressed(file_path,
+                            **{column: np.asarray(getattr(self, column),
+                                                  dtype=str)
+                               for column in ROSTER_COLUMNS},
+                            source=np.array(json.dumps(source)))
+
+    @classmethod
+    def load(cls, file_path: str,
+             source: Optional[dict[str, Any]] = None
+             ) -> Optional["RosterIndex"]:
+        """
+        Loads a saved index if it belongs to the profiles and summaries.
+
+        Args:
+            file_path: The path of the npz file
+            source: The fingerprint of the profiles and summaries, not
+            checked if None
+
+        Returns:
+            RosterIndex: The index, None if it has to be built
+        """
+        if not os.path.exists(file_path):
+            return None
+        with np.load(file_path) as data:
+            if (source is not None
+                    and json.loads(str(data["source"])) != source):
+                return None
+            return cls(*(data[column] for column in ROSTER_COLUMNS))
+
+
+def read_player_profile(profiles_dir: str, pid: str) -> dict[str, Any]:
+    """
+    Reads the profile of a player.
+
+    Args:
+        profiles_dir: The directory of the player profiles
+        pid: The Sportradar ID of the player without prefix
+
+    Returns:
+        dict: The profile, empty if it cannot be read
+    """
+    try:
+        with open(os.path.join(profiles_dir, f"players_{pid}_profile.json"),
+                  "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (json.JSONDecodeError, FileNotFoundError) as e:
+        logger.warning("Error loading profile for player %s: %s", pid, e)
+        return {}
+
+
+def build_roster_index(profiles_dir: str, summary_files: Iterable[str],
+                       player_ids: Iterable[str] = ()) -> RosterIndex:
+    """
+    Builds the index of the players of the event summaries and of further
+    players. Every profile is read once.
+
+    Args:
+        profiles_dir: The directory of the player profiles
+        summary_files: The Sportradar summary files of the season
+        player_ids: Further players, e.g. of a single match
+
+    Returns:
+        RosterIndex: The index
+    """
+    players: dict[str, dict[str, str]] = {}
+    for summary_file in summary_files:
+        with open(summary_file, "r", encoding="utf-8") as f:
+            summary = json.load(f)
+        competitors = summary.get("statistics", {}).get(
+            "totals", {}).get("competitors", [])
+        for team in competitors:
+            for player in team.get("players", []):
+                players[player["id"].split(":")[-1]] = {
+                    "name": player.get("name", ""),
+                    "team_id": team.get("id", ""),
+                    "team_name": team.get("name", "")}
+    for pid in player_ids:
+        players.setdefault(str(pid), {})
+
+    rows = []
+    for pid, player in players.items():
+        profile = read_player_profile(profiles_dir, pid)
+        details = profile.get("player", {})
+        if "type" not in details:
+            logger.debug("'type' not found for player %s", pid)
+        team = (profile.get("competitors") or [{}])[0]
+        name = player.get("name") or details.get("name", "")
+        rows.append((pid, name, normalize_player_name(name),
+                     details.get("type", UNKNOWN_ROLE),
+                     player.get("team_id") or team.get("id", ""),
+                     player.get("team_name") or team.get("name", "")))
+    columns = zip(*rows) if rows else [()] * len(ROSTER_COLUMNS)
+    return RosterIndex(*(np.array(column, dtype=str) for column in columns))
+
+
+def roster_source(profiles_dir: str,
+                  summary_files: list[str]) -> dict[str, Any]:
+    """
+    Returns the fingerprint of the profiles and summaries of a season.
+
+    Args:
+        profiles_dir: The directory of the player profiles
+        summary_files: The Sportradar summary files of the season
+
+    Returns:
+        dict: The modification times of the directories and files
+    """
+    def mtime(path: str) -> float:
+        return os.path.getmtime(path) if os.path.exists(path) else 0.0
+
+    return {"profiles": mtime(profiles_dir),
+            "summaries": len(summary_files),
+            "modified": max((mtime(path) for path in summary_files),
+                            default=0.0)}
+
+
+def load_or_build_roster_index(profiles_dir: str, summaries_dir: str,
+                               file_path: Optional[str] = None
+                               ) -> RosterIndex:
+    """
+    Returns the index of the players of a season. The index is built once
+    per process and, with a file path, saved and loaded again as long as
+    the profiles and summaries do not change.
+
+    Args:
+        profiles_dir: The directory of the player profiles
+        summaries_dir: The directory of the summaries of the season
+        file_path: The path of the npz file, not saved if None
+
+    Returns:
+        RosterIndex: The index
+    """
+    summary_files = sorted(glob.glob(os.path.join(
+        summaries_dir, "sport_events_*_summary.json")))
+    source = roster_source(profiles_dir, summary_files)
+    key = (profiles_dir, summaries_dir, file_path)
+    if key in _ROSTERS and _ROSTERS[key][0] == source:
+        return _ROSTERS[key][1]
+    roster = (RosterIndex.load(file_path, source)
+              if file_path is not None else None)
+    if roster is None:
+        roster = build_roster_index(profiles_dir, summary_files)
+        if file_path is not None:
+            try:
+                roster.save(file_path, source)
+                logger.info("Saved %s players of %s summaries %s",
+                            len(roster), len(summary_files), file_path)
+            except OSError as e:
+                logger.warning("Could not save the roster index %s: %s",
+                               file_path, e)
+    _ROSTERS[key] = (source, roster)
+    return roster
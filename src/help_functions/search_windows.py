@@ -0,0 +1,164 @@
+"""
+This module holds the search windows and the baseline offsets of the
+event types.
+
+The Sportradar timestamps of the events are late by a few seconds,
+depending on the event type. The position and the cost approach search
+the frames before every event for its true frame, the baseline approach
+shifts every event by the mean offset of its type. Instead of one
+hard-coded lookback for all events and hard-coded means, the windows and
+offsets are calibrated on the annotated matches
+(evaluation.calibrate_windows) and saved as JSON file, which the
+approaches load at the start of a match:
+
+    windows = load_search_windows(file_path)
+    before = windows.before_frames(event_types, default=499)
+
+Event types without a calibrated window use the default of the approach,
+event types without a calibrated offset the former constant means.
+
+Author:
+    @Annabelle Runge
+
+Date:
+    2025-05-26
+"""
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SEARCH_WINDOWS_FILE = "search_windows.json"
+SEARCH_WINDOWS_VERSION = 1
+
+# Mean offsets (annotated - Sportradar frame) of the event types
+BASELINE_OFFSETS = {
+    'break_start': -359,
+    'match_started': -258983,
+    'red_card': -260,
+    'score_change': -109,
+    'seven_m_awarded': -469,
+    'seven_m_missed': -74,
+    'shot_blocked': -142,
+    'shot_off_target': -237,
+    'shot_saved': -251,
+    'steal': -257,
+    'substitution ': -5,
+    'suspension': -386,
+    'suspension_over': -384,
+    'technical_ball_fault': -245,
+    'technical_rule_fault': -258,
+    'timeout': -284,
+    'timeout_over': -29,
+    'yellow_card': -268
+}
+
+
+@dataclass
+class SearchWindows:
+    """
+    The search windows and the baseline offsets of the event types.
+
+    Attributes:
+        before (dict): Number of frames before an event of the type that
+        are searched.
+        baseline (dict): The mean offset of the type in frames.
+        quantile (float): The quantile of the offsets the windows cover,
+        None if not calibrated.
+    """
+
+    before: dict[str, int] = field(default_factory=dict)
+    baseline: dict[str, int] = field(
+        default_factory=lambda: dict(BASELINE_OFFSETS))
+    quantile: Optional[float] = None
+
+    def before_frames(self, event_types: Iterable[Any],
+                      default: int) -> np.ndarray:
+        """
+        Returns the number of frames before every event that are
+        searched.
+
+        Args:
+            event_types: The types of the events
+            default: The window of the approach for types without a
+            calibrated window
+
+        Returns:
+            np.ndarray: The window of every event
+        """
+        return np.array([self.before.get(event_type, default)
+                         for event_type in event_types], dtype=np.int64)
+
+    def save(self, file_path: str) -> None:
+        """
+        Saves the windows and the offsets as JSON file.
+
+        Args:
+            file_path: The path of the JSON file
+        """
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump({"version": SEARCH_WINDOWS_VERSION,
+                       "quantile": self.quantile, "before": self.before,
+                       "baseline": self.baseline}, f, indent=2,
+                      default=int)
+
+    @classmethod
+    def load(cls, file_path: str) -> "SearchWindows":
+        """
+        Loads saved windows and offsets. Offsets that were not
+        calibrated keep the constant means.
+
+        Args:
+            file_path: The path of the JSON file
+
+        Returns:
+            SearchWindows: The windows and the offsets
+        """
+        with open(file_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != SEARCH_WINDOWS_VERSION:
+            raise ValueError(f"Unknown search window file version "
+                             f"{data.get('version')} in {file_path}")
+        return cls({key: int(value) for key, value
+                    in data["before"].items()},
+                   {**BASELINE_OFFSETS,
+                    **{key: int(value) for key, value
+                       in data["baseline"].items()}},
+                   data.get("quantile"))
+
+
+def search_windows_path(base_path: str = r"D:\Handball") -> str:
+    """
+    Returns the path of the calibration file of a data directory.
+
+    Args:
+        base_path: The directory of the handball data
+
+    Returns:
+        str: The path of search_windows.json in HBL_Synchronization
+    """
+    return os.path.join(base_path, "HBL_Synchronization", SEARCH_WINDOWS_FILE)
+
+
+def load_search_windows(file_path: Optional[str]) -> SearchWindows:
+    """
+    Loads the calibrated windows and offsets, the defaults if there is no
+    calibration file.
+
+    Args:
+        file_path: The path of the JSON file
+
+    Returns:
+        SearchWindows: The windows and the offsets
+    """
+    if file_path is None or not os.path.exists(file_path):
+        return SearchWindows()
+    windows = SearchWindows.load(file_path)
+    logger.info("Loaded search windows of %s event types from %s",
+                len(windows.before), file_path)
+    return windows
@@ -0,0 +1,257 @@
+"""
+This module publishes the loaded position data of a match in shared
+memory, so that worker processes can use it without a copy.
+
+The position arrays of a full match (all players of both teams and the
+ball at 20 Hz) are the largest inputs of the synchronization. Pickling
+them to every worker process would duplicate them per worker. Instead,
+publish_context() copies every array once into a
+`multiprocessing.shared_memory` block and returns a small, picklable
+SharedMatch with the names, shapes and dtypes of the blocks and the
+small inputs of the match (meta data, events, sequences, summary,
+search windows, roster, gap indices). The full-match distance and cost
+pyramids are computed once by the publisher and shared as blocks, too.
+attach_context() creates a MatchContext in the worker whose XY objects,
+ball arrays and pyramids are read-only views of the shared blocks.
+
+Author:
+    @Annabelle Runge
+
+Date:
+    2025-05-24
+"""
+import dataclasses
+import sys
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+from typing import Any, Optional
+
+import numpy as np
+
+from help_functions.match_context import MatchContext
+from help_functions.min_pyramid import MinPyramid
+
+# The pyramids of the context that are shared as blocks
+SHARED_PYRAMIDS = ("distance_pyramid", "cost_pyramid")
+# The small derived inputs of the context that are pickled
+SHARED_DATA = ("match_row", "meta_data", "xids", "event_stream",
+               "sequences", "summary", "lookup", "search_windows",
+               "roster", "gaps")
+
+
+@dataclass(frozen=True)
+class SharedArray:
+    """
+    The description of an array in a shared memory block.
+
+    Attributes:
+        name (str): The name of the shared memory block.
+        shape (tuple): The shape of the array.
+        dtype (str): The dtype of the array.
+    """
+
+    name: str
+    shape: tuple[int, ...]
+    dtype: str
+
+
+@dataclass
+class SharedMatch:
+    """
+    The picklable handle of a match published in shared memory.
+
+    Attributes:
+        context (MatchContext): The match context without loaded data.
+        positions (list): The shared XY arrays of all groups with their
+        framerate and direction.
+        ball (tuple): The shared ball positions and ball acceleration.
+        data (dict): The small loaded inputs of the match, which are
+        pickled to the workers.
+        pyramids (dict): The shared values, missing counts and levels of
+        every pyramid with its factors and columns, by name.
+    """
+
+    context: MatchContext
+    positions: list[tuple[SharedArray, Any, Any]]
+    ball: tuple[SharedArray, SharedArray]
+    data: dict[str, Any] = field(default_factory=dict)
+    pyramids: dict[str, tuple[list[SharedArray], tuple[int, ...],
+                              dict[Any, int]]] = field(default_factory=dict)
+    _blocks: list[shared_memory.SharedMemory] = field(
+        default_factory=list, repr=False)
+
+    def __getstate__(self) -> dict[str, Any]:
+        # The blocks are owned by the publishing process
+        state = self.__dict__.copy()
+        state["_blocks"] = []
+        return state
+
+    @property
+    def key(self) -> str:
+        """The name of the first block, which identifies the publication."""
+        return self.ball[0].name
+
+    def nbytes(self) -> int:
+        """
+        Returns the size of all shared arrays.
+
+        Returns:
+            int: The size in bytes
+        """
+        arrays = ([array for array, _, _ in self.positions] +
+                  list(self.ball) +
+                  [array for shared, _, _ in self.pyramids.values()
+                   for array in shared])
+        return sum(int(np.prod(array.shape)) * np.dtype(array.dtype).itemsize
+                   for array in arrays)
+
+    def close(self) -> None:
+        """
+        Releases the shared memory blocks. Must be called by the
+        publishing process once all workers are done.
+        """
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks.clear()
+
+
+def _share(array: np.ndarray,
+           blocks: list[shared_memory.SharedMemory]) -> SharedArray:
+    """
+    Copies an array into a new shared memory block.
+
+    Args:
+        array: The array
+        blocks: The blocks of the match, the new block is appended
+
+    Returns:
+        SharedArray: The description of the shared array
+    """
+    array = np.ascontiguousarray(array)
+    block = shared_memory.SharedMemory(create=True,
+                                       size=max(array.nbytes, 1))
+    blocks.append(block)
+    np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+    return SharedArray(block.name, array.shape, array.dtype.str)
+
+
+def publish_context(context: MatchContext) -> SharedMatch:
+    """
+    Loads the data of a match, computes its derived indices and
+    publishes the position, ball and pyramid arrays in shared memory.
+
+    Args:
+        context: The match context
+
+    Returns:
+        SharedMatch: The handle of the shared match, which has to be
+        closed by the caller
+    """
+    context.load()
+    for name in ("xids", "search_windows", "roster", "gaps"):
+        getattr(context, name)
+    blocks: list[shared_memory.SharedMemory] = []
+    try:
+        positions = [(_share(xy.xy, blocks), xy.framerate, xy.direction)
+                     for xy in context.pos_data]
+        ball = (_share(context.ball_positions, blocks),
+                _share(context.ball_acceleration, blocks))
+        pyramids = {}
+        for name in SHARED_PYRAMIDS:
+            pyramid = getattr(context, name)
+            pyramids[name] = (
+                [_share(array, blocks) for array
+                 in [pyramid.values, pyramid.missing, *pyramid.levels]],
+                pyramid.factors, pyramid.columns)
+    except BaseException:
+        for block in blocks:
+            block.close()
+            block.unlink()
+        raise
+    data = {name: context.__dict__[name] for name in SHARED_DATA
+            if name in context.__dict__}
+    # A fresh context with the same files, cache and calibration
+    return SharedMatch(dataclasses.replace(context), positions, ball, data,
+                       pyramids, blocks)
+
+
+def _attach_block(name: str) -> shared_memory.SharedMemory:
+    """
+    Attaches to an existing shared memory block without taking over its
+    ownership.
+
+    Args:
+        name: The name of the block
+
+    Returns:
+        SharedMemory: The attached block
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    # Before Python 3.13 every process that attaches registers the block
+    # with the resource tracker, which then unlinks it when the worker
+    # exits or, for forked workers that share the tracker of the main
+    # process, fails to unregister it when the main process unlinks it
+    from multiprocessing import resource_tracker
+
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args, **kwargs: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _view(array: SharedArray, blocks: list[shared_memory.SharedMemory]
+          ) -> np.ndarray:
+    """
+    Creates a read-only view of a shared array.
+
+    Args:
+        array: The description of the shared array
+        blocks: The attached blocks, the block of the array is appended
+
+    Returns:
+        np.ndarray: The read-only view
+    """
+    block = _attach_block(array.name)
+    blocks.append(block)
+    view = np.ndarray(array.shape, np.dtype(array.dtype), buffer=block.buf)
+    view.flags.writeable = False
+    return view
+
+
+def attach_context(shared: SharedMatch,
+                   blocks: Optional[list[shared_memory.SharedMemory]] = None
+                   ) -> MatchContext:
+    """
+    Creates the context of a shared match in a worker process. The XY
+    objects, the ball arrays and the pyramids are read-only views of the
+    shared memory, all other data is taken from the handle.
+
+    Args:
+        shared: The handle of the shared match
+        blocks: List that keeps the attached blocks open, they have to
+        stay referenced as long as the context is used
+
+    Returns:
+        MatchContext: The context with the loaded data
+    """
+    from floodlight import XY
+
+    blocks = [] if blocks is None else blocks
+    context = dataclasses.replace(shared.context)
+    context.__dict__.update(shared.data)
+    context.__dict__["pos_data"] = [
+        XY(xy=_view(array, blocks), framerate=framerate, direction=direction)
+        for array, framerate, direction in shared.positions]
+    context.__dict__["ball"] = tuple(_view(array, blocks)
+                                     for array in shared.ball)
+    for name, (arrays, factors, columns) in shared.pyramids.items():
+        values, missing, *levels = [_view(array, blocks)
+                                    for array in arrays]
+        context.__dict__[name] = MinPyramid.from_arrays(
+            values, levels, missing, factors, columns)
+    context.__dict__["_shared_blocks"] = blocks
+    return context
@@ -10,9 +10,16 @@ Author:
 Date:
     2025-04-01
 """
+import argparse
+import os
+
 import main_structure
 # import plot_functions.plot_phases as plot_phases
 import variables.data_variables as dv
+from help_functions.headless import enable_headless_mode
+from help_functions.instrumentation import (configure_logging, flame_summary,
+                                            load_reports, run_report,
+                                            write_folded)
 
 # plot_phases.plot_phases(23400263, dv.Approach.RULE_BASED)
 # plot_phases.plotEvents(23400263)
@@ -48,8 +55,46 @@ match_ids_20_21 = [
 ]
 match_ids_20_21_not_working = [23400749]
 
-for match_id in match_ids_20_21:
-    main_structure.approach_plot(match_id, dv.Approach.POS_DATA)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Synchronize and plot all matches of the season.')
+    parser.add_argument('--headless', action='store_true',
+                        help='Close the figures instead of showing them')
+    parser.add_argument('--log-level', default='INFO',
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help='DEBUG shows the per-event messages')
+    parser.add_argument('--report-dir',
+                        help='Directory for the run reports and the '
+                        'season flame summary')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='Measure the peak memory of every stage')
+    args = parser.parse_args()
+
+    if args.headless:
+        enable_headless_mode()
+    configure_logging(args.log_level)
+    approach = dv.Approach.POS_DATA
+    for match_id in match_ids_20_21:
+        if args.report_dir is None:
+            main_structure.approach_plot(match_id, approach)
+            continue
+        os.makedirs(args.report_dir, exist_ok=True)
+        name = f"{match_id}_{approach.name}"
+        with run_report(name, args.trace_memory,
+                        os.path.join(args.report_dir, f"run_{name}.json"),
+                        os.path.join(args.report_dir, f"run_{name}.csv")):
+            main_structure.approach_plot(match_id, approach)
+
+    if args.report_dir is not None:
+        season = flame_summary(load_reports([
+            os.path.join(args.report_dir, f"run_{match_id}_{approach.name}"
+                         ".json") for match_id in match_ids_20_21]))
+        season.to_csv(os.path.join(args.report_dir, "season_summary.csv"),
+                      index=False)
+        write_folded(season, os.path.join(args.report_dir,
+                                          "season_folded.txt"))
+        print(season.sort_values("wall", ascending=False).to_string(
+            index=False, float_format="{:.3f}".format))
 
 # main_structure.approach_plot(23400439, dv.Approach.POS_RB)
 
@@ -1,8 +1,6 @@
 import json
 import os
-from typing import Any
-
-from matplotlib import pyplot as plt
+from typing import Any, Optional
 
 import synchronization_approaches.pos_data_approach as pos_data_approach
 import variables.data_variables as dv
@@ -11,11 +9,15 @@ from help_functions.floodlight_code import (add_team_to_events,
                                             adjust_timestamp_baseline,
                                             calculate_event_stream,
                                             calculate_team_order)
-from old_code import cost_function_approach
-from plot_functions import processing
+from help_functions.headless import show_or_close
+from help_functions.instrumentation import span
+from help_functions.search_windows import (load_search_windows,
+                                           search_windows_path)
+from plot_functions import html_timeline, phase_renderer, processing
 from plot_functions.plot_phases import berechne_phase_und_speichern_fl
 from sport_analysis import sport_analysis_overall
-from synchronization_approaches import cost_function_approach_2, rule_based
+from synchronization_approaches import (cost_alignment_approach,
+                                        cost_function_approach_2, rule_based)
 from synchronization_approaches.correction_extension import correct_events_fl
 
 
@@ -32,44 +34,54 @@ def approach_plot(match_id: int, approach: dv.Approach
     Returns:
         None
     """
+    with span("calculate_sequences") as counts:
+        sequences = processing.calculate_sequences(match_id)
+        counts["sequences"] = len(sequences)
     (events, sequences, datei_pfad) = (handle_approach(
-        approach, processing.calculate_sequences(match_id),
-        match_id, os.path.join(base_path, r"Datengrundlagen")))
-    events = sportanalysis.evaluation_of_players_on_field(
-        match_id, events, sequences)
-    events = sportanalysis.evaluate_phase_events(events, sequences)
-    events = sportanalysis.next_phase(events, sequences)
+        approach, sequences, match_id,
+        os.path.join(base_path, r"Datengrundlagen")))
+    with span("players_on_field", events=len(events)):
+        events = sportanalysis.evaluation_of_players_on_field(
+            match_id, events, sequences)
+    with span("phase_events", events=len(events)):
+        events = sportanalysis.evaluate_phase_events(events, sequences)
+        events = sportanalysis.next_phase(events, sequences)
     plot_phases(events, sequences, datei_pfad, match_id, approach)
     if approach == dv.Approach.COST_BASED:
 
-        events1, sequences = correct_events_fl(events, sequences)
-        events1 = sportanalysis.evaluation_of_players_on_field(
-            match_id, events1, sequences)
-        events1 = sportanalysis.evaluate_phase_events(events1, sequences)
+        with span("correction"):
+            events1, sequences = correct_events_fl(events, sequences)
+            events1 = sportanalysis.evaluation_of_players_on_field(
+                match_id, events1, sequences)
+            events1 = sportanalysis.evaluate_phase_events(events1, sequences)
         datei_pfad = os.path.join(os.path.join(base_path, r"Datengrundlagen"),
                                   r"cost_based_cor",
                                   (str(match_id) + "_cost_based_cor_fl.csv"))
         plot_phases(events1, sequences, datei_pfad, match_id, approach)
-        events2, sequences = rule_based.synchronize_events_fl_rule_based(
-            events, sequences)
+        with span("rule_based"):
+            events2, sequences = rule_based.synchronize_events_fl_rule_based(
+                events, sequences)
         datei_pfad = os.path.join(os.path.join(base_path, r"Datengrundlagen"),
                                   r"cost_based_rb",
                                   (str(match_id) + "_cost_based_rb_fl.csv"))
-        events2 = sportanalysis.evaluation_of_players_on_field(
-            match_id, events, sequences)
-        events2 = sportanalysis.evaluate_phase_events(events2, sequences)
+        with span("phase_events"):
+            events2 = sportanalysis.evaluation_of_players_on_field(
+                match_id, events, sequences)
+            events2 = sportanalysis.evaluate_phase_events(events2, sequences)
         plot_phases(events2, sequences, datei_pfad, match_id, approach)
 
 
 def plot_phases(events: Any, sequences: list[tuple[int, int, int]],
                 datei_pfad: str, match_id: int, approach: dv.Approach
                 = dv.Approach.RULE_BASED,
-                base_path: str = r"D:\Handball\HBL_Events\season_20_21"
-                ) -> None:
+                base_path: str = r"D:\Handball\HBL_Events\season_20_21",
+                html_dir: Optional[str] = None) -> None:
     """
     Plots the phases of a handball match along with event markers.
     Args:
         match_id (int): The ID of the match.
+        html_dir (str, optional): Directory for an interactive HTML
+        timeline of the match. No HTML file is written if None.
     Returns:
         None
     This function performs the following steps:
@@ -77,156 +89,59 @@ def plot_phases(events: Any, sequences: list[tuple[int, int, int]],
     2. Converts event frame numbers to absolute timestamps.
     3. Loads positional data and phasse predictions.
     4. Calculates sequences of game phases.
-    5. Defines positions and labels for each phase.
-    6. Defines event colors based on categories.
-    7. Initializes lists to hold x (time) and y (position) values for a
-    continuous line.
-    8. Fills in x_vals and y_vals for a continuous line.
-    9. Creates the plot and adds event markers with labels from `type`.
-    10. Customizes the plot and shows it.
-    Note:
-        The function assumes the existence of several helper functions
-        and modules such as `helpFuctions`, `np`, `plt`, and `Code`.
+    5. Saves the analysis results and the phases of the events.
+    6. Draws the phase line and one marker layer per event type with
+    `phase_renderer` and shows the plot.
+    7. Optionally exports the timeline as interactive HTML file with
+    `html_timeline`.
     """
 
-    combined_results = sport_analysis_overall.create_combined_statistics(
-        events, match_id)
-
-    # Define positions for each phase
-    phase_positions = {
-        0: 2,  # (inac)
-        1: 3,  # (CATT-A)
-        2: 1,  # (CATT-B)
-        3: 4,  # (PATT-A)
-        4: 0,  # (PATT-B)
-    }
-    phase_labels = {2: "inac", 3: "CATT-A",
-                    1: "CATT-B", 4: "PATT-A", 0: "PATT-B"}
-    # Define event colors based on categories
-    event_colors = {
-        "score_change": "dodgerblue",
-        "suspension": "purple",
-        "suspension_over": "darkviolet",
-        "technical_rule_fault": "gold",
-        "technical_ball_fault": "orange",
-        "steal": "limegreen",
-        "shot_saved": "mediumblue",
-        "shot_off_target": "crimson",
-        "shot_blocked": "red",
-        "seven_m_awarded": "deeppink",
-        "seven_m_missed": "hotpink",
-        "yellow_card": "yellow",
-        "red_card": "darkred",
-        "timeout": "cyan",
-        "timeout_over": "cyan",
-        "subsitution": "black",
-        # Default for all other events
-        "default": "grey",
-    }
-    x_vals = []
-    y_vals = []
+    # pyplot is imported here so that the synchronization does not load it
+    from matplotlib import pyplot as plt
 
-    # Fill in x_vals and y_vals for a continuous line
-    for start, end, phase in sequences:
-        # Append start of phase
-        x_vals.append(start)
-        y_vals.append(phase_positions[phase])
+    with span("statistics", events=len(events)):
+        combined_results = (
+            sport_analysis_overall.create_combined_statistics(
+                events, match_id))
 
-        # Append end of phase
-        x_vals.append(end)
-        y_vals.append(phase_positions[phase])
-
-    # Create the plot
-    _, ax = plt.subplots(figsize=(14, 4))
-
-    # Plot the continuous line
-    ax.plot(x_vals, y_vals, color="black", linewidth=2)
-
-    # Track labels to avoid duplicates in the legend
-    added_labels = set()
     # Save analysis results to a JSON file
-    analysis_results_path = os.path.join(
-        base_path, r"Analysis_results",
-        f"analysis_results_{match_id}_{approach.name}.json")
-    with open(analysis_results_path, 'w', encoding='utf-8') as f:
-        json.dump(combined_results, f, ensure_ascii=False, indent=4)
-    berechne_phase_und_speichern_fl(events, sequences, datei_pfad)
-    # Add event markers with labels from `type`
-    if hasattr(events, 'values'):
-        for event in events.values:
-            # Find the y value on the continuous line for this event's time
-            event_y = None
-            for start, end, phase in sequences:
-                if start <= event[24] < end:
-                    event_y = phase_positions[phase]
-
-                    break
-            if event_y is not None:
-                ax.plot(
-                    event[24],
-                    event_y,
-                    "x",
-                    color=event_colors.get(event[0], event_colors["default"]),
-                    markersize=8,
-                    label=event[0] if event[0] not in added_labels else "",
-                )
-                added_labels.add(event[0])
-        # Add legend
-        ax.legend(title="Event Types", loc="upper right",
-                  bbox_to_anchor=(1.15, 1))
-
-        # Customize the plot
-        ax.axhline(0, color="grey", linewidth=0.5)
-        ax.set_yticks(sorted(set(phase_positions.values())))
-        ax.set_yticklabels(
-            [phase_labels[phase] for phase in sorted(phase_positions.keys())]
-        )
-        ax.set_xlabel("Timeframe")
-        ax.set_title("Continuous Game phase Timeline")
-
-        # Set x-axis limit to show only from 0 to 2000
-        ax.set_xlim(6000, 50000)
-        # Show plot
-        plt.show()
-    else:
-        for event in events:
-            # Find the y value on the continuous line for this event's time
-            event_y = None
-            for start, end, phase in sequences:
-
-                if start <= event["time"] < end:
-                    event_y = phase_positions[phase]
-
-                    break
-            if event_y is not None:
-                ax.plot(
-                    event["time"],
-                    event_y,
-                    "x",
-                    color=event_colors.get(
-                        event["type"], event_colors["default"]),
-                    markersize=8,
-                    label=(event["type"] if event["type"]
-                           not in added_labels else ""),
-                )
-                added_labels.add(event["type"])
-        # Add legend
-        ax.legend(title="Event Types", loc="upper right",
-                  bbox_to_anchor=(1.15, 1))
-
-        # Customize the plot
-        ax.axhline(0, color="grey", linewidth=0.5)
-        ax.set_yticks(sorted(set(phase_positions.values())))
-        ax.set_yticklabels(
-            [phase_labels[phase] for phase in sorted(phase_positions.keys())]
-        )
-        ax.set_xlabel("Timeframe")
-        ax.set_title("Continuous Game phase Timeline")
-
-        # Set x-axis limit to show only from 0 to 2000
-        ax.set_xlim(6000, 50000)
-        # Show plot
-        # plt.show()
+    with span("save_results"):
+        analysis_results_path = os.path.join(
+            base_path, r"Analysis_results",
+            f"analysis_results_{match_id}_{approach.name}.json")
+        with open(analysis_results_path, 'w', encoding='utf-8') as f:
+            json.dump(combined_results, f, ensure_ascii=False, indent=4)
+        berechne_phase_und_speichern_fl(events, sequences, datei_pfad)
+
+    # Create the plot with the phase line and one marker layer per event
+    # type
+    with span("plot"):
+        _, ax = plt.subplots(figsize=(14, 4))
+        phase_renderer.draw_timeline(ax, sequences, events)
+        if html_dir is not None:
+            html_timeline.export_html_timeline(
+                sequences, {approach.name: events},
+                os.path.join(html_dir,
+                             f"timeline_{match_id}_{approach.name}.html"),
+                match_id)
+        if hasattr(events, 'values'):
+            # Show plot
+            show_or_close()
+
+
+# Folder and file suffix of the results of every approach
+APPROACH_FILES = {
+    dv.Approach.NONE: ("none", "none"),
+    dv.Approach.BASELINE: ("baseline", "bl"),
+    dv.Approach.RULE_BASED: ("rulebased", "rb"),
+    dv.Approach.POS_DATA: ("pos", "pos"),
+    dv.Approach.POS_RB: ("pos_rb", "pos_rb"),
+    dv.Approach.POS_CORRECTION: ("pos_cor", "pos_cor"),
+    dv.Approach.COST_BASED: ("cost_based", "cost_based"),
+    dv.Approach.COST_BASED_COR: ("cost_based_cor", "cost_based_cor"),
+    dv.Approach.COST_BASED_RB: ("cost_based_rb", "cost_based_rb"),
+    dv.Approach.COST_BASED_DP: ("cost_based_dp", "cost_based_dp"),
+}
 
 
 def handle_approach(approach: dv.Approach,
@@ -248,110 +163,121 @@ def handle_approach(approach: dv.Approach,
         containing the events,
         the sequences, and the datei_pfad.
     """
-    # BASELINE NONE APPROACH
-    if approach == dv.Approach.NONE:
+    # INVALID APPROACH
+    if approach not in APPROACH_FILES:
+        raise ValueError("Invalid approach specified!")
+
+    with span("load_events") as counts:
         (_, _, events) = calculate_event_stream(match_id)
         team_order = calculate_team_order(events)
         events = add_team_to_events(events, team_order)
-        datei_pfad = os.path.join(
-            datengrundlage, r"none", (str(match_id) + "_none_fl.csv"))
+        counts["events"] = len(events)
+    with span(f"synchronize:{approach.name}", events=len(events),
+              sequences=len(sequences),
+              frames=sequences[-1][1] if sequences else 0):
+        events, sequences = synchronize_approach(approach, events,
+                                                 sequences, match_id)
+
+    folder, suffix = APPROACH_FILES[approach]
+    datei_pfad = os.path.join(datengrundlage, folder,
+                              f"{match_id}_{suffix}_fl.csv")
+    return events, sequences, datei_pfad
+
+
+def synchronize_approach(approach: dv.Approach, events: Any,
+                         sequences: list[tuple[int, int, int]],
+                         match_id: int, context: Optional[Any] = None,
+                         candidates: bool = False
+                         ) -> tuple[Any, list[tuple[int, int, int]]]:
+    """
+    Synchronizes the events of a match with one approach.
+    Args:
+        approach (dv.Approach): The approach to use for
+        synchronization
+        events (pd.DataFrame): The events with the team column
+        sequences (list[tuple[int, int, int]]): The sequences
+        to use for synchronization
+        match_id (int): The match ID to use for synchronization
+        context (MatchContext, optional): The already loaded data of the
+        match. The position data is loaded from the files of the match
+        if None.
+        candidates (bool): Whether the cost based approach scores only
+        the ball event candidates of the context in the window of an
+        event instead of every frame.
+    Returns:
+        tuple[Any, list[tuple[int, int, int]]]: The synchronized events
+        and the sequences.
+    """
+    # BASELINE NONE APPROACH
+    if approach == dv.Approach.NONE:
+        pass
 
     # BASELINE MEAN APPROACH
     elif approach == dv.Approach.BASELINE:
-        (_, _, events) = calculate_event_stream(match_id)
-        team_order = calculate_team_order(events)
-        events = add_team_to_events(events, team_order)
-        events = adjust_timestamp_baseline(events)
-
-        datei_pfad = os.path.join(datengrundlage, r"baseline",
-                                  (str(match_id) + "_bl_fl.csv"))
+        search_windows = (load_search_windows(search_windows_path())
+                          if context is None else context.search_windows)
+        events = adjust_timestamp_baseline(events, search_windows.baseline)
 
     # RULE BASED APPROACH
     elif approach == dv.Approach.RULE_BASED:
-        (_, _, events) = calculate_event_stream(match_id)
-        # print(events)
-        team_order = calculate_team_order(events)
-        events = add_team_to_events(events, team_order)
-        events, sequences = rule_based.synchronize_events_fl_rule_based(
-            events, sequences)
-
-        datei_pfad = os.path.join(datengrundlage, r"rulebased",
-                                  (str(match_id) + "_rb_fl.csv"))
-
-    # POSITIONAL DATA APPROACH
-    elif approach == dv.Approach.POS_DATA:
-        (_, _, events) = calculate_event_stream(match_id)
-        datei_pfad = os.path.join(datengrundlage, r"pos",
-                                  (str(match_id) + "_pos_fl.csv"))
-        team_order = calculate_team_order(events)
-        events = add_team_to_events(events, team_order)
-        events = pos_data_approach.sync_event_data_pos_data(
-            events, match_id)
-
-    # POSITIONAL RB APPROACH
-    elif approach == dv.Approach.POS_RB:
-        (_, _, events) = calculate_event_stream(match_id)
-        team_order = calculate_team_order(events)
-        events = add_team_to_events(events, team_order)
-        events = pos_data_approach.sync_event_data_pos_data(
-            events, match_id)
-
         events, sequences = rule_based.synchronize_events_fl_rule_based(
             events, sequences)
-        datei_pfad = os.path.join(datengrundlage, r"pos_rb",
-                                  (str(match_id) + "_pos_rb_fl.csv")
-                                  )
-    # POSITIONAL CORRECTION APPROACH
-    elif approach == dv.Approach.POS_CORRECTION:
-        (_, _, events) = calculate_event_stream(match_id)
-        team_order = calculate_team_order(events)
-        events = add_team_to_events(events, team_order)
-        events = pos_data_approach.sync_event_data_pos_data(
-            events, match_id)
-        events, sequences = correct_events_fl(events, sequences)
 
-        datei_pfad = os.path.join(datengrundlage, r"pos_cor",
-                                  (str(match_id) + "_pos_cor_fl.csv"))
+    # POSITIONAL DATA APPROACHES
+    elif approach in (dv.Approach.POS_DATA, dv.Approach.POS_RB,
+                      dv.Approach.POS_CORRECTION):
+        if context is None:
+            events = pos_data_approach.sync_event_data_pos_data(
+                events, match_id)
+        else:
+            events = pos_data_approach.sync_events_with_positions(
+                events, context.pos_data, context.pid_dict,
+                context.ball_positions, pyramid=context.distance_pyramid,
+                gaps=context.gaps, search_windows=context.search_windows,
+                roster=context.roster)
+        if approach == dv.Approach.POS_RB:
+            events, sequences = rule_based.synchronize_events_fl_rule_based(
+                events, sequences)
+        elif approach == dv.Approach.POS_CORRECTION:
+            events, sequences = correct_events_fl(events, sequences)
 
     # COST BASED APPROACH
     elif approach == dv.Approach.COST_BASED:
-        (_, _, events) = calculate_event_stream(match_id)
-        team_order = calculate_team_order(events)
-        events = add_team_to_events(events, team_order)
-        events = cost_function_approach_2.main(match_id, events)
-        # events = cost_function_approach.sync_events_cost_function(
-        #     events, sequences, match_id)
-
-        datei_pfad = os.path.join(datengrundlage, r"cost_based",
-                                  (str(match_id) + "_cost_based_fl.csv"))
-
-    # COST BASED CORRECTION APPROACH
-    elif approach == dv.Approach.COST_BASED_COR:
-        (_, _, events) = calculate_event_stream(match_id)
-        team_order = calculate_team_order(events)
-        events = add_team_to_events(events, team_order)
+        if context is None:
+            events = cost_function_approach_2.main(match_id, events)
+        else:
+            events = cost_function_approach_2.sync_events_cost(
+                events, context.pos_data, context.pid_dict, context.xids,
+                context.ball_positions, context.ball_acceleration,
+                candidates=(context.ball_candidates if candidates
+                            else None),
+                pyramid=context.cost_pyramid, gaps=context.gaps,
+                search_windows=context.search_windows)
+
+    # COST BASED CORRECTION AND RB APPROACHES
+    elif approach in (dv.Approach.COST_BASED_COR, dv.Approach.COST_BASED_RB):
+        from old_code import cost_function_approach
         events = cost_function_approach.sync_events_cost_function(
-            events, sequences, match_id)
-        events, sequences = correct_events_fl(events, sequences)
-
-        datei_pfad = os.path.join(datengrundlage, r"cost_based_cor",
-                                  (str(match_id) + "_cost_based_cor_fl.csv"))
-
-    # COST BASED RB APPROACH
-    elif approach == dv.Approach.COST_BASED_RB:
-        (_, _, events) = calculate_event_stream(match_id)
-        team_order = calculate_team_order(events)
-        events = add_team_to_events(events, team_order)
-
-        events = cost_function_approach.sync_events_cost_function(
-            events, sequences, match_id)
-        events, sequences = rule_based.synchronize_events_fl_rule_based(
-            events, sequences)
-
-        datei_pfad = os.path.join(datengrundlage, r"cost_based_rb",
-                                  (str(match_id) + "_cost_based_rb_fl.csv"))
+            events, sequences, match_id,
+            None if context is None else (context.pos_data,
+                                          context.pid_dict))
+        if approach == dv.Approach.COST_BASED_COR:
+            events, sequences = correct_events_fl(events, sequences)
+        else:
+            events, sequences = rule_based.synchronize_events_fl_rule_based(
+                events, sequences)
+
+    # COST BASED ALIGNMENT APPROACH
+    elif approach == dv.Approach.COST_BASED_DP:
+        if context is None:
+            events = cost_alignment_approach.main(match_id, events,
+                                                  sequences)
+        else:
+            events = cost_alignment_approach.sync_events_alignment(
+                events, sequences, context.pos_data, context.pid_dict,
+                context.ball_positions, roster=context.roster)
 
     # INVALID APPROACH
     else:
         raise ValueError("Invalid approach specified!")
-    return events, sequences, datei_pfad
+    return events, sequences
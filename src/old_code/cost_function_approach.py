@@ -9,7 +9,7 @@ Author:
 Date:
     2025-04-01
 """
-from typing import Any, List, Tuple
+from typing import Any, List, Optional, Tuple
 
 import floodlight
 import floodlight.io.kinexon as fliok
@@ -58,6 +58,7 @@ def sigmoid(
 def calculate_cost_matrix(events: pd.DataFrame,
                           sequences: List[Tuple[int, int, int]],
                           match_id: int,
+                          position_data: Optional[tuple[Any, Any]] = None
                           ) -> np.ndarray:
     """
     Calculates the cost matrix for event synchronization.
@@ -65,10 +66,15 @@ def calculate_cost_matrix(events: pd.DataFrame,
     Args:
         events: DataFrame with event data
         sequences: List of sequence tuples (start, end, phase)
+        match_id: The match ID
+        position_data: The XY objects and the meta data of the position
+        file, loaded from the file of the match if None
 
     Returns:
         np.ndarray: Cost matrix
     """
+    if position_data is None:
+        position_data = load_position_data(match_id)
     cost_matrix = np.full((len(events), len(sequences)), np.inf)
 
     # Reduzierte maximale Zeitdifferenz, da Events vor der Zeit stattfinden
@@ -80,7 +86,7 @@ def calculate_cost_matrix(events: pd.DataFrame,
         event_type = event[0]
         competitor = event[25]
         links, pos_data, ball_data, pid = prepare_position_cost(
-            match_id, event)
+            match_id, event, position_data)
         # event_frequency = calculate_event_frequency(events, event_type, i)
 
         for j, (start, end, phase) in enumerate(sequences):
@@ -106,14 +112,36 @@ def calculate_cost_matrix(events: pd.DataFrame,
     return cost_matrix
 
 
+def load_position_data(match_id: int) -> tuple[Any, Any]:
+    """
+    Loads the position data of a match.
+
+    Args:
+        match_id: The match ID
+
+    Returns:
+        tuple: The XY objects of all groups and the meta data of the
+        position file
+    """
+    filepath_data = get_pos_filepath(match_id)
+    pos_data = fliok.read_position_data_csv(filepath_data)
+    pid_dict, _, _, _ = fliok.get_meta_data(
+        filepath_data)
+    return pos_data, pid_dict
+
+
 def prepare_position_cost(match_id: int,
-                          event: pd.Series) -> tuple[Any, Any, Any, Any]:
+                          event: pd.Series,
+                          position_data: Optional[tuple[Any, Any]] = None
+                          ) -> tuple[Any, Any, Any, Any]:
     """
     Calculates the position cost for an event.
 
     Args:
         match_id: The match ID
         events: The events DataFrame
+        position_data: The XY objects and the meta data of the position
+        file, loaded from the file of the match if None
 
     Returns:
         links: Dictionary with player IDs and their assignments
@@ -123,10 +151,9 @@ def prepare_position_cost(match_id: int,
         pid: The player ID (name)
 
     """
-    filepath_data = get_pos_filepath(match_id)
-    pos_data = fliok.read_position_data_csv(filepath_data)
-    pid_dict, _, _, _ = fliok.get_meta_data(
-        filepath_data)
+    if position_data is None:
+        position_data = load_position_data(match_id)
+    pos_data, pid_dict = position_data
     xids = fliok.create_links_from_meta_data(pid_dict, identifier="name")
     ball_num = find_key_position(pid_dict, "Ball")
 
@@ -231,18 +258,24 @@ def calculate_phase_cost(phase: int, competitor: dv.Team,
 
 def sync_events_cost_function(events: pd.DataFrame,
                               sequences: List[Tuple[int, int, int]],
-                              match_id: int) -> pd.DataFrame:
+                              match_id: int,
+                              position_data: Optional[tuple[Any, Any]] = None
+                              ) -> pd.DataFrame:
     """
     Synchronizes events using a cost function.
 
     Args:
         events: DataFrame with event data
         sequences: List of sequence tuples
+        match_id: The match ID
+        position_data: The XY objects and the meta data of the position
+        file, loaded from the file of the match if None
 
     Returns:
         pd.DataFrame: Synchronized events
     """
-    cost_matrix = calculate_cost_matrix(events, sequences, match_id)
+    cost_matrix = calculate_cost_matrix(events, sequences, match_id,
+                                        position_data)
 
     # Find optimal assignment for each event
     for i, _ in enumerate(events.values):
@@ -0,0 +1,213 @@
+"""
+This module exports the game phase timeline of a match as a
+self-contained interactive HTML file with plotly.
+
+The phase line of a full match has thousands of vertices. The file
+therefore contains the full line once and shows a decimated version: on
+every zoom or pan the visible range is reduced in the browser to the
+first, minimum, maximum and last point of each pixel column (M4
+min/max decimation), so the timeline stays responsive at every zoom
+level. The events of each approach are drawn as separate legend groups
+that can be toggled on and off.
+
+Author:
+    @Annabelle Runge
+
+Date:
+    2025-05-21
+"""
+import json
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional, Sequence
+
+import numpy as np
+
+from plot_functions.phase_renderer import (EVENT_COLORS, PHASE_LABELS,
+                                           PHASE_POSITIONS, _reduce_events,
+                                           decimate_line, event_arrays,
+                                           event_heights, phase_line)
+
+# Decimates the visible part of the phase line in the browser. The
+# placeholder {plot_id} is filled in by plotly.
+_DECIMATION_SCRIPT = """
+(function() {
+    var gd = document.getElementById('{plot_id}');
+    var full = __FULL_LINE__;
+    function lowerBound(xs, value) {
+        var lo = 0, hi = xs.length;
+        while (lo < hi) {
+            var mid = (lo + hi) >> 1;
+            if (xs[mid] < value) { lo = mid + 1; } else { hi = mid; }
+        }
+        return lo;
+    }
+    function m4(x0, x1, columns) {
+        var xs = full.x, ys = full.y;
+        var start = Math.max(lowerBound(xs, x0) - 1, 0);
+        var end = Math.min(lowerBound(xs, x1) + 1, xs.length - 1);
+        if (end - start + 1 <= 4 * columns) {
+            return {x: xs.slice(start, end + 1), y: ys.slice(start, end + 1)};
+        }
+        var width = (xs[end] - xs[start]) / columns;
+        var keep = [], column = -1, first, last, min, max;
+        function flush() {
+            var idx = [first, min, max, last].sort(function(a, b) {
+                return a - b; });
+            for (var k = 0; k < 4; k++) {
+                if (keep.length === 0 || keep[keep.length - 1] !== idx[k]) {
+                    keep.push(idx[k]);
+                }
+            }
+        }
+        for (var i = start; i <= end; i++) {
+            var c = Math.min(Math.floor((xs[i] - xs[start]) / width),
+                             columns - 1);
+            if (c !== column) {
+                if (column >= 0) { flush(); }
+                column = c; first = i; min = i; max = i;
+            }
+            if (ys[i] < ys[min]) { min = i; }
+            if (ys[i] > ys[max]) { max = i; }
+            last = i;
+        }
+        flush();
+        return {x: keep.map(function(k) { return xs[k]; }),
+                y: keep.map(function(k) { return ys[k]; })};
+    }
+    gd.on('plotly_relayout', function() {
+        var range = gd._fullLayout.xaxis.range;
+        var columns = Math.max(gd._fullLayout._size.w, 100);
+        var line = m4(range[0], range[1], columns);
+        Plotly.restyle(gd, {x: [line.x], y: [line.y]}, [0]);
+    });
+})();
+"""
+
+
+def timeline_figure(sequences: Sequence[tuple[int, int, int]],
+                    events_by_approach: dict[str, Any],
+                    match_id: Any = "", n_columns: int = 2000) -> Any:
+    """
+    Creates the plotly figure of the timeline with the decimated phase
+    line and one legend group of event markers per approach.
+
+    Args:
+        sequences: The (start, end, phase) sequences of the match
+        events_by_approach: The synchronized events of each approach
+        match_id: The ID of the match, used in the title
+        n_columns: Number of pixel columns of the initial view
+
+    Returns:
+        plotly.graph_objects.Figure: The timeline figure
+    """
+    import plotly.graph_objects as go
+
+    x_vals, y_vals = decimate_line(*phase_line(sequences),
+                                   n_columns=n_columns)
+    fig = go.Figure()
+    fig.add_trace(go.Scattergl(
+        x=x_vals, y=y_vals, mode="lines", name="Game phase",
+        line={"color": "black", "width": 2}, hoverinfo="skip"))
+
+    for approach, events in events_by_approach.items():
+        times, types = event_arrays(events)
+        heights = event_heights(times, sequences)
+        on_line = ~np.isnan(heights)
+        times, types, heights = (times[on_line], types[on_line],
+                                 heights[on_line])
+        _, first = np.unique(types, return_index=True)
+        for event_type in types[np.sort(first)]:
+            mask = types == event_type
+            fig.add_trace(go.Scattergl(
+                x=times[mask], y=heights[mask], mode="markers",
+                name=event_type, legendgroup=str(approach),
+                legendgrouptitle_text=str(approach),
+                marker={"symbol": "x", "size": 9,
+                        "color": EVENT_COLORS.get(event_type,
+                                                  EVENT_COLORS["default"])},
+                hovertemplate=(f"{approach}<br>{event_type}"
+                               "<br>Frame %{x}<extra></extra>")))
+
+    fig.update_layout(
+        title=f"Continuous Game phase Timeline {match_id}".strip(),
+        xaxis_title="Timeframe",
+        yaxis={"tickmode": "array",
+               "tickvals": sorted(set(PHASE_POSITIONS.values())),
+               "ticktext": [PHASE_LABELS[phase]
+                            for phase in sorted(PHASE_POSITIONS.keys())],
+               "fixedrange": True},
+        legend={"groupclick": "toggleitem"},
+        template="plotly_white")
+    return fig
+
+
+def export_html_timeline(sequences: Sequence[tuple[int, int, int]],
+                         events_by_approach: dict[str, Any],
+                         output_path: str, match_id: Any = "",
+                         n_columns: int = 2000,
+                         include_plotlyjs: Any = True) -> str:
+    """
+    Exports the timeline of one match to an interactive HTML file.
+
+    Args:
+        sequences: The (start, end, phase) sequences of the match
+        events_by_approach: The synchronized events of each approach
+        output_path: Path of the HTML file
+        match_id: The ID of the match, used in the title
+        n_columns: Number of pixel columns of the initial view
+        include_plotlyjs: True embeds plotly.js so that the file works
+        offline, "cdn" loads it from the internet and keeps files small
+
+    Returns:
+        str: Path of the HTML file
+    """
+    fig = timeline_figure(sequences, events_by_approach, match_id,
+                          n_columns)
+    x_vals, y_vals = phase_line(sequences)
+    full_line = json.dumps({"x": x_vals.tolist(), "y": y_vals.tolist()})
+    fig.write_html(output_path, include_plotlyjs=include_plotlyjs,
+                   post_script=_DECIMATION_SCRIPT.replace("__FULL_LINE__",
+                                                          full_line))
+    return output_path
+
+
+def _export_job(job: dict[str, Any]) -> Optional[str]:
+    """
+    Exports a single timeline in a worker process.
+
+    Args:
+        job: Keyword arguments of export_html_timeline
+
+    Returns:
+        str: Path of the HTML file, None if the export failed
+    """
+    try:
+        return export_html_timeline(**job)
+    except Exception as e:
+        print(f"Error exporting {job.get('output_path')}: {e}")
+        return None
+
+
+def export_many(jobs: list[dict[str, Any]],
+                max_workers: Optional[int] = None) -> list[Optional[str]]:
+    """
+    Exports the timelines of several matches in a process pool.
+
+    Args:
+        jobs: Keyword arguments of export_html_timeline for each match
+        max_workers: Number of processes, the number of CPUs if None
+
+    Returns:
+        list: Paths of the HTML files, None for failed exports
+    """
+    reduced = []
+    for job in jobs:
+        job = dict(job)
+        # Only the times and types of the events are sent to the workers
+        job["events_by_approach"] = {
+            approach: _reduce_events(events)
+            for approach, events in job["events_by_approach"].items()}
+        reduced.append(job)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_export_job, reduced))
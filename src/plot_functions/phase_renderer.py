@@ -0,0 +1,353 @@
+"""
+This module renders the continuous game phase timeline of a match
+together with its event markers.
+
+The phase line is drawn as a single artist from the sequences and all
+events of one type are drawn with one scatter call. The y values of the
+events are looked up with a binary search over the sorted sequences
+instead of scanning the sequences for each event. For full-match views
+the phase line is decimated to at most four points per pixel column
+(first, min, max, last), which gives the same image with far fewer
+vertices.
+
+Figures are rendered off-screen without pyplot, so the renderer can run
+in worker processes. A comparison figure draws one panel per approach
+and computes the phase line of the match only once.
+
+Author:
+    @Annabelle Runge
+
+Date:
+    2025-05-20
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional, Sequence
+
+import numpy as np
+
+# Define positions for each phase
+PHASE_POSITIONS = {
+    0: 2,  # (inac)
+    1: 3,  # (CATT-A)
+    2: 1,  # (CATT-B)
+    3: 4,  # (PATT-A)
+    4: 0,  # (PATT-B)
+}
+PHASE_LABELS = {2: "inac", 3: "CATT-A", 1: "CATT-B", 4: "PATT-A",
+                0: "PATT-B"}
+
+# Define event colors based on categories
+EVENT_COLORS = {
+    "score_change": "dodgerblue",
+    "suspension": "purple",
+    "suspension_over": "darkviolet",
+    "technical_rule_fault": "gold",
+    "technical_ball_fault": "orange",
+    "steal": "limegreen",
+    "shot_saved": "mediumblue",
+    "shot_off_target": "crimson",
+    "shot_blocked": "red",
+    "seven_m_awarded": "deeppink",
+    "seven_m_missed": "hotpink",
+    "yellow_card": "yellow",
+    "red_card": "darkred",
+    "timeout": "cyan",
+    "timeout_over": "cyan",
+    "subsitution": "black",
+    # Default for all other events
+    "default": "grey",
+}
+
+# Default x-axis limits of the timeline plots
+DEFAULT_XLIM = (6000, 50000)
+
+
+def phase_line(sequences: Sequence[tuple[int, int, int]]
+               ) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Calculates the vertices of the continuous phase line. Every sequence
+    contributes its start and its end at the height of its phase.
+
+    Args:
+        sequences: The (start, end, phase) sequences of the match
+
+    Returns:
+        tuple: The x and y values of the line
+    """
+    if len(sequences) == 0:
+        return np.empty(0), np.empty(0)
+    seq = np.asarray(sequences, dtype=float)
+    heights = np.vectorize(PHASE_POSITIONS.get, otypes=[float])(
+        seq[:, 2].astype(int))
+    x_vals = seq[:, :2].reshape(-1)
+    y_vals = np.repeat(heights, 2)
+    return x_vals, y_vals
+
+
+def decimate_line(x_vals: np.ndarray, y_vals: np.ndarray,
+                  n_columns: int = 2000
+                  ) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Decimates a line to the first, minimum, maximum and last point of
+    each pixel column (M4 aggregation). The rendered line looks the same
+    as the full line at a width of n_columns pixels.
+
+    Args:
+        x_vals: The sorted x values of the line
+        y_vals: The y values of the line
+        n_columns: Number of pixel columns of the plot
+
+    Returns:
+        tuple: The decimated x and y values
+    """
+    if len(x_vals) <= 4 * n_columns:
+        return x_vals, y_vals
+
+    width = (x_vals[-1] - x_vals[0]) / n_columns
+    columns = np.minimum(((x_vals - x_vals[0]) // width).astype(int),
+                         n_columns - 1)
+    starts = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+    ends = np.r_[starts[1:], len(x_vals)] - 1
+
+    # Position of the minimum and maximum within each column
+    order = np.lexsort((y_vals, columns))
+    first_in_column = np.searchsorted(columns[order], columns[starts])
+    last_in_column = np.r_[first_in_column[1:], len(order)] - 1
+    arg_min = order[first_in_column]
+    arg_max = order[last_in_column]
+
+    keep = np.unique(np.concatenate([starts, arg_min, arg_max, ends]))
+    return x_vals[keep], y_vals[keep]
+
+
+def event_arrays(events: Any) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Extracts the times and types of the events. Supports the floodlight
+    event DataFrames, with the type in column 0 and the frame in column
+    24, and lists of event dictionaries with "time" and "type".
+
+    Args:
+        events: The events of the match
+
+    Returns:
+        tuple: The times and the types of the events
+    """
+    if hasattr(events, "iloc"):
+        times = events.iloc[:, 24].to_numpy(dtype=float)
+        types = events.iloc[:, 0].astype(str).to_numpy()
+    else:
+        times = np.array([event["time"] for event in events], dtype=float)
+        types = np.array([event["type"] for event in events], dtype=str)
+    return times, types
+
+
+def event_heights(times: np.ndarray,
+                  sequences: Sequence[tuple[int, int, int]]) -> np.ndarray:
+    """
+    Finds the height of the phase line at the time of each event.
+
+    Args:
+        times: The times of the events
+        sequences: The sorted (start, end, phase) sequences
+
+    Returns:
+        np.ndarray: The heights, NaN for events outside of all sequences
+    """
+    heights = np.full(len(times), np.nan)
+    if len(sequences) == 0 or len(times) == 0:
+        return heights
+    x_vals, y_vals = phase_line(sequences)
+    starts, ends = x_vals[0::2], x_vals[1::2]
+    index = np.searchsorted(starts, times, side="right") - 1
+    valid = (index >= 0) & ~np.isnan(times)
+    valid[valid] &= times[valid] < ends[index[valid]]
+    heights[valid] = y_vals[0::2][index[valid]]
+    return heights
+
+
+def draw_timeline(ax: Any, sequences: Sequence[tuple[int, int, int]],
+                  events: Any, title: str = "Continuous Game phase Timeline",
+                  xlim: Optional[tuple[float, float]] = DEFAULT_XLIM,
+                  n_columns: Optional[int] = 2000,
+                  line: Optional[tuple[np.ndarray, np.ndarray]] = None,
+                  legend: bool = True) -> None:
+    """
+    Draws the phase line and the event markers into an axis.
+
+    Args:
+        ax: The matplotlib axis
+        sequences: The (start, end, phase) sequences of the match
+        events: The events of the match
+        title: The title of the axis
+        xlim: The x-axis limits, the full match if None
+        n_columns: Number of pixel columns the phase line is decimated
+        to, no decimation if None
+        line: The precomputed, possibly decimated phase line
+        legend: Whether to add the legend of the event types
+    """
+    if line is None:
+        line = phase_line(sequences)
+        if n_columns is not None:
+            line = decimate_line(*line, n_columns=n_columns)
+    ax.plot(line[0], line[1], color="black", linewidth=2)
+
+    times, types = event_arrays(events)
+    heights = event_heights(times, sequences)
+    on_line = ~np.isnan(heights)
+    times, types, heights = times[on_line], types[on_line], heights[on_line]
+    # One scatter call per event type, in order of the first occurrence
+    _, first = np.unique(types, return_index=True)
+    for event_type in types[np.sort(first)]:
+        mask = types == event_type
+        ax.scatter(times[mask], heights[mask], marker="x", s=64,
+                   color=EVENT_COLORS.get(event_type,
+                                          EVENT_COLORS["default"]),
+                   label=event_type)
+
+    if legend and len(types):
+        ax.legend(title="Event Types", loc="upper right",
+                  bbox_to_anchor=(1.15, 1))
+    ax.axhline(0, color="grey", linewidth=0.5)
+    ax.set_yticks(sorted(set(PHASE_POSITIONS.values())))
+    ax.set_yticklabels(
+        [PHASE_LABELS[phase] for phase in sorted(PHASE_POSITIONS.keys())])
+    ax.set_xlabel("Timeframe")
+    ax.set_title(title)
+    if xlim is not None:
+        ax.set_xlim(*xlim)
+
+
+def render_timeline(sequences: Sequence[tuple[int, int, int]], events: Any,
+                    output_path: str,
+                    title: str = "Continuous Game phase Timeline",
+                    xlim: Optional[tuple[float, float]] = None,
+                    n_columns: Optional[int] = 2000) -> str:
+    """
+    Renders the timeline of one match off-screen to a PNG or SVG file,
+    depending on the file extension.
+
+    Args:
+        sequences: The (start, end, phase) sequences of the match
+        events: The events of the match
+        output_path: Path of the image file
+        title: The title of the plot
+        xlim: The x-axis limits, the full match if None
+        n_columns: Number of pixel columns the phase line is decimated
+        to, no decimation if None
+
+    Returns:
+        str: Path of the image file
+    """
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(14, 4))
+    draw_timeline(fig.subplots(), sequences, events, title, xlim, n_columns)
+    fig.savefig(output_path, bbox_inches="tight")
+    return output_path
+
+
+def render_comparison(sequences: Sequence[tuple[int, int, int]],
+                      events_by_approach: dict[str, Any], output_path: str,
+                      match_id: Any = "",
+                      xlim: Optional[tuple[float, float]] = None,
+                      n_columns: Optional[int] = 2000) -> str:
+    """
+    Renders one panel per approach for one match off-screen. The phase
+    line is calculated and decimated once and shared by all panels.
+
+    Args:
+        sequences: The (start, end, phase) sequences of the match
+        events_by_approach: The synchronized events of each approach
+        output_path: Path of the PNG or SVG file
+        match_id: The ID of the match, used in the title
+        xlim: The x-axis limits, the full match if None
+        n_columns: Number of pixel columns the phase line is decimated
+        to, no decimation if None
+
+    Returns:
+        str: Path of the image file
+    """
+    from matplotlib.figure import Figure
+
+    line = phase_line(sequences)
+    if n_columns is not None:
+        line = decimate_line(*line, n_columns=n_columns)
+
+    n_panels = max(len(events_by_approach), 1)
+    fig = Figure(figsize=(14, 2.5 * n_panels), layout="constrained")
+    axes = np.atleast_1d(fig.subplots(n_panels, 1, sharex=True))
+    for index, (ax, (approach, events)) in enumerate(
+            zip(axes, events_by_approach.items())):
+        # The event colors are the same in all panels, one legend is enough
+        draw_timeline(ax, sequences, events, title=str(approach),
+                      xlim=xlim, line=line, legend=index == 0)
+        ax.set_xlabel("")
+    axes[-1].set_xlabel("Timeframe")
+    fig.suptitle(f"Game phase timeline of match {match_id} per approach")
+    fig.savefig(output_path, bbox_inches="tight")
+    return output_path
+
+
+def _render_job(job: dict[str, Any]) -> Optional[str]:
+    """
+    Renders a single job in a worker process.
+
+    Args:
+        job: Keyword arguments of render_timeline, or of
+        render_comparison if the job contains "events_by_approach"
+
+    Returns:
+        str: Path of the image file, None if the rendering failed
+    """
+    try:
+        if "events_by_approach" in job:
+            return render_comparison(**job)
+        return render_timeline(**job)
+    except Exception as e:
+        print(f"Error rendering {job.get('output_path')}: {e}")
+        return None
+
+
+def render_many(jobs: list[dict[str, Any]],
+                max_workers: Optional[int] = None) -> list[Optional[str]]:
+    """
+    Renders several timelines or comparison figures in a process pool.
+
+    Args:
+        jobs: Keyword arguments of render_timeline or render_comparison
+        for each figure
+        max_workers: Number of processes, the number of CPUs if None
+
+    Returns:
+        list: Paths of the image files, None for failed figures
+    """
+    # The floodlight event DataFrames are reduced to the columns that are
+    # drawn, so that only small arrays are sent to the workers
+    reduced = []
+    for job in jobs:
+        job = dict(job)
+        if "events" in job:
+            job["events"] = _reduce_events(job["events"])
+        if "events_by_approach" in job:
+            job["events_by_approach"] = {
+                approach: _reduce_events(events)
+                for approach, events in job["events_by_approach"].items()}
+        reduced.append(job)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_render_job, reduced))
+
+
+def _reduce_events(events: Any) -> list[dict[str, Any]]:
+    """
+    Reduces the events to their times and types.
+
+    Args:
+        events: The events of the match
+
+    Returns:
+        list: Event dictionaries with "time" and "type"
+    """
+    times, types = event_arrays(events)
+    return [{"time": time, "type": event_type}
+            for time, event_type in zip(times.tolist(), types.tolist())]
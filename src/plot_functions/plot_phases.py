@@ -6,17 +6,17 @@ Author:
 Date:
     2025-04-29
 """
+import logging
 import os
 from typing import Any
 
-import matplotlib
-import matplotlib.pyplot as plt
 import pandas as pd
 
 import variables.data_variables as dv
-from plot_functions import processing
+from help_functions.headless import show_or_close
+from plot_functions import phase_renderer, processing
 
-matplotlib.use("TkAgg", force=True)
+logger = logging.getLogger(__name__)
 
 
 def plot_phases(match_id: int, approach: dv.Approach
@@ -32,17 +32,15 @@ def plot_phases(match_id: int, approach: dv.Approach
     2. Converts event frame numbers to absolute timestamps.
     3. Loads positional data and phasse predictions.
     4. Calculates sequences of game phases.
-    5. Defines positions and labels for each phase.
-    6. Defines event colors based on categories.
-    7. Initializes lists to hold x (time) and y (position) values for a
-    continuous line.
-    8. Fills in x_vals and y_vals for a continuous line.
-    9. Creates the plot and adds event markers with labels from `type`.
-    10. Customizes the plot and shows it.
+    5. Saves the phases of the events.
+    6. Draws the phase line and one marker layer per event type with
+    `phase_renderer` and shows the plot.
     Note:
         The function assumes the existence of several helper functions
         and modules such as `helpFuctions`, `np`, `plt`, and `Code`.
     """
+    from matplotlib import pyplot as plt
+
     events = []
     base_path = r"D:\Handball\HBL_Events\season_20_21"
     datengrundlage = r"Datengrundlagen"
@@ -71,105 +69,14 @@ def plot_phases(match_id: int, approach: dv.Approach
         datei_pfad = os.path.join(base_path_grundlage, r"none", new_name)
     else:
         raise ValueError("Invalid approach specified!")
-    # Define positions for each phase
-    phase_positions = {
-        0: 2,  # (inac)
-        1: 3,  # (CATT-A)
-        2: 1,  # (CATT-B)
-        3: 4,  # (PATT-A)
-        4: 0,  # (PATT-B)
-    }
-    phase_labels = {2: "inac", 3: "CATT-A",
-                    1: "CATT-B", 4: "PATT-A", 0: "PATT-B"}
-    # Define event colors based on categories
-    event_colors = {
-        "score_change": "dodgerblue",
-        "suspension": "purple",
-        "suspension_over": "darkviolet",
-        "technical_rule_fault": "gold",
-        "technical_ball_fault": "orange",
-        "steal": "limegreen",
-        "shot_saved": "mediumblue",
-        "shot_off_target": "crimson",
-        "shot_blocked": "red",
-        "seven_m_awarded": "deeppink",
-        "seven_m_missed": "hotpink",
-        "yellow_card": "yellow",
-        "red_card": "darkred",
-        "timeout": "cyan",
-        "timeout_over": "cyan",
-        "subsitution": "black",
-        # Default for all other events
-        "default": "grey",
-    }
-    # Initialize lists to hold x (time) and y (position) values for a
-    # continuous line
-    x_vals = []
-    y_vals = []
-
-    # Fill in x_vals and y_vals for a continuous line
-    for start, end, phase in sequences:
-        # Append start of phase
-        x_vals.append(start)
-        y_vals.append(phase_positions[phase])
-
-        # Append end of phase
-        x_vals.append(end)
-        y_vals.append(phase_positions[phase])
-
-    # Create the plot
-    _, ax = plt.subplots(figsize=(14, 4))
-
-    # Plot the continuous line
-    ax.plot(x_vals, y_vals, color="black", linewidth=2)
-
-    # Track labels to avoid duplicates in the legend
-    added_labels = set()
-
     berechne_phase_und_speichern(events, sequences, datei_pfad)
-    # Add event markers with labels from `type`
-    for event in events:
-        t_start = event["time"]
-        event_type = event["type"]
-        color = event_colors.get(event_type, event_colors["default"])
-        # Find the y value on the continuous line for this event's time
-        # (t_start)
-        event_y = None
-        for start, end, phase in sequences:
-            if start <= t_start < end:
-                event_y = phase_positions[phase]
 
-                break
-        # Plot event marker
-        # ax.axvline(t_start, color="red", linestyle="--", linewidth=1)
-        # Vertical line at event time
-        if event_y is not None:
-            ax.plot(
-                t_start,
-                event_y,
-                "x",
-                color=color,
-                markersize=8,
-                label=event_type if event_type not in added_labels else "",
-            )
-            print(t_start, event_y, event_type)
-            added_labels.add(event_type)
-    # Add legend
-    ax.legend(title="Event Types", loc="upper right", bbox_to_anchor=(1.15, 1))
-
-    # Customize the plot
-    ax.axhline(0, color="grey", linewidth=0.5)
-    ax.set_yticks(sorted(set(phase_positions.values())))
-    ax.set_yticklabels(
-        [phase_labels[phase] for phase in sorted(phase_positions.keys())]
-    )
-    ax.set_xlabel("Timeframe")
-    ax.set_title("Continuous Game phase Timeline")
-
-    # Set x-axis limit to show only from 0 to 2000
-    ax.set_xlim(6000, 50000)
+    # Create the plot with the phase line and one marker layer per event
+    # type
+    _, ax = plt.subplots(figsize=(14, 4))
+    phase_renderer.draw_timeline(ax, sequences, events)
     # Show plot
-    plt.show()
+    show_or_close()
 
 
 def berechne_phase_und_speichern_fl(events: pd.DataFrame,
@@ -220,7 +127,7 @@ def berechne_phase_und_speichern_fl(events: pd.DataFrame,
         # Speichern in eine CSV-Datei (oder Excel)
         # Ändere dies zu .to_excel für Excel-Datei
         df.to_csv(dateipfad, index=False)
-        print(f"Die Datei wurde unter {dateipfad} gespeichert.")
+        logger.info("Die Datei wurde unter %s gespeichert.", dateipfad)
     else:
         # Durchlaufe jedes Event
         for event in events:
@@ -250,7 +157,7 @@ def berechne_phase_und_speichern_fl(events: pd.DataFrame,
         # Speichern in eine CSV-Datei (oder Excel)
         # Ändere dies zu .to_excel für Excel-Datei
         df.to_csv(dateipfad, index=False)
-        print(f"Die Datei wurde unter {dateipfad} gespeichert.")
+        logger.info("Die Datei wurde unter %s gespeichert.", dateipfad)
 
 
 def berechne_phase_und_speichern(events: list[Any],
@@ -302,7 +209,7 @@ def berechne_phase_und_speichern(events: list[Any],
     # Speichern in eine CSV-Datei (oder Excel)
     # Ändere dies zu .to_excel für Excel-Datei
     df.to_csv(dateipfad, index=False)
-    print(f"Die Datei wurde unter {dateipfad} gespeichert.")
+    logger.info("Die Datei wurde unter %s gespeichert.", dateipfad)
 
 
 def plot_events(match_id: int) -> None:
@@ -340,6 +247,8 @@ def plot_events(match_id: int) -> None:
     events, and the x-axis represents the timeframe.
     """
 
+    from matplotlib import pyplot as plt
+
     events, _ = processing.adjust_timestamp(match_id)
     # Define event colors based on categories
     event_colors = {
@@ -401,4 +310,4 @@ def plot_events(match_id: int) -> None:
     ax.set_xlim(6000, 50000)
 
     # Show plot
-    plt.show()
+    show_or_close()
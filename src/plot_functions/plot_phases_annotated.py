@@ -1,25 +1,27 @@
 import json
 from datetime import datetime
+from typing import Optional
 
-import matplotlib
-import matplotlib.pyplot as plt
 import numpy as np
 import pytz  # type: ignore
 from floodlight import Code
 
 import preprocessing.reformatJson_methods as helpFuctions
 from existing_code.rolling_mode import rolling_mode
+from help_functions.headless import show_or_close
+from plot_functions import html_timeline
 
-matplotlib.use("TkAgg", force=True)
 
-
-def plot_phases(match_id: int, event_name: str) -> None:
+def plot_phases(match_id: int, event_name: str,
+                html_path: Optional[str] = None) -> None:
     """
     Plots the phases of a handball match along with annotated events.
     Args:
         match_id (int): The ID of the match to plot.
         event_name (str): The name of the event file (without extension)
         containing annotations.
+        html_path (str, optional): Path of an interactive HTML timeline
+        of the annotated events. No HTML file is written if None.
     Returns:
         None
     This function performs the following steps:
@@ -41,6 +43,7 @@ def plot_phases(match_id: int, event_name: str) -> None:
           and `Code`) are defined elsewhere in the codebase.
         - The function uses the `matplotlib` library for plotting.
     """
+    from matplotlib import pyplot as plt
 
     # Paths
     base_path = "D:\\Handball\\"
@@ -115,6 +118,13 @@ def plot_phases(match_id: int, event_name: str) -> None:
     sequences = slices.find_sequences(return_type="list")
     sequences = [x for x in sequences if x[1] - x[0] > slices.framerate]
 
+    if html_path is not None:
+        html_timeline.export_html_timeline(
+            sequences,
+            {"Annotated": [{"time": time, "type": event_type}
+                           for time, event_type in events_with_timestamps]},
+            html_path, match_id)
+
     # Define positions for each phase
     phase_positions = {
         0: 2,  # (inac)
@@ -205,4 +215,4 @@ def plot_phases(match_id: int, event_name: str) -> None:
     # Set x-axis limit to show only from 0 to 2000
     ax.set_xlim(0, 20000)
     # Show plot
-    plt.show()
+    show_or_close()
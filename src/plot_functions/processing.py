@@ -6,6 +6,7 @@ Author:
 Date:
     2025-04-29
 """
+import logging
 from datetime import datetime as dt
 from typing import Any, List, Tuple
 
@@ -16,6 +17,8 @@ from floodlight.core.code import Code
 import preprocessing.reformatJson_methods as helpFuctions
 from existing_code.rolling_mode import rolling_mode
 
+logger = logging.getLogger(__name__)
+
 
 def adjust_timestamp(match_id: int) -> tuple[Any, dict[Any, Any]]:
     """
@@ -110,7 +113,6 @@ def calculate_sequences(match_id: int, base_path: str = "D:\\Handball\\",
             - x: X coordinate
             - y: Y coordinate
     """
-    sequences: list[Any]
     # Paths
     _, _, _, positions_path, _, _, _, match = (
         helpFuctions.get_paths_by_match_id(match_id))
@@ -120,12 +122,30 @@ def calculate_sequences(match_id: int, base_path: str = "D:\\Handball\\",
 
     # Load positional data and phase predictions
     predictions = np.load(phase_predictions_path)
-    predictions = rolling_mode(predictions, 101)
+    return sequences_from_predictions(predictions, fps_positional)
+
+
+def sequences_from_predictions(predictions: np.ndarray, framerate: float,
+                               window_size: int = 101
+                               ) -> list[tuple[int, int, int]]:
+    """
+    Calculates the sequences of game phases from the per-frame phase
+    predictions of a match.
+    Args:
+        predictions (np.ndarray): The predicted phase of every frame.
+        framerate (float): The framerate of the positional data.
+        window_size (int): The window of the rolling mode that smoothes
+        the predictions in frames, needs to be odd.
+    Returns:
+        list[tuple[int, int, int]]: The (start, end, phase) sequences that
+        are longer than one second.
+    """
+    predictions = rolling_mode(predictions, window_size)
     slices = Code(
         predictions,
         "match_phases",
         {0: "inac", 1: "CATT-A", 2: "CATT-B", 3: "PATT-A", 4: "PATT-B"},
-        fps_positional,
+        framerate,
     )
 
     # get Sequences of the game phases
@@ -172,8 +192,8 @@ def synchronize_events(events: list[Any],
     team_a_location = team_info[team_a]
     team_b_location = team_info[team_b]
 
-    print(f"Team A: {team_a} ({team_a_location})")
-    print(f"Team B: {team_b} ({team_b_location})")
+    logger.info("Team A: %s (%s)", team_a, team_a_location)
+    logger.info("Team B: %s (%s)", team_b, team_b_location)
     # Create a mapping of location to Team A or Team B
     location_to_team = {team_a_location: "A", team_b_location: "B"}
 
@@ -183,12 +203,11 @@ def synchronize_events(events: list[Any],
             team_ab = location_to_team[
                 competitor_location
             ]  # Map "home"/"away" to "A" or "B"
-            print(
-                f"Event Type: {event['type']}, Competitor: Team "
-                f"{team_ab}({competitor_location})")
+            logger.debug("Event Type: %s, Competitor: Team %s(%s)",
+                         event['type'], team_ab, competitor_location)
         else:
             # Handle events without a competitor if necessary
-            print(f"Event Type: {event['type']}, Competitor: None")
+            logger.debug("Event Type: %s, Competitor: None", event['type'])
         type = event["type"]
         time = event["time"]
         if type == "score_change":
@@ -349,7 +368,7 @@ def calculate_inactive_phase(
     for start, end, phase in sequences:
         if start <= time < end:
             if phase == 0:
-                print("correct Phase")
+                logger.debug("correct Phase")
                 return time  # Indicates phase is active and valid.
             break
 
@@ -391,13 +410,13 @@ def calculate_timeouts(time: int, sequences: list[tuple[int, int, int]],
                 phase_timeout = phase
                 break
         if phase_timeout == 0:
-            print("correct Phase")
+            logger.debug("correct Phase")
             return time
         if ((phase_timeout in (1, 3) and team_ab == "A")
             or (phase_timeout in (2, 4)
                 and team_ab == "B")):
             if int(time) == int(end - 1):
-                print("correct Phase")
+                logger.debug("correct Phase")
                 return time
             return end - 1
 
@@ -529,7 +548,7 @@ def calculate_correct_phase(
     if ((phase in (1, 3)) and team_ab == "A") or (
         (phase in (2, 4)) and team_ab == "B"
     ):
-        print("correct Phase")
+        logger.debug("correct Phase")
 
     else:
         new_time = search_phase(time, sequences, team_ab)
@@ -587,7 +606,7 @@ def adjust_timestamp_baseline(match_id: int) -> tuple[Any, dict[Any, Any]]:
     # Match start timestamp
     first_time_stamp_event = helpFuctions.get_first_time_stamp_event(
         path_timeline)
-    print("match_start_datetime:", first_time_stamp_event)
+    logger.debug("match_start_datetime: %s", first_time_stamp_event)
 
     # timezone
     # utc_timezone = pytz.utc
@@ -663,7 +682,7 @@ def get_events(match_id: int) -> tuple[Any, dict[Any, Any]]:
     # Match start timestamp
     first_time_stamp_event = helpFuctions.get_first_time_stamp_event(
         path_timeline)
-    print("match_start_datetime:", first_time_stamp_event)
+    logger.debug("match_start_datetime: %s", first_time_stamp_event)
 
     # timezone
     utc_timezone = pytz.utc
@@ -673,7 +692,8 @@ def get_events(match_id: int) -> tuple[Any, dict[Any, Any]]:
     positional_data_start_date = dt.fromtimestamp(
         positional_data_start_timestamp
     ).replace(tzinfo=utc_timezone)
-    print("positional_data_start_date:", positional_data_start_date)
+    logger.debug("positional_data_start_date: %s",
+                 positional_data_start_date)
 
     # Change the time of the events to the timeframe of the positional data
     for event in events:
@@ -683,7 +703,7 @@ def get_events(match_id: int) -> tuple[Any, dict[Any, Any]]:
             positional_data_start_timestamp + event_time_seconds)
         event_timestamp_date = (dt.fromtimestamp(event_absolute_timestamp)
                                 .replace(tzinfo=utc_timezone))
-        print("event_timestamp_date:", event_timestamp_date)
+        logger.debug("event_timestamp_date: %s", event_timestamp_date)
         event_timeframe = (
             event_timestamp_date - positional_data_start_date
         ).seconds * fps_positional
@@ -0,0 +1,208 @@
+"""
+This module provides a library of formation templates that scores the
+average formation of a phase against all templates in a batch.
+
+template_matching() normalizes the templates on every call and scores a
+phase against every template with its own cdist and linear sum
+assignment, so the runtime grows linearly with the number of templates.
+The library normalizes the templates once and stores them in a single
+array. A phase is scored in two steps:
+    - a lower bound of the assignment cost of every template at once:
+      the optimal assignment of the sorted x and of the sorted y
+      coordinates, which never costs more than the assignment of the
+      points,
+    - the exact assignment on stacked cost matrices, only for the
+      templates whose bound can still reach the top k.
+The similarities are the same as in template_matching().
+
+    library = TemplateLibrary.load(template_path)
+    top = library.top_k(average_formation(coords), k=3)
+
+Author:
+    @Annabelle Runge
+
+Date:
+    2025-05-26
+"""
+import json
+import os
+from typing import Any, Optional
+
+import numpy as np
+
+from preprocessing.template_matching.template_matching import \
+    scale_coords_from_zero_to_one
+
+# Number of templates whose exact assignment is solved per step
+BATCH_SIZE = 16
+# Rounding tolerance of the lower bounds
+BOUND_TOLERANCE = 1e-12
+
+
+class TemplateLibrary:
+    """
+    Formation templates normalized from zero to one.
+
+    Attributes:
+        names (list): The names of the templates.
+        points (np.ndarray): [T, m, 2] points of the templates, padded
+        with NaN to the largest template.
+        sizes (np.ndarray): [T] number of points of every template.
+        sorted_x (np.ndarray): [T, m] sorted x coordinates, padded with
+        NaN.
+        sorted_y (np.ndarray): [T, m] sorted y coordinates, padded with
+        NaN.
+    """
+
+    def __init__(self, names: list[str], points: np.ndarray,
+                 sizes: np.ndarray) -> None:
+        self.names = list(names)
+        self.points = np.asarray(points, dtype=float).reshape(
+            len(self.names), -1, 2)
+        self.sizes = np.asarray(sizes, dtype=np.int64)
+        self.sorted_x = np.sort(self.points[:, :, 0], axis=1)
+        self.sorted_y = np.sort(self.points[:, :, 1], axis=1)
+
+    @classmethod
+    def from_templates(cls, templates: dict[str, Any]) -> "TemplateLibrary":
+        """
+        Builds the library from templates in the format of templates.json.
+
+        Args:
+            templates: The coordinates of every template like in an XY
+            object, by name
+
+        Returns:
+            TemplateLibrary: The normalized templates
+        """
+        normalized = [scale_coords_from_zero_to_one(
+            np.array(template, dtype=float).flatten().reshape(-1, 2))
+            for template in templates.values()]
+        size = max((len(points) for points in normalized), default=0)
+        points = np.full((len(normalized), size, 2), np.nan)
+        for i, template in enumerate(normalized):
+            points[i, :len(template)] = template
+        return cls(list(templates), points,
+                   np.array([len(points) for points in normalized]))
+
+    @classmethod
+    def load(cls, file_path: str) -> "TemplateLibrary":
+        """
+        Loads a saved library or the templates of a JSON file.
+
+        Args:
+            file_path: The path of the npz or JSON file
+
+        Returns:
+            TemplateLibrary: The normalized templates
+        """
+        if os.path.splitext(file_path)[1] == ".npz":
+            with np.load(file_path) as data:
+                return cls(data["names"].tolist(), data["points"],
+                           data["sizes"])
+        with open(file_path, "r", encoding="utf-8") as f:
+            return cls.from_templates(json.load(f))
+
+    def save(self, file_path: str) -> None:
+        """
+        Saves the normalized templates as compressed npz file.
+
+        Args:
+            file_path: The path of the npz file
+        """
+        np.savez_compressed(file_path, names=np.array(self.names, dtype=str),
+                            points=self.points, sizes=self.sizes)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def lower_bounds(self, formation: np.ndarray) -> np.ndarray:
+        """
+        Calculates a lower bound of the mean assignment cost of a
+        formation to every template. The bound is 0 for templates with
+        another number of points.
+
+        Args:
+            formation: [n, 2] normalized formation
+
+        Returns:
+            np.ndarray: [T] lower bounds
+        """
+        n_points = len(formation)
+        bounds = np.zeros(len(self))
+        same = self.sizes == n_points
+        if not same.any() or n_points > self.points.shape[1]:
+            return bounds
+        # In one dimension the sorted points are the optimal assignment
+        x = np.sort(formation[:, 0])
+        y = np.sort(formation[:, 1])
+        bounds[same] = (np.square(self.sorted_x[same, :n_points] - x) +
+                        np.square(self.sorted_y[same, :n_points] - y)
+                        ).sum(axis=1) / n_points
+        return bounds
+
+    def similarities(self, formation: np.ndarray,
+                     indices: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Calculates the exact similarities of a formation to templates,
+        solving the assignments on stacked cost matrices per template
+        size.
+
+        Args:
+            formation: [n, 2] normalized formation
+            indices: The templates, all templates if None
+
+        Returns:
+            np.ndarray: The similarities of the templates
+        """
+        from scipy.optimize import linear_sum_assignment
+
+        if indices is None:
+            indices = np.arange(len(self))
+        indices = np.asarray(indices, dtype=np.int64)
+        fsims = np.empty(len(indices))
+        for size in np.unique(self.sizes[indices]):
+            group = np.flatnonzero(self.sizes[indices] == size)
+            points = self.points[indices[group], :size]
+            costs = np.square(formation[None, :, None, :] -
+                              points[:, None, :, :]).sum(axis=3)
+            for i, cost in zip(group, costs):
+                row, col = linear_sum_assignment(cost)
+                fsims[i] = 1 - cost[row, col].mean() * 3
+        return fsims
+
+    def top_k(self, formation: np.ndarray,
+              k: int = 1) -> list[tuple[str, float]]:
+        """
+        Finds the k templates that are most similar to a formation. The
+        templates are scored in the order of their lower bounds until no
+        remaining template can reach the top k.
+
+        Args:
+            formation: [n, 2] normalized formation
+            k: Number of templates
+
+        Returns:
+            list: The names and similarities of the templates, the most
+            similar first, the first template of the library if several
+            are equally similar
+        """
+        if k < 1 or len(self) == 0:
+            return []
+        formation = np.asarray(formation, dtype=float)
+        best = 1 - self.lower_bounds(formation) * 3
+        order = np.argsort(-best, kind="stable")
+        scored = np.array([], dtype=np.int64)
+        fsims = np.array([])
+        for start in range(0, len(order), max(k, BATCH_SIZE)):
+            if len(scored) >= k:
+                kth = np.sort(fsims)[::-1][k - 1]
+                if kth > best[order[start]] + BOUND_TOLERANCE:
+                    break
+            batch = order[start:start + max(k, BATCH_SIZE)]
+            scored = np.concatenate([scored, batch])
+            fsims = np.concatenate([fsims,
+                                    self.similarities(formation, batch)])
+        # Most similar first, ties in the order of the library
+        ranking = np.lexsort((scored, -fsims))[:k]
+        return [(self.names[scored[i]], float(fsims[i])) for i in ranking]
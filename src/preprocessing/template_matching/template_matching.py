@@ -11,8 +11,6 @@ Date:
     2025-04-01
 """
 import numpy as np
-from scipy.optimize import linear_sum_assignment
-from scipy.spatial.distance import cdist
 
 
 def scale_coords_from_zero_to_one(coords: np.ndarray,
@@ -42,28 +40,22 @@ def scale_coords_from_zero_to_one(coords: np.ndarray,
     return scaled_xy
 
 
-def template_matching(coords: np.ndarray,
-                      templates: dict[str, list[np.ndarray]]
-                      ) -> dict[str, float]:
+def average_formation(coords: np.ndarray) -> np.ndarray:
     """
-    Performs formation recognition with template matching. Note that the
-    coordinates and the stemplates have to be in the same playing
-    direction, e.g. from left to right so the template matching makes sense
+    Calculates the average formation of a team in a phase. The roles of
+    the players are solved frame by frame with a linear sum assignment to
+    their average positions, so that role swaps do not blur the average.
     Parameters
     ----------
-    coords: xy object the template matching should be performed on
-    templates: dict with keys: names of the templates, values: lists
-    of coordinates, like in xy.object
+    coords: xy object of the phase
 
     Returns
     -------
-    fsim: dict with keys: template names and value: respective fsim value
+    avg_pos_scaled: np.array of shape (n, 2), the average position of
+    every role scaled from zero to one
     """
-    # Templates normalisieren
-    for key in templates:
-        templates[key] = scale_coords_from_zero_to_one(
-            np.array(templates[key]).flatten().reshape(-1, 2)
-        )
+    from scipy.optimize import linear_sum_assignment
+    from scipy.spatial.distance import cdist
 
     # Durchschnittliche Position und Rollenverteilung berechnen
     avg_pos = np.nanmean(coords.xy, axis=0)
@@ -73,19 +65,48 @@ def template_matching(coords: np.ndarray,
 
     # Positionen für jedes Frame lösen
     solved_pos = np.full(
-        (coords_clean.shape[0], int(coords_clean.shape[1]/2), 2), np.NaN)
+        (coords_clean.shape[0], int(coords_clean.shape[1]/2), 2), np.nan)
     for i, frame in enumerate(coords_clean):
         cost_mat = cdist(frame.reshape((-1, 2)), avg_pos.reshape((-1, 2)))
         cost_mat = np.where(np.isnan(cost_mat), 1000000, cost_mat)
         row, col = linear_sum_assignment(cost_mat)
 
-        solved_frame = np.full((int(coords_clean.shape[1]/2), 2), np.NaN)
+        solved_frame = np.full((int(coords_clean.shape[1]/2), 2), np.nan)
         solved_frame[row] = frame.reshape((-1, 2))[col]
         solved_pos[i] = solved_frame
 
+    return scale_coords_from_zero_to_one(np.nanmean(solved_pos, axis=0))
+
+
+def template_matching(coords: np.ndarray,
+                      templates: dict[str, list[np.ndarray]]
+                      ) -> dict[str, float]:
+    """
+    Performs formation recognition with template matching. Note that the
+    coordinates and the stemplates have to be in the same playing
+    direction, e.g. from left to right so the template matching makes sense
+    Parameters
+    ----------
+    coords: xy object the template matching should be performed on
+    templates: dict with keys: names of the templates, values: lists
+    of coordinates, like in xy.object
+
+    Returns
+    -------
+    fsim: dict with keys: template names and value: respective fsim value
+    """
+    from scipy.optimize import linear_sum_assignment
+    from scipy.spatial.distance import cdist
+
+    # Templates normalisieren
+    for key in templates:
+        templates[key] = scale_coords_from_zero_to_one(
+            np.array(templates[key]).flatten().reshape(-1, 2)
+        )
+
+    avg_pos_scaled = average_formation(coords)
+
     # Finale Ähnlichkeitsberechnung
-    avg_pos_scaled = scale_coords_from_zero_to_one(
-        np.nanmean(solved_pos, axis=0))
     return {
         formation: 1 - np.square(cdist(avg_pos_scaled, templates[formation]))[
             linear_sum_assignment(
@@ -11,34 +11,33 @@ Date:
     2025-04-01
 """
 # from matplotlib import pyplot as plt
-import json
+import logging
 import re
 import unicodedata
-from typing import Any, Union
+from typing import Any, Optional, Union
 
 # import floodlight.core.pitch
 import floodlight.core.xy as xy
 # import floodlight as fl
-import matplotlib
 import numpy as np
 import pandas as pd
 import rapidfuzz
 from floodlight import Code
 from floodlight.io.kinexon import (create_links_from_meta_data, get_meta_data,
                                    read_position_data_csv)
-from floodlight.models.kinematics import DistanceModel, VelocityModel
 
-from existing_code import template_matching
 from existing_code.rolling_mode import rolling_mode
+from help_functions.phase_kinematics import phase_kinematics
+from help_functions.roster_index import RosterIndex, build_roster_index
+from preprocessing.template_matching.template_library import TemplateLibrary
+from preprocessing.template_matching.template_matching import average_formation
 
 # from floodlight.io.sportradar import read_event_data_json
 
 
 # import help_functions.reformatjson_methods
 
-matplotlib.use("TkAgg", force=True)
-
-print("Switched to:", matplotlib.get_backend())
+logger = logging.getLogger(__name__)
 
 
 def get_path_template_matching(
@@ -157,38 +156,11 @@ def separate_ball_data(positions: list[xy.XY],
     return xy1, xy2, team_a_name, team_b_name, ball
 
 
-def calculate_team_metrics(xy_objects: dict[str, xy.XY]
-                           ) -> tuple[dict[str, float],
-                                      dict[str, float]]:
-    """
-    Calculates distance and velocity for both teams.
-    Args:
-        xy_objects: The xy objects.
-    Returns:
-        distances: The distances.
-        velocities: The velocities.
-    """
-    distances = {}
-    velocities = {}
-    for team in xy_objects:
-
-        dm = DistanceModel()
-        dm.fit(xy_objects[team])
-        distances.update({team: dm.distance_covered()})
-
-        vm = VelocityModel()
-        vm.fit(xy_objects[team])
-        velocities.update({team: vm.velocity()})
-
-    return distances, velocities
-
-
 def process_formation_phase(phase: tuple[int, int, int],
                             xy_objects: dict[str, xy.XY],
                             phase_to_team_def: dict[int, str],
-                            template_dict: dict[str, np.ndarray],
-                            distances: dict[Any, Any],
-                            velocities: dict[Any, Any],
+                            library: TemplateLibrary,
+                            kinematics: pd.DataFrame,
                             match: str, sequences: list[tuple[int, int, int]],
                             phase_index: int
                             ) -> Any:
@@ -198,9 +170,8 @@ def process_formation_phase(phase: tuple[int, int, int],
         phase: The phase to process.
         xy_objects: The xy objects.
         phase_to_team_def: The phase to team definition.
-        template_dict: The template dictionary.
-        distances: The distances.
-        velocities: The velocities.
+        library: The formation templates.
+        kinematics: The kinematics of the teams per sequence and team.
         match: The match.
         sequences: The sequences.
         phase_index: The phase index.
@@ -221,16 +192,13 @@ def process_formation_phase(phase: tuple[int, int, int],
         coords_def.reflect(axis="y")
         coords_def.reflect(axis="x")
 
-    fsims = template_matching.template_matching(coords_def, template_dict)
-    top_formation = sorted(
-        fsims.items(), key=lambda x: x[1], reverse=True)[0][0]
+    top_formation = library.top_k(average_formation(coords_def), k=1)[0][0]
 
     next_phase = get_next_phase(sequences, phase_index)
 
-    dist_def = np.nansum(
-        distances[phase_to_team_def[phase_type]].slice(start, end).property)
-    vel_def = np.nanmean(
-        velocities[phase_to_team_def[phase_type]].slice(start, end).property)
+    team_def = kinematics.loc[(phase_index, phase_to_team_def[phase_type])]
+    dist_def = team_def["distance"]
+    vel_def = team_def["velocity"]
 
     return {
         "match": match,
@@ -287,35 +255,89 @@ def run_template_matching(match_id: int
 
     # Metadaten laden
     meta_data, _, _, _ = get_meta_data(positions_path)
+    return match_formations(positions, meta_data, sequences,
+                            pd.read_csv(lookup_path), events_sr,
+                            player_profiles, template_path, match)
+
+
+def formation_teams(positions: list[xy.XY], meta_data: dict[str, Any],
+                    lookup: pd.DataFrame, events_sr: Any,
+                    player_profiles: Union[str, RosterIndex], match: str
+                    ) -> dict[str, xy.XY]:
+    """
+    Returns the positions of the field players of both teams, the teams
+    the formations and the phase kinematics are calculated on.
+    Args:
+        positions: The XY objects of all groups.
+        meta_data: The meta data of the position file.
+        lookup: The lookup table of the matches.
+        events_sr: The Sportradar event summary.
+        player_profiles: The roster of the season or the directory of the
+        player profiles.
+        match: The name of the position file of the match.
+    Returns:
+        dict: The XY objects of the teams "a" and "b" without the
+        goalkeepers.
+    """
     links = create_links_from_meta_data(meta_data, "sensor_id")
 
     # Ball- und Spielerdaten trennen
     xy1, xy2, team_a_name, team_b_name, _ = separate_ball_data(
-        positions, meta_data)
+        list(positions), meta_data)
+    # The goalkeepers are filtered in place, so only the arrays of the
+    # teams are copied; the positions may be read-only shared memory
+    xy1, xy2 = (xy.XY(team.xy.copy(), team.framerate, team.direction)
+                for team in (xy1, xy2))
 
     # Team-Mapping und Spieler-IDs
     home_team_statistics = events_sr["statistics"]["totals"]["competitors"][0]
     away_team_statistics = events_sr["statistics"]["totals"]["competitors"][1]
-    lookup = pd.read_csv(lookup_path)
     team_mapping = map_teams_and_extract_player_ids(
         team_a_name, match, lookup, home_team_statistics, away_team_statistics
     )
     team_a_player_ids, team_b_player_ids = team_mapping[2:4]
 
     # Torhüter identifizieren und filtern
-    xy_objects = identify_and_filter_goalkeepers(
+    return identify_and_filter_goalkeepers(
         team_a_player_ids, team_b_player_ids, player_profiles,
         links, team_a_name, team_b_name, xy1, xy2
     )
 
-    # Team-Metriken berechnen
-    distances, velocities = calculate_team_metrics(xy_objects)
+
+def match_formations(positions: list[xy.XY], meta_data: dict[str, Any],
+                     sequences: list[tuple[int, int, int]],
+                     lookup: pd.DataFrame, events_sr: Any,
+                     player_profiles: Union[str, RosterIndex],
+                     template_path: str, match: str,
+                     kinematics: Optional[pd.DataFrame] = None
+                     ) -> list[dict[str, Union[float, str, int]]]:
+    """
+    Runs the template matching for a match on already loaded data.
+    Args:
+        positions: The XY objects of all groups.
+        meta_data: The meta data of the position file.
+        sequences: The (start, end, phase) sequences.
+        lookup: The lookup table of the matches.
+        events_sr: The Sportradar event summary.
+        player_profiles: The roster of the season or the directory of the
+        player profiles.
+        template_path: The path to the template file.
+        match: The name of the position file of the match.
+        kinematics: The phase kinematics of the teams from
+        formation_teams(), e.g. MatchContext.phase_kinematics, calculated
+        if None.
+    Returns:
+        The formation dictionary.
+    """
+    xy_objects = formation_teams(positions, meta_data, lookup, events_sr,
+                                 player_profiles, match)
+
+    # Team-Metriken aller Phasen berechnen
+    if kinematics is None:
+        kinematics = phase_kinematics(xy_objects, sequences)
 
     # Templates laden
-    with open(template_path, "r", encoding="utf-8") as f:
-        templates = json.load(f)
-    template_dict = {k: np.array(v).reshape(-1, 2)
-                     for k, v in templates.items()}
+    library = TemplateLibrary.load(template_path)
 
     # Phasen verarbeiten
     phase_to_team_def = {3: "b", 4: "a"}
@@ -323,8 +345,8 @@ def run_template_matching(match_id: int
 
     for i, phase in enumerate(sequences):
         formation_dict = process_formation_phase(
-            phase, xy_objects, phase_to_team_def, template_dict,
-            distances, velocities, match, sequences, i
+            phase, xy_objects, phase_to_team_def, library,
+            kinematics, match, sequences, i
         )
         if formation_dict:
             formations.append(formation_dict)
@@ -433,7 +455,8 @@ def map_teams_and_extract_player_ids(team_a_name: str, match: str,
 
 def identify_and_filter_goalkeepers(team_a_player_ids: list[str],
                                     team_b_player_ids: list[str],
-                                    player_profiles: str,
+                                    player_profiles: Union[str,
+                                                           RosterIndex],
                                     links: dict[str, dict[str, str]],
                                     team_a_name: str,
                                     team_b_name: str,
@@ -448,7 +471,8 @@ def identify_and_filter_goalkeepers(team_a_player_ids: list[str],
     Args:
         team_a_player_ids: List of player IDs of team A
         team_b_player_ids: List of player IDs of team B
-        player_profiles: Path to the player profiles
+        player_profiles: The roster of the season or the path to the
+        player profiles
         links: Dictionary with mappings between player IDs and sensor IDs
         team_a_name: Name of team A
         team_b_name: Name of team B
@@ -459,74 +483,22 @@ def identify_and_filter_goalkeepers(team_a_player_ids: list[str],
     Returns:
         dict: Dictionary with filtered movement data of both teams
     """
-    team_a_roles = {}
-    for pid in team_a_player_ids:
-
-        try:
-            with open(
-                    f"{player_profiles}\\players_{pid}_profile.json", "r",
-                    encoding="utf-8"
-            ) as file:
-                player_profile = json.load(file)
-
-            if ("player" in player_profile
-                    and "type" in player_profile["player"]):
-                player_role = player_profile["player"]["type"]
-            else:
-                player_role = "Unknown"
-
-                print(f"Warning: 'type' not found for player {pid}")
-
-            team_a_roles[pid] = player_role
-
-        except (json.JSONDecodeError, FileNotFoundError) as e:
-            print(f"Error loading profile for player {pid}: {e}")
-            team_a_roles[pid] = "Unknown"
-
-    team_b_roles = {}
-    for pid in team_b_player_ids:
-        try:
-            with open(
-                f"{player_profiles}\\players_{pid}_profile.json", "r",
-                encoding="utf-8"
-            ) as file:
-                player_profile = json.load(file)
-
-            if ("player" in player_profile
-                    and "type" in player_profile["player"]):
-                player_role = player_profile["player"]["type"]
-            else:
-                player_role = "Unknown"
-
-                print(f"Warning: 'type' not found for player {pid}")
-
-            team_b_roles[pid] = player_role
-
-        except (json.JSONDecodeError, FileNotFoundError) as e:
-            print(f"Error loading profile for player {pid}: {e}")
-            team_b_roles[pid] = "Unknown"
-
-    role_df_a = pd.DataFrame(
-        list(team_a_roles.items()), columns=["pID", "role"])
-    column_df_a = pd.DataFrame(
-        list(links[team_a_name].items()), columns=["pID", "xID"])
-
-    role_df_b = pd.DataFrame(
-        list(team_b_roles.items()), columns=["pID", "role"])
-    column_df_b = pd.DataFrame(
-        list(links[team_b_name].items()), columns=["pID", "xID"])
-
-    teamsheet_a = pd.merge(role_df_a, column_df_a, on="pID")
-    teamsheet_b = pd.merge(role_df_b, column_df_b, on="pID")
+    roster = (player_profiles if isinstance(player_profiles, RosterIndex)
+              else build_roster_index(player_profiles, [],
+                                      team_a_player_ids + team_b_player_ids))
+    team_a_roles = roster.player_roles(team_a_player_ids)
+    team_b_roles = roster.player_roles(team_b_player_ids)
 
-    gk_ids_a = teamsheet_a.loc[teamsheet_a["role"] == "G", "xID"]
-    gk_ids_b = teamsheet_b.loc[teamsheet_b["role"] == "G", "xID"]
+    gk_ids_a = [xid for pid, xid in links[team_a_name].items()
+                if team_a_roles.get(pid) == "G"]
+    gk_ids_b = [xid for pid, xid in links[team_b_name].items()
+                if team_b_roles.get(pid) == "G"]
 
     # Filter goalkeepers
     for xid in gk_ids_a:
-        xy1.xy[:, 2 * xid: 2 * xid + 2] = np.NaN
+        xy1.xy[:, 2 * xid: 2 * xid + 2] = np.nan
     for xid in gk_ids_b:
-        xy2.xy[:, 2 * xid: 2 * xid + 2] = np.NaN
+        xy2.xy[:, 2 * xid: 2 * xid + 2] = np.nan
 
     return {"a": xy1, "b": xy2}
 
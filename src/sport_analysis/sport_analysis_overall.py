@@ -12,7 +12,7 @@ Date:
     2025-04-01
 """
 
-from typing import Any, Counter, Union
+from typing import Any, Counter, Optional, Union
 
 import variables.data_variables as dv
 from preprocessing.template_matching.template_start import \
@@ -416,7 +416,8 @@ def calculate_player_count_per_phase(events: Any) -> dict[Any, Any]:
     return analysis_results
 
 
-def analyze_events_and_formations(events: Any, match_id: int
+def analyze_events_and_formations(events: Any, match_id: int,
+                                  phase_results: Optional[list[Any]] = None
                                   ) -> tuple[dict[str, dict[Any, Any]], Any]:
     """
     Analyzes events and defensive formations during different phases of the
@@ -428,6 +429,8 @@ def analyze_events_and_formations(events: Any, match_id: int
             - time: Timestamp of the event
             - team: Team identifier (home/away)
         match_id (int): Unique identifier for the match
+        phase_results (list, optional): The formations of the template
+        matching. The template matching is run if None.
 
     Returns:
         tuple: Contains two elements:
@@ -445,7 +448,8 @@ def analyze_events_and_formations(events: Any, match_id: int
             information
     """
     # Template Matching ausführen
-    phase_results = run_template_matching(match_id)
+    if phase_results is None:
+        phase_results = run_template_matching(match_id)
 
     # Ergebnisdictionary initialisieren
     analysis_results: dict[Any, Any]
@@ -525,7 +529,8 @@ def analyze_events_and_formations(events: Any, match_id: int
     }, events
 
 
-def create_combined_statistics(events: Any, match_id: int
+def create_combined_statistics(events: Any, match_id: int,
+                               phase_results: Optional[list[Any]] = None
                                ) -> dict[Any, Any]:
     """
     Creates a comprehensive analysis combining all match statistics
@@ -539,6 +544,8 @@ def create_combined_statistics(events: Any, match_id: int
             - home_players: Number of home team players
             - away_players: Number of away team players
         match_id (int): Unique identifier for the match
+        phase_results (list, optional): The formations of the template
+        matching. The template matching is run if None.
 
     Returns:
         dict: Dictionary containing combined match statistics:
@@ -564,7 +571,8 @@ def create_combined_statistics(events: Any, match_id: int
             }
     """
     # Gather all individual statistics
-    formation_stats, events = analyze_events_and_formations(events, match_id)
+    formation_stats, events = analyze_events_and_formations(
+        events, match_id, phase_results)
     phase_stats = calculate_goal_success_rate_per_phase(events)
     player_count_stats = calculate_player_count_per_phase(events)
     next_phase_stats = calculate_next_phase(events)
@@ -773,7 +781,6 @@ def create_combined_statistics(events: Any, match_id: int
             }
         }
     }
-    print(type(combined_stats))
 
     return combined_stats
 
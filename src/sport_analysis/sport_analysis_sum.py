@@ -3,6 +3,11 @@ This script is used to aggregate statistics from multiple JSON files
 and calculate rates and averages for each statistic.
 It is used to create summary statistics for handball matches.
 
+The statistics of every match are flattened to (path, value) records,
+so the totals and averages of a season follow from a single groupby
+instead of summing the nested dictionaries file by file. The files are
+aggregated separately for each approach.
+
 Author:
     @Annabelle Runge
 
@@ -11,11 +16,29 @@ Date:
 """
 
 import argparse
-import copy
 import json
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import variables.data_variables as dv
+
+# Keys that represent rates/percentages that shouldn't be summed
+RATE_KEYS = {"attack_success_rate", "goal_rate", "successful_attack_rate"}
+
+# Matches the file names written by main_structure.approach_plot, e.g.
+# analysis_results_sr:sport_event:123_POS_RB.json
+APPROACH_PATTERN = re.compile(
+    r"^analysis_results_(?P<match_id>.+)_(?P<approach>"
+    + "|".join(sorted((a.name for a in dv.Approach), key=len, reverse=True))
+    + r")\.json$")
+
+Record = Tuple[Tuple[str, ...], Any]
 
 
 def calculate_rates(d: Dict[str, Any]) -> Dict[str, Any]:
@@ -124,36 +147,137 @@ def calculate_rates(d: Dict[str, Any]) -> Dict[str, Any]:
     return d
 
 
-def deep_sum_dicts(dict1: Dict[str, Any], dict2: Dict[str, Any]
-                   ) -> Dict[str, Any]:
+def parse_approach(file_name: str) -> Optional[str]:
     """
-    Recursively sum numeric values in nested dictionaries.
-    Skip summing percentage/rate fields.
+    Extracts the approach name from the file name of an analysis result.
     Args:
-        dict1: The first dictionary to sum.
-        dict2: The second dictionary to sum.
+        file_name: The name of the JSON file.
     Returns:
-        A dictionary with the summed values.
+        The name of the approach, or None if the file name does not
+        follow the pattern analysis_results_{match_id}_{approach}.json.
     """
-    result = copy.deepcopy(dict1)
+    match = APPROACH_PATTERN.match(file_name)
+    return match.group("approach") if match else None
+
 
-    # List of keys that represent rates/percentages that shouldn't be summed
-    rate_keys = {"attack_success_rate", "goal_rate", "successful_attack_rate"}
+def flatten_statistics(data: Dict[str, Any]) -> List[Record]:
+    """
+    Flattens a nested dictionary to (path, value) records in the order
+    of the keys. Empty dictionaries are kept as values so that the
+    structure can be restored.
+    Args:
+        data: The dictionary containing the statistics.
+    Returns:
+        A list of (path, value) records.
+    """
+    records: List[Record] = []
+    stack = [((), iter(data.items()))]
+    while stack:
+        path, items = stack[-1]
+        item = next(items, None)
+        if item is None:
+            stack.pop()
+            continue
+        key, value = item
+        if isinstance(value, dict) and value:
+            stack.append((path + (key,), iter(value.items())))
+        else:
+            records.append((path + (key,), value))
+    return records
 
-    for key, value in dict2.items():
-        if key in rate_keys:
-            continue  # Skip summing rates
-        if key not in result:
-            result[key] = value
-        elif isinstance(value, dict) and isinstance(result[key], dict):
-            result[key] = deep_sum_dicts(result[key], value)
-        elif isinstance(value, (int, float)):
-            result[key] += value
 
+def unflatten_statistics(records: List[Record]) -> Dict[str, Any]:
+    """
+    Restores the nested dictionary from (path, value) records. If a path
+    is used both as a value and as a dictionary, the first record wins.
+    Args:
+        records: The (path, value) records.
+    Returns:
+        The nested dictionary.
+    """
+    result: Dict[str, Any] = {}
+    for path, value in records:
+        node = result
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+            if not isinstance(node, dict):
+                break
+        else:
+            node.setdefault(path[-1], value)
     return result
 
 
-def calculate_averages(sum_dict: Dict[str, Any], file_count: int
+def load_statistics(file_paths: List[Path], max_workers: int = 8
+                    ) -> List[List[Record]]:
+    """
+    Loads and flattens the JSON files with a thread pool.
+    Args:
+        file_paths: The JSON files to load.
+        max_workers: The number of threads used for loading.
+    Returns:
+        The flattened statistics of all valid files, in the order of
+        the file paths.
+    """
+    def load(file_path: Path) -> Optional[List[Record]]:
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                try:
+                    return flatten_statistics(json.load(f))
+                except json.JSONDecodeError:
+                    print(f"Error reading JSON from file: {file_path}")
+        except IOError as e:
+            print(f"Error opening file {file_path}: {e}")
+        return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        loaded = list(executor.map(load, file_paths))
+    return [records for records in loaded if records is not None]
+
+
+def sum_statistics(files: List[List[Record]]) -> Dict[str, Any]:
+    """
+    Sums the numeric values of the flattened statistics of all files.
+    Rates and non-numeric values are taken from the first file that
+    contains them.
+    Args:
+        files: The flattened statistics of each file.
+    Returns:
+        The nested dictionary with the summed values.
+    """
+    path_ids: Dict[Tuple[str, ...], int] = {}
+    first_values: List[Any] = []
+    ids: List[int] = []
+    values: List[float] = []
+
+    for records in files:
+        for path, value in records:
+            path_id = path_ids.get(path)
+            if path_id is None:
+                path_id = path_ids[path] = len(first_values)
+                first_values.append(value)
+            if isinstance(value, (int, float)):
+                ids.append(path_id)
+                values.append(value)
+
+    summable = np.array([
+        isinstance(value, (int, float)) and path[-1] not in RATE_KEYS
+        for path, value in zip(path_ids, first_values)], dtype=bool)
+    records = pd.DataFrame({"path": np.asarray(ids, dtype=np.int64),
+                            "value": np.asarray(values, dtype=float)})
+    records = records[summable[records["path"].to_numpy()]]
+    sums = records.groupby("path")["value"].sum()
+
+    totals = list(first_values)
+    for path_id, total in sums.items():
+        # Integer counts stay integers as long as no file stores a float
+        if isinstance(totals[path_id], int) and float(total).is_integer():
+            totals[path_id] = int(total)
+        else:
+            totals[path_id] = float(total)
+    return unflatten_statistics(list(zip(path_ids, totals)))
+
+
+def average_statistics(sum_dict: Dict[str, Any], file_count: int
                        ) -> Dict[str, Any]:
     """
     Calculate averages for all numeric values in the nested dictionary.
@@ -163,86 +287,102 @@ def calculate_averages(sum_dict: Dict[str, Any], file_count: int
     Returns:
         A dictionary with the averaged values.
     """
-    result = copy.deepcopy(sum_dict)
+    return unflatten_statistics([
+        (path, value / file_count if isinstance(value, (int, float))
+         else value)
+        for path, value in flatten_statistics(sum_dict)])
 
-    def recursive_average(d: Dict[str, Any]) -> None:
-        for key, value in d.items():
-            if isinstance(value, dict):
-                recursive_average(value)
-            elif isinstance(value, (int, float)):
-                d[key] = value / file_count
 
-    recursive_average(result)
-    return result
+def save_statistics(stats: Dict[str, Any], file_path: str) -> bool:
+    """
+    Saves the statistics to a JSON file.
+    Args:
+        stats: The dictionary containing the statistics.
+        file_path: The path of the output file.
+    Returns:
+        True if the file was saved, False otherwise.
+    """
+    try:
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(stats, f, indent=4, ensure_ascii=False)
+    except IOError as e:
+        print(f"Error saving statistics to {file_path}: {e}")
+        return False
+    return True
 
 
-def aggregate_statistics(input_dir: str, output_dir: str) -> None:
+def aggregate_files(file_paths: List[Path], output_dir: str,
+                    max_workers: int = 8) -> None:
     """
-    Process all JSON files in the input directory and create
-    summary statistics.
+    Creates the total and average statistics of the given JSON files.
 
     Args:
-        input_dir: Directory containing JSON files to process
+        file_paths: JSON files to process
         output_dir: Directory where output files will be saved
+        max_workers: Number of threads used for loading the files
     Returns:
         None
     """
-    # Create output directory if it doesn't exist
-    Path(output_dir).mkdir(parents=True, exist_ok=True)
-
-    # Initialize variables
-    combined_stats: Dict[str, Any] = {}
-    file_count = 0
-
-    # Process all JSON files
-    for file_path in Path(input_dir).glob('**/*.json'):
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                try:
-                    data = json.load(f)
-                    if not combined_stats:
-                        combined_stats = copy.deepcopy(data)
-                    else:
-                        combined_stats = deep_sum_dicts(combined_stats, data)
-                    file_count += 1
-                except json.JSONDecodeError:
-                    print(f"Error reading JSON from file: {file_path}")
-                    continue
-        except IOError as e:
-            print(f"Error opening file {file_path}: {e}")
-            continue
-
+    files = load_statistics(file_paths, max_workers)
+    file_count = len(files)
     if file_count == 0:
         print("No valid JSON files found")
         return
 
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+    combined_stats = sum_statistics(files)
     # Add file count to the summary
     combined_stats['total_files_processed'] = file_count
 
     # Calculate rates for the total statistics
     combined_stats = calculate_rates(combined_stats)
-
-    # Save total sums
-    try:
-        with open(os.path.join(output_dir, 'total_statistics.json'),
-                  'w',
-                  encoding='utf-8') as f:
-            json.dump(combined_stats, f, indent=4, ensure_ascii=False)
-    except IOError as e:
-        print(f"Error saving total statistics: {e}")
+    if not save_statistics(combined_stats, os.path.join(
+            output_dir, 'total_statistics.json')):
         return
 
     # Calculate averages (including the rates)
-    average_stats = calculate_averages(combined_stats, file_count)
+    average_stats = average_statistics(combined_stats, file_count)
     average_stats = calculate_rates(average_stats)
-    # Save averages
-    try:
-        with open(os.path.join(output_dir, 'average_statistics.json'),
-                  'w',
-                  encoding='utf-8') as f:
-            json.dump(average_stats, f, indent=4, ensure_ascii=False)
-    except IOError as e:
-        print(f"Error saving average statistics: {e}")
+    save_statistics(average_stats, os.path.join(
+        output_dir, 'average_statistics.json'))
+
+
+def aggregate_statistics(input_dir: str, output_dir: str,
+                         approaches: Optional[List[str]] = None,
+                         max_workers: int = 8) -> None:
+    """
+    Process all JSON files in the input directory and create
+    summary statistics for each approach.
+
+    The statistics of an approach are saved in a subdirectory of the
+    output directory named after the approach. Files whose name does
+    not contain an approach are aggregated directly into the output
+    directory.
+
+    Args:
+        input_dir: Directory containing JSON files to process
+        output_dir: Directory where output files will be saved
+        approaches: Names of the approaches to aggregate, all approaches
+        found in the input directory if None
+        max_workers: Number of threads used for loading the files
+    Returns:
+        None
+    """
+    files_per_approach: Dict[Optional[str], List[Path]] = {}
+    for file_path in sorted(Path(input_dir).glob('**/*.json')):
+        approach = parse_approach(file_path.name)
+        if approaches is None or approach in approaches:
+            files_per_approach.setdefault(approach, []).append(file_path)
+
+    if not files_per_approach:
+        print("No valid JSON files found")
+        return
+
+    for approach, file_paths in files_per_approach.items():
+        approach_dir = (output_dir if approach is None
+                        else os.path.join(output_dir, approach))
+        aggregate_files(file_paths, approach_dir, max_workers)
 
 
 # Example usage
@@ -263,8 +403,15 @@ if __name__ == "__main__":
                         default=os.getenv(
                             'HANDBALL_OUTPUT_DIR', DEFAULT_OUTPUT_DIR),
                         help='Directory where output files will be saved')
+    parser.add_argument('--approach', action='append', default=None,
+                        choices=[approach.name for approach in dv.Approach],
+                        help='Approach to aggregate, can be repeated; '
+                             'all approaches if omitted')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='Number of threads used for loading the files')
 
     args = parser.parse_args()
 
     # Run the aggregation
-    aggregate_statistics(args.input_dir, args.output_dir)
+    aggregate_statistics(args.input_dir, args.output_dir, args.approach,
+                         args.workers)
@@ -0,0 +1,332 @@
+"""
+This module synchronizes events by aligning the time-ordered events to the
+time-ordered sequences with a monotone dynamic program.
+
+The cost function approach of old_code.cost_function_approach fills an
+events x sequences matrix cell by cell and picks the cheapest sequence of
+every event independently, so two consecutive events can be assigned to
+sequences in the opposite order (e.g. a score change after the throw-off
+that follows it). Here the same costs (phase cost and distance between
+player and ball at the end of the sequence, weighted 0.5 / 0.5) are
+computed as tables over a band of candidate sequences per event:
+    - the sequences that start before the event and end at most
+      MAX_TIME_DIFF frames after it, like in the cost matrix,
+    - and end at most MAX_LOOKBACK frames before it. The cost matrix
+      has no such limit, every earlier sequence of the match is a
+      candidate, although the events are late by a few seconds only,
+and the events are aligned to the sequences with a Viterbi-style dynamic
+program in which the sequence index never decreases from one event to
+the next. Time and memory are O(events x band) instead of
+O(events x sequences) Python calls.
+
+    events = sync_events_alignment(events, sequences, pos_data, pid_dict,
+                                   ball_positions)
+
+Author:
+    @Annabelle Runge
+
+Date:
+    2025-05-26
+"""
+import logging
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+import help_functions.position_helpers as position_helpers
+from help_functions.instrumentation import span
+from help_functions.roster_index import RosterIndex
+from synchronization_approaches.cost_function_approach_2 import (
+    calculate_phase_cost, prepare, sigmoid)
+from synchronization_approaches.pos_data_approach import event_players
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of frames a sequence may end after the event
+MAX_TIME_DIFF = 1000
+# Maximum number of frames a sequence may end before the event
+MAX_LOOKBACK = 1000
+# Weights of the position and the phase cost
+POSITION_WEIGHT = 0.5
+PHASE_WEIGHT = 0.5
+
+
+def sequence_band(frames: np.ndarray, sequences: np.ndarray,
+                  max_lookback: int = MAX_LOOKBACK
+                  ) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the band of candidate sequences of every event: the sequences
+    that start before the event and end at most max_lookback frames
+    before it.
+
+    Args:
+        frames: [n] frames of the events, sorted
+        sequences: [m, 3] start, end and phase of the sequences, sorted by
+        start
+        max_lookback: Maximum number of frames a sequence may end before
+        the event
+
+    Returns:
+        tuple: The first and the last + 1 candidate sequence of every
+        event
+    """
+    hi = np.searchsorted(sequences[:, 0], frames, side="right")
+    # No sequence before the running maximum of the ends is a candidate
+    lo = np.searchsorted(np.maximum.accumulate(sequences[:, 1]),
+                         frames - max_lookback, side="left")
+    return lo, np.maximum(hi, lo)
+
+
+def phase_cost_table(event_types: np.ndarray, competitors: np.ndarray,
+                     phases: np.ndarray) -> np.ndarray:
+    """
+    Calculates the phase cost of every event in every phase, once per
+    event type and team.
+
+    Args:
+        event_types: [n] types of the events
+        competitors: [n] teams of the events
+        phases: [p] phases
+
+    Returns:
+        np.ndarray: [n, p] phase costs
+    """
+    rows: dict[tuple[Any, Any], np.ndarray] = {}
+    table = np.empty((len(event_types), len(phases)))
+    for i, key in enumerate(zip(event_types, competitors)):
+        if key not in rows:
+            rows[key] = np.array([calculate_phase_cost(int(phase), key[1],
+                                                       key[0])
+                                  for phase in phases], dtype=float)
+        table[i] = rows[key]
+    return table
+
+
+def position_cost_band(player: np.ndarray, ball_positions: np.ndarray,
+                       sequences: np.ndarray, lo: int,
+                       hi: int) -> np.ndarray:
+    """
+    Calculates the position cost of a player for the candidate sequences
+    of an event: the sigmoid of the minimum distance between the player
+    and the ball in the last 10 % of every sequence. Sequences without
+    positions in that part get the maximum cost of 1.
+
+    Args:
+        player: [n, 2] positions of the player
+        ball_positions: [n, 2] combined ball positions
+        sequences: [m, 3] start, end and phase of the sequences
+        lo: The first candidate sequence
+        hi: The last + 1 candidate sequence
+
+    Returns:
+        np.ndarray: [hi - lo] position costs
+    """
+    n_frames = min(len(player), len(ball_positions))
+    starts = sequences[lo:hi, 0]
+    stops = np.minimum(sequences[lo:hi, 1] + 1, n_frames)
+    lengths = np.maximum(stops - starts, 0)
+    window_starts = stops - np.maximum(1, (0.1 * lengths).astype(np.int64))
+    window_starts = np.maximum(window_starts, starts)
+    valid = lengths > 0
+    costs = np.ones(hi - lo)
+    if not valid.any():
+        return costs
+    first = int(window_starts[valid].min())
+    last = int(stops[valid].max())
+    distance = np.hypot(*(ball_positions[first:last] -
+                          player[first:last]).T)
+    # The windows are disjoint and sorted, the minimum of every window is
+    # at the even positions of the reduction
+    bounds = np.column_stack([window_starts[valid],
+                              stops[valid]]).ravel() - first
+    if np.all(np.diff(bounds) >= 0):
+        minima = np.fmin.reduceat(np.append(distance, np.nan),
+                                  bounds)[::2]
+    else:
+        minima = np.array([np.fmin.reduce(distance[a:b]) for a, b
+                           in bounds.reshape(-1, 2)])
+    costs[valid] = np.where(np.isnan(minima), 1.0,
+                            sigmoid(minima, d=5, e=2.5))
+    return costs
+
+
+def alignment_costs(frames: np.ndarray, players: list[Optional[tuple]],
+                    phase_table: np.ndarray, phase_index: np.ndarray,
+                    sequences: np.ndarray,
+                    pos_data: list[Any], ball_positions: np.ndarray,
+                    max_time_diff: int = MAX_TIME_DIFF,
+                    max_lookback: int = MAX_LOOKBACK
+                    ) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Calculates the costs of the candidate sequences of every event.
+
+    Args:
+        frames: [n] frames of the events, sorted
+        players: The group and the xID of the player of every event, None
+        for events without player
+        phase_table: [n, p] phase cost of every event in every phase
+        phase_index: [m] index of the phase of every sequence in the
+        phase table
+        sequences: [m, 3] start, end and phase of the sequences, sorted by
+        start
+        pos_data: The XY objects of all groups
+        ball_positions: The combined ball positions
+        max_time_diff: Maximum number of frames a sequence may end after
+        the event
+        max_lookback: Maximum number of frames a sequence may end before
+        the event
+
+    Returns:
+        tuple: [n, band] costs, inf for no candidate, and the first
+        candidate sequence of every event
+    """
+    lo, hi = sequence_band(frames, sequences, max_lookback)
+    band = int((hi - lo).max()) if len(frames) else 0
+    costs = np.full((len(frames), band), np.inf)
+    for i, player in enumerate(players):
+        if player is None or hi[i] == lo[i]:
+            continue
+        group, xid = player
+        candidates = sequences[lo[i]:hi[i]]
+        position_cost = position_cost_band(
+            pos_data[group].player(xid), ball_positions, sequences,
+            int(lo[i]), int(hi[i]))
+        cost = (POSITION_WEIGHT * position_cost +
+                PHASE_WEIGHT * phase_table[i, phase_index[lo[i]:hi[i]]])
+        # Candidates that end too late, or too early if the ends are not
+        # sorted
+        cost[(candidates[:, 1] > frames[i] + max_time_diff) |
+             (candidates[:, 1] < frames[i] - max_lookback)] = np.inf
+        costs[i, :hi[i] - lo[i]] = cost
+    return costs, lo
+
+
+def monotone_alignment(costs: np.ndarray, lo: np.ndarray) -> np.ndarray:
+    """
+    Assigns a candidate sequence to every event with the lowest total
+    cost, so that the sequences of the time-ordered events never go
+    back in time. Events without a candidate are not assigned and do not
+    constrain the others. If no order-preserving assignment is left for
+    an event, the alignment restarts at this event.
+
+    Args:
+        costs: [n, band] costs of the candidate sequences, inf for no
+        candidate
+        lo: [n] first candidate sequence of every event, not decreasing
+
+    Returns:
+        np.ndarray: [n] assigned sequence of every event, -1 if not
+        assigned
+    """
+    n_events, band = costs.shape
+    assigned = np.full(n_events, -1, dtype=np.int64)
+    chain = np.flatnonzero(np.isfinite(costs).any(axis=1))
+    if len(chain) == 0:
+        return assigned
+    total = np.full((len(chain), band), np.inf)
+    back = np.full((len(chain), band), -1, dtype=np.int64)
+    offsets = np.arange(band)
+    total[0] = costs[chain[0]]
+    for k in range(1, len(chain)):
+        i, p = chain[k], chain[k - 1]
+        # Lowest total and its first candidate of the previous event up to
+        # every candidate
+        best = np.minimum.accumulate(total[k - 1])
+        improves = np.concatenate([[True], total[k - 1][1:] < best[:-1]])
+        best_arg = np.maximum.accumulate(np.where(improves, offsets, 0))
+        previous = np.minimum(lo[i] - lo[p] + offsets, band - 1)
+        step = costs[i] + best[previous]
+        if np.isfinite(step).any():
+            total[k] = step
+            back[k] = best_arg[previous]
+        else:
+            total[k] = costs[i]
+    position = int(np.argmin(total[-1]))
+    for k in range(len(chain) - 1, -1, -1):
+        assigned[chain[k]] = lo[chain[k]] + position
+        if k > 0:
+            position = (int(back[k, position]) if back[k, position] >= 0
+                        else int(np.argmin(total[k - 1])))
+    return assigned
+
+
+def sync_events_alignment(events: pd.DataFrame,
+                          sequences: list[tuple[int, int, int]],
+                          pos_data: list[Any], pid_dict: dict[str, Any],
+                          ball_positions: np.ndarray,
+                          max_time_diff: int = MAX_TIME_DIFF,
+                          max_lookback: int = MAX_LOOKBACK,
+                          roster: Optional[RosterIndex] = None
+                          ) -> pd.DataFrame:
+    """
+    Synchronizes the events with the monotone alignment to the sequences
+    on already loaded position data. Every assigned event is moved to the
+    middle of its sequence, like in the cost function approach.
+
+    Args:
+        events: The events with the team column
+        sequences: The sequences (start, end, phase)
+        pos_data: The XY objects of all groups
+        pid_dict: The meta data of the position file
+        ball_positions: The combined ball positions
+        max_time_diff: Maximum number of frames a sequence may end after
+        the event
+        max_lookback: Maximum number of frames a sequence may end before
+        the event
+        roster: The players of the season, used to find the players of
+        the events by their Sportradar IDs
+
+    Returns:
+        pd.DataFrame: The synchronized events
+    """
+    if len(events) == 0 or len(sequences) == 0:
+        return events
+    seq = np.asarray(sequences, dtype=np.int64).reshape(-1, 3)
+    seq = seq[np.argsort(seq[:, 0], kind="stable")]
+    frames = pd.to_numeric(events.iloc[:, 24],
+                           errors="coerce").to_numpy(dtype=float)
+    rows = np.flatnonzero(~np.isnan(frames))
+    rows = rows[np.argsort(frames[rows], kind="stable")]
+
+    player_rows = event_players(events, pid_dict, roster)
+    players = [player_rows.get(int(row)) for row in rows]
+    phases, phase_index = np.unique(seq[:, 2], return_inverse=True)
+    phase_table = phase_cost_table(events.iloc[rows, 0].to_numpy(),
+                                   events.iloc[rows, 25].to_numpy(),
+                                   phases)
+
+    costs, lo = alignment_costs(frames[rows].astype(np.int64), players,
+                                phase_table, phase_index, seq, pos_data,
+                                ball_positions, max_time_diff,
+                                max_lookback)
+    assigned = monotone_alignment(costs, lo)
+    moved = assigned >= 0
+    starts, ends = seq[assigned[moved], 0], seq[assigned[moved], 1]
+    events.iloc[rows[moved], 24] = starts + (ends - starts) // 2
+    logger.info("Aligned %s of %s events to %s sequences (band %s)",
+                int(moved.sum()), len(events), len(seq), costs.shape[1])
+    return events
+
+
+def main(match_id: int, events: pd.DataFrame,
+         sequences: list[tuple[int, int, int]]) -> pd.DataFrame:
+    """
+    Loads the position data of a match and synchronizes the events with
+    the monotone alignment.
+
+    Args:
+        match_id: The match ID
+        events: The events with the team column
+        sequences: The sequences (start, end, phase)
+
+    Returns:
+        pd.DataFrame: The synchronized events
+    """
+    with span("load_positions"):
+        pos_data, ball_data, pid_dict, _ = prepare(match_id)
+    with span("ball_fusion"):
+        ball_positions, _ = position_helpers.prepare_ball_data(ball_data)
+    with span("sync_events", events=len(events)):
+        return sync_events_alignment(events, sequences, pos_data, pid_dict,
+                                     ball_positions)
@@ -9,7 +9,8 @@ Author:
 Date:
     2025-04-01
 """
-from typing import Any
+import logging
+from typing import Any, Optional
 
 import floodlight.io.kinexon as fliok
 import numpy as np
@@ -18,11 +19,21 @@ import pandas as pd
 import help_functions.position_helpers as position_helpers
 import preprocessing.template_matching.template_start as template_start
 import variables.data_variables as dv
+from help_functions.event_windows import (EventWindows, event_windows,
+                                          gather_frames)
+from help_functions.gap_index import (GapIndex, MatchGaps, build_match_gaps,
+                                      search_start)
+from help_functions.instrumentation import span
+from help_functions.min_pyramid import MinPyramid
+from help_functions.search_windows import (SearchWindows, load_search_windows,
+                                           search_windows_path)
 from synchronization_approaches.pos_data_approach import (find_key_position,
                                                           get_pid_from_name,
                                                           get_pos_filepath,
                                                           normalize)
 
+logger = logging.getLogger(__name__)
+
 # def get_distance_ball_event_cost(tracking_data, event):
 #     distance = np.hypot(
 #         tracking_data["ball_x"].values - event["start_x"],
@@ -83,9 +94,9 @@ def get_distance_ball_player_cost(ball_data: np.ndarray,
 
     distance = np.hypot(
         # x-Koordinaten (erste Stelle)
-        ball_data[:, 0] - player_data[:, 0],
+        ball_data[..., 0] - player_data[..., 0],
         # y-Koordinaten (zweite Stelle)
-        ball_data[:, 1] - player_data[:, 1]
+        ball_data[..., 1] - player_data[..., 1]
     )
     return sigmoid(distance, d=5, e=2.5)
 
@@ -246,7 +257,8 @@ def prepare(match_id: int) -> tuple[Any, Any, Any, Any]:
 
 def main(match_id: int, events: Any) -> Any:
     """
-    Main function to prepare the data for the cost function.
+    Main function to prepare the data for the cost function. The
+    calibrated search windows are loaded from HBL_Synchronization.
     Args:
         match_id: The match ID
         events: The events
@@ -255,46 +267,253 @@ def main(match_id: int, events: Any) -> Any:
         Any: The events with the tracking indices
 
     """
-    pos_data, ball_data, pid_dict, xids = prepare(match_id)
-    ball_data, ball_acceleration = position_helpers.prepare_ball_data(
-        ball_data)
+    search_windows = load_search_windows(search_windows_path())
+    with span("load_positions"):
+        pos_data, ball_data, pid_dict, xids = prepare(match_id)
+    with span("ball_fusion"):
+        ball_data, ball_acceleration = position_helpers.prepare_ball_data(
+            ball_data)
+    with span("sync_events", events=len(events)):
+        return sync_events_cost(events, pos_data, pid_dict, xids, ball_data,
+                                ball_acceleration,
+                                search_windows=search_windows)
+
+
+def sync_events_cost(events: Any, pos_data: Any, pid_dict: Any, xids: Any,
+                     ball_data: np.ndarray,
+                     ball_acceleration: np.ndarray,
+                     candidates: Optional[Any] = None,
+                     pyramid: Optional[MinPyramid] = None,
+                     gaps: Optional[MatchGaps] = None,
+                     search_windows: Optional[SearchWindows] = None) -> Any:
+    """
+    Synchronizes the events with the cost function on already loaded
+    position data.
+    Args:
+        events: The events
+        pos_data: The XY objects of all groups
+        pid_dict: The meta data of the position file
+        xids: The links of the player names to the xIDs
+        ball_data: The combined ball positions
+        ball_acceleration: The acceleration of the ball
+        candidates: The ball event candidates of the match. If given, only
+        the candidate frames in the window of an event are scored instead
+        of every frame.
+        pyramid: The cost pyramid of the match from cost_pyramid(). If
+        given (and no candidates), the lowest cost is searched
+        coarse-to-fine with the same results.
+        gaps: The gap indices of the match from build_match_gaps(), built
+        from the positions if None.
+        search_windows: The calibrated windows of the event types, 500
+        frames before every event if None.
+
+    Returns:
+        Any: The events with the tracking indices
+    """
+    targets = cost_targets(events, pos_data, pid_dict, xids, ball_data,
+                           gaps, search_windows)
+    if not targets:
+        return events
+
+    if pyramid is not None and candidates is None:
+        for idx, group, pid_num, start, end, _ in targets:
+            frame, cost = pyramid.argmin(pyramid.columns[(group, pid_num)],
+                                         start, end)
+            tracking_idx = frame if np.isfinite(cost) else 0
+            lowest_cost = cost / 2 if tracking_idx != 0 else 0
+            if lowest_cost <= 0.5 and tracking_idx != 0:
+                events.iloc[idx, 24] = tracking_idx
+                logger.debug("Lowest cost %s at frame %s", lowest_cost,
+                             tracking_idx)
+        return events
+
+    # The costs of all events with the usual window are computed at once,
+    # events with an extended window (interruption, no frame) one by one
+    targets_array = np.array(targets, dtype=np.int64)
+    usual = (targets_array[:, 4] - targets_array[:, 3]
+             <= targets_array[:, 5])
+    batches = [targets_array[usual]] + [
+        targets_array[i:i + 1] for i in np.flatnonzero(~usual)]
+    for batch in batches:
+        if len(batch) == 0:
+            continue
+        idxs, groups, pids, starts, ends, _ = batch.T
+        if candidates is None:
+            windows = event_windows(
+                ends, pids, groups, pos_data, ball_data,
+                before=max(int((ends - starts).max()), 1),
+                ball_acceleration=ball_acceleration)
+        else:
+            windows = gather_frames(
+                candidates.window_frames(starts, ends), pids, groups,
+                pos_data, ball_data, ball_acceleration)
+        for idx, tracking_idx, lowest_cost in zip(
+                idxs, *lowest_costs(windows, starts)):
+            if lowest_cost <= 0.5 and tracking_idx != 0:
+                events.iloc[idx, 24] = tracking_idx
+                logger.debug("Lowest cost %s at frame %s", lowest_cost,
+                             tracking_idx)
+    return events
+
+
+def cost_targets(events: Any, pos_data: Any, pid_dict: Any, xids: Any,
+                 ball_data: np.ndarray,
+                 gaps: Optional[MatchGaps] = None,
+                 search_windows: Optional[SearchWindows] = None
+                 ) -> list[tuple[int, int, int, int, int, int]]:
+    """
+    Finds the player and the window of the choosable frames of every
+    event.
+    Args:
+        events: The events
+        pos_data: The XY objects of all groups
+        pid_dict: The meta data of the position file
+        xids: The links of the player names to the xIDs
+        ball_data: The combined ball positions
+        gaps: The gap indices of the match, built from the positions if
+        None
+        search_windows: The calibrated windows of the event types, 500
+        frames before every event if None
+
+    Returns:
+        list: The row of the event, the group and the xID of the player,
+        the first frame and the frame after the last frame of the window
+        and the window without extension of every event with a player
+    """
+    if gaps is None:
+        gaps = build_match_gaps(pos_data, pid_dict, ball_data)
+    targets = []
     for idx, event in enumerate(events.values):
         links, player_data, pid = prepare_position_cost(
             pos_data, pid_dict, xids, event)
         if player_data is not None:
             pid = normalize(pid)
             pid_num = get_pid_from_name(pid, links)
+            group = find_key_position(pid_dict, event[10])
+            window = 500
+            if search_windows is not None:
+                window = int(search_windows.before_frames([event[0]],
+                                                          500)[0])
+            start, end = cost_window(event[24], player_data.player(pid_num),
+                                     ball_data, gaps.combined(group, pid_num),
+                                     window)
+            targets.append((idx, group, pid_num, start, end, window))
+    return targets
+
+
+def cost_pyramid(pos_data: list[Any], pid_dict: dict[str, Any],
+                 ball_data: np.ndarray,
+                 ball_acceleration: np.ndarray) -> MinPyramid:
+    """
+    Computes the total cost of every player in every frame and its
+    pyramid of block minima for the coarse-to-fine search of
+    sync_events_cost.
 
-            # Get player positions data
-            player_data = player_data.player(pid_num)
-            pos_cost = get_distance_ball_player_cost(ball_data, player_data)
-            acc_cost = get_ball_acceleration_cost(ball_acceleration)
-            # phase_cost = calculate_phase_cost(event[0], event[1], event[2])
-            total_cost = pos_cost + acc_cost  # + phase_cost
-            total_cost = inf_values(
-                total_cost, event[24], player_data, ball_data)
-            # Ersetze NaN-Werte durch inf, damit sie nicht als Minimum
-            # gewählt werden
-            total_cost = np.where(np.isnan(total_cost), np.inf, total_cost)
-            tracking_idx = total_cost.argmin()
-            if tracking_idx != 0:
-                lowest_cost = (
-                    total_cost / 2
-                ).min()
-            else:
-                lowest_cost = 0
+    Args:
+        pos_data: The XY objects of all groups
+        pid_dict: The meta data of the position file
+        ball_data: The combined ball positions
+        ball_acceleration: The acceleration of the ball
 
-            if lowest_cost <= 0.5 and tracking_idx != 0:
-                events.iloc[idx, 24] = tracking_idx
-                print(lowest_cost)
-                print(tracking_idx)
-    return events
+    Returns:
+        MinPyramid: The costs, inf for unknown frames, with the column of
+        every (group, xID)
+    """
+    ball_num = find_key_position(pid_dict, "Ball")
+    groups = [group for group in range(len(pos_data)) if group != ball_num]
+    n_frames = min([len(ball_data), len(ball_acceleration)]
+                   + [len(pos_data[group].xy) for group in groups])
+    ball = np.asarray(ball_data[:n_frames], dtype=float)[:, None, :]
+    acc_cost = get_ball_acceleration_cost(
+        np.asarray(ball_acceleration[:n_frames], dtype=float))[:, None]
+    costs = []
+    columns = {}
+    for group in groups:
+        players = np.asarray(pos_data[group].xy[:n_frames],
+                             dtype=float).reshape(n_frames, -1, 2)
+        for xid in range(players.shape[1]):
+            columns[(group, xid)] = len(columns)
+        costs.append(get_distance_ball_player_cost(ball, players)
+                     + acc_cost)
+    total_cost = np.concatenate(costs, axis=1)
+    return MinPyramid(np.where(np.isnan(total_cost), np.inf, total_cost),
+                      columns=columns)
+
+
+def lowest_costs(windows: EventWindows,
+                 starts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the frame with the lowest cost in the windows of many events.
+    Args:
+        windows: The windows of the events, ending before the events
+        starts: The first choosable frame of every event
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The frame with the lowest cost of
+        every event, 0 if no frame can be chosen, and half of the lowest
+        cost
+    """
+    pos_cost = get_distance_ball_player_cost(windows.ball, windows.player)
+    acc_cost = get_ball_acceleration_cost(windows.acceleration)
+    # phase_cost = calculate_phase_cost(event[0], event[1], event[2])
+    total_cost = pos_cost + acc_cost  # + phase_cost
+    # Ersetze NaN-Werte durch inf, damit sie nicht als Minimum
+    # gewählt werden
+    total_cost = np.where(
+        np.isnan(total_cost) | (windows.frames < starts[:, None]),
+        np.inf, total_cost)
+    best = total_cost.argmin(axis=1)
+    tracking_idx = np.where(np.isfinite(total_cost).any(axis=1),
+                            windows.frames[np.arange(len(windows)), best],
+                            0)
+    lowest_cost = np.where(tracking_idx != 0,
+                           total_cost.min(axis=1) / 2, 0)
+    return tracking_idx, lowest_cost
+
+
+def cost_window(time: Any,
+                player_data: Any,
+                ball_data: Any,
+                gaps: Optional[GapIndex] = None,
+                window: int = 500) -> tuple[int, int]:
+    """
+    Returns the frames before an event that can be chosen by the cost
+    function: the window before the event, extended until it contains as
+    many frames with data if the game was interrupted.
+    Args:
+        time: The time
+        player_data: The player data
+        ball_data: The ball data
+        gaps: The gap index of the player combined with the ball, built
+        from the positions if None
+        window: The number of frames before the event
+
+    Returns:
+        tuple[int, int]: The first frame and the frame after the last
+        frame of the window
+    """
+    data_length = len(player_data)
+    if time is None or time <= 0:
+        return 0, data_length
+
+    # Ensure time is within bounds
+    if time >= data_length:
+        time = data_length - 1
+
+    if gaps is None:
+        gaps = GapIndex.from_positions(player_data, ball_data)
+    max_time, none_idx = search_start(gaps, time, window)
+    if none_idx > 10:
+        logger.debug("Game was interrupted for %s frames", none_idx)
+    # Ensure max_time is not negative
+    return max(0, max_time), time
 
 
 def inf_values(total_cost: Any,
                time: Any,
                player_data: Any,
-               ball_data: Any) -> Any:
+               ball_data: Any,
+               gaps: Optional[GapIndex] = None) -> Any:
     """
     Inf values for the cost function.
     Args:
@@ -302,6 +521,7 @@ def inf_values(total_cost: Any,
         time: The time
         player_data: The player data
         ball_data: The ball data
+        gaps: The gap index of the player combined with the ball
 
     Returns:
         Any: The total cost
@@ -309,41 +529,9 @@ def inf_values(total_cost: Any,
     if time is None or time <= 0:
         return total_cost
 
-    # Ensure time is within bounds
-    data_length = len(player_data)
-    if time >= data_length:
-        time = data_length - 1
-
-    # Set future values to infinity
-    total_cost[time:] = np.inf
-
-    none_idx = 0
-    max_time = max(0, time - 500)  # Ensure max_time is not negative
-
-    # Check for None values in the window
-    for t in range(time - 1, max_time - 1, -1):
-        if t >= data_length:
-            continue
-        if player_data[t].any() is None or ball_data[t].any() is None:
-            none_idx += 1
-
-    if none_idx >= 499:
-        for t in range(max_time - 1, -1, -1):
-            if t >= data_length:
-                continue
-            if player_data[t].any() is None or ball_data[t].any() is None:
-                none_idx += 1
-            else:
-                break
-
-    if none_idx > 10:
-        print(f"Game was interrupted for {none_idx} frames")
-        # Ensure max_time is not negative
-        max_time = max(0, max_time - none_idx)
-
-    # Set past values to infinity
-    for t in range(max_time - 1, -1, -1):
-        if t < data_length:
-            total_cost[t] = np.inf
+    start, end = cost_window(time, player_data, ball_data, gaps)
+    # Set future and past values to infinity
+    total_cost[end:] = np.inf
+    total_cost[:start] = np.inf
 
     return total_cost
@@ -6,28 +6,41 @@ Author:
 Date:
     2025-04-29
 """
+import logging
 import os
 import re
 import unicodedata
-from typing import Any
+from typing import Any, Optional
 
 import floodlight.core.xy
 import floodlight.io.kinexon as fliok
 import numpy as np
 import pandas as pd
-from matplotlib import pyplot as plt
 from rapidfuzz import fuzz
 
 import help_functions.position_helpers as position_helpers
 import variables.data_variables as dv
+from help_functions.event_windows import event_windows, last_true
+from help_functions.gap_index import (GapIndex, MatchGaps, build_match_gaps,
+                                      search_start)
+from help_functions.headless import show_or_close
+from help_functions.instrumentation import span
+from help_functions.min_pyramid import MinPyramid
+from help_functions.possession import sync_possession_batch
+from help_functions.roster_index import RosterIndex
+from help_functions.search_windows import (SearchWindows, load_search_windows,
+                                           search_windows_path)
 from preprocessing.template_matching.template_start import \
     fuzzy_match_team_name
 
+logger = logging.getLogger(__name__)
+
 
 def sync_event_data_pos_data(events: Any,
                              match_id: int) -> Any:
     """
-    Synchronizes event data with position data for a given match.
+    Synchronizes event data with position data for a given match. The
+    calibrated search windows are loaded from HBL_Synchronization.
     Args:
         events (dict): A dictionary containing event data.
         sequences (list): A list of sequences to be used for synchronization.
@@ -35,15 +48,110 @@ def sync_event_data_pos_data(events: Any,
     Returns:
         dict: The updated events dictionary with synchronized position data.
     """
+    search_windows = load_search_windows(search_windows_path())
+
+    with span("load_positions") as counts:
+        filepath_data = get_pos_filepath(match_id)
+        pos_data = fliok.read_position_data_csv(filepath_data)
+        pid_dict, counts["frames"], _, _ = fliok.get_meta_data(
+            filepath_data)
+    with span("ball_fusion"):
+        ball_num = find_key_position(pid_dict, "Ball")
+        ball_positions, _ = position_helpers.prepare_ball_data(
+            pos_data[ball_num])
+    with span("sync_events", events=len(events)):
+        return sync_events_with_positions(events, pos_data, pid_dict,
+                                          ball_positions,
+                                          search_windows=search_windows)
+
+
+def sync_events_with_positions(events: Any, pos_data: Any,
+                               pid_dict: dict[str, Any],
+                               ball_positions: np.ndarray,
+                               possession: Optional[Any] = None,
+                               pyramid: Optional[MinPyramid] = None,
+                               gaps: Optional[MatchGaps] = None,
+                               search_windows: Optional[SearchWindows] = None,
+                               roster: Optional[RosterIndex] = None
+                               ) -> Any:
+    """
+    Synchronizes event data with already loaded position data.
+    Args:
+        events (pd.DataFrame): The events of the match.
+        pos_data (list): The XY objects of all groups.
+        pid_dict (dict): The meta data of the position file.
+        ball_positions (np.ndarray): The combined ball positions.
+        possession (PossessionTimeline, optional): The possession
+        timeline of the match. If given, the possession frames are
+        searched on the timeline instead of the positions.
+        pyramid (MinPyramid, optional): The distance pyramid of the match
+        for the coarse-to-fine search of the possession frames.
+        gaps (MatchGaps, optional): The gap indices of the match, built
+        from the positions if None.
+        search_windows (SearchWindows, optional): The calibrated windows
+        of the event types, 499 frames before every event if None.
+        roster (RosterIndex, optional): The players of the season, used
+        to find the players of the events by their Sportradar IDs.
+    Returns:
+        pd.DataFrame: The events with synchronized timestamps.
+    """
+    # Find the group and the xID of the player of every event
+    values = events.values
+    players = event_players(events, pid_dict, roster)
+
+    # Search the possession frames of all events at once
+    indices = list(players)
+    frames = [values[idx][24] for idx in indices]
+    xids_of_events = [players[idx][1] for idx in indices]
+    groups = [players[idx][0] for idx in indices]
+    before = None
+    if search_windows is not None:
+        before = search_windows.before_frames(
+            [values[idx][0] for idx in indices], 499)
+    if possession is None:
+        synced_frames = sync_pos_data_batch(frames, xids_of_events, groups,
+                                            pos_data, ball_positions,
+                                            pyramid=pyramid, gaps=gaps,
+                                            before=before)
+    else:
+        synced_frames = sync_possession_batch(possession, frames,
+                                              xids_of_events, groups)
+    synced = dict(zip(indices, synced_frames))
+
+    for idx, event in enumerate(values):
+        last_event = give_last_event_fl(events.values, event[24])
+        if last_event is not None:
+            last_event = last_event[0]
+        if (event[0] == "score_change" and last_event ==
+                "seven_m_awarded"):
+            events.iloc[idx, 0] = "seven_m_scored"
+        if idx in synced:
+            events.iloc[idx, 24] = synced[idx]
+
+    return events
 
-    filepath_data = get_pos_filepath(match_id)
-    pos_data = fliok.read_position_data_csv(filepath_data)
-    pid_dict, _, _, _ = fliok.get_meta_data(
-        filepath_data)
-    # print(pid_dict)
+
+def event_players(events: Any,
+                  pid_dict: dict[str, Any],
+                  roster: Optional[RosterIndex] = None
+                  ) -> dict[int, tuple[int, Any]]:
+    """
+    Finds the group and the xID of the player of every event the position
+    approach synchronizes.
+    Args:
+        events (pd.DataFrame): The events of the match.
+        pid_dict (dict): The meta data of the position file.
+        roster (RosterIndex, optional): The players of the season. The
+        Sportradar ID of a player is the sensor ID of the position data,
+        so players found in the roster are not matched by name.
+    Returns:
+        dict: The index of the group in pos_data and the xID of the
+        player per row of the events.
+    """
     xids = fliok.create_links_from_meta_data(pid_dict, identifier="name")
-    ball_num = find_key_position(pid_dict, "Ball")
-    ball_positions, _ = position_helpers.prepare_ball_data(pos_data[ball_num])
+    sensors = fliok.create_links_from_meta_data(pid_dict,
+                                                identifier="sensor_id")
+    groups = list(pid_dict)
     # Normalize names in xids dictionary
     normalized_xids = {}
     for name, id_value in xids.items():
@@ -57,61 +165,45 @@ def sync_event_data_pos_data(events: Any,
         normalized_xids[normalized_name] = id_value
 
     # events = add_information_to_events(events, match_id)
+    players: dict[int, tuple[int, Any]] = {}
     for idx, event in enumerate(events.values):
-        last_event = give_last_event_fl(events.values, event[24])
-        if last_event is not None:
-            last_event = last_event[0]
-        if (event[0] == "score_change" and last_event ==
-                "seven_m_awarded"):
-            events.iloc[idx, 0] = "seven_m_scored"
         if event[0] in ["score_change", "shot_saved", "shot_off_target",
                         "shot_blocked", "technical_rule_fault",
                         "seven_m_awarded", "steal", "technical_ball_fault"]:
             if event[8] is not None:
-                pos_num = find_key_position(pid_dict, event[10])
-                # Normalize the player name from the event for comparison
-                event_player_name = event[10]
-                if event_player_name:
-                    # Apply the same normalization as above
-                    normalized_event_player = (unicodedata.normalize(
-                        'NFKD', event_player_name
-                    ).encode('ASCII', 'ignore').decode('utf-8'))
-                    normalized_event_player = re.sub(
-                        r'[^\w\s]', '', normalized_event_player)
-                    normalized_event_player = (normalized_event_player
-                                               .lower().strip())
-                for i in normalized_xids.items():
-                    # Compare with both original and normalized names
-                    if fuzzy_match_team_name(
-                            normalized_event_player, i[0]):
-                        events.iloc[idx, 24] = (sync_pos_data(
-                            i[1], event[24],
-                            pos_data[pos_num],
-                            ball_positions,
-                            event[8]))
+                pid = event[8]
             elif event[14] is not None:
-                pos_num = find_key_position(pid_dict, event[10])
-                # Normalize the player name from the event for comparison
-                event_player_name = event[10]
-                if event_player_name:
-                    # Apply the same normalization as above
-                    normalized_event_player = (unicodedata.normalize(
-                        'NFKD', event_player_name
-                    ).encode('ASCII', 'ignore').decode('utf-8'))
-                    normalized_event_player = re.sub(
-                        r'[^\w\s]', '', normalized_event_player)
-                    normalized_event_player = (normalized_event_player
-                                               .lower().strip())
-                for i in normalized_xids.items():
-                    if fuzzy_match_team_name(
-                            normalized_event_player, i[0]):
-                        events.iloc[idx, 24] = (sync_pos_data(
-                            i[1], event[24],
-                            pos_data[pos_num],
-                            ball_positions,
-                            event[14]["name"]))
-
-    return events
+                pid = event[14]["name"]
+            else:
+                continue
+            pos_num = find_key_position(pid_dict, event[10])
+            if roster is not None:
+                sr_id = (str(event[14]["id"]).split(":")[-1]
+                         if event[8] is None and "id" in event[14]
+                         else roster.player_id(pid, event[10]))
+                xid = sensors.get(groups[pos_num], {}).get(sr_id)
+                if xid is not None:
+                    players[idx] = (pos_num, xid)
+                    continue
+            # Normalize the player name from the event for comparison
+            event_player_name = event[10]
+            if event_player_name:
+                # Apply the same normalization as above
+                normalized_event_player = (unicodedata.normalize(
+                    'NFKD', event_player_name
+                ).encode('ASCII', 'ignore').decode('utf-8'))
+                normalized_event_player = re.sub(
+                    r'[^\w\s]', '', normalized_event_player)
+                normalized_event_player = (normalized_event_player
+                                           .lower().strip())
+            for i in normalized_xids.items():
+                # Compare with both original and normalized names
+                if fuzzy_match_team_name(
+                        normalized_event_player, i[0]):
+                    players[idx] = (pos_num, get_pid_from_name(
+                        normalize(pid), i[1]))
+
+    return players
 
 
 # def add_information_to_events(events, match_id: int):
@@ -173,7 +265,8 @@ def get_pos_filepath(match_id: int,
 def sync_pos_data(links: Any, t_event: int,
                   pos_data: floodlight.core.xy.XY,
                   ball_positions: floodlight.core.xy.XY, pid: str,
-                  threshold: float = 0.99) -> int:
+                  threshold: float = 0.99,
+                  gaps: Optional[GapIndex] = None) -> int:
     """
     This function finds the last frame before a specific event where a
     player had the ball.
@@ -185,6 +278,8 @@ def sync_pos_data(links: Any, t_event: int,
         ball_data: XY-object with the ball positions
         pid: The player ID (name)
         threshold: Threshold for the distance to the ball (in meters)
+        gaps: The gap index of the player combined with the ball, built
+        from the positions if None
 
     Returns:
         int: Frame index of the last ball possession before the event
@@ -198,7 +293,6 @@ def sync_pos_data(links: Any, t_event: int,
 
     pos_index = False
     ball_index = False
-    none_idx = 0
     max_time = t_event-500
     # Search backwards from the event time
     for t in range(t_event - 1, max(-1, max_time), -1):
@@ -206,12 +300,11 @@ def sync_pos_data(links: Any, t_event: int,
             player_pos = player_data[t, :]
             ball_pos = ball_positions[t, :]
         except Exception as e:
-            print(f"Warning: Error accessing position data at frame {t}: {e}")
+            logger.debug("Error accessing position data at frame %s: %s", t, e)
             continue
 
         # Skip frames with missing data
         if np.isnan(player_pos).any() or np.isnan(ball_pos).any():
-            none_idx += 1
             continue
 
         # Calculate distance between player and ball
@@ -220,29 +313,26 @@ def sync_pos_data(links: Any, t_event: int,
         if distance < 0.3:
             return t
     # plot_test(max_time, t_event, player_data, ball_positions, pid)
-    if none_idx >= 499:
-        for t in range(max_time, 0, -1):
-            if np.isnan(player_pos).any() or np.isnan(ball_pos).any():
-                none_idx += 1
-            else:
-                break
+    # Missing data in the window means that the game was interrupted,
+    # the window is extended until it contains 499 frames with data
+    if gaps is None:
+        gaps = GapIndex.from_positions(player_data, ball_positions)
+    lower, none_idx = search_start(gaps, t_event, 499)
     if none_idx > 10:
-        print(f"Game was interrupted for {none_idx} frames")
-        max_time = max_time-none_idx
+        logger.debug("Game was interrupted for %s frames", none_idx)
+    max_time = lower - 1
     for t in range(t_event - 1, max(-1, max_time), -1):
         try:
             player_pos = player_data[t, :]
         except Exception as e:
-            print(
-                f"Warning: Error accessing player position data at frame {t}: "
-                f"{e}")
+            logger.debug(
+                "Error accessing player position data at frame %s: %s", t, e)
             continue
         try:
             ball_pos = ball_positions[t, :]
         except Exception as e:
-            print(
-                f"Warning: Error accessing ball position data at frame {t}: "
-                f"{e}")
+            logger.debug(
+                "Error accessing ball position data at frame %s: %s", t, e)
             continue
         if not np.isnan(player_pos).any():
             pos_index = True
@@ -259,20 +349,177 @@ def sync_pos_data(links: Any, t_event: int,
             return t
     else:
 
-        print(
-            f"No ball possession found before frame {t_event} for {pid}")
+        logger.debug("No ball possession found before frame %s for %s",
+                     t_event, pid)
     # If no ball possession is found, return the original event frame
     if not pos_index:
-        print(
-            f"No player position data found for {pid} from frame {t_event} "
-            f"to {max_time}")
+        logger.debug("No player position data found for %s from frame %s "
+                     "to %s", pid, t_event, max_time)
     if not ball_index:
-        print(f"No ball data found from frame {t_event} to {max_time}")
+        logger.debug("No ball data found from frame %s to %s", t_event,
+                     max_time)
     # plot_test(max_time, t_event, player_data, ball_positions, pid)
-    print(f"No ball possession found before frame {t_event} for {pid}")
+    logger.debug("No ball possession found before frame %s for %s", t_event,
+                 pid)
     return t_event
 
 
+def distance_pyramid(pos_data: list[Any], pid_dict: dict[str, Any],
+                     ball_positions: np.ndarray) -> MinPyramid:
+    """
+    Computes the distance of every player to the ball in every frame and
+    its pyramid of block minima for the coarse-to-fine search of
+    sync_pos_data_batch.
+
+    Args:
+        pos_data: The XY objects of all groups
+        pid_dict: The meta data of the position file
+        ball_positions: The combined ball positions
+
+    Returns:
+        MinPyramid: The distances with the column of every
+        (group, xID)
+    """
+    ball_num = find_key_position(pid_dict, "Ball")
+    groups = [group for group in range(len(pos_data)) if group != ball_num]
+    n_frames = min([len(ball_positions)]
+                   + [len(pos_data[group].xy) for group in groups])
+    ball = np.asarray(ball_positions[:n_frames], dtype=float)
+    distances = []
+    columns = {}
+    for group in groups:
+        xy = np.asarray(pos_data[group].xy[:n_frames], dtype=float)
+        players = xy.reshape(n_frames, -1, 2)
+        for xid in range(players.shape[1]):
+            columns[(group, xid)] = len(columns)
+        distances.append(np.linalg.norm(players - ball[:, None, :],
+                                        axis=-1))
+    return MinPyramid(np.concatenate(distances, axis=1), columns=columns)
+
+
+def sync_pos_data_batch(frames: Any, players: Any, groups: Any,
+                        pos_data: list[Any], ball_positions: np.ndarray,
+                        threshold: float = 0.99,
+                        pyramid: Optional[MinPyramid] = None,
+                        gaps: Optional[MatchGaps] = None,
+                        before: Optional[Any] = None) -> np.ndarray:
+    """
+    Finds the last frame before every event where the player had the
+    ball, like sync_pos_data, for all events at once on event windows.
+    With a distance pyramid the windows are searched coarse-to-fine
+    instead, with the same results.
+
+    Args:
+        frames: The frame indices of the events
+        players: The xIDs of the players of the events
+        groups: The indices of the groups of the players in pos_data
+        pos_data: The XY objects of all groups
+        ball_positions: The combined ball positions
+        threshold: Threshold for the distance to the ball (in meters)
+        pyramid: The distance pyramid of the match from
+        distance_pyramid()
+        gaps: The gap indices of the match from build_match_gaps(), built
+        for the groups of the events if None
+        before: The number of frames before every event that are
+        searched, 499 for all events if None
+
+    Returns:
+        np.ndarray: Frame index of the last ball possession before every
+        event, the event frame if no possession is found
+    """
+    frames = np.asarray(frames, dtype=np.int64)
+    players = np.asarray(players, dtype=np.int64)
+    groups = np.asarray(groups, dtype=np.int64)
+    synced = frames.copy()
+    if len(frames) == 0:
+        return synced
+    if before is None:
+        before = np.full(len(frames), 499, dtype=np.int64)
+    before = np.asarray(before, dtype=np.int64)
+    if gaps is None:
+        gaps = build_match_gaps(pos_data, None, ball_positions,
+                                groups=np.unique(groups))
+    if pyramid is not None:
+        for i, (t_event, player, group) in enumerate(zip(frames, players,
+                                                         groups)):
+            synced[i] = search_pyramid(pyramid,
+                                       pyramid.columns[(group, player)],
+                                       int(t_event), threshold,
+                                       gaps.combined(group, player),
+                                       int(before[i]))
+        return synced
+    # The windows before the events, cut to the window of every event
+    windows = event_windows(frames, players, groups, pos_data,
+                            ball_positions, before=int(before.max()))
+    complete = windows.complete() & (
+        windows.frames >= (frames - before)[:, None])
+    distances = windows.distances()
+    rows = np.arange(len(frames))
+
+    hit = last_true(complete & (distances < 0.3))
+    found = hit >= 0
+    synced[found] = windows.frames[rows[found], hit[found]]
+
+    # Missing data in the window means that the game was interrupted,
+    # the search with the threshold is extended until the window contains
+    # as many frames with data as the window
+    close = last_true(complete & (distances < threshold))
+    for i in np.flatnonzero(~found):
+        lower, none_idx = search_start(gaps.combined(groups[i], players[i]),
+                                       int(frames[i]), int(before[i]))
+        if lower < frames[i] - before[i]:
+            logger.debug("Game was interrupted for %s frames", none_idx)
+            extended = event_windows(
+                frames[i:i + 1], players[i:i + 1], groups[i:i + 1],
+                pos_data, ball_positions, before=int(frames[i] - lower))
+            position = last_true(extended.complete()
+                                 & (extended.distances() < threshold))[0]
+            if position >= 0:
+                synced[i] = extended.frames[0, position]
+        elif close[i] >= 0:
+            synced[i] = windows.frames[i, close[i]]
+        if synced[i] == frames[i]:
+            logger.debug("No ball possession found before frame %s",
+                         frames[i])
+    return synced
+
+
+def search_pyramid(pyramid: MinPyramid, column: int, t_event: int,
+                   threshold: float = 0.99,
+                   gaps: Optional[GapIndex] = None,
+                   before: int = 499) -> int:
+    """
+    Searches the possession frame of one event coarse-to-fine on the
+    distance pyramid, with the search of sync_pos_data.
+
+    Args:
+        pyramid: The distance pyramid of the match
+        column: The column of the player of the event
+        t_event: The frame index of the event
+        threshold: Threshold for the distance to the ball (in meters)
+        gaps: The gap index of the player combined with the ball, the
+        window is not extended if None
+        before: The number of frames before the event that are searched
+
+    Returns:
+        int: Frame index of the last ball possession before the event
+    """
+    lower = t_event - before
+    frame = pyramid.last_below(column, lower, t_event, 0.3)
+    if frame >= 0:
+        return frame
+    # Missing data in the window means that the game was interrupted
+    if gaps is not None:
+        lower, none_idx = search_start(gaps, t_event, before)
+        if none_idx > 10:
+            logger.debug("Game was interrupted for %s frames", none_idx)
+    frame = pyramid.last_below(column, lower, t_event, threshold)
+    if frame < 0:
+        logger.debug("No ball possession found before frame %s", t_event)
+        return t_event
+    return frame
+
+
 def plot_test(max_time: int, t_event: int,
               player_data: Any, ball_positions: Any, pid: str) -> None:
     """
@@ -284,6 +531,8 @@ def plot_test(max_time: int, t_event: int,
         ball_positions (Any): The ball positions.
         pid (str): The player ID.
     """
+    from matplotlib import pyplot as plt
+
     # Define the time range for plotting
     plot_range = range(max_time, t_event)
     # Prepare data for plotting
@@ -313,9 +562,9 @@ def plot_test(max_time: int, t_event: int,
         plt.ylim(-10, 10)  # Width of the field (20m)
         plt.gca().set_aspect('equal')  # Force aspect ratio 2:1
 
-        plt.show()
+        show_or_close()
     except Exception as e:
-        print(f"Error accessing player position data for plot: {e}")
+        logger.warning("Error accessing player position data for plot: %s", e)
         # player_positions = np.array([])  # Empty array as fallback
 
 
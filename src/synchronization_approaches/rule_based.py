@@ -7,6 +7,7 @@
     Date:
         2025-04-29
     """
+import logging
 from typing import Any, Callable, Dict, List, Tuple
 
 import numpy as np
@@ -14,6 +15,8 @@ import pandas as pd
 
 from variables import data_variables as dv
 
+logger = logging.getLogger(__name__)
+
 
 def synchronize_events_fl_rule_based(events: Any,
                                      sequences: list[tuple[int, int, int]]
@@ -225,7 +228,7 @@ def calculate_correct_phase_fl(
     if ((phase in (1, 3)) and team_ab == dv.Team.A) or (
         (phase in (2, 4)) and team_ab == dv.Team.B
     ):
-        print("correct Phase")
+        logger.debug("correct Phase")
 
     else:
         new_time = search_phase_fl(time, sequences, team_ab)
@@ -313,7 +316,7 @@ def search_phase_fl(time: int,
     # phase before the given `time`
     end: int
     phase: int
-    print(time)
+    logger.debug("Searching the phase before frame %s", time)
     for _, end, phase in reversed(sequences):
         if end <= time:
             if (phase in (1, 3)) and competitor == dv.Team.A:
@@ -321,7 +324,7 @@ def search_phase_fl(time: int,
             if (phase in (2, 4)) and competitor == dv.Team.B:
                 return end - 1  # Return the end of this phase for
 
-    print("No valid phase found for the given time!")
+    logger.debug("No valid phase found for the given time!")
     return time
 
 
@@ -348,7 +351,7 @@ def calculate_inactive_phase_fl(
     for start, end, phase in sequences:
         if start <= time < end:
             if phase == 0:
-                print("correct Phase")
+                logger.debug("correct Phase")
                 return time  # Indicates phase is active and valid.
             break
 
@@ -391,12 +394,12 @@ def calculate_timeouts_fl(time: int, sequences: list[tuple[int, int, int]],
                 phase_timeout = phase
                 break
         if phase_timeout == 0:
-            print("correct Phase")
+            logger.debug("correct Phase")
             return time
         if ((phase_timeout in (1, 3) and (team_ab == dv.Team.A))
                 or (phase_timeout in (2, 4) and team_ab == dv.Team.B)):
             if int(time) == int(end - 1):
-                print("correct Phase")
+                logger.debug("correct Phase")
                 return time
 
             return end - 1
@@ -446,11 +449,11 @@ def calculate_timeouts_over_fl(sequences: list[tuple[int, int, int]],
             lastevent = give_last_event_fl(events, time)
             if lastevent[0] == "timeout":
                 return time
-            print("No valid phase found for timeout_over event!")
+            logger.debug("No valid phase found for timeout_over event!")
         time_inactive = calculate_inactive_phase_fl(time, sequences)
         if time_inactive is not None:
             lastevent = give_last_event_fl(events, time_inactive)
             if lastevent[0] == "timeout":
                 return time_inactive
-    print("No valid phase found for timeout_over event!")
+    logger.debug("No valid phase found for timeout_over event!")
     return time
@@ -16,6 +16,8 @@ class Approach(Enum):
         COST_FUNCTION (str): Represents a cost function based approach.
         ML_CORRECTION (str): Represents a machine learning approach with
                             correction.
+        COST_BASED_DP (str): Represents a cost based approach that aligns
+                            the events to the sequences in time order.
     """
 
     RULE_BASED = "Rule-based Approach"
@@ -27,6 +29,7 @@ class Approach(Enum):
     COST_BASED = "Cost-based Approach"
     COST_BASED_COR = "Cost-based with Correction"
     COST_BASED_RB = "Cost-based with Rule-based"
+    COST_BASED_DP = "Cost-based with Alignment"
 
 
 class Season(Enum):
@@ -0,0 +1,27 @@
+"""
+Tests of the import time budgets of the synchronization hot path.
+
+Author:
+    @Annabelle Runge
+
+Date:
+    2025-05-26
+"""
+import pytest
+
+from help_functions.import_budget import (IMPORT_BUDGETS, LAZY_MODULES,
+                                          check_import_budgets, measure_import)
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("module", list(IMPORT_BUDGETS))
+def test_no_eager_imports(module: str) -> None:
+    measured = measure_import(module)
+    assert measured["loaded"] == [], (
+        f"{module} loads {measured['loaded']}, which should be imported "
+        f"lazily ({', '.join(LAZY_MODULES)})")
+
+
+@pytest.mark.slow
+def test_import_budgets() -> None:
+    assert check_import_budgets(), "an import time budget is exceeded"